@@ -0,0 +1,265 @@
+"""
+バッチ(tweet_monitor_batch.lambda_handler)のベンチマーク。
+
+motoのDynamoDB・偽のX APIサーバー・偽のSlack APIサーバーを相手に本物のハンドラを実行し、
+設定数とキーワードあたりのツイート数を変えながらスループット・設定ごとの処理時間(p50/p95)・
+バックエンドごとの呼び出し回数を測る。結果はJSONで保存し、ベースラインと比べて悪化を検出する。
+
+    python -m benchmarks.batch_benchmark --settings 10,100 --tweets 10,100
+    python -m benchmarks.batch_benchmark --save-baseline
+"""
+
+import argparse
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from benchmarks import report
+from benchmarks.environment import (
+    benchmark_environment,
+    seed_credentials,
+    seed_settings,
+)
+from benchmarks.fakes import FakeSlackServer, FakeXServer
+from observability import metrics
+from observability.metrics import MemorySink
+from lambda_functions.event_bridge import tweet_monitor_batch
+
+DEFAULT_SETTINGS = [10, 50, 100]
+DEFAULT_TWEETS_PER_KEYWORD = [10, 25]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "batch.json")
+DEFAULT_RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+# ベンチマーク中の環境変数の既定値（同じ名前の環境変数が設定されていればそちらを使う）
+# Slackのチャンネルごとの送信レートはSlack側の制限ではなく処理自体を測るため緩めておく
+BENCHMARK_ENV = {
+    "DELIVERY_MODE": "inline",
+    "SHARD_EXECUTOR": "thread",
+    "SLACK_BOT_TOKEN": "xoxb-benchmark",
+    "SLACK_CHANNEL_RATE": "1000",
+    "SLACK_CHANNEL_BURST": "1000",
+    "LOG_LEVEL": "WARNING",
+}
+
+# 結果に載せる処理時間のメトリクス
+LATENCY_METRICS = [
+    "setting",
+    "pack",
+    "x_search_request",
+    "notifications_dedup",
+    "notifications_write",
+    "slack_post",
+    "settings_update",
+    "watchlist_recheck",
+]
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def collect_metrics(sink):
+    """
+    MemorySinkに溜まったEMFのレコードをカウンタの合計と処理時間の一覧に分ける
+    """
+    counts = {}
+    timings = {}
+    for record in sink.records:
+        for definition in record["_aws"]["CloudWatchMetrics"]:
+            for metric in definition["Metrics"]:
+                name = metric["Name"]
+                if metric["Unit"] == "Count":
+                    counts[name] = counts.get(name, 0) + record[name]
+                else:
+                    timings.setdefault(name, []).extend(record[name])
+    return counts, timings
+
+
+def run_once(x_server, slack_server, settings, credentials):
+    """
+    シナリオを1回実行し、(経過秒数, カウンタ, 処理時間, 呼び出し回数, ハンドラの戻り値)を返す
+    """
+    x_server.reset()
+    slack_server.reset()
+    env = {name: os.environ.get(name, value) for name, value in BENCHMARK_ENV.items()}
+    env["X_API_BASE_URL"] = x_server.base_url
+    env["SLACK_API_BASE_URL"] = slack_server.base_url
+    sink = MemorySink()
+    previous_sink = metrics.set_sink(sink)
+    try:
+        with benchmark_environment(env) as (dynamodb, dynamodb_calls):
+            seed_settings(dynamodb, settings)
+            seed_credentials(dynamodb, credentials)
+            started = time.perf_counter()
+            response = tweet_monitor_batch.lambda_handler({}, None)
+            elapsed = time.perf_counter() - started
+    finally:
+        metrics.set_sink(previous_sink)
+    counts, timings = collect_metrics(sink)
+    calls = {
+        "x": dict(x_server.calls),
+        "slack": dict(slack_server.calls),
+        "dynamodb": dict(dynamodb_calls.calls),
+    }
+    return elapsed, counts, timings, calls, response
+
+
+def run_scenario(
+    x_server, slack_server, settings, tweets_per_keyword, credentials, repeat
+):
+    """
+    シナリオをrepeat回実行する。経過時間とカウンタ・呼び出し回数は中央値の回の値、
+    処理時間は全回の値をまとめて集計する
+    """
+    x_server.tweets_per_keyword = tweets_per_keyword
+    attempts = [
+        run_once(x_server, slack_server, settings, credentials) for _ in range(repeat)
+    ]
+    elapsed_values = [attempt[0] for attempt in attempts]
+    median = statistics.median_low(elapsed_values)
+    elapsed, counts, _, calls, response = attempts[elapsed_values.index(median)]
+    timings = {}
+    for attempt in attempts:
+        for name, values in attempt[2].items():
+            timings.setdefault(name, []).extend(values)
+    summary = response.get("summary", {})
+    return {
+        "scenario": {"settings": settings, "tweets_per_keyword": tweets_per_keyword},
+        "status_code": response.get("statusCode"),
+        "elapsed_seconds": round(elapsed, 4),
+        "elapsed_seconds_all": [round(value, 4) for value in elapsed_values],
+        "throughput": {
+            "settings_per_second": round(settings / elapsed, 2),
+            "tweets_per_second": round(counts.get("tweets_fetched", 0) / elapsed, 2),
+        },
+        "latency": {
+            name: report.latency_summary(timings.get(name, []))
+            for name in LATENCY_METRICS
+        },
+        "counts": counts,
+        "calls": calls,
+        "errors": len(summary.get("errors", [])),
+    }
+
+
+def run_benchmark(
+    settings_list,
+    tweets_list,
+    repeat=1,
+    credentials=4,
+    x_latency=0.02,
+    slack_latency=0.02,
+    x_rate_limit_ratio=0.0,
+    slack_rate_limit_ratio=0.0,
+    pass_ratio=0.5,
+):
+    """
+    設定数×キーワードあたりのツイート数の全シナリオを実行し、結果をdictで返す
+    """
+    x_server = FakeXServer(
+        pass_ratio=pass_ratio, latency=x_latency, rate_limit_ratio=x_rate_limit_ratio
+    )
+    slack_server = FakeSlackServer(
+        latency=slack_latency, rate_limit_ratio=slack_rate_limit_ratio
+    )
+    with x_server, slack_server:
+        runs = [
+            run_scenario(x_server, slack_server, settings, tweets, credentials, repeat)
+            for settings in settings_list
+            for tweets in tweets_list
+        ]
+    return {
+        "benchmark": "batch",
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": {
+            "repeat": repeat,
+            "credentials": credentials,
+            "x_latency_ms": x_latency * 1000,
+            "slack_latency_ms": slack_latency * 1000,
+            "x_429_ratio": x_rate_limit_ratio,
+            "slack_429_ratio": slack_rate_limit_ratio,
+            "pass_ratio": pass_ratio,
+            "env": {
+                name: os.environ.get(name, value)
+                for name, value in BENCHMARK_ENV.items()
+            },
+        },
+        "runs": runs,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--settings",
+        type=_int_list,
+        default=DEFAULT_SETTINGS,
+        help="設定数（カンマ区切りで複数指定）",
+    )
+    parser.add_argument(
+        "--tweets",
+        type=_int_list,
+        default=DEFAULT_TWEETS_PER_KEYWORD,
+        help="キーワードあたりの検索結果のツイート数（カンマ区切りで複数指定）",
+    )
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--credentials", type=int, default=4)
+    parser.add_argument("--x-latency-ms", type=float, default=20)
+    parser.add_argument("--slack-latency-ms", type=float, default=20)
+    parser.add_argument("--x-429-ratio", type=float, default=0.0)
+    parser.add_argument("--slack-429-ratio", type=float, default=0.0)
+    parser.add_argument(
+        "--pass-ratio", type=float, default=0.5, help="閾値を通過するツイートの割合"
+    )
+    parser.add_argument("--output", help="結果のJSONの保存先")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="結果をベースラインとして保存する"
+    )
+    parser.add_argument("--tolerance", type=float, default=report.DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(
+        args.settings,
+        args.tweets,
+        repeat=max(1, args.repeat),
+        credentials=args.credentials,
+        x_latency=args.x_latency_ms / 1000,
+        slack_latency=args.slack_latency_ms / 1000,
+        x_rate_limit_ratio=args.x_429_ratio,
+        slack_rate_limit_ratio=args.slack_429_ratio,
+        pass_ratio=args.pass_ratio,
+    )
+    print(report.format_table(results))
+
+    output = args.output or os.path.join(
+        DEFAULT_RESULTS_DIR,
+        f"batch-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.json",
+    )
+    report.save(output, results)
+    print(f"結果を保存しました: {output}")
+    if args.save_baseline:
+        report.save(args.baseline, results)
+        print(f"ベースラインを保存しました: {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"ベースラインがありません: {args.baseline}")
+        return 0
+    regressions = report.compare(results, report.load(args.baseline), args.tolerance)
+    for regression in regressions:
+        print(
+            f"悪化: {regression['scenario']} {regression['metric']} "
+            f"{regression['baseline']} -> {regression['current']} "
+            f"(x{regression['ratio']})"
+        )
+    if regressions:
+        return 1
+    print("ベースラインからの悪化はありません")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""
+Slackコマンドの入口(lambda_functions.api_gateway.main)のコールドスタートの計測。
+
+シナリオごとに新しいPythonプロセスを起動し（-X importtimeでimportの時間も取る）、
+main.pyのimportから最初のlambda_handlerの応答までの時間、boto3を読み込んだかどうか、
+累積時間の大きいimportの上位を表示する。
+（importlib.import_moduleで遅延importしたモジュールは-X importtimeに出ないため、
+ハンドラの処理時間とapp_modulesで確認する）
+
+    python -m benchmarks.cold_start
+    python -m benchmarks.cold_start --repeat 5 --top 15
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from benchmarks import report
+
+SIGNING_SECRET = "benchmark-signing-secret"
+
+# シナリオ名と(コマンドのテキスト, 署名が正しいかどうか)
+SCENARIOS = {
+    "help": ("setting help", True),
+    "unknown_action": ("setting unknown", True),
+    "bad_signature": ("setting help", False),
+    "list": ("setting list", True),
+}
+
+# 子プロセスで実行するコード。結果は標準出力の最終行にJSONで出す
+CHILD_CODE = """
+import hashlib, hmac, json, sys, time
+from urllib.parse import urlencode
+started = time.perf_counter()
+from lambda_functions.api_gateway import main
+imported = time.perf_counter()
+text, signed = json.loads(sys.argv[1])
+body = urlencode({"text": text})
+timestamp = str(int(time.time()))
+secret = sys.argv[2] if signed else "wrong-secret"
+signature = "v0=" + hmac.new(
+    secret.encode(), f"v0:{timestamp}:{body}".encode(), hashlib.sha256
+).hexdigest()
+event = {
+    "headers": {
+        "X-Slack-Request-Timestamp": timestamp,
+        "X-Slack-Signature": signature,
+    },
+    "body": body,
+}
+try:
+    status = main.lambda_handler(event, None)["statusCode"]
+except Exception as e:
+    status = type(e).__name__
+finished = time.perf_counter()
+print(json.dumps({
+    "status": status,
+    "import_ms": (imported - started) * 1000,
+    "handler_ms": (finished - imported) * 1000,
+    "total_ms": (finished - started) * 1000,
+    "boto3_loaded": "boto3" in sys.modules,
+    "app_modules": sorted(
+        name for name in sys.modules
+        if name.split(".")[0] in ("lambda_functions", "repositories", "integration")
+    ),
+}))
+"""
+
+
+def parse_importtime(stderr):
+    """
+    -X importtimeの出力からモジュールごとの累積時間（マイクロ秒）を取り出す
+    """
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative_us, module = line[len("import time:") :].split("|", 2)
+        try:
+            value = int(cumulative_us.strip())
+        except ValueError:
+            # 見出し行
+            continue
+        cumulative[module.strip()] = value
+    return cumulative
+
+
+def run_cold(text, signed, env=None):
+    """
+    新しいプロセスでmain.pyのimportと最初のハンドラ呼び出しを1回行い、
+    (計測結果のdict, モジュールごとの累積import時間)を返す
+    """
+    child_env = dict(os.environ if env is None else env)
+    child_env["SLACK_SIGNING_SECRET"] = SIGNING_SECRET
+    child_env.setdefault("AWS_DEFAULT_REGION", "ap-northeast-1")
+    child_env.setdefault("LOG_LEVEL", "WARNING")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    child_env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [root, child_env.get("PYTHONPATH")])
+    )
+    completed = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            CHILD_CODE,
+            json.dumps([text, signed]),
+            SIGNING_SECRET,
+        ],
+        capture_output=True,
+        text=True,
+        env=child_env,
+        cwd=root,
+        check=True,
+    )
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    return result, parse_importtime(completed.stderr)
+
+
+def run_profile(scenarios=None, repeat=3, top=10):
+    """
+    シナリオごとにrepeat回コールドスタートを計測し、合計時間の中央値と上位のimportを返す
+    """
+    results = []
+    for name in scenarios or SCENARIOS:
+        text, signed = SCENARIOS[name]
+        attempts = [run_cold(text, signed) for _ in range(repeat)]
+        totals = [attempt[0]["total_ms"] for attempt in attempts]
+        result, imports = attempts[totals.index(statistics.median_low(totals))]
+        results.append(
+            {
+                "scenario": name,
+                "status": result["status"],
+                "import_ms": round(result["import_ms"], 2),
+                "handler_ms": round(result["handler_ms"], 2),
+                "total_ms": round(result["total_ms"], 2),
+                "total_ms_p50": round(report.percentile(totals, 50), 2),
+                "boto3_loaded": result["boto3_loaded"],
+                "app_modules": result["app_modules"],
+                "top_imports": [
+                    {"module": module, "cumulative_ms": round(us / 1000, 2)}
+                    for module, us in sorted(
+                        imports.items(), key=lambda item: item[1], reverse=True
+                    )[:top]
+                ],
+            }
+        )
+    return results
+
+
+def format_table(results):
+    lines = [
+        f"{'scenario':<16} {'status':>6} {'import_ms':>9} {'handler_ms':>10} "
+        f"{'total_ms':>8} {'boto3':>5}"
+    ]
+    for result in results:
+        lines.append(
+            f"{result['scenario']:<16} {result['status']:>6} "
+            f"{result['import_ms']:>9.1f} {result['handler_ms']:>10.1f} "
+            f"{result['total_ms']:>8.1f} {'yes' if result['boto3_loaded'] else 'no':>5}"
+        )
+    for result in results:
+        lines.append("")
+        lines.append(f"[{result['scenario']}] 累積時間の大きいimport")
+        for item in result["top_imports"]:
+            lines.append(f"  {item['cumulative_ms']:>8.1f} ms  {item['module']}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--scenarios",
+        default=",".join(SCENARIOS),
+        help=f"計測するシナリオ（カンマ区切り: {', '.join(SCENARIOS)}）",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10, help="表示するimportの件数")
+    parser.add_argument("--output", help="結果のJSONの保存先")
+    args = parser.parse_args(argv)
+
+    scenarios = [name for name in args.scenarios.split(",") if name.strip()]
+    for name in scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"不明なシナリオです: {name}")
+    results = run_profile(scenarios, repeat=max(1, args.repeat), top=args.top)
+    print(format_table(results))
+    if args.output:
+        report.save(args.output, {"benchmark": "cold_start", "runs": results})
+        print(f"結果を保存しました: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+import os
+import threading
+from contextlib import contextmanager
+import boto3
+from moto import mock_dynamodb
+from repositories.resource_registry import reset_registry
+
+BENCHMARK_REGION = "ap-northeast-1"
+
+# template.yamlと同じキー・インデックスのテーブル定義（課金モードはすべてPAY_PER_REQUEST）
+TABLES = {
+    "TweetWacherXCredentialSettingsTable": {
+        "keys": [("bearer_token", "HASH", "S")],
+        "indexes": {},
+    },
+    "TweetWacherSettingsTable": {
+        "keys": [("id", "HASH", "S")],
+        "indexes": {"publication_status-index": [("publication_status", "HASH", "S")]},
+    },
+    "TweetWacherNotificationsTable": {
+        "keys": [("tweet_uid", "HASH", "S"), ("slack_ch", "RANGE", "S")],
+        "indexes": {
+            "slack_message_ts-index": [
+                ("slack_message_ts", "HASH", "S"),
+                ("tweet_uid", "RANGE", "S"),
+            ],
+            "notified_date-index": [
+                ("notified_date", "HASH", "S"),
+                ("notified_at", "RANGE", "S"),
+            ],
+        },
+        "stream": True,
+    },
+    "TweetWacherWatchlistTable": {
+        "keys": [("tweet_uid", "HASH", "S"), ("setting_id", "RANGE", "S")],
+        "indexes": {},
+    },
+}
+
+
+def _key_schema(keys):
+    return [{"AttributeName": name, "KeyType": key_type} for name, key_type, _ in keys]
+
+
+def create_tables(dynamodb):
+    for table_name, definition in TABLES.items():
+        attributes = {}
+        for keys in [definition["keys"], *definition["indexes"].values()]:
+            for name, _, attribute_type in keys:
+                attributes[name] = attribute_type
+        params = {
+            "TableName": table_name,
+            "KeySchema": _key_schema(definition["keys"]),
+            "AttributeDefinitions": [
+                {"AttributeName": name, "AttributeType": attribute_type}
+                for name, attribute_type in attributes.items()
+            ],
+            "BillingMode": "PAY_PER_REQUEST",
+        }
+        if definition["indexes"]:
+            params["GlobalSecondaryIndexes"] = [
+                {
+                    "IndexName": index_name,
+                    "KeySchema": _key_schema(keys),
+                    "Projection": {"ProjectionType": "ALL"},
+                }
+                for index_name, keys in definition["indexes"].items()
+            ]
+        if definition.get("stream"):
+            params["StreamSpecification"] = {
+                "StreamEnabled": True,
+                "StreamViewType": "NEW_IMAGE",
+            }
+        dynamodb.create_table(**params)
+
+
+def seed_settings(dynamodb, count, like_threshold=10):
+    """
+    ベンチマーク用のアクティブな設定をcount件登録する。
+    キーワードとSlackチャンネルは設定ごとに別にする（検索パックへのまとめ方は本番と同じ処理に任せる）
+    """
+    table = dynamodb.Table("TweetWacherSettingsTable")
+    with table.batch_writer() as batch:
+        for i in range(count):
+            batch.put_item(
+                Item={
+                    "id": f"bench{i:05d}",
+                    "keyword": f"benchkw{i:05d}",
+                    "slack_ch": f"C{i:05d}",
+                    "publication_status": "active",
+                    "like_threshold": like_threshold,
+                }
+            )
+
+
+def seed_credentials(dynamodb, count):
+    table = dynamodb.Table("TweetWacherXCredentialSettingsTable")
+    for i in range(count):
+        table.put_item(Item={"bearer_token": f"bench-token-{i}"})
+
+
+class DynamoDBCallCounter:
+    """
+    boto3のイベントフックでDynamoDBのAPI呼び出しを操作名ごとに数える。
+    install後に作られたクライアント・リソースの呼び出しが対象になる
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = {}
+
+    def _before_call(self, model, **kwargs):
+        with self._lock:
+            self.calls[model.name] = self.calls.get(model.name, 0) + 1
+
+    def install(self, session):
+        session.events.register("before-call.dynamodb", self._before_call)
+
+    def uninstall(self, session):
+        session.events.unregister("before-call.dynamodb", self._before_call)
+
+
+@contextmanager
+def benchmark_environment(env):
+    """
+    motoのDynamoDBにテンプレートと同じテーブルを作り、環境変数envを設定した状態にする。
+    (DynamoDBのリソース, DynamoDB呼び出し回数のカウンタ)を返す。
+    抜けるときに環境変数と共有のboto3リソースを元に戻す
+    """
+    env = {
+        "AWS_DEFAULT_REGION": BENCHMARK_REGION,
+        "AWS_ACCESS_KEY_ID": "benchmark",
+        "AWS_SECRET_ACCESS_KEY": "benchmark",
+        **env,
+    }
+    saved = {name: os.environ.get(name) for name in env}
+    os.environ.update(env)
+    counter = DynamoDBCallCounter()
+    try:
+        with mock_dynamodb():
+            boto3.setup_default_session(region_name=BENCHMARK_REGION)
+            reset_registry()
+            dynamodb = boto3.resource("dynamodb")
+            create_tables(dynamodb)
+            counter.install(boto3.DEFAULT_SESSION)
+            yield dynamodb, counter
+    finally:
+        reset_registry()
+        boto3.DEFAULT_SESSION = None
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
@@ -0,0 +1,295 @@
+import json
+import random
+import re
+import socket
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 偽のツイートIDの開始値（実際のSnowflake IDと同じ桁数にする）
+TWEET_ID_BASE = 1_900_000_000_000_000_000
+# 検索クエリから語を取り出す（ORや括弧は除く）
+QUERY_WORD = re.compile(r"[^\s()\"]+")
+
+
+class FakeServer:
+    """
+    ベンチマーク用の偽APIサーバーの共通部分。
+    別スレッドでHTTPサーバーを起動し、リクエストごとにlatency秒待ってから応答する。
+    rate_limit_ratioの確率で429を返す（乱数はseedで固定する）。
+    エンドポイントごとの呼び出し回数をcallsに数える。
+    """
+
+    def __init__(self, latency=0.0, rate_limit_ratio=0.0, seed=0):
+        self.latency = latency
+        self.rate_limit_ratio = rate_limit_ratio
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = {}
+        self._server = None
+        self._thread = None
+        # Keep-Aliveで開いたままの接続（停止時に切断する）
+        self._connections = set()
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # ヘッダーと本文を別々に書くため、Nagleアルゴリズムによる遅延を避ける
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server._connections.add(self.connection)
+
+            def finish(self):
+                with server._lock:
+                    server._connections.discard(self.connection)
+                super().finish()
+
+            def do_GET(self):
+                server._handle(self, "GET")
+
+            def do_POST(self):
+                server._handle(self, "POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        サーバーを停止し、開いたままの接続も切断する
+        （切断しないと、接続を使い回すクライアントが停止後のサーバーと通信し続ける）
+        """
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        with self._lock:
+            connections, self._connections = self._connections, set()
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset(self):
+        """呼び出し回数と、サーバーが保持している状態を破棄する（シナリオの切り替え時に呼ぶ）"""
+        with self._lock:
+            self.calls = {}
+
+    def _count(self, name):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def _chance(self, ratio):
+        if ratio <= 0:
+            return False
+        with self._lock:
+            return self._random.random() < ratio
+
+    def _rate_limited(self):
+        return self._chance(self.rate_limit_ratio)
+
+    def _handle(self, handler, method):
+        url = urllib.parse.urlsplit(handler.path)
+        length = int(handler.headers.get("Content-Length") or 0)
+        body = handler.rfile.read(length) if length else b""
+        if self.latency:
+            time.sleep(self.latency)
+        status, headers, payload = self.respond(
+            method, url.path, urllib.parse.parse_qs(url.query), body
+        )
+        data = json.dumps(payload).encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def respond(self, method, path, query, body):
+        raise NotImplementedError
+
+
+class FakeXServer(FakeServer):
+    """
+    X APIの検索(GET /2/tweets/search/recent)とID指定取得(GET /2/tweets)の偽サーバー。
+    検索ではクエリの語ごとにtweets_per_keyword件のツイートを返し、max_results件ずつページングする。
+    ツイートのうちpass_ratioの割合はいいね数をpassing_like_count、残りは0にする
+    （ID指定取得でも同じIDには同じ値を返す）
+    """
+
+    def __init__(
+        self,
+        tweets_per_keyword=10,
+        pass_ratio=0.5,
+        passing_like_count=100,
+        latency=0.0,
+        rate_limit_ratio=0.0,
+        seed=0,
+    ):
+        super().__init__(latency, rate_limit_ratio, seed)
+        self.tweets_per_keyword = tweets_per_keyword
+        self.pass_ratio = pass_ratio
+        self.passing_like_count = passing_like_count
+        self._next_id = TWEET_ID_BASE
+        # 検索クエリごとに生成済みのツイート（ページングの2ページ目以降で使う）
+        self._results = {}
+
+    def reset(self):
+        super().reset()
+        with self._lock:
+            self._results = {}
+
+    def _public_metrics(self, tweet_id):
+        # 生成順にn件目までの通過数がfloor(n * pass_ratio)になるよう均等に散らす
+        n = int(tweet_id) - TWEET_ID_BASE
+        passed = int(n * self.pass_ratio) > int((n - 1) * self.pass_ratio)
+        return {
+            "like_count": self.passing_like_count if passed else 0,
+            "retweet_count": 0,
+            "reply_count": 0,
+            "quote_count": 0,
+        }
+
+    def _tweet(self, tweet_id, word):
+        return {
+            "id": str(tweet_id),
+            "text": f"{word} benchmark tweet",
+            "created_at": "2026-01-01T00:00:00.000Z",
+            "lang": "ja",
+            "public_metrics": self._public_metrics(tweet_id),
+        }
+
+    def _search_results(self, search_query):
+        with self._lock:
+            if search_query not in self._results:
+                words = [
+                    word
+                    for word in QUERY_WORD.findall(search_query)
+                    if word != "OR" and ":" not in word
+                ]
+                tweets = []
+                for word in words:
+                    for _ in range(self.tweets_per_keyword):
+                        self._next_id += 1
+                        tweets.append(self._tweet(self._next_id, word))
+                # X APIと同じく新しい順に返す
+                tweets.sort(key=lambda tweet: int(tweet["id"]), reverse=True)
+                self._results[search_query] = tweets
+            return self._results[search_query]
+
+    def _rate_limit_headers(self, remaining):
+        return {
+            "x-rate-limit-remaining": str(remaining),
+            "x-rate-limit-reset": str(int(time.time()) + 1),
+        }
+
+    def respond(self, method, path, query, body):
+        if self._rate_limited():
+            self._count("rate_limited")
+            return 429, self._rate_limit_headers(0), {"title": "Too Many Requests"}
+        headers = self._rate_limit_headers(10000)
+        if path == "/2/tweets/search/recent":
+            self._count("search")
+            tweets = self._search_results(query["query"][0])
+            page_size = int(query.get("max_results", ["100"])[0])
+            offset = int(query.get("next_token", ["0"])[0])
+            page = tweets[offset : offset + page_size]
+            meta = {"result_count": len(page)}
+            if offset + page_size < len(tweets):
+                meta["next_token"] = str(offset + page_size)
+            return 200, headers, {"data": page, "meta": meta}
+        if path == "/2/tweets":
+            self._count("lookup")
+            ids = query["ids"][0].split(",")
+            return (
+                200,
+                headers,
+                {
+                    "data": [
+                        {
+                            "id": tweet_id,
+                            "public_metrics": self._public_metrics(tweet_id),
+                        }
+                        for tweet_id in ids
+                    ]
+                },
+            )
+        self._count("not_found")
+        return 404, {}, {"title": "Not Found"}
+
+
+class FakeSlackServer(FakeServer):
+    """
+    Slack API(chat.postMessage / chat.update)の偽サーバー。
+    429の場合はRetry-Afterにretry_after秒を返す。error_ratioの確率でHTTP 500を返す。
+    送信されたメッセージ数はチャンネルごとに数え、送信されたメッセージ本体はpostedに残す
+    """
+
+    def __init__(
+        self,
+        latency=0.0,
+        rate_limit_ratio=0.0,
+        retry_after=0.05,
+        error_ratio=0.0,
+        seed=0,
+    ):
+        super().__init__(latency, rate_limit_ratio, seed)
+        self.retry_after = retry_after
+        self.error_ratio = error_ratio
+        self.messages = {}
+        self.posted = []
+        self._ts = 0
+
+    def reset(self):
+        super().reset()
+        with self._lock:
+            self.messages = {}
+            self.posted = []
+
+    def respond(self, method, path, query, body):
+        if self._rate_limited():
+            self._count("rate_limited")
+            return 429, {"Retry-After": str(self.retry_after)}, {"ok": False}
+        if self._chance(self.error_ratio):
+            self._count("server_error")
+            return 500, {}, {"ok": False, "error": "internal_error"}
+        payload = json.loads(body or b"{}")
+        if path == "/api/chat.postMessage":
+            self._count("chat.postMessage")
+            with self._lock:
+                self._ts += 1
+                ts = f"{int(time.time())}.{self._ts:06d}"
+                channel = payload.get("channel")
+                self.messages[channel] = self.messages.get(channel, 0) + 1
+                self.posted.append(payload)
+            return 200, {}, {"ok": True, "channel": channel, "ts": ts}
+        if path == "/api/chat.update":
+            self._count("chat.update")
+            return 200, {}, {"ok": True, "ts": payload.get("ts")}
+        self._count("not_found")
+        return 404, {}, {"ok": False, "error": "unknown_method"}
@@ -0,0 +1,127 @@
+import json
+import math
+import os
+
+# ベースラインより悪化したとみなす割合の既定値（スループットの低下・p95の増加）
+DEFAULT_TOLERANCE = 0.25
+
+
+def percentile(values, rate):
+    """
+    値の一覧のパーセンタイル（最近傍順位法）。空の場合はNone
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(rate / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def latency_summary(values):
+    """
+    処理時間（ミリ秒）の一覧から件数・p50・p95・最大値を返す
+    """
+    if not values:
+        return {"count": 0, "p50": None, "p95": None, "max": None}
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 50), 3),
+        "p95": round(percentile(values, 95), 3),
+        "max": round(max(values), 3),
+    }
+
+
+def scenario_key(scenario):
+    return f"settings={scenario['settings']},tweets={scenario['tweets_per_keyword']}"
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    ベースラインと同じシナリオの結果を比べ、悪化した項目の一覧を返す。
+    スループット（件/秒）が(1 - tolerance)倍未満、設定ごとの処理時間のp95が(1 + tolerance)倍を超えたものを悪化とする
+    """
+    previous = {scenario_key(run["scenario"]): run for run in baseline.get("runs", [])}
+    regressions = []
+    for run in results["runs"]:
+        key = scenario_key(run["scenario"])
+        base = previous.get(key)
+        if base is None:
+            continue
+        checks = [
+            (
+                "settings_per_second",
+                run["throughput"]["settings_per_second"],
+                base["throughput"]["settings_per_second"],
+                False,
+            ),
+            (
+                "tweets_per_second",
+                run["throughput"]["tweets_per_second"],
+                base["throughput"]["tweets_per_second"],
+                False,
+            ),
+            (
+                "setting_p95_ms",
+                run["latency"]["setting"]["p95"],
+                base["latency"]["setting"]["p95"],
+                True,
+            ),
+        ]
+        for name, value, base_value, lower_is_better in checks:
+            if not value or not base_value:
+                continue
+            ratio = value / base_value
+            if (lower_is_better and ratio > 1 + tolerance) or (
+                not lower_is_better and ratio < 1 - tolerance
+            ):
+                regressions.append(
+                    {
+                        "scenario": key,
+                        "metric": name,
+                        "baseline": base_value,
+                        "current": value,
+                        "ratio": round(ratio, 3),
+                    }
+                )
+    return regressions
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save(path, data):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def format_table(results):
+    """
+    シナリオごとの結果を表形式の文字列にする
+    """
+    header = (
+        f"{'settings':>8} {'tweets':>6} {'elapsed_s':>9} {'settings/s':>10} "
+        f"{'tweets/s':>9} {'p50_ms':>8} {'p95_ms':>8} {'x_calls':>7} "
+        f"{'slack':>6} {'ddb':>6}"
+    )
+    lines = [header]
+    for run in results["runs"]:
+        latency = run["latency"]["setting"]
+        lines.append(
+            f"{run['scenario']['settings']:>8} "
+            f"{run['scenario']['tweets_per_keyword']:>6} "
+            f"{run['elapsed_seconds']:>9.3f} "
+            f"{run['throughput']['settings_per_second']:>10.1f} "
+            f"{run['throughput']['tweets_per_second']:>9.1f} "
+            f"{latency['p50'] or 0:>8.1f} "
+            f"{latency['p95'] or 0:>8.1f} "
+            f"{sum(run['calls']['x'].values()):>7} "
+            f"{sum(run['calls']['slack'].values()):>6} "
+            f"{sum(run['calls']['dynamodb'].values()):>6}"
+        )
+    return "\n".join(lines)
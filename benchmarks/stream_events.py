@@ -0,0 +1,148 @@
+import random
+import re
+
+# 生成する通知のツイートURL（Slackに送られたメッセージからツイートIDを取り出せる形にする）
+TWEET_URL_FORMAT = "https://x.com/benchmark/status/{tweet_uid}"
+TWEET_URL_PATTERN = re.compile(r"/benchmark/status/(\d+)")
+# ストリームレコードのシーケンス番号の開始値（実際のシーケンス番号と同じく21桁の数字にする）
+SEQUENCE_NUMBER_BASE = 100_000_000_000_000_000_000
+
+CHANNEL_UNIFORM = "uniform"
+CHANNEL_ZIPF = "zipf"
+
+
+def channel_picker(channels, distribution=CHANNEL_UNIFORM, skew=1.2, rng=None):
+    """
+    通知の送信先チャンネルを選ぶ関数を返す。
+    uniformは全チャンネルから均等に、zipfは先頭のチャンネルほど多く（重み1/k^skew）選ぶ
+    """
+    rng = rng or random.Random(0)
+    names = [f"C{i:05d}" for i in range(channels)]
+    if distribution == CHANNEL_ZIPF:
+        weights = [1 / (rank**skew) for rank in range(1, channels + 1)]
+        return lambda: rng.choices(names, weights)[0]
+    if distribution != CHANNEL_UNIFORM:
+        raise ValueError(f"チャンネルの分布が不正です: {distribution}")
+    return lambda: rng.choice(names)
+
+
+def generate_notifications(
+    count, channels, distribution=CHANNEL_UNIFORM, skew=1.2, digest_ratio=0.0, seed=0
+):
+    """
+    通知テーブルに登録される行（outboxモードでバッチが登録した未送信の行）をcount件作る
+    """
+    rng = random.Random(seed)
+    pick_channel = channel_picker(channels, distribution, skew, rng)
+    rows = []
+    for i in range(count):
+        tweet_uid = str(1_900_000_000_000_000_000 + i)
+        row = {
+            "tweet_uid": tweet_uid,
+            "tweet_url": TWEET_URL_FORMAT.format(tweet_uid=tweet_uid),
+            "slack_ch": pick_channel(),
+            "like_count": rng.randint(0, 1000),
+            "retweet_count": rng.randint(0, 100),
+        }
+        if rng.random() < digest_ratio:
+            row["digest"] = True
+            row["digest_max"] = 10
+        rows.append(row)
+    return rows
+
+
+def _attribute(value):
+    if isinstance(value, bool):
+        return {"BOOL": value}
+    if isinstance(value, int):
+        return {"N": str(value)}
+    return {"S": value}
+
+
+def to_stream_record(row, event_name, sequence_number, notified_at=None):
+    """
+    通知テーブルの行からDynamoDB Streamsのレコード（StreamViewType: NEW_IMAGE）を作る
+    """
+    image = {name: _attribute(value) for name, value in row.items()}
+    if notified_at is not None:
+        image["notified_at"] = {"S": notified_at}
+        image["slack_message_ts"] = {"S": "1700000000.000001"}
+    return {
+        "eventID": f"bench-{sequence_number}",
+        "eventName": event_name,
+        "eventSource": "aws:dynamodb",
+        "awsRegion": "ap-northeast-1",
+        "dynamodb": {
+            "Keys": {
+                "tweet_uid": {"S": row["tweet_uid"]},
+                "slack_ch": {"S": row["slack_ch"]},
+            },
+            "NewImage": image,
+            "SequenceNumber": str(sequence_number),
+            "StreamViewType": "NEW_IMAGE",
+        },
+    }
+
+
+def generate_stream_batches(
+    rows,
+    batch_size,
+    insert_ratio=1.0,
+    duplicate_ratio=0.0,
+    replay_ratio=0.0,
+    seed=0,
+):
+    """
+    通知の行からイベントソースマッピングがLambdaへ渡すレコードのバッチ（batch_size件ずつ）を作る。
+
+    - 全レコードのうちinsert_ratioの割合を各行のINSERTにし、残りは登録済みの行の通知済み更新(MODIFY)にする
+    - duplicate_ratioの割合のINSERTは、同じシーケンス番号のレコードを後ろにもう一度入れる（at-least-once）
+    - replay_ratioの割合のバッチは、直後に同じバッチをもう一度渡す（シャードの読み直し）
+    """
+    if not 0 < insert_ratio <= 1:
+        raise ValueError(
+            f"insert_ratioは0より大きく1以下にしてください: {insert_ratio}"
+        )
+    rng = random.Random(seed)
+    sequence_number = SEQUENCE_NUMBER_BASE
+    modifies_per_insert = (1 - insert_ratio) / insert_ratio
+    records = []
+    modified = 0
+    for index, row in enumerate(rows):
+        sequence_number += 1
+        records.append(to_stream_record(row, "INSERT", sequence_number))
+        # MODIFYは登録済みの行に対してだけ発生させ、INSERTの間に均等に散らす
+        while modified < round((index + 1) * modifies_per_insert):
+            sequence_number += 1
+            records.append(
+                to_stream_record(
+                    rows[rng.randint(0, index)],
+                    "MODIFY",
+                    sequence_number,
+                    notified_at="2026-01-01T00:00:00+00:00",
+                )
+            )
+            modified += 1
+
+    if duplicate_ratio > 0:
+        # 元のレコードより後ろのランダムな位置に重複を差し込む
+        ordered = [(index, record) for index, record in enumerate(records)]
+        for index, record in enumerate(records):
+            if record["eventName"] == "INSERT" and rng.random() < duplicate_ratio:
+                ordered.append((rng.uniform(index, len(records)), record))
+        records = [record for _, record in sorted(ordered, key=lambda item: item[0])]
+
+    batches = []
+    for start in range(0, len(records), batch_size):
+        batch = records[start : start + batch_size]
+        batches.append(batch)
+        if rng.random() < replay_ratio:
+            batches.append(list(batch))
+    return batches
+
+
+def delivered_tweet_uids(payload):
+    """
+    Slackに送られたメッセージ本体に含まれるツイートIDの一覧（ダイジェストは複数件）
+    """
+    return TWEET_URL_PATTERN.findall(str(payload.get("blocks") or payload.get("text")))
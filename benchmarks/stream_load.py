@@ -0,0 +1,359 @@
+"""
+ストリーム(notify_slack_stream.lambda_handler)の負荷試験。
+
+合成したDynamoDB Streamsのバッチ（件数・INSERT/MODIFYの比率・チャンネルの偏り・重複・再送を指定）を
+motoのDynamoDBと偽のSlack APIサーバーを相手に本物のハンドラへ順に渡し、
+レコード/秒・1レコードあたりのSlack呼び出し数・重複送信数・再試行による増幅率を測る。
+イベントソースマッピングのBatchSizeとSTREAM_CONCURRENCYを変えて比べられる。
+
+    python -m benchmarks.stream_load --records 2000 --batch-sizes 10,100,500 --concurrency 1,4,8
+"""
+
+import argparse
+import os
+import platform
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from benchmarks import report
+from benchmarks.environment import benchmark_environment
+from benchmarks.fakes import FakeSlackServer
+from benchmarks.stream_events import (
+    CHANNEL_UNIFORM,
+    CHANNEL_ZIPF,
+    delivered_tweet_uids,
+    generate_notifications,
+    generate_stream_batches,
+)
+from observability import metrics
+from observability.metrics import MemorySink
+from lambda_functions.dynamodb_stream import notify_slack_stream
+
+DEFAULT_BATCH_SIZES = [10, 100]
+DEFAULT_CONCURRENCY = [1, 4]
+DEFAULT_RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+# イベントソースマッピングのMaximumRetryAttemptsに相当する再試行回数の既定値
+DEFAULT_MAX_RETRY_ATTEMPTS = 3
+NOTIFICATIONS_TABLE = "TweetWacherNotificationsTable"
+
+# 負荷試験中の環境変数の既定値（同じ名前の環境変数が設定されていればそちらを使う）
+STREAM_ENV = {
+    "NOTIFICATIONS_TABLE": NOTIFICATIONS_TABLE,
+    "SLACK_BOT_TOKEN": "xoxb-benchmark",
+    "SLACK_CHANNEL_RATE": "1000",
+    "SLACK_CHANNEL_BURST": "1000",
+    "LOG_LEVEL": "WARNING",
+}
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def seed_notifications(dynamodb, rows):
+    table = dynamodb.Table(NOTIFICATIONS_TABLE)
+    with table.batch_writer() as batch:
+        for row in rows:
+            batch.put_item(Item=row)
+
+
+def invoke_with_retries(batch, max_retry_attempts):
+    """
+    ReportBatchItemFailuresを有効にしたイベントソースマッピングと同じく、
+    失敗したレコードのうち最も前のものから後ろをmax_retry_attempts回まで再送する。
+    (各呼び出しの経過秒数の一覧, ハンドラへ渡したレコード数, 再送を諦めたレコード数)を返す
+    """
+    elapsed = []
+    invoked_records = 0
+    records = batch
+    for attempt in range(max_retry_attempts + 1):
+        started = time.perf_counter()
+        response = notify_slack_stream.lambda_handler({"Records": records}, None)
+        elapsed.append(time.perf_counter() - started)
+        invoked_records += len(records)
+        failed = {item["itemIdentifier"] for item in response["batchItemFailures"]}
+        if not failed:
+            return elapsed, invoked_records, 0
+        first = min(
+            index
+            for index, record in enumerate(records)
+            if record["dynamodb"]["SequenceNumber"] in failed
+        )
+        records = records[first:]
+    return elapsed, invoked_records, len(records)
+
+
+def run_scenario(
+    slack_server, rows, batches, batch_size, concurrency, max_retry_attempts
+):
+    """
+    1つの設定（バッチの並び・並列数）でバッチを順に処理し、結果をdictで返す
+    """
+    slack_server.reset()
+    env = {name: os.environ.get(name, value) for name, value in STREAM_ENV.items()}
+    env["STREAM_CONCURRENCY"] = str(concurrency)
+    env["SLACK_API_BASE_URL"] = slack_server.base_url
+    sink = MemorySink()
+    previous_sink = metrics.set_sink(sink)
+    invocation_seconds = []
+    invoked_records = 0
+    discarded = 0
+    try:
+        with benchmark_environment(env) as (dynamodb, dynamodb_calls):
+            seed_notifications(dynamodb, rows)
+            for batch in batches:
+                elapsed, invoked, dropped = invoke_with_retries(
+                    batch, max_retry_attempts
+                )
+                invocation_seconds.extend(elapsed)
+                invoked_records += invoked
+                discarded += dropped
+            unmarked = sum(
+                1
+                for item in dynamodb.Table(NOTIFICATIONS_TABLE).scan()["Items"]
+                if "notified_at" not in item
+            )
+    finally:
+        metrics.set_sink(previous_sink)
+
+    timings = {}
+    for record in sink.records:
+        for name in ("slack_post", "stream_claim", "notifications_mark"):
+            timings.setdefault(name, []).extend(record.get(name, []))
+    generated_records = sum(len(batch) for batch in batches)
+    delivered = Counter(
+        tweet_uid
+        for payload in slack_server.posted
+        for tweet_uid in delivered_tweet_uids(payload)
+    )
+    slack_requests = sum(slack_server.calls.values())
+    elapsed_total = sum(invocation_seconds)
+    return {
+        "scenario": {
+            "batch_size": batch_size,
+            "concurrency": concurrency,
+        },
+        "elapsed_seconds": round(elapsed_total, 4),
+        "records": {
+            "notifications": len(rows),
+            "generated": generated_records,
+            "invoked": invoked_records,
+            "discarded": discarded,
+        },
+        "records_per_second": round(generated_records / elapsed_total, 2),
+        "invocations": len(invocation_seconds),
+        "retry_amplification": round(invoked_records / generated_records, 3),
+        "slack": {
+            "requests": slack_requests,
+            "calls": dict(slack_server.calls),
+            "calls_per_notification": round(slack_requests / len(rows), 3),
+            "messages": len(slack_server.posted),
+        },
+        "deliveries": {
+            "delivered": len(delivered),
+            "duplicates": sum(count - 1 for count in delivered.values()),
+            "undelivered": len(rows) - len(delivered),
+            "unmarked": unmarked,
+        },
+        "latency": {
+            "invocation": report.latency_summary(
+                [seconds * 1000 for seconds in invocation_seconds]
+            ),
+            **{
+                name: report.latency_summary(values) for name, values in timings.items()
+            },
+        },
+        "dynamodb": dict(dynamodb_calls.calls),
+    }
+
+
+def run_load(
+    records=1000,
+    batch_sizes=DEFAULT_BATCH_SIZES,
+    concurrency_list=DEFAULT_CONCURRENCY,
+    channels=20,
+    distribution=CHANNEL_UNIFORM,
+    skew=1.2,
+    insert_ratio=0.7,
+    duplicate_ratio=0.05,
+    replay_ratio=0.05,
+    digest_ratio=0.0,
+    slack_latency=0.02,
+    slack_rate_limit_ratio=0.0,
+    slack_error_ratio=0.0,
+    max_retry_attempts=DEFAULT_MAX_RETRY_ATTEMPTS,
+    seed=0,
+):
+    """
+    BatchSize×STREAM_CONCURRENCYの全シナリオを実行し、結果をdictで返す。
+    recordsは生成するレコード数（重複・再送の分は含まない）で、そのinsert_ratioの割合が通知の行になる
+    """
+    notifications = max(1, round(records * insert_ratio))
+    rows = generate_notifications(
+        notifications, channels, distribution, skew, digest_ratio, seed
+    )
+    slack_server = FakeSlackServer(
+        latency=slack_latency,
+        rate_limit_ratio=slack_rate_limit_ratio,
+        error_ratio=slack_error_ratio,
+        seed=seed,
+    )
+    with slack_server:
+        runs = []
+        for batch_size in batch_sizes:
+            batches = generate_stream_batches(
+                rows,
+                batch_size,
+                insert_ratio=insert_ratio,
+                duplicate_ratio=duplicate_ratio,
+                replay_ratio=replay_ratio,
+                seed=seed,
+            )
+            for concurrency in concurrency_list:
+                runs.append(
+                    run_scenario(
+                        slack_server,
+                        rows,
+                        batches,
+                        batch_size,
+                        concurrency,
+                        max_retry_attempts,
+                    )
+                )
+    return {
+        "benchmark": "stream",
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": {
+            "records": records,
+            "channels": channels,
+            "distribution": distribution,
+            "skew": skew,
+            "insert_ratio": insert_ratio,
+            "duplicate_ratio": duplicate_ratio,
+            "replay_ratio": replay_ratio,
+            "digest_ratio": digest_ratio,
+            "slack_latency_ms": slack_latency * 1000,
+            "slack_429_ratio": slack_rate_limit_ratio,
+            "slack_error_ratio": slack_error_ratio,
+            "max_retry_attempts": max_retry_attempts,
+            "seed": seed,
+        },
+        "runs": runs,
+    }
+
+
+def format_table(results):
+    header = (
+        f"{'batch':>6} {'conc':>4} {'elapsed_s':>9} {'records/s':>9} "
+        f"{'invokes':>7} {'amplif':>6} {'slack/n':>7} {'dup':>4} "
+        f"{'lost':>4} {'p50_ms':>8} {'p95_ms':>8}"
+    )
+    lines = [header]
+    for run in results["runs"]:
+        latency = run["latency"]["invocation"]
+        lines.append(
+            f"{run['scenario']['batch_size']:>6} "
+            f"{run['scenario']['concurrency']:>4} "
+            f"{run['elapsed_seconds']:>9.3f} "
+            f"{run['records_per_second']:>9.1f} "
+            f"{run['invocations']:>7} "
+            f"{run['retry_amplification']:>6.2f} "
+            f"{run['slack']['calls_per_notification']:>7.2f} "
+            f"{run['deliveries']['duplicates']:>4} "
+            f"{run['deliveries']['undelivered']:>4} "
+            f"{latency['p50'] or 0:>8.1f} "
+            f"{latency['p95'] or 0:>8.1f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=1000)
+    parser.add_argument(
+        "--batch-sizes",
+        type=_int_list,
+        default=DEFAULT_BATCH_SIZES,
+        help="イベントソースマッピングのBatchSize（カンマ区切りで複数指定）",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=_int_list,
+        default=DEFAULT_CONCURRENCY,
+        help="STREAM_CONCURRENCY（カンマ区切りで複数指定）",
+    )
+    parser.add_argument("--channels", type=int, default=20)
+    parser.add_argument(
+        "--distribution", choices=[CHANNEL_UNIFORM, CHANNEL_ZIPF], default="uniform"
+    )
+    parser.add_argument("--skew", type=float, default=1.2)
+    parser.add_argument("--insert-ratio", type=float, default=0.7)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.05)
+    parser.add_argument("--replay-ratio", type=float, default=0.05)
+    parser.add_argument("--digest-ratio", type=float, default=0.0)
+    parser.add_argument("--slack-latency-ms", type=float, default=20)
+    parser.add_argument("--slack-429-ratio", type=float, default=0.0)
+    parser.add_argument("--slack-error-ratio", type=float, default=0.0)
+    parser.add_argument(
+        "--max-retry-attempts", type=int, default=DEFAULT_MAX_RETRY_ATTEMPTS
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="結果のJSONの保存先")
+    parser.add_argument(
+        "--write-event",
+        help="負荷試験は行わず、最初のバッチをsam local invoke用のイベントとして保存する",
+    )
+    args = parser.parse_args(argv)
+
+    if args.write_event:
+        rows = generate_notifications(
+            max(1, round(args.records * args.insert_ratio)),
+            args.channels,
+            args.distribution,
+            args.skew,
+            args.digest_ratio,
+            args.seed,
+        )
+        batches = generate_stream_batches(
+            rows,
+            args.batch_sizes[0],
+            insert_ratio=args.insert_ratio,
+            duplicate_ratio=args.duplicate_ratio,
+            replay_ratio=args.replay_ratio,
+            seed=args.seed,
+        )
+        report.save(args.write_event, {"Records": batches[0]})
+        print(f"イベントを保存しました: {args.write_event}")
+        return 0
+
+    results = run_load(
+        records=args.records,
+        batch_sizes=args.batch_sizes,
+        concurrency_list=args.concurrency,
+        channels=args.channels,
+        distribution=args.distribution,
+        skew=args.skew,
+        insert_ratio=args.insert_ratio,
+        duplicate_ratio=args.duplicate_ratio,
+        replay_ratio=args.replay_ratio,
+        digest_ratio=args.digest_ratio,
+        slack_latency=args.slack_latency_ms / 1000,
+        slack_rate_limit_ratio=args.slack_429_ratio,
+        slack_error_ratio=args.slack_error_ratio,
+        max_retry_attempts=args.max_retry_attempts,
+        seed=args.seed,
+    )
+    print(format_table(results))
+    output = args.output or os.path.join(
+        DEFAULT_RESULTS_DIR,
+        f"stream-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.json",
+    )
+    report.save(output, results)
+    print(f"結果を保存しました: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+# ダイジェスト1メッセージに載せるツイート数の既定値と上限
+# （Slackの1メッセージのblocksは50個まで。見出し・超過分の表示に2つ使う）
+DEFAULT_DIGEST_MAX = 10
+DIGEST_MAX_LIMIT = 45
+
+
+def _count_text(count):
+    return count if count is not None else "-"
+
+
+def build_tweet_blocks(tweet_url, like_count, retweet_count):
+    """
+    blocks形式のリッチ通知を組み立てる
+    """
+    return [
+        {
+            "type": "section",
+            "text": {"type": "mrkdwn", "text": "*新しいツイート通知*"},
+        },
+        {
+            "type": "section",
+            "fields": [
+                {
+                    "type": "mrkdwn",
+                    "text": f"*👍 いいね:* {_count_text(like_count)}",
+                },
+                {
+                    "type": "mrkdwn",
+                    "text": f"*🔁 リツイート:* {_count_text(retweet_count)}",
+                },
+            ],
+        },
+        {
+            "type": "actions",
+            "elements": [
+                {
+                    "type": "button",
+                    "text": {"type": "plain_text", "text": "ツイートを表示"},
+                    "url": tweet_url,
+                }
+            ],
+        },
+    ]
+
+
+def engagement(item):
+    """
+    ダイジェストの並び順に使うエンゲージメント（いいね数+リツイート数）
+    """
+    return (item.get("like_count") or 0) + (item.get("retweet_count") or 0)
+
+
+def clamp_digest_max(digest_max):
+    if digest_max is None:
+        return DEFAULT_DIGEST_MAX
+    return max(1, min(int(digest_max), DIGEST_MAX_LIMIT))
+
+
+def build_digest_blocks(items, digest_max=None):
+    """
+    複数のツイートを1メッセージにまとめたダイジェストのblocksを組み立てる。
+    エンゲージメントの高い順に最大digest_max件を載せ、残りは「+N件」として件数だけ表示する。
+    itemsはtweet_url・like_count・retweet_countを持つdictのリスト
+    """
+    digest_max = clamp_digest_max(digest_max)
+    ranked = sorted(items, key=engagement, reverse=True)
+    shown, overflow = ranked[:digest_max], ranked[digest_max:]
+    blocks = [
+        {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": f"*新しいツイート通知 ({len(items)}件)*",
+            },
+        }
+    ]
+    for item in shown:
+        blocks.append(
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": (
+                        f"<{item['tweet_url']}|ツイートを表示>  👍 {_count_text(item.get('like_count'))}  🔁 {_count_text(item.get('retweet_count'))}"
+                    ),
+                },
+            }
+        )
+    if overflow:
+        blocks.append(
+            {
+                "type": "context",
+                "elements": [
+                    {"type": "mrkdwn", "text": f"+{len(overflow)} more"},
+                ],
+            }
+        )
+    return blocks
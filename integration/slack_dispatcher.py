@@ -0,0 +1,252 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from integration.slack_integration import SLACK_API_TIMEOUT, SlackRateLimitedError
+from observability.logger import get_logger
+
+logger = get_logger("SlackDispatcher")
+
+# チャンネルごとの送信レート（件/秒）とバースト数の既定値
+# 環境変数SLACK_CHANNEL_RATE / SLACK_CHANNEL_BURSTで上書き可
+DEFAULT_CHANNEL_RATE = 1.0
+DEFAULT_CHANNEL_BURST = 3
+# Retry-Afterで待つ最大秒数。これを超える場合は待たずに例外を投げて呼び出し側で再キューさせる
+DEFAULT_MAX_RETRY_WAIT = 10.0
+DEFAULT_MAX_RETRIES = 3
+# submitで非同期送信する際のワーカー数
+DEFAULT_DISPATCH_WORKERS = 4
+# Lambdaの残り時間から差し引く余裕（秒）。待った後の送信（SLACK_API_TIMEOUT）と結果の記録が収まるようにする
+DEFAULT_DEADLINE_MARGIN = SLACK_API_TIMEOUT + 2.0
+
+
+class SlackDeadlineExceededError(SlackRateLimitedError):
+    """
+    レート制限の待ち時間が実行の期限を超えるため送信しなかったことを示す例外
+    """
+
+
+def deadline_from_context(context, margin=DEFAULT_DEADLINE_MARGIN):
+    """
+    Lambdaのcontextの残り時間から、送信を待ってよい期限（UNIX時刻の秒）を返す。
+    contextが無い場合（テスト・ローカル実行）はNone（期限なし）
+    """
+    get_remaining = getattr(context, "get_remaining_time_in_millis", None)
+    if get_remaining is None:
+        return None
+    return time.time() + get_remaining() / 1000 - margin
+
+
+def _env_float(name, default):
+    value = os.environ.get(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        logger.warning("%sが不正です: %s", name, value)
+        return default
+
+
+class TokenBucket:
+    """
+    チャンネル1つ分のトークンバケット。reserveでトークンを1つ予約し、送信できるまでの待ち時間を返す
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+
+    def reserve(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+        self.tokens -= 1
+        wait = max(0.0, -self.tokens / self.rate)
+        return max(wait, self.blocked_until - now)
+
+    def block(self, seconds):
+        """Retry-Afterを受けたら、その間はトークンを払い出さない"""
+        now = time.monotonic()
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = min(self.tokens, 0.0)
+
+
+class SlackDispatcher:
+    """
+    SlackIntegrationの送信をチャンネル単位のトークンバケットで制御するディスパッチャ。
+    同じチャンネルへの送信は順番に、レートを超えないよう待ってから行い、
+    異なるチャンネルへの送信は並行して行える（呼び出し元スレッド・submitのワーカー）。
+    429を受けた場合はRetry-Afterだけ待って再送し、待ち時間が長すぎる場合は
+    SlackRateLimitedErrorを投げて呼び出し側での再キューに任せる。
+    deadline（UNIX時刻の秒）を渡した場合は、待つと期限を過ぎる送信は待たずに
+    SlackDeadlineExceededErrorを投げる（Lambdaのタイムアウトで処理ごと失わないようにする）。
+    キューの深さ・待ち時間はstatsで参照できる。
+    """
+
+    def __init__(
+        self,
+        slack_integration,
+        rate=None,
+        burst=None,
+        max_retry_wait=DEFAULT_MAX_RETRY_WAIT,
+        max_retries=DEFAULT_MAX_RETRIES,
+        max_workers=DEFAULT_DISPATCH_WORKERS,
+        deadline=None,
+    ):
+        self.slack_integration = slack_integration
+        self.rate = rate or _env_float("SLACK_CHANNEL_RATE", DEFAULT_CHANNEL_RATE)
+        self.burst = burst or int(
+            _env_float("SLACK_CHANNEL_BURST", DEFAULT_CHANNEL_BURST)
+        )
+        self.max_retry_wait = max_retry_wait
+        self.max_retries = max_retries
+        self.max_workers = max_workers
+        self.deadline = deadline
+        self._lock = threading.Lock()
+        self._channels = {}
+        self._executor = None
+        self._stats = {
+            "sent": 0,
+            "rate_limited": 0,
+            "max_queue_depth": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+            "deadline_exceeded": 0,
+        }
+
+    def _channel(self, channel):
+        with self._lock:
+            if channel not in self._channels:
+                self._channels[channel] = {
+                    "lock": threading.Lock(),
+                    "bucket": TokenBucket(self.rate, self.burst),
+                    "depth": 0,
+                }
+            return self._channels[channel]
+
+    def _record_wait(self, waited):
+        with self._lock:
+            self._stats["total_wait_seconds"] += waited
+            self._stats["max_wait_seconds"] = max(
+                self._stats["max_wait_seconds"], waited
+            )
+
+    def _check_deadline(self, channel, wait):
+        """
+        wait秒待つと期限を過ぎる場合はSlackDeadlineExceededErrorを投げる
+        """
+        if self.deadline is None or time.time() + wait <= self.deadline:
+            return
+        with self._lock:
+            self._stats["deadline_exceeded"] += 1
+        logger.warning("実行の期限を過ぎるため送信を見送り", channel=channel, wait=wait)
+        raise SlackDeadlineExceededError(
+            wait, f"Slack dispatch would exceed the deadline: wait {wait:.1f}s"
+        )
+
+    def send_message(self, channel, message, thread_ts=None, blocks=None):
+        """
+        SlackIntegration.send_messageと同じ引数でメッセージを送信し、tsを返す（送信できるまでブロックする）
+        """
+        kwargs = {}
+        if thread_ts:
+            kwargs["thread_ts"] = thread_ts
+        if blocks is not None:
+            kwargs["blocks"] = blocks
+        return self._dispatch(
+            channel, self.slack_integration.send_message, channel, message, **kwargs
+        )
+
+    def update_message(self, channel, ts, message, blocks=None):
+        """
+        SlackIntegration.update_messageを送信と同じチャンネルのレート制限の下で呼び出す
+        """
+        kwargs = {}
+        if blocks is not None:
+            kwargs["blocks"] = blocks
+        return self._dispatch(
+            channel,
+            self.slack_integration.update_message,
+            channel,
+            ts,
+            message,
+            **kwargs,
+        )
+
+    def _dispatch(self, channel, func, *args, **kwargs):
+        state = self._channel(channel)
+        enqueued_at = time.monotonic()
+        with self._lock:
+            state["depth"] += 1
+            depth = sum(s["depth"] for s in self._channels.values())
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], depth)
+        try:
+            with state["lock"]:
+                for attempt in range(self.max_retries + 1):
+                    wait = state["bucket"].reserve()
+                    self._check_deadline(channel, wait)
+                    if wait > 0:
+                        time.sleep(wait)
+                    if attempt == 0:
+                        self._record_wait(time.monotonic() - enqueued_at)
+                    try:
+                        result = func(*args, **kwargs)
+                    except SlackRateLimitedError as e:
+                        with self._lock:
+                            self._stats["rate_limited"] += 1
+                        state["bucket"].block(e.retry_after)
+                        if (
+                            attempt >= self.max_retries
+                            or e.retry_after > self.max_retry_wait
+                        ):
+                            raise
+                        logger.warning(
+                            "レート制限",
+                            channel=channel,
+                            retry_after=e.retry_after,
+                        )
+                        continue
+                    with self._lock:
+                        self._stats["sent"] += 1
+                    return result
+        finally:
+            with self._lock:
+                state["depth"] -= 1
+
+    def submit(self, channel, message, thread_ts=None, blocks=None):
+        """
+        メッセージ送信を非同期に投入し、tsを返すFutureを返す
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            executor = self._executor
+        return executor.submit(self.send_message, channel, message, thread_ts, blocks)
+
+    def queue_depth(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                state = self._channels.get(channel)
+                return state["depth"] if state else 0
+            return sum(state["depth"] for state in self._channels.values())
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["queue_depth"] = sum(s["depth"] for s in self._channels.values())
+            stats["channels"] = len(self._channels)
+        stats["total_wait_seconds"] = round(stats["total_wait_seconds"], 3)
+        stats["max_wait_seconds"] = round(stats["max_wait_seconds"], 3)
+        return stats
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
@@ -4,11 +4,171 @@ import http.client
 import json
 import os
 import shlex
+import urllib.parse
+import threading
+import time
+from observability.logger import get_logger
+
+logger = get_logger("SlackIntegration")
+
+SLACK_API_HOST = "slack.com"
+# Slack APIへの接続・読み込みのタイムアウト（秒）
+SLACK_API_TIMEOUT = 10
+# プールに保持するアイドル接続の最大数
+SLACK_POOL_MAX_IDLE = 8
+# これより長くアイドルだった接続はサーバー側で切られている可能性が高いので使わない（秒）
+SLACK_POOL_IDLE_TIMEOUT = 30
+
+# 再利用した接続がサーバー側で既に切れていたことを示す例外
+STALE_CONNECTION_ERRORS = (http.client.CannotSendRequest, ConnectionError)
+
+
+def get_slack_api_base_url():
+    """
+    Slack APIの接続先。環境変数SLACK_API_BASE_URLで差し替えられる（ベンチマーク・ローカル検証用）
+    """
+    return os.environ.get("SLACK_API_BASE_URL") or f"https://{SLACK_API_HOST}"
+
+
+class SlackConnectionPool:
+    """
+    Slack APIへのHTTPS接続をKeep-Aliveで使い回すコネクションプール。
+    モジュール単位で保持するため、Lambdaのウォームスタート間でも接続が再利用される。
+    1つの接続を同時に使うのは1リクエストだけなので、複数スレッドから同時に呼び出してよい。
+    """
+
+    def __init__(
+        self,
+        host=None,
+        timeout=SLACK_API_TIMEOUT,
+        max_idle=SLACK_POOL_MAX_IDLE,
+        idle_timeout=SLACK_POOL_IDLE_TIMEOUT,
+    ):
+        self.host = host
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _new_connection(self):
+        # hostを省略した場合は、接続を作るたびにSLACK_API_BASE_URLから接続先を決める
+        if self.host:
+            return http.client.HTTPSConnection(self.host, timeout=self.timeout)
+        url = urllib.parse.urlsplit(get_slack_api_base_url())
+        if url.scheme == "http":
+            return http.client.HTTPConnection(url.netloc, timeout=self.timeout)
+        return http.client.HTTPSConnection(url.netloc, timeout=self.timeout)
+
+    def _acquire(self):
+        """アイドル接続があれば(接続, True)、なければ新しい接続を(接続, False)で返す"""
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                conn, last_used = self._idle.pop()
+                if now - last_used < self.idle_timeout:
+                    return conn, True
+                conn.close()
+        return self._new_connection(), False
+
+    def _release(self, conn):
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    def _send(self, conn, method, path, body, headers):
+        conn.request(method, path, body, headers)
+        res = conn.getresponse()
+        data = res.read()
+        return res, data
+
+    def request(self, method, path, body=None, headers=None):
+        """
+        リクエストを送信し、(レスポンス, 本文)を返す。
+        再利用した接続が切れていた場合のみ、新しい接続で1回だけ再送する。
+        """
+        headers = headers or {}
+        conn, reused = self._acquire()
+        try:
+            res, data = self._send(conn, method, path, body, headers)
+        except STALE_CONNECTION_ERRORS:
+            conn.close()
+            if not reused:
+                raise
+            conn = self._new_connection()
+            try:
+                res, data = self._send(conn, method, path, body, headers)
+            except Exception:
+                conn.close()
+                raise
+        except Exception:
+            conn.close()
+            raise
+        if res.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+        return res, data
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            conn.close()
+
+
+class SlackRateLimitedError(Exception):
+    """
+    Slack APIがHTTP 429を返したことを示す例外。retry_afterは待つべき秒数
+    """
+
+    def __init__(self, retry_after, message=None):
+        super().__init__(
+            message or f"Slack API rate limited: retry after {retry_after}s"
+        )
+        self.retry_after = retry_after
+
+
+class SlackApiError(Exception):
+    """
+    Slack APIがok:falseを返したことを示す例外。errorはSlackのエラーコード（channel_not_found等）
+    """
+
+    # 再送しても成功しないエラー（チャンネル・メッセージ自体の問題）
+    PERMANENT_ERRORS = frozenset(
+        {
+            "channel_not_found",
+            "not_in_channel",
+            "is_archived",
+            "msg_too_long",
+            "no_text",
+            "invalid_blocks",
+            "restricted_action",
+            "message_not_found",
+            "cant_update_message",
+        }
+    )
+
+    def __init__(self, error, response=None):
+        super().__init__(f"Slack API error: {error}")
+        self.error = error
+        self.response = response
+
+    @property
+    def permanent(self):
+        return self.error in self.PERMANENT_ERRORS
+
+
+# ウォームスタート間で共有するSlack APIのコネクションプール
+_connection_pool = SlackConnectionPool()
 
 
 class SlackIntegration(IntegrationBase):
-    def __init__(self, bot_token=None):
+    def __init__(self, bot_token=None, connection_pool=None):
         self.bot_token = bot_token or os.environ.get("SLACK_BOT_TOKEN")
+        self.connection_pool = connection_pool or _connection_pool
 
     def parse_input(self, event):
         body = event.get("body", "")
@@ -24,24 +184,58 @@ class SlackIntegration(IntegrationBase):
             "body": message,
         }
 
+    def respond(self, response_url, message, response_type="ephemeral"):
+        """
+        スラッシュコマンドのresponse_urlへ結果を送る（受付後にバックグラウンドで処理した結果の返信用）。
+        response_urlはSlack API以外のホスト(hooks.slack.com)なので、プールを使わず1回ごとに接続する
+        """
+        url = urllib.parse.urlsplit(response_url)
+        connection_cls = (
+            http.client.HTTPConnection
+            if url.scheme == "http"
+            else http.client.HTTPSConnection
+        )
+        conn = connection_cls(url.netloc, timeout=SLACK_API_TIMEOUT)
+        path = url.path or "/"
+        if url.query:
+            path += f"?{url.query}"
+        body = json.dumps({"response_type": response_type, "text": message})
+        try:
+            conn.request(
+                "POST",
+                path,
+                body,
+                {"Content-Type": "application/json; charset=utf-8"},
+            )
+            res = conn.getresponse()
+            data = res.read()
+        finally:
+            conn.close()
+        if res.status != 200:
+            raise Exception(f"Slack response_url HTTP error: {res.status} {data}")
+
     def _slack_api_post(self, endpoint, payload):
         if not self.bot_token:
             raise ValueError("SLACK_BOT_TOKENが設定されていません")
-        conn = http.client.HTTPSConnection("slack.com")
         headers = {
             "Authorization": f"Bearer {self.bot_token}",
             "Content-Type": "application/json; charset=utf-8",
         }
         body = json.dumps(payload)
-        conn.request("POST", f"/api/{endpoint}", body, headers)
-        res = conn.getresponse()
-        data = res.read()
-        conn.close()
+        res, data = self.connection_pool.request(
+            "POST", f"/api/{endpoint}", body, headers
+        )
+        if res.status == 429:
+            try:
+                retry_after = float(res.getheader("Retry-After") or 1)
+            except ValueError:
+                retry_after = 1.0
+            raise SlackRateLimitedError(retry_after)
         if res.status != 200:
             raise Exception(f"Slack API HTTP error: {res.status} {data}")
         resp_json = json.loads(data)
         if not resp_json.get("ok"):
-            raise Exception(f"Slack API error: {resp_json}")
+            raise SlackApiError(resp_json.get("error"), resp_json)
         return resp_json
 
     def send_message(self, channel, message, thread_ts=None, blocks=None):
@@ -57,9 +251,25 @@ class SlackIntegration(IntegrationBase):
             payload["blocks"] = blocks
         try:
             data = self._slack_api_post("chat.postMessage", payload)
-            print(f"[SlackIntegration] Slack API response: {data}")
-            if not data.get("ok"):
-                raise Exception(f"Slack API error: {data}")
+            logger.debug("Slack API response", response=data)
             return data["ts"]
+        except (SlackRateLimitedError, SlackApiError):
+            # 呼び出し側（SlackDispatcher・ストリーム）が待機・再送・送信の断念を判断できるようそのまま投げる
+            raise
         except Exception as e:
             raise Exception(f"Slackメッセージ送信に失敗しました: {str(e)}") from e
+
+    def update_message(self, channel, ts, message, blocks=None):
+        """
+        chat.update APIで送信済みのメッセージ(ts)の本文・blocksを書き換える。戻り値はts
+        """
+        payload = {"channel": channel, "ts": ts, "text": message}
+        if blocks is not None:
+            payload["blocks"] = blocks
+        try:
+            data = self._slack_api_post("chat.update", payload)
+            return data["ts"]
+        except (SlackRateLimitedError, SlackApiError):
+            raise
+        except Exception as e:
+            raise Exception(f"Slackメッセージ更新に失敗しました: {str(e)}") from e
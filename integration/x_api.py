@@ -0,0 +1,106 @@
+import json
+import os
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from integration.x_credential_pool import ENDPOINT_LOOKUP, NoAvailableCredentialError
+from observability import metrics
+from observability.logger import get_logger
+
+logger = get_logger("XApi")
+
+DEFAULT_X_API_BASE_URL = "https://api.twitter.com"
+# ツイートのID指定取得(GET /2/tweets)で1回に指定できるIDの上限
+TWEETS_LOOKUP_MAX_IDS = 100
+
+
+def get_x_api_base_url():
+    """
+    X APIの接続先。環境変数X_API_BASE_URLで差し替えられる（ベンチマーク・ローカル検証用）
+    """
+    return (os.environ.get("X_API_BASE_URL") or DEFAULT_X_API_BASE_URL).rstrip("/")
+
+
+def fetch_tweets_by_ids(credential_pool, ids):
+    """
+    ツイートIDを指定してX APIに1回だけリクエストし、取得できたツイートの一覧を返す。
+    削除・非公開のツイートはレスポンスのerrorsに入り、一覧には含まれない。
+    認証情報はプールから選び、レスポンスのレート制限ヘッダーをプールへ反映する
+    """
+    if len(ids) > TWEETS_LOOKUP_MAX_IDS:
+        raise ValueError(f"IDは{TWEETS_LOOKUP_MAX_IDS}件までです: {len(ids)}件")
+    params = {"ids": ",".join(ids), "tweet.fields": "public_metrics"}
+    full_url = f"{get_x_api_base_url()}/2/tweets?" + urllib.parse.urlencode(params)
+    bearer_token = credential_pool.acquire(ENDPOINT_LOOKUP)
+    req = urllib.request.Request(
+        full_url, headers={"Authorization": f"Bearer {bearer_token}"}
+    )
+    metrics.count("x_lookup_requests")
+    try:
+        with metrics.span("x_lookup_request"), urllib.request.urlopen(req) as res:
+            credential_pool.record_response(
+                bearer_token, res.status, res.headers, ENDPOINT_LOOKUP
+            )
+            if res.status == 429:
+                raise urllib.error.HTTPError(
+                    full_url, 429, "Rate limit exceeded", res.headers, None
+                )
+            return json.load(res).get("data", [])
+    except urllib.error.HTTPError as e:
+        credential_pool.record_response(
+            bearer_token, e.code, e.headers, ENDPOINT_LOOKUP
+        )
+        raise
+
+
+def lookup_public_metrics(
+    credential_pool, ids, max_retry=2, deadline=None, progress=None
+):
+    """
+    ツイートIDの一覧を100件ずつまとめて問い合わせ、{ツイートID: public_metrics}を返す。
+    レートリミット・認証エラー時はプールの別の認証情報でリトライし、
+    それでも取得できなかった分や利用可能な認証情報が尽きた後の分は結果に含めない。
+    deadline（UNIX時刻の秒）を過ぎたら残りは問い合わせない。
+    progress(dict)を渡した場合、問い合わせを終えたID（削除済みなどで結果に含まれないものも含む）を
+    渡された順にprogress["processed_ids"]へ入れる。打ち切った後の分やリトライしても
+    取得できなかった分は含めない
+    """
+    if progress is None:
+        progress = {}
+    progress["processed_ids"] = []
+    unique_ids = list(dict.fromkeys(str(tweet_id) for tweet_id in ids))
+    found = {}
+    for start in range(0, len(unique_ids), TWEETS_LOOKUP_MAX_IDS):
+        if deadline is not None and time.time() >= deadline:
+            logger.warning(
+                "期限を過ぎたためツイートの取得を打ち切ります",
+                remaining=len(unique_ids) - start,
+            )
+            return found
+        chunk = unique_ids[start : start + TWEETS_LOOKUP_MAX_IDS]
+        for error_count in range(max_retry + 1):
+            try:
+                tweets = fetch_tweets_by_ids(credential_pool, chunk)
+            except NoAvailableCredentialError as e:
+                logger.warning("認証情報切り替え失敗: %s", e)
+                return found
+            except urllib.error.HTTPError as e:
+                if e.code in (401, 403, 429) and error_count < max_retry:
+                    logger.warning(
+                        "X API error (HTTPError %s) [%s/%s]",
+                        e.code,
+                        error_count + 1,
+                        max_retry + 1,
+                    )
+                    continue
+                logger.error("ツイートの取得に失敗: %s", e)
+                # 再試行しても取得できない要求は、同じ所で止まり続けないよう処理済みにする
+                if e.code not in (401, 403, 429):
+                    progress["processed_ids"].extend(chunk)
+                break
+            for tweet in tweets:
+                found[tweet["id"]] = tweet.get("public_metrics", {})
+            progress["processed_ids"].extend(chunk)
+            break
+    return found
@@ -0,0 +1,176 @@
+import threading
+import time
+from datetime import datetime, timezone
+from repositories.x_credential_settings_repository import XCredentialSettingsRepository
+from observability.logger import get_logger
+
+logger = get_logger("XCredentialPool")
+
+# 残りリクエスト数がこの値以下になったら429を待たずに別の認証情報へ切り替える
+ROTATE_REMAINING_THRESHOLD = 1
+# 429でx-rate-limit-resetが返らなかった場合に待つ時間（秒）。X APIのウィンドウは15分
+DEFAULT_RATE_LIMIT_WINDOW = 15 * 60
+# X APIのレート制限はエンドポイントごとに別枠のため、残り予算もエンドポイントごとに追跡する
+ENDPOINT_SEARCH = "search"  # GET /2/tweets/search/recent
+ENDPOINT_LOOKUP = "lookup"  # GET /2/tweets
+# エンドポイントごとにリセット時刻を保存する認証情報テーブルの属性
+RESET_TIME_ATTRIBUTES = {
+    ENDPOINT_SEARCH: "latelimit_reset_time",
+    ENDPOINT_LOOKUP: "lookup_latelimit_reset_time",
+}
+
+
+class NoAvailableCredentialError(Exception):
+    pass
+
+
+def _parse_reset_time(value):
+    """ISO8601文字列のlatelimit_reset_timeをエポック秒に変換する（不正値はNone）"""
+    if not value:
+        return None
+    try:
+        reset_time = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (ValueError, AttributeError):
+        return None
+    if reset_time.tzinfo is None:
+        reset_time = reset_time.replace(tzinfo=timezone.utc)
+    return reset_time.timestamp()
+
+
+def _header_int(headers, name):
+    if headers is None:
+        return None
+    value = headers.get(name)
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class XCredentialPool:
+    """
+    X APIのBearer Tokenをプロセス内で管理するプール。
+    レスポンスのx-rate-limit-remaining / x-rate-limit-resetから(トークン, エンドポイント)ごとの
+    残り予算を追跡し、最も残りの多いトークンを払い出す。残りが閾値を下回ったトークンは
+    そのエンドポイントについて429を待たずに切り替え、リセット時刻はリポジトリに保存して
+    他の実行とも共有する。401/403を返したトークンは全エンドポイントで隔離する。
+    複数スレッドから同時に利用してよい。
+    """
+
+    def __init__(self, repo=None, credentials=None):
+        self.repo = repo or XCredentialSettingsRepository()
+        if credentials is None:
+            credentials = self.repo.list_all().get("Items", [])
+        now = time.time()
+        self._lock = threading.Lock()
+        self._states = {}
+        for item in credentials:
+            bearer_token = item.get("bearer_token")
+            if not bearer_token:
+                continue
+            endpoints = {}
+            for endpoint, attribute in RESET_TIME_ATTRIBUTES.items():
+                reset_at = _parse_reset_time(item.get(attribute))
+                exhausted = reset_at is not None and reset_at > now
+                endpoints[endpoint] = {
+                    # Noneは残数不明（まだ使っていない）
+                    "remaining": 0 if exhausted else None,
+                    "reset_at": reset_at if exhausted else None,
+                    "persisted_reset_at": reset_at,
+                }
+            self._states[bearer_token] = {"quarantined": False, "endpoints": endpoints}
+
+    def _refresh_window(self, state, now):
+        if state["reset_at"] is not None and state["reset_at"] <= now:
+            state["remaining"] = None
+            state["reset_at"] = None
+
+    def acquire(self, endpoint=ENDPOINT_SEARCH):
+        """
+        endpointの残り予算が最も多い利用可能なトークンを返す。
+        残数不明のトークンは未使用とみなして優先する。無ければNoAvailableCredentialErrorを投げる。
+        """
+        now = time.time()
+        with self._lock:
+            best_token = None
+            best_budget = None
+            for bearer_token, token_state in self._states.items():
+                if token_state["quarantined"]:
+                    continue
+                state = token_state["endpoints"][endpoint]
+                self._refresh_window(state, now)
+                remaining = state["remaining"]
+                if remaining is not None and remaining <= ROTATE_REMAINING_THRESHOLD:
+                    continue
+                budget = float("inf") if remaining is None else remaining
+                if best_budget is None or budget > best_budget:
+                    best_token, best_budget = bearer_token, budget
+            if best_token is None:
+                raise NoAvailableCredentialError(
+                    "利用可能なTwitter API認証情報が見つかりません"
+                )
+            # 並行実行中の他のリクエストの分を先に差し引いておく
+            state = self._states[best_token]["endpoints"][endpoint]
+            if state["remaining"] is not None:
+                state["remaining"] -= 1
+            return best_token
+
+    def record_response(self, bearer_token, status, headers, endpoint=ENDPOINT_SEARCH):
+        """
+        endpointへのX APIのレスポンス（エラー含む）のステータスとレート制限ヘッダーを反映する。
+        枯渇したトークンのリセット時刻はエンドポイントごとにリポジトリへ保存する。
+        """
+        remaining = _header_int(headers, "x-rate-limit-remaining")
+        reset_at = _header_int(headers, "x-rate-limit-reset")
+        persist_reset_at = None
+        with self._lock:
+            token_state = self._states.get(bearer_token)
+            if token_state is None:
+                return
+            if status in (401, 403):
+                token_state["quarantined"] = True
+                logger.warning("認証情報を隔離しました", status=status)
+                return
+            state = token_state["endpoints"][endpoint]
+            if status == 429:
+                remaining = 0
+                if reset_at is None:
+                    reset_at = int(time.time()) + DEFAULT_RATE_LIMIT_WINDOW
+            if remaining is not None:
+                state["remaining"] = remaining
+            if reset_at is not None:
+                state["reset_at"] = reset_at
+            if (
+                state["remaining"] is not None
+                and state["remaining"] <= ROTATE_REMAINING_THRESHOLD
+                and state["reset_at"] is not None
+                and state["reset_at"] != state["persisted_reset_at"]
+            ):
+                state["persisted_reset_at"] = state["reset_at"]
+                persist_reset_at = state["reset_at"]
+        if persist_reset_at is not None:
+            try:
+                self.repo.update_latelimit_reset_time(
+                    bearer_token,
+                    persist_reset_at,
+                    attribute=RESET_TIME_ATTRIBUTES[endpoint],
+                )
+            except Exception as e:
+                logger.error("リセット時刻の保存に失敗しました: %s", e)
+
+    def available_count(self, endpoint=ENDPOINT_SEARCH):
+        """
+        endpointに使える（隔離されておらず残り予算のある）トークンの数を返す
+        """
+        now = time.time()
+        with self._lock:
+            count = 0
+            for token_state in self._states.values():
+                state = token_state["endpoints"][endpoint]
+                self._refresh_window(state, now)
+                if not token_state["quarantined"] and (
+                    state["remaining"] is None
+                    or state["remaining"] > ROTATE_REMAINING_THRESHOLD
+                ):
+                    count += 1
+            return count
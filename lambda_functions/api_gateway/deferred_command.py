@@ -0,0 +1,79 @@
+import json
+import os
+from urllib.parse import parse_qs
+from repositories.resource_registry import get_client
+from observability.logger import get_logger
+
+logger = get_logger("DeferredCommand")
+
+# スラッシュコマンドの実行方式（環境変数COMMAND_MODEで切り替え）
+# inline: その場で処理して応答する
+# async: 時間のかかるアクションは受付の応答だけ返し、自分自身を非同期で呼び出して処理し、
+#        結果をSlackのresponse_urlへ送る（Slackの3秒の応答期限を超えないようにする）
+COMMAND_MODE_INLINE = "inline"
+COMMAND_MODE_ASYNC = "async"
+# 自己呼び出しのペイロードに付ける目印（API Gatewayからのイベントには無いキー）
+DEFERRED_EVENT_KEY = "deferred_command"
+# 非同期呼び出し(Event)はキューに積まれるだけなので、短いタイムアウトで十分
+DEFER_INVOKE_READ_TIMEOUT = 2
+# 受け付け済みの呼び出しがタイムアウトしたときに再送すると同じコマンドが二重に積まれるため、再試行しない
+DEFER_INVOKE_MAX_ATTEMPTS = 1
+
+
+def get_command_mode():
+    mode = (os.environ.get("COMMAND_MODE") or COMMAND_MODE_INLINE).lower()
+    if mode not in (COMMAND_MODE_INLINE, COMMAND_MODE_ASYNC):
+        logger.warning("COMMAND_MODEが不正です: %s", mode)
+        return COMMAND_MODE_INLINE
+    return mode
+
+
+def get_function_name(context):
+    return getattr(context, "invoked_function_arn", None) or os.environ.get(
+        "AWS_LAMBDA_FUNCTION_NAME"
+    )
+
+
+def get_response_url(event):
+    params = parse_qs(event.get("body") or "")
+    return (params.get("response_url") or [None])[0]
+
+
+def is_deferred_event(event):
+    """
+    自己呼び出しで渡された、バックグラウンドで処理するコマンドのイベントかどうか
+    """
+    return bool(event.get(DEFERRED_EVENT_KEY))
+
+
+def defer(event, context, lambda_client=None):
+    """
+    コマンドをバックグラウンドで処理するため、自分自身を非同期(Event)で呼び出す。
+    呼び出せた場合はTrue、asyncモードでない・関数名やresponse_urlが分からない・
+    既にバックグラウンドで処理中の場合はFalse（呼び出し側でその場で処理する）。
+    呼び出しに失敗した場合は例外を投げる（Lambda側で受け付け済みの可能性があるため、
+    その場で処理すると二重実行になりうる）
+    """
+    if is_deferred_event(event) or get_command_mode() != COMMAND_MODE_ASYNC:
+        return False
+    function_name = get_function_name(context)
+    if not function_name or not get_response_url(event):
+        logger.warning("関数名またはresponse_urlが分からないためその場で処理します")
+        return False
+    client = lambda_client or get_client(
+        "lambda",
+        read_timeout=DEFER_INVOKE_READ_TIMEOUT,
+        max_attempts=DEFER_INVOKE_MAX_ATTEMPTS,
+    )
+    try:
+        client.invoke(
+            FunctionName=function_name,
+            InvocationType="Event",
+            Payload=json.dumps(
+                {DEFERRED_EVENT_KEY: True, "body": event.get("body", "")}
+            ).encode(),
+        )
+    except Exception as e:
+        logger.error("非同期呼び出しに失敗: %s", e, exc_info=True)
+        raise
+    return True
@@ -1,10 +1,21 @@
 import importlib
 from integration.slack_integration import SlackIntegration
+from lambda_functions.api_gateway.deferred_command import (
+    get_response_url,
+    is_deferred_event,
+)
+from observability.logger import get_logger
 import os
 import hmac
 import hashlib
 import time
 
+logger = get_logger("SlackCommand")
+
+# ドメイン名と解決済みのサブAPIのlambda_handler（ウォームスタート間で使い回す）
+# サブAPIのモジュールは使うときに初めてimportする
+_domain_handlers = {}
+
 
 def get_slack_signing_secret():
     return os.environ.get("SLACK_SIGNING_SECRET")
@@ -27,7 +38,47 @@ def verify_slack_request(headers, body, signing_secret):
     return hmac.compare_digest(my_signature, slack_signature)
 
 
+def get_domain_handler(domain):
+    """
+    ドメインに対応するサブAPI(lambda_functions.api_gateway.<domain>_api)のlambda_handlerを返す。
+    モジュールが無い場合はModuleNotFoundError、lambda_handlerが無い場合はAttributeErrorを投げる
+    """
+    handler = _domain_handlers.get(domain)
+    if handler is None:
+        if not domain.isidentifier():
+            raise ModuleNotFoundError(f"不正なドメインです: {domain}")
+        module = importlib.import_module(f"lambda_functions.api_gateway.{domain}_api")
+        handler = module.lambda_handler
+        _domain_handlers[domain] = handler
+    return handler
+
+
+def run_deferred(event, context):
+    """
+    受付済みのコマンドをバックグラウンドで処理し、結果をresponse_urlへ送る。
+    非同期呼び出しの自動リトライで同じコマンドが二重に実行されないよう、例外は投げずに結果を返す
+    """
+    integration = SlackIntegration()
+    response_url = get_response_url(event)
+    args = integration.parse_input(event)
+    try:
+        response = get_domain_handler(args[0])(event, context)
+        message = response.get("body", "")
+    except Exception as e:
+        logger.error("コマンドの処理に失敗: %s", e, args=args, exc_info=True)
+        message = f"エラー: {str(e)}"
+    try:
+        integration.respond(response_url, message)
+    except Exception as e:
+        logger.error("response_urlへの送信に失敗: %s", e, args=args, exc_info=True)
+        return {"statusCode": 500, "body": str(e)}
+    return {"statusCode": 200, "body": message}
+
+
 def lambda_handler(event, context):
+    # 自己呼び出し（Lambdaの呼び出し権限で保護される）は署名検証済みのコマンドなのでそのまま処理する
+    if is_deferred_event(event):
+        return run_deferred(event, context)
     signing_secret = get_slack_signing_secret()
     headers = event.get("headers", {})
     body = event.get("body", "")
@@ -42,16 +93,13 @@ def lambda_handler(event, context):
         )
 
     domain = args[0]
-    module_name = f"lambda_functions.api_gateway.{domain}_api"
     try:
-        module = importlib.import_module(module_name)
+        handler = get_domain_handler(domain)
     except ModuleNotFoundError:
         return integration.build_response(f"不明なドメインです: {domain}")
-
-    if hasattr(module, "lambda_handler"):
-        # サブAPIのlambda_handlerにevent, context, argsを渡す
-        return module.lambda_handler(event, context)
-    else:
+    except AttributeError:
         return integration.build_response(
             f"{domain}_api.py にlambda_handlerが定義されていません"
         )
+    # サブAPIのlambda_handlerにevent, contextを渡す
+    return handler(event, context)
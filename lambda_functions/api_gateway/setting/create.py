@@ -1,5 +1,8 @@
-import logging
 from repositories.settings_repository import SettingsRepository
+from repositories.resource_registry import get_repository
+from observability.logger import get_logger
+
+logger = get_logger("SettingApi")
 
 
 def create_setting(args, integration):
@@ -11,7 +14,7 @@ def create_setting(args, integration):
     slack_ch = args[1]
     like_threshold = int(args[2]) if len(args) > 2 and args[2] != "" else None
     retweet_threshold = int(args[3]) if len(args) > 3 and args[3] != "" else None
-    settings_repo = SettingsRepository()
+    settings_repo = get_repository(SettingsRepository)
     try:
         resp = settings_repo.put(keyword, slack_ch, like_threshold, retweet_threshold)
         msg = f"[create] 登録しました: {keyword} {slack_ch} (id: {resp['id']}, publication_status: {resp['publication_status']})"
@@ -21,7 +24,7 @@ def create_setting(args, integration):
             msg += f" retweet閾値: {retweet_threshold}"
         return integration.build_response(msg)
     except Exception as e:
-        logging.error(f"[create] エラーが発生しました: {str(e)}", exc_info=True)
+        logger.error("エラーが発生しました: %s", e, action="create", exc_info=True)
         return integration.build_response(f"[create] エラー: {str(e)}")
 
 
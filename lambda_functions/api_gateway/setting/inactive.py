@@ -1,5 +1,8 @@
-import logging
 from repositories.settings_repository import SettingsRepository
+from repositories.resource_registry import get_repository
+from observability.logger import get_logger
+
+logger = get_logger("SettingApi")
 
 
 def inactive_setting(args, integration):
@@ -8,7 +11,7 @@ def inactive_setting(args, integration):
             "[inactive] パラメータ数が正しくありません。/tweet-watcher setting help を参照してください。\n例: /tweet-watcher setting inactive id"
         )
     id = args[0]
-    settings_repo = SettingsRepository()
+    settings_repo = get_repository(SettingsRepository)
     try:
         resp = settings_repo.get_by_id(id)
         if "Item" not in resp:
@@ -18,7 +21,7 @@ def inactive_setting(args, integration):
         settings_repo.update_publication_status_inactive_by_id(id)
         return integration.build_response(f"[inactive] 非アクティブにしました: id={id}")
     except Exception as e:
-        logging.error(f"[inactive] エラーが発生しました: {str(e)}", exc_info=True)
+        logger.error("エラーが発生しました: %s", e, action="inactive", exc_info=True)
         return integration.build_response(f"[inactive] エラー: {str(e)}")
 
 
@@ -1,6 +1,9 @@
-import logging
 from repositories.settings_repository import SettingsRepository
+from repositories.resource_registry import get_repository
 from datetime import datetime, timezone, timedelta
+from observability.logger import get_logger
+
+logger = get_logger("SettingApi")
 
 
 def format_jst(dt_str):
@@ -17,7 +20,7 @@ def format_jst(dt_str):
 
 
 def get_setting(args, integration):
-    settings_repo = SettingsRepository()
+    settings_repo = get_repository(SettingsRepository)
     try:
         if len(args) == 0:
             resp = settings_repo.list_valid_settings()
@@ -28,7 +31,7 @@ def get_setting(args, integration):
                 )
             msg = "[list] アクティブな設定一覧:\n" + "\n".join(
                 [
-                    f"{item['id']}: {item['keyword']} {item['slack_ch']} like: {item.get('like_threshold', '-')}, rt: {item.get('retweet_threshold', '-')} lastExecuted: {format_jst(item.get('lastExecutedTime'))}"
+                    f"{item['id']}: {item['keyword']} {item['slack_ch']} like: {item.get('like_threshold', '-')}, rt: {item.get('retweet_threshold', '-')}{' digest' if item.get('digest') else ''} lastExecuted: {format_jst(item.get('lastExecutedTime'))}"
                     for item in items
                 ]
             )
@@ -40,7 +43,7 @@ def get_setting(args, integration):
                 return integration.build_response("[list] 設定が1件もありません")
             msg = "[list] 全設定一覧:\n" + "\n".join(
                 [
-                    f"{item['id']}: {item['keyword']} {item['slack_ch']} (publication_status: {item.get('publication_status', 'unknown')}) like: {item.get('like_threshold', '-')}, rt: {item.get('retweet_threshold', '-')} lastExecuted: {format_jst(item.get('lastExecutedTime'))}"
+                    f"{item['id']}: {item['keyword']} {item['slack_ch']} (publication_status: {item.get('publication_status', 'unknown')}) like: {item.get('like_threshold', '-')}, rt: {item.get('retweet_threshold', '-')}{' digest' if item.get('digest') else ''} lastExecuted: {format_jst(item.get('lastExecutedTime'))}"
                     for item in items
                 ]
             )
@@ -54,7 +57,7 @@ def get_setting(args, integration):
                 "[list] パラメータ数が正しくありません。/tweet-watcher setting help を参照してください。"
             )
     except Exception as e:
-        logging.error(f"[list] エラーが発生しました: {str(e)}", exc_info=True)
+        logger.error("エラーが発生しました: %s", e, action="list", exc_info=True)
         return integration.build_response(f"[list] エラー: {str(e)}")
 
 
@@ -1,5 +1,8 @@
-import logging
 from repositories.settings_repository import SettingsRepository
+from repositories.resource_registry import get_repository
+from observability.logger import get_logger
+
+logger = get_logger("SettingApi")
 
 
 def update_setting(args, integration):
@@ -8,7 +11,7 @@ def update_setting(args, integration):
             "[update] パラメータ数が正しくありません。/tweet-watcher setting help を参照してください。\n例: /tweet-watcher setting update id 新キーワード"
         )
     id, new_keyword = args
-    settings_repo = SettingsRepository()
+    settings_repo = get_repository(SettingsRepository)
     try:
         resp = settings_repo.get_by_id(id)
         if "Item" not in resp:
@@ -18,7 +21,7 @@ def update_setting(args, integration):
             f"[update] 更新しました: id={id} {new_keyword}"
         )
     except Exception as e:
-        logging.error(f"[update] エラーが発生しました: {str(e)}", exc_info=True)
+        logger.error("エラーが発生しました: %s", e, action="update", exc_info=True)
         return integration.build_response(f"[update] エラー: {str(e)}")
 
 
@@ -0,0 +1,43 @@
+from repositories.settings_repository import SettingsRepository
+from repositories.resource_registry import get_repository
+from observability.logger import get_logger
+
+logger = get_logger("SettingApi")
+
+DIGEST_VALUES = {"on": True, "off": False}
+
+
+def update_digest(args, integration):
+    if len(args) not in (2, 3) or args[1] not in DIGEST_VALUES:
+        return integration.build_response(
+            "[update_digest] パラメータが正しくありません。/tweet-watcher setting help を参照してください。\n例: /tweet-watcher setting update_digest id on|off [最大件数]"
+        )
+    id, value = args[0], args[1]
+    digest_max = None
+    if len(args) == 3:
+        if not args[2].isdigit() or int(args[2]) < 1:
+            return integration.build_response(
+                f"[update_digest] 最大件数は1以上の整数で指定してください: {args[2]}"
+            )
+        digest_max = int(args[2])
+    settings_repo = get_repository(SettingsRepository)
+    try:
+        resp = settings_repo.get_by_id(id)
+        if "Item" not in resp:
+            return integration.build_response(
+                f"[update_digest] 該当設定がありません: id={id}"
+            )
+        settings_repo.update_digest_by_id(id, DIGEST_VALUES[value], digest_max)
+        return integration.build_response(
+            f"[update_digest] 更新しました: id={id} digest={value}"
+            + (f" digest_max={digest_max}" if digest_max is not None else "")
+        )
+    except Exception as e:
+        logger.error(
+            "エラーが発生しました: %s", e, action="update_digest", exc_info=True
+        )
+        return integration.build_response(f"[update_digest] エラー: {str(e)}")
+
+
+def main(args, integration):
+    return update_digest(args, integration)
@@ -1,5 +1,8 @@
-import logging
 from repositories.settings_repository import SettingsRepository
+from repositories.resource_registry import get_repository
+from observability.logger import get_logger
+
+logger = get_logger("SettingApi")
 
 
 def update_retweet_threshold(args, integration):
@@ -8,7 +11,7 @@ def update_retweet_threshold(args, integration):
             "[update_retweet_threshold] パラメータ数が正しくありません。/tweet-watcher setting help を参照してください。\n例: /tweet-watcher setting update_retweet_threshold id 値"
         )
     id, value = args
-    settings_repo = SettingsRepository()
+    settings_repo = get_repository(SettingsRepository)
     try:
         resp = settings_repo.get_by_id(id)
         if "Item" not in resp:
@@ -20,8 +23,11 @@ def update_retweet_threshold(args, integration):
             f"[update_retweet_threshold] 更新しました: id={id} retweet_threshold={value}"
         )
     except Exception as e:
-        logging.error(
-            f"[update_retweet_threshold] エラーが発生しました: {str(e)}", exc_info=True
+        logger.error(
+            "エラーが発生しました: %s",
+            e,
+            action="update_retweet_threshold",
+            exc_info=True,
         )
         return integration.build_response(
             f"[update_retweet_threshold] エラー: {str(e)}"
@@ -1,16 +1,50 @@
+import importlib
 from integration.slack_integration import SlackIntegration
-from lambda_functions.api_gateway.setting.create import main as create_setting_main
-from lambda_functions.api_gateway.setting.list import main as list_setting_main
-from lambda_functions.api_gateway.setting.update import main as update_setting_main
-from lambda_functions.api_gateway.setting.update_like_threshold import (
-    main as update_like_threshold_main,
-)
-from lambda_functions.api_gateway.setting.update_retweet_threshold import (
-    main as update_retweet_threshold_main,
-)
-from lambda_functions.api_gateway.setting.delete import main as delete_setting_main
-from lambda_functions.api_gateway.setting.active import main as activate_setting_main
-from lambda_functions.api_gateway.setting.inactive import main as inactive_setting_main
+from lambda_functions.api_gateway.deferred_command import defer
+from observability.logger import get_logger
+
+logger = get_logger("SettingApi")
+
+# アクション名と処理モジュール（main(args, integration)を持つ）の対応。
+# 各モジュールはSettingsRepository経由でboto3を読み込むため、使うときに初めてimportする
+# （helpや不正なアクションではboto3を読み込まずに応答する）
+SETTING_ACTIONS = {
+    "create": "lambda_functions.api_gateway.setting.create",
+    "list": "lambda_functions.api_gateway.setting.list",
+    "update": "lambda_functions.api_gateway.setting.update",
+    "update_like_threshold": (
+        "lambda_functions.api_gateway.setting.update_like_threshold"
+    ),
+    "update_retweet_threshold": (
+        "lambda_functions.api_gateway.setting.update_retweet_threshold"
+    ),
+    "update_digest": "lambda_functions.api_gateway.setting.update_digest",
+    "delete": "lambda_functions.api_gateway.setting.delete",
+    "active": "lambda_functions.api_gateway.setting.active",
+    "inactive": "lambda_functions.api_gateway.setting.inactive",
+}
+
+# COMMAND_MODE=asyncのときにバックグラウンドで処理するアクションと、引数から処理するかを決める関数
+# （createはIDの採番で最大10回のget_itemと件数の集計、list -aはテーブル全体のスキャンを行う）。
+# それ以外（引数なしのlistはスナップショットの読み込みだけ）はその場で処理する
+DEFERRED_ACTIONS = {
+    "create": lambda args: True,
+    "list": lambda args: args == ["-a"],
+}
+
+# 解決済みのアクションの処理（ウォームスタート間で使い回す）
+_action_handlers = {}
+
+
+def get_action_handler(action):
+    """
+    アクション名に対応する処理(main関数)を返す。不明なアクションの場合はNone
+    """
+    handler = _action_handlers.get(action)
+    if handler is None and action in SETTING_ACTIONS:
+        handler = importlib.import_module(SETTING_ACTIONS[action]).main
+        _action_handlers[action] = handler
+    return handler
 
 
 def lambda_handler(event, context):
@@ -18,7 +52,7 @@ def lambda_handler(event, context):
     integration = SlackIntegration()
     args = integration.parse_input(event)
 
-    print(f"request with args: {args}, body: {event.get('body', '')}")
+    logger.debug("request", args=args, body=lambda: event.get("body", ""))
     if len(args) < 2 or args[0] != "setting":
         return integration.build_response(
             "コマンド形式が正しくありません。/tweet-watcher setting help を参照してください。"
@@ -26,37 +60,35 @@ def lambda_handler(event, context):
     action = args[1]
     if action == "help":
         return integration.build_response(help_text())
-    elif action == "create":
-        return create_setting_main(args[2:], integration)
-    elif action == "list":
-        return list_setting_main(args[2:], integration)
-    elif action == "update":
-        return update_setting_main(args[2:], integration)
-    elif action == "update_like_threshold":
-        return update_like_threshold_main(args[2:], integration)
-    elif action == "update_retweet_threshold":
-        return update_retweet_threshold_main(args[2:], integration)
-    elif action == "delete":
-        return delete_setting_main(args[2:], integration)
-    elif action == "active":
-        return activate_setting_main(args[2:], integration)
-    elif action == "inactive":
-        return inactive_setting_main(args[2:], integration)
-    else:
+    handler = get_action_handler(action)
+    if handler is None:
         return integration.build_response(
             "不明なアクションです。/tweet-watcher setting help を参照してください。"
         )
+    if action in DEFERRED_ACTIONS and DEFERRED_ACTIONS[action](args[2:]):
+        try:
+            deferred = defer(event, context)
+        except Exception:
+            return integration.build_response(
+                f"[{action}] 受け付けに失敗しました。時間をおいて再度お試しください。"
+            )
+        if deferred:
+            return integration.build_response(
+                f"[{action}] 受け付けました。処理が終わったら結果をお知らせします。"
+            )
+    return handler(args[2:], integration)
 
 
 def help_text():
     return (
-        "使い方: /tweet-watcher setting [create|list|update|update_like_threshold|update_retweet_threshold|delete|active|inactive|help] ...\n"
+        "使い方: /tweet-watcher setting [create|list|update|update_like_threshold|update_retweet_threshold|update_digest|delete|active|inactive|help] ...\n"
         "例:\n"
         "/tweet-watcher setting create 'キーワード1 キーワード2' #slackチャンネル [like閾値] [retweet閾値]\n"
         "/tweet-watcher setting list (-a)\n"
         "/tweet-watcher setting update id '新キーワード'\n"
         "/tweet-watcher setting update_like_threshold id 値\n"
         "/tweet-watcher setting update_retweet_threshold id 値\n"
+        "/tweet-watcher setting update_digest id on|off [最大件数]\n"
         "/tweet-watcher setting delete id\n"
         "/tweet-watcher setting active id\n"
         "/tweet-watcher setting inactive id\n"
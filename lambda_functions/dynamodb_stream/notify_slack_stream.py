@@ -1,134 +1,373 @@
 import os
-import boto3
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from integration.slack_integration import SlackIntegration
+from integration.slack_blocks import build_digest_blocks, build_tweet_blocks
+from integration.slack_dispatcher import SlackDispatcher, deadline_from_context
+from integration.slack_integration import SlackApiError, SlackIntegration
+from repositories.notifications_repository import NotificationsRepository
+from repositories.resource_registry import get_repository
+from observability import metrics
+from observability.logger import get_logger
 
+logger = get_logger("notify_slack_stream")
 
-def lambda_handler(event, context):
-    """
-    DynamoDB Streamsの新規レコード追加をトリガーにSlack通知を送信し、notified_atとslack_message_tsを更新するLambda関数。
-    多重実行防止も考慮。
-    """
-    print(
-        f"[notify_slack_stream] Lambda関数開始: {datetime.now(timezone.utc).isoformat()}"
-    )
-    print(f"[notify_slack_stream] 受信したレコード数: {len(event.get('Records', []))}")
-
-    table_name = os.environ.get("NOTIFICATIONS_TABLE", "TweetWacherNotificationsTable")
-    slack_bot_token = os.environ.get("SLACK_BOT_TOKEN")
-    print(f"[notify_slack_stream] テーブル名: {table_name}")
-    print(
-        f"[notify_slack_stream] Slack Bot Token設定: {'あり' if slack_bot_token else 'なし'}"
-    )
+# チャンネルごとの配信を並列実行するワーカー数の既定値（環境変数STREAM_CONCURRENCYで上書き可）
+DEFAULT_STREAM_CONCURRENCY = 4
 
-    dynamodb = boto3.resource("dynamodb")
-    table = dynamodb.Table(table_name)
-    slack = SlackIntegration(bot_token=slack_bot_token)
-
-    processed_count = 0
-    skipped_count = 0
 
-    for i, record in enumerate(event.get("Records", [])):
-        print(
-            f"[notify_slack_stream] レコード {i+1} 処理開始: eventName={record.get('eventName')}"
-        )
+def get_stream_concurrency():
+    """
+    環境変数STREAM_CONCURRENCYからチャンネル配信の並列数を取得する
+    """
+    value = os.environ.get("STREAM_CONCURRENCY")
+    if not value:
+        return DEFAULT_STREAM_CONCURRENCY
+    try:
+        return max(1, int(value))
+    except ValueError:
+        logger.warning("STREAM_CONCURRENCYが不正です: %s", value)
+        return DEFAULT_STREAM_CONCURRENCY
 
-        if record["eventName"] != "INSERT":
-            print(
-                f"[notify_slack_stream] レコード {i+1} スキップ: INSERT以外のイベント"
-            )
-            continue
 
-        new_image = record["dynamodb"].get("NewImage", {})
-        tweet_url = new_image.get("tweet_url", {}).get("S")
-        slack_ch = new_image.get("slack_ch", {}).get("S")
-        tweet_uid = new_image.get("tweet_uid", {}).get("S")
-        notified_at = new_image.get("notified_at", {}).get("S")
-        like_count = (
+def parse_record(record):
+    """
+    ストリームレコードのNewImageから通知に必要な値を取り出す
+    """
+    new_image = record["dynamodb"].get("NewImage", {})
+    return {
+        "sequence_number": record["dynamodb"].get("SequenceNumber"),
+        "tweet_url": new_image.get("tweet_url", {}).get("S"),
+        "slack_ch": new_image.get("slack_ch", {}).get("S"),
+        "tweet_uid": new_image.get("tweet_uid", {}).get("S"),
+        "notified_at": new_image.get("notified_at", {}).get("S"),
+        "digest": new_image.get("digest", {}).get("BOOL", False),
+        "digest_max": (
+            int(new_image["digest_max"]["N"]) if "digest_max" in new_image else None
+        ),
+        "notify_claimed_at": new_image.get("notify_claimed_at", {}).get("N"),
+        "notify_failed_at": new_image.get("notify_failed_at", {}).get("S"),
+        "like_count": (
             int(new_image.get("like_count", {}).get("N", 0))
             if "like_count" in new_image
             else None
-        )
-        retweet_count = (
+        ),
+        "retweet_count": (
             int(new_image.get("retweet_count", {}).get("N", 0))
             if "retweet_count" in new_image
             else None
-        )
+        ),
+    }
 
-        print(
-            f"[notify_slack_stream] レコード {i+1} データ: tweet_uid={tweet_uid}, slack_ch={slack_ch}, tweet_url={tweet_url}, notified_at={notified_at}, like_count={like_count}, retweet_count={retweet_count}"
-        )
 
-        # 冪等性: すでにnotified_atが埋まっていればスキップ
-        if notified_at:
-            print(
-                f"[notify_slack_stream] レコード {i+1} スキップ: 既に通知済み (notified_at={notified_at})"
-            )
-            skipped_count += 1
-            continue
+def is_recently_claimed(notification, now=None):
+    """
+    ストリームのイメージの送信中の印が、送信権の有効期限内かどうか
+    """
+    claimed_at = notification["notify_claimed_at"]
+    if claimed_at is None:
+        return False
+    now = now if now is not None else time.time()
+    return int(claimed_at) >= now - NotificationsRepository.NOTIFY_CLAIM_TIMEOUT
+
 
+def _release_claims(notifications, notifications_repo, slack_ch):
+    """
+    再試行時に送信し直せるよう送信中の印を外す
+    """
+    for notification in notifications:
         try:
-            # blocks形式でリッチ通知
-            blocks = [
-                {
-                    "type": "section",
-                    "text": {"type": "mrkdwn", "text": "*新しいツイート通知*"},
-                },
-                {
-                    "type": "section",
-                    "fields": [
-                        {
-                            "type": "mrkdwn",
-                            "text": (
-                                f"*👍 いいね:* {like_count if like_count is not None else '-'}"
-                            ),
-                        },
-                        {
-                            "type": "mrkdwn",
-                            "text": (
-                                f"*🔁 リツイート:* {retweet_count if retweet_count is not None else '-'}"
-                            ),
-                        },
-                    ],
-                },
-                {
-                    "type": "actions",
-                    "elements": [
-                        {
-                            "type": "button",
-                            "text": {"type": "plain_text", "text": "ツイートを表示"},
-                            "url": tweet_url,
-                        }
-                    ],
-                },
-            ]
+            notifications_repo.release_claim(notification["tweet_uid"], slack_ch)
+        except Exception as e:
+            logger.error(
+                "送信中の印の解除に失敗: %s", e, tweet_uid=notification["tweet_uid"]
+            )
+
+
+def give_up(notifications, notifications_repo, slack_ch, error):
+    """
+    再送しても成功しないSlackのエラーで送信できなかった行を送信断念として記録する。
+    batchItemFailuresで返すと同じエラーで再試行され続け、シャードの後続のレコードが止まるため
+    """
+    logger.error(
+        "送信を断念: %s",
+        error.error,
+        slack_ch=slack_ch,
+        tweet_uids=[n["tweet_uid"] for n in notifications],
+    )
+    failed_at = datetime.now(timezone.utc).isoformat()
+    for notification in notifications:
+        notifications_repo.mark_failed(
+            notification["tweet_uid"], slack_ch, error.error, failed_at
+        )
+    metrics.count("stream_dropped", len(notifications))
+
+
+def deliver_record(notification, notifications_repo, slack):
+    """
+    1件の通知をSlackへ送信する。
+    送信前に条件付き更新で送信権を取得し、既に通知済み・他の実行が送信中なら何もしない。
+    送信した場合は"processed"、通知済みで送信しなかった場合は"skipped"、
+    他の実行が送信権を持ったまま未通知の場合は"held"（再試行させる）、
+    再送しても成功しないエラーで送信を断念した場合は"dropped"を返し、それ以外の失敗時は例外を投げる。
+    """
+    tweet_uid = notification["tweet_uid"]
+    slack_ch = notification["slack_ch"]
+    with metrics.span("stream_claim"):
+        claimed = notifications_repo.claim_for_notification(tweet_uid, slack_ch)
+    if not claimed:
+        if notifications_repo.is_pending(tweet_uid, slack_ch):
+            return "held"
+        logger.debug("スキップ: 通知済み", tweet_uid=tweet_uid, slack_ch=slack_ch)
+        return "skipped"
+    try:
+        blocks = build_tweet_blocks(
+            notification["tweet_url"],
+            notification["like_count"],
+            notification["retweet_count"],
+        )
+        with metrics.span("slack_post"):
             ts = slack.send_message(slack_ch, "新しいツイート通知", blocks=blocks)
-            print(f"[notify_slack_stream] レコード {i+1} Slack通知送信成功: ts={ts}")
+    except SlackApiError as e:
+        if not e.permanent:
+            _release_claims([notification], notifications_repo, slack_ch)
+            raise
+        give_up([notification], notifications_repo, slack_ch, e)
+        return "dropped"
+    except Exception:
+        _release_claims([notification], notifications_repo, slack_ch)
+        raise
+    logger.debug("Slack通知送信成功", tweet_uid=tweet_uid, ts=ts)
+    # notified_atとslack_message_tsを現在時刻・tsで更新
+    now_iso = datetime.now(timezone.utc).isoformat()
+    with metrics.span("notifications_mark"):
+        notifications_repo.mark_notified(tweet_uid, slack_ch, ts, now_iso)
+    metrics.count("tweets_delivered")
+    return "processed"
+
 
-            # notified_atとslack_message_tsを現在時刻・tsで更新
-            now_iso = datetime.now(timezone.utc).isoformat()
-            print(
-                f"[notify_slack_stream] レコード {i+1} DynamoDB更新開始: notified_at={now_iso}, slack_message_ts={ts}"
+def deliver_digest(notifications, notifications_repo, slack):
+    """
+    1チャンネル分のダイジェスト行を1メッセージにまとめて送信し、
+    (送信件数, スキップ件数, 他の実行が送信権を持ったまま未通知の行)を返す。
+    各行の送信権を条件付き更新で取得し、取得できた行だけを載せる。
+    再送しても成功しないエラーの場合は載せた行を送信断念として記録し、スキップ件数に含める。
+    まとめるのはこの呼び出しで受け取った行だけで、バッチの1回の実行で登録された行でも
+    ストリームのシャード・バッチの区切りをまたぐと別のメッセージになる。
+    送信に失敗した場合は送信権を解除して例外を投げる（全ての行を再試行させる）。
+    """
+    slack_ch = notifications[0]["slack_ch"]
+    with metrics.span("stream_claim"):
+        claimed = [
+            notification
+            for notification in notifications
+            if notifications_repo.claim_for_notification(
+                notification["tweet_uid"], slack_ch
+            )
+        ]
+    claimed_uids = {notification["tweet_uid"] for notification in claimed}
+    held = [
+        notification
+        for notification in notifications
+        if notification["tweet_uid"] not in claimed_uids
+        and notifications_repo.is_pending(notification["tweet_uid"], slack_ch)
+    ]
+    skipped_count = len(notifications) - len(claimed) - len(held)
+    if not claimed:
+        return 0, skipped_count, held
+    digest_max = max(
+        (n["digest_max"] for n in claimed if n["digest_max"] is not None),
+        default=None,
+    )
+    try:
+        blocks = build_digest_blocks(claimed, digest_max)
+        with metrics.span("slack_post"):
+            ts = slack.send_message(
+                slack_ch, f"新しいツイート通知 ({len(claimed)}件)", blocks=blocks
             )
+    except SlackApiError as e:
+        if not e.permanent:
+            _release_claims(claimed, notifications_repo, slack_ch)
+            raise
+        give_up(claimed, notifications_repo, slack_ch, e)
+        return 0, skipped_count + len(claimed), held
+    except Exception:
+        _release_claims(claimed, notifications_repo, slack_ch)
+        raise
+    logger.info("ダイジェスト送信成功: %s件", len(claimed), slack_ch=slack_ch, ts=ts)
+    now_iso = datetime.now(timezone.utc).isoformat()
+    with metrics.span("notifications_mark"):
+        for notification in claimed:
+            notifications_repo.mark_notified(
+                notification["tweet_uid"], slack_ch, ts, now_iso
+            )
+    metrics.count("tweets_delivered", len(claimed))
+    return len(claimed), skipped_count, held
+
 
-            table.update_item(
-                Key={"tweet_uid": tweet_uid, "slack_ch": slack_ch},
-                UpdateExpression="SET notified_at = :n, slack_message_ts = :ts",
-                ExpressionAttributeValues={":n": now_iso, ":ts": ts},
+def deliver_channel(notifications, notifications_repo, slack):
+    """
+    1チャンネル分の通知を順番に送信し、(送信件数, スキップ件数, 失敗したシーケンス番号)を返す。
+    ダイジェスト行は1メッセージにまとめて送信する。
+    失敗したレコードがあっても後続のレコードの送信は続ける。
+    他の実行が送信権を持ったまま未通知のレコードも失敗として返し、
+    送信権が解除されるか古くなって再取得できるまで再試行させる。
+    """
+    processed_count = 0
+    skipped_count = 0
+    failed = []
+    held = []
+    digest_notifications = [n for n in notifications if n["digest"]]
+    notifications = [n for n in notifications if not n["digest"]]
+    if digest_notifications:
+        try:
+            processed_count, skipped_count, held = deliver_digest(
+                digest_notifications, notifications_repo, slack
+            )
+        except Exception as e:
+            logger.error(
+                "ダイジェストのエラー: %s",
+                e,
+                slack_ch=digest_notifications[0]["slack_ch"],
+            )
+            failed.extend(n["sequence_number"] for n in digest_notifications)
+    for notification in notifications:
+        try:
+            result = deliver_record(notification, notifications_repo, slack)
+        except Exception as e:
+            logger.error(
+                "エラー: %s",
+                e,
+                tweet_uid=notification["tweet_uid"],
+                slack_ch=notification["slack_ch"],
             )
-            print(f"[notify_slack_stream] レコード {i+1} DynamoDB更新成功")
+            failed.append(notification["sequence_number"])
+            continue
+        if result == "processed":
             processed_count += 1
+        elif result == "held":
+            held.append(notification)
+        else:
+            # 通知済み・送信断念
+            skipped_count += 1
+    if held:
+        metrics.count("stream_claim_held", len(held))
+        logger.warning(
+            "他の実行が送信中のため再試行: %s件",
+            len(held),
+            slack_ch=held[0]["slack_ch"],
+            tweet_uids=[n["tweet_uid"] for n in held],
+        )
+        failed.extend(n["sequence_number"] for n in held)
+    return processed_count, skipped_count, failed
 
-        except Exception as e:
-            print(f"[notify_slack_stream] レコード {i+1} エラー: {str(e)}")
-            raise e
 
-    print(
-        f"[notify_slack_stream] 処理完了: 処理済み={processed_count}, スキップ={skipped_count}"
+def lambda_handler(event, context):
+    """
+    DynamoDB Streamsの新規レコード追加をトリガーにSlack通知を送信し、notified_atとslack_message_tsを更新するLambda関数。
+    outboxモードではこの関数だけがSlackへの送信を行う。
+    inlineモードでバッチの送信が失敗して送信中の印が外された行（MODIFY）もここから送信する。
+    レコードはチャンネルごとにまとめ、チャンネル間は並列・チャンネル内は順番に送信する。
+    失敗したレコードはbatchItemFailuresで返し、そのレコードだけを再試行させる。
+    多重実行防止は通知テーブルへの条件付き更新で行う。
+    実行中に記録したメトリクスは最後にEMFで出力する。
+    """
+    try:
+        with metrics.span("stream_total"):
+            return handle_records(event.get("Records", []), context)
+    finally:
+        metrics.flush(function="NotifySlack")
+
+
+def handle_records(records, context=None):
+    table_name = os.environ.get("NOTIFICATIONS_TABLE", "TweetWacherNotificationsTable")
+    slack_bot_token = os.environ.get("SLACK_BOT_TOKEN")
+    logger.info(
+        "受信したレコード数: %s",
+        len(records),
+        table=table_name,
+        slack_bot_token=bool(slack_bot_token),
+    )
+
+    # リポジトリ（DynamoDBリソース）はウォームスタート間で使い回す
+    notifications_repo = get_repository(NotificationsRepository, table_name)
+    # チャンネルごとのレート制限を守り、429の場合はRetry-Afterだけ待って再送する。
+    # Lambdaの残り時間を超えて待つ送信は失敗させ、batchItemFailuresで再試行させる
+    slack = SlackDispatcher(
+        SlackIntegration(bot_token=slack_bot_token),
+        deadline=deadline_from_context(context),
+    )
+
+    skipped_count = 0
+    channels = {}
+    for i, record in enumerate(records):
+        if record["eventName"] not in ("INSERT", "MODIFY"):
+            logger.debug("レコード %s スキップ: INSERT・MODIFY以外のイベント", i + 1)
+            continue
+        notification = parse_record(record)
+        # MODIFYは送信中の印が外された未通知の行（送信の失敗）だけを送信し直す。
+        # 送信権の取得・通知済みの記録によるMODIFYは数えずに読み飛ばす
+        if record["eventName"] == "MODIFY" and (
+            notification["notified_at"]
+            or notification["notify_claimed_at"]
+            or notification["notify_failed_at"]
+        ):
+            continue
+        # ストリームのイメージで通知済みと分かるものは問い合わせずにスキップ
+        if notification["notified_at"]:
+            logger.debug(
+                "レコード %s スキップ: 既に通知済み",
+                i + 1,
+                notified_at=notification["notified_at"],
+            )
+            skipped_count += 1
+            continue
+        # 登録時にバッチが送信権を取得した行（inlineモード）はバッチが送信するため読み飛ばす。
+        # 送信に失敗した行はバッチが印を外したMODIFYで、バッチが途中で落ちた行は印が古くなった後に
+        # 次のバッチ（同じツイートを再び検索したとき）かストリームの再試行で送信し直される
+        if is_recently_claimed(notification):
+            logger.debug(
+                "レコード %s スキップ: バッチが送信中",
+                i + 1,
+                notify_claimed_at=notification["notify_claimed_at"],
+            )
+            skipped_count += 1
+            continue
+        channels.setdefault(notification["slack_ch"], []).append(notification)
+
+    processed_count = 0
+    failed = []
+    if channels:
+        max_workers = min(get_stream_concurrency(), len(channels))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(
+                    deliver_channel, notifications, notifications_repo, slack
+                )
+                for notifications in channels.values()
+            ]
+            for future in futures:
+                channel_processed, channel_skipped, channel_failed = future.result()
+                processed_count += channel_processed
+                skipped_count += channel_skipped
+                failed.extend(channel_failed)
+
+    metrics.count("stream_records", len(records))
+    metrics.count("stream_skipped", skipped_count)
+    metrics.count("stream_failed", len(failed))
+    logger.info(
+        "処理完了",
+        processed=processed_count,
+        skipped=skipped_count,
+        failed=len(failed),
+        slack=slack.stats(),
     )
     return {
         "statusCode": 200,
         "body": (
-            f"Notifications processed. Processed: {processed_count}, Skipped: {skipped_count}"
+            f"Notifications processed. Processed: {processed_count}, Skipped: {skipped_count}, Failed: {len(failed)}"
         ),
+        "batchItemFailures": [
+            {"itemIdentifier": sequence_number} for sequence_number in failed
+        ],
     }
@@ -0,0 +1,100 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from integration.slack_blocks import build_digest_blocks, clamp_digest_max
+from observability import metrics
+from observability.logger import get_logger
+
+logger = get_logger("BatchWatcher")
+
+# ダイジェストを送信するチャンネルの並列数
+DIGEST_SEND_CONCURRENCY = 4
+
+
+class DigestCollector:
+    """
+    inlineモードでダイジェストモードの設定が新規に保存した通知を、1回の実行の間チャンネルごとに溜める。
+    実行の最後にflushでチャンネルごとに1メッセージだけ送信し、
+    そのメッセージのtsを各通知行のslack_message_tsとして記録する。
+    複数の検索パックのワーカーから同時にaddされるためロックで保護する。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.channels = {}
+
+    def add(self, slack_ch, items, digest_max=None):
+        if not items:
+            return
+        with self._lock:
+            channel = self.channels.setdefault(
+                slack_ch, {"items": [], "digest_max": None}
+            )
+            channel["items"].extend(items)
+            # 同じチャンネルに複数の設定がある場合は大きい方の件数を使う
+            if digest_max is not None:
+                channel["digest_max"] = max(
+                    clamp_digest_max(digest_max), channel["digest_max"] or 0
+                )
+
+    def _send_channel(self, slack_ch, channel, slack_integration, notifications_repo):
+        items = channel["items"]
+        blocks = build_digest_blocks(items, channel["digest_max"])
+        try:
+            with metrics.span("slack_post"):
+                ts = slack_integration.send_message(
+                    slack_ch, f"新しいツイート通知 ({len(items)}件)", blocks=blocks
+                )
+        except Exception:
+            # 送信中の印を外し、ストリーム（MODIFYイベント）から送信し直させる
+            for item in items:
+                try:
+                    notifications_repo.release_claim(item["tweet_uid"], slack_ch)
+                except Exception as e:
+                    logger.error(
+                        "送信中の印の解除に失敗: %s", e, tweet_uid=item["tweet_uid"]
+                    )
+            raise
+        metrics.count("tweets_delivered", len(items))
+        logger.info("ダイジェスト送信: %s件", len(items), slack_ch=slack_ch, ts=ts)
+        notified_at = datetime.now(timezone.utc).isoformat()
+        for item in items:
+            try:
+                notifications_repo.mark_notified(
+                    item["tweet_uid"], slack_ch, ts, notified_at
+                )
+            except Exception as e:
+                logger.error(
+                    "ダイジェストのts記録失敗: %s", e, tweet_uid=item["tweet_uid"]
+                )
+        return len(items)
+
+    def flush(self, slack_integration, notifications_repo):
+        """
+        溜めた通知をチャンネルごとに1メッセージで送信し、送信結果の集計を返す
+        """
+        with self._lock:
+            channels, self.channels = self.channels, {}
+        summary = {"channels": 0, "tweets": 0, "failed": []}
+        if not channels:
+            return summary
+        max_workers = min(DIGEST_SEND_CONCURRENCY, len(channels))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                slack_ch: executor.submit(
+                    self._send_channel,
+                    slack_ch,
+                    channel,
+                    slack_integration,
+                    notifications_repo,
+                )
+                for slack_ch, channel in channels.items()
+            }
+            for slack_ch, future in futures.items():
+                try:
+                    summary["tweets"] += future.result()
+                    summary["channels"] += 1
+                except Exception as e:
+                    logger.error("ダイジェスト送信失敗: %s", e, slack_ch=slack_ch)
+                    summary["failed"].append(slack_ch)
+        return summary
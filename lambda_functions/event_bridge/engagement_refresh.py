@@ -0,0 +1,172 @@
+import os
+from datetime import datetime, timedelta, timezone
+from integration.slack_blocks import build_digest_blocks, build_tweet_blocks
+from integration.slack_dispatcher import SlackDispatcher, deadline_from_context
+from integration.slack_integration import SlackIntegration
+from integration.x_api import lookup_public_metrics
+from integration.x_credential_pool import (
+    ENDPOINT_LOOKUP,
+    NoAvailableCredentialError,
+    XCredentialPool,
+)
+from repositories.notifications_repository import NotificationsRepository
+from repositories.x_credential_settings_repository import XCredentialSettingsRepository
+from repositories.resource_registry import get_repository
+from observability import metrics
+from observability.logger import get_logger
+
+logger = get_logger("EngagementRefresh")
+
+# エンゲージメントを更新する対象（通知してからの時間）の既定値
+# 環境変数REFRESH_WINDOW_HOURSで上書き可
+DEFAULT_REFRESH_WINDOW_HOURS = 24
+
+
+def get_refresh_window_hours():
+    value = os.environ.get("REFRESH_WINDOW_HOURS")
+    if not value:
+        return DEFAULT_REFRESH_WINDOW_HOURS
+    try:
+        return max(1, int(value))
+    except ValueError:
+        logger.warning("REFRESH_WINDOW_HOURSが不正です: %s", value)
+        return DEFAULT_REFRESH_WINDOW_HOURS
+
+
+def _count(value):
+    return int(value) if value is not None else None
+
+
+def build_message(rows):
+    """
+    1つのSlackメッセージで通知した行から、更新後のメッセージ本文とblocksを組み立てる
+    """
+    if any(row.get("digest") for row in rows):
+        digest_max = max(
+            (int(row["digest_max"]) for row in rows if row.get("digest_max")),
+            default=None,
+        )
+        return (
+            f"新しいツイート通知 ({len(rows)}件)",
+            build_digest_blocks(rows, digest_max),
+        )
+    row = rows[0]
+    return "新しいツイート通知", build_tweet_blocks(
+        row["tweet_url"], row.get("like_count"), row.get("retweet_count")
+    )
+
+
+def refresh_engagement(credential_pool, notifications_repo, slack, now=None):
+    """
+    最近通知したツイートの現在のいいね数・リツイート数をまとめて取得し、
+    値が変わった行を載せたSlackメッセージをchat.updateで書き換えてから、その行を条件付きで更新する。
+    メッセージの更新に失敗した行は書き込まないため、次回の実行で再び差分として検出され再試行される。
+    ダイジェストのメッセージは同じtsの行をslack_message_ts-indexから集めて組み立て直す
+    """
+    now = now or datetime.now(timezone.utc)
+    since = now - timedelta(hours=get_refresh_window_hours())
+    rows = [
+        row
+        for row in notifications_repo.iter_notified_since(since, now)
+        if row.get("slack_message_ts")
+    ]
+    summary = {
+        "rows": len(rows),
+        "looked_up": 0,
+        "changed": 0,
+        "unchanged": 0,
+        "conflicts": 0,
+        "messages_updated": 0,
+        "errors": [],
+    }
+    if not rows:
+        return summary
+    looked_up = lookup_public_metrics(
+        credential_pool, [row["tweet_uid"] for row in rows]
+    )
+    summary["looked_up"] = len(looked_up)
+
+    # メッセージ(チャンネル, ts)ごとに、このメッセージで値が変わった行の新しい値と読み込んだ時点の値
+    changed = {}
+    for row in rows:
+        public_metrics = looked_up.get(row["tweet_uid"])
+        if public_metrics is None:
+            continue
+        like_count = public_metrics.get("like_count", 0)
+        retweet_count = public_metrics.get("retweet_count", 0)
+        old_like_count = _count(row.get("like_count"))
+        old_retweet_count = _count(row.get("retweet_count"))
+        if (like_count, retweet_count) == (old_like_count, old_retweet_count):
+            summary["unchanged"] += 1
+            continue
+        key = (row["slack_ch"], row["slack_message_ts"])
+        changed.setdefault(key, {})[row["tweet_uid"]] = (
+            {**row, "like_count": like_count, "retweet_count": retweet_count},
+            old_like_count,
+            old_retweet_count,
+        )
+
+    for (slack_ch, ts), pending in changed.items():
+        updated = {uid: row for uid, (row, _, _) in pending.items()}
+        try:
+            message_rows = list(updated.values())
+            if any(row.get("digest") for row in message_rows):
+                # インデックスは結果整合なので、今回更新した行は手元の値で上書きする
+                by_uid = {
+                    row["tweet_uid"]: row
+                    for row in notifications_repo.list_by_message_ts(ts, slack_ch)
+                }
+                by_uid.update(updated)
+                message_rows = list(by_uid.values())
+            text, blocks = build_message(message_rows)
+            with metrics.span("slack_update"):
+                slack.update_message(slack_ch, ts, text, blocks=blocks)
+            summary["messages_updated"] += 1
+        except Exception as e:
+            # 行は書き換えずに残し、次回の実行でメッセージの更新を再試行する
+            logger.error("メッセージ更新失敗: %s", e, slack_ch=slack_ch, ts=ts)
+            summary["errors"].append({"slack_ch": slack_ch, "ts": ts, "error": str(e)})
+            continue
+        for row, old_like_count, old_retweet_count in pending.values():
+            if notifications_repo.update_engagement(
+                row["tweet_uid"],
+                slack_ch,
+                row["like_count"],
+                row["retweet_count"],
+                old_like_count,
+                old_retweet_count,
+            ):
+                summary["changed"] += 1
+            else:
+                # 他の実行が先に更新した（メッセージはどちらの実行でも最新の値で書き換わる）
+                summary["conflicts"] += 1
+    return summary
+
+
+def lambda_handler(event, context):
+    """
+    通知済みツイートのエンゲージメントを定期的に更新するLambdaのエントリポイント
+    """
+    try:
+        credential_pool = XCredentialPool(get_repository(XCredentialSettingsRepository))
+        # エンゲージメントの取得はID指定取得(GET /2/tweets)の枠を使う
+        if credential_pool.available_count(ENDPOINT_LOOKUP) == 0:
+            raise NoAvailableCredentialError(
+                "利用可能なTwitter API認証情報が見つかりません"
+            )
+    except Exception as e:
+        logger.error("%s", e)
+        return {"statusCode": 500, "body": str(e)}
+    notifications_repo = get_repository(NotificationsRepository)
+    # メッセージの更新はLambdaの残り時間に収まる分だけ行う
+    slack = SlackDispatcher(SlackIntegration(), deadline=deadline_from_context(context))
+    try:
+        with metrics.span("refresh_total"):
+            summary = refresh_engagement(credential_pool, notifications_repo, slack)
+        metrics.count("engagement_changed", summary["changed"])
+        metrics.count("messages_updated", summary["messages_updated"])
+    finally:
+        metrics.flush(function="EngagementRefresh")
+    summary["slack"] = slack.stats()
+    logger.info("実行サマリ", summary=summary)
+    return {"statusCode": 200, "body": "Engagement refreshed.", "summary": summary}
@@ -0,0 +1,143 @@
+import heapq
+import os
+from datetime import datetime, timedelta, timezone
+from observability.logger import get_logger
+
+logger = get_logger("PollScheduler")
+
+# 設定ごとのポーリング間隔（分）。環境変数POLL_MIN_INTERVAL_MINUTES / POLL_BASE_INTERVAL_MINUTES /
+# POLL_MAX_INTERVAL_MINUTESで上書き可。最小間隔はEventBridgeのスケジュール間隔に合わせる
+DEFAULT_POLL_MIN_INTERVAL = 5
+DEFAULT_POLL_BASE_INTERVAL = 20
+DEFAULT_POLL_MAX_INTERVAL = 240
+# 閾値を通過したツイートがあった場合は間隔を縮め、無かった場合は広げる
+POLL_SPEEDUP_FACTOR = 0.5
+# 検索結果はあったが閾値を通過しなかった場合・検索結果が無かった場合の間隔の伸び率
+POLL_BACKOFF_FACTOR_ACTIVE = 1.25
+POLL_BACKOFF_FACTOR_QUIET = 2.0
+
+
+def _env_minutes(name, default):
+    value = os.environ.get(name)
+    if not value:
+        return default
+    try:
+        return max(1, int(value))
+    except ValueError:
+        logger.warning("%sが不正です: %s", name, value)
+        return default
+
+
+def get_poll_intervals():
+    """
+    (最小間隔, 初期間隔, 最大間隔)を分で返す
+    """
+    minimum = _env_minutes("POLL_MIN_INTERVAL_MINUTES", DEFAULT_POLL_MIN_INTERVAL)
+    base = _env_minutes("POLL_BASE_INTERVAL_MINUTES", DEFAULT_POLL_BASE_INTERVAL)
+    maximum = _env_minutes("POLL_MAX_INTERVAL_MINUTES", DEFAULT_POLL_MAX_INTERVAL)
+    maximum = max(minimum, maximum)
+    return minimum, min(max(base, minimum), maximum), maximum
+
+
+def get_max_settings_per_run():
+    """
+    環境変数POLL_MAX_SETTINGS_PER_RUNから1回の実行で処理する設定数の上限を取得する（未設定は上限なし）
+    """
+    value = os.environ.get("POLL_MAX_SETTINGS_PER_RUN")
+    if not value:
+        return None
+    try:
+        return max(1, int(value))
+    except ValueError:
+        logger.warning("POLL_MAX_SETTINGS_PER_RUNが不正です: %s", value)
+        return None
+
+
+def _parse_time(value):
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def _format_time(dt):
+    return dt.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def update_poll_stats(stats, returned, matched, now=None, due_at=None):
+    """
+    今回の実行結果（キーワードに一致した件数・閾値を通過した件数）から設定の統計を更新し、
+    (新しい統計, 次回の実行予定時刻)を返す。
+    閾値を通過したツイートがあれば間隔を縮め（バースト中は速く）、無ければ段階的に広げる。
+    次回の予定時刻は今回の予定時刻(due_at)に間隔を足して決める。処理を終えた時刻を基準にすると、
+    スケジュールの間隔ごとにしか拾われないため予定が毎回後ろへずれていく。
+    予定時刻が無い場合・間隔以上遅れていた場合は今の時刻を基準にする。
+    DynamoDBに保存するため、数値は全て整数で持つ
+    """
+    now = now or datetime.now(timezone.utc)
+    minimum, base, maximum = get_poll_intervals()
+    stats = dict(stats or {})
+    interval = int(stats.get("interval", base))
+    if matched > 0:
+        interval = interval * POLL_SPEEDUP_FACTOR
+        stats["last_hit_at"] = _format_time(now)
+        stats["hits"] = int(stats.get("hits", 0)) + 1
+    elif returned > 0:
+        interval = interval * POLL_BACKOFF_FACTOR_ACTIVE
+    else:
+        interval = interval * POLL_BACKOFF_FACTOR_QUIET
+    interval = int(min(maximum, max(minimum, round(interval))))
+    stats.update(
+        {
+            "interval": interval,
+            "last_returned": int(returned),
+            "last_matched": int(matched),
+            "runs": int(stats.get("runs", 0)) + 1,
+        }
+    )
+    stats.setdefault("last_hit_at", None)
+    stats.setdefault("hits", 0)
+    next_due_at = _parse_time(due_at)
+    if next_due_at is not None:
+        next_due_at += timedelta(minutes=interval)
+    if next_due_at is None or next_due_at <= now:
+        next_due_at = now + timedelta(minutes=interval)
+    return stats, _format_time(next_due_at)
+
+
+def poll_priority(setting, now):
+    """
+    実行予定時刻をどれだけ過ぎたかを間隔で割った値（大きいほど優先）。
+    予定時刻が無い設定（新規・統計なし）は最優先、予定時刻前の設定はNoneを返す
+    """
+    due_at = _parse_time(setting.get("next_due_at"))
+    if due_at is None:
+        return float("inf")
+    overdue = (now - due_at).total_seconds()
+    if overdue < 0:
+        return None
+    interval = int((setting.get("poll_stats") or {}).get("interval") or 1)
+    return overdue / (interval * 60)
+
+
+def select_due_settings(settings, now=None, limit=None):
+    """
+    実行予定時刻を過ぎた設定だけを優先度の高い順に返す（上限件数が無ければ全件）。
+    戻り値は(実行する設定の一覧, 予定時刻前で見送った設定数, 上限により持ち越した設定数)
+    """
+    now = now or datetime.now(timezone.utc)
+    heap = []
+    not_due = 0
+    for index, setting in enumerate(settings):
+        priority = poll_priority(setting, now)
+        if priority is None:
+            not_due += 1
+            continue
+        heapq.heappush(heap, (-priority, index, setting))
+    selected = []
+    while heap and (limit is None or len(selected) < limit):
+        selected.append(heapq.heappop(heap)[2])
+    return selected, not_due, len(heap)
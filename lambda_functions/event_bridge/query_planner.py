@@ -0,0 +1,341 @@
+import os
+import re
+from observability.logger import get_logger
+
+logger = get_logger("QueryPlanner")
+
+# X APIのクエリ長の上限の既定値（Basic/Freeプランは512文字）。環境変数X_QUERY_MAX_LENGTHで上書き可
+DEFAULT_QUERY_MAX_LENGTH = 512
+# ローカルで判定できる演算子（それ以外の演算子を含む設定はまとめずに単独で検索する）
+LOCAL_OPERATORS = {"lang", "is"}
+LOCAL_IS_VALUES = {"retweet", "reply", "quote"}
+# 英数字の語は単語境界で、それ以外（日本語など）は部分一致で判定する
+WORD_CHARS = r"0-9a-z_"
+
+
+class QuerySyntaxError(Exception):
+    pass
+
+
+def get_query_max_length():
+    """
+    環境変数X_QUERY_MAX_LENGTHからクエリ長の上限を取得する（0以下でクエリのまとめを無効化）
+    """
+    value = os.environ.get("X_QUERY_MAX_LENGTH")
+    if not value:
+        return DEFAULT_QUERY_MAX_LENGTH
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning("X_QUERY_MAX_LENGTHが不正です: %s", value)
+        return DEFAULT_QUERY_MAX_LENGTH
+
+
+def tokenize_query(query):
+    """
+    Xの検索クエリを字句に分割する。
+    括弧・OR・否定(-)・フレーズ("...")・ハッシュタグ・演算子(name:value)・語を扱う
+    """
+    tokens = []
+    i = 0
+    length = len(query)
+    while i < length:
+        ch = query[i]
+        if ch.isspace():
+            i += 1
+        elif ch in "()":
+            tokens.append((ch, ch))
+            i += 1
+        elif ch == "-" and i + 1 < length and not query[i + 1].isspace():
+            tokens.append(("-", "-"))
+            i += 1
+        elif ch == '"':
+            end = query.find('"', i + 1)
+            if end == -1:
+                raise QuerySyntaxError(f"フレーズが閉じられていません: {query}")
+            tokens.append(("phrase", query[i + 1 : end]))
+            i = end + 1
+        else:
+            start = i
+            while i < length and not query[i].isspace() and query[i] not in '()"':
+                i += 1
+            word = query[start:i]
+            if word == "OR":
+                tokens.append(("OR", word))
+            elif word.startswith("#") and len(word) > 1:
+                tokens.append(("hashtag", word[1:]))
+            elif ":" in word.strip(":"):
+                name, value = word.split(":", 1)
+                tokens.append(("op", (name.lower(), value)))
+            else:
+                tokens.append(("term", word))
+    return tokens
+
+
+def parse_query(query):
+    """
+    検索クエリを構文木に変換する。ノードは以下のタプルで表す。
+    ("term", 語) / ("phrase", 文字列) / ("hashtag", タグ) / ("op", 名前, 値)
+    ("not", ノード) / ("and", [ノード]) / ("or", [ノード])
+    """
+    tokens = tokenize_query(query)
+    position = 0
+
+    def peek():
+        return tokens[position][0] if position < len(tokens) else None
+
+    def parse_or():
+        nonlocal position
+        nodes = [parse_and()]
+        while peek() == "OR":
+            position += 1
+            nodes.append(parse_and())
+        return nodes[0] if len(nodes) == 1 else ("or", nodes)
+
+    def parse_and():
+        nodes = []
+        while peek() not in (None, "OR", ")"):
+            nodes.append(parse_unary())
+        if not nodes:
+            raise QuerySyntaxError(f"空の条件があります: {query}")
+        return nodes[0] if len(nodes) == 1 else ("and", nodes)
+
+    def parse_unary():
+        nonlocal position
+        kind, value = tokens[position]
+        position += 1
+        if kind == "-":
+            if peek() in (None, "OR", ")"):
+                raise QuerySyntaxError(f"否定の対象がありません: {query}")
+            return ("not", parse_unary())
+        if kind == "(":
+            node = parse_or()
+            if peek() != ")":
+                raise QuerySyntaxError(f"括弧が閉じられていません: {query}")
+            position += 1
+            return node
+        if kind == ")":
+            raise QuerySyntaxError(f"括弧の対応が不正です: {query}")
+        if kind == "op":
+            return ("op", value[0], value[1])
+        return (kind, value)
+
+    if not tokens:
+        raise QuerySyntaxError("クエリが空です")
+    node = parse_or()
+    if position != len(tokens):
+        raise QuerySyntaxError(f"括弧の対応が不正です: {query}")
+    return node
+
+
+def is_locally_matchable(node):
+    """
+    構文木の全ての条件をローカルで判定できるかどうか
+    """
+    kind = node[0]
+    if kind in ("and", "or"):
+        return all(is_locally_matchable(child) for child in node[1])
+    if kind == "not":
+        return is_locally_matchable(node[1])
+    if kind == "op":
+        name, value = node[1], node[2]
+        if name == "is":
+            return value.lower() in LOCAL_IS_VALUES
+        return name in LOCAL_OPERATORS
+    return True
+
+
+def _contains_word(text, word):
+    word = word.casefold()
+    if re.fullmatch(f"[{WORD_CHARS}]+", word):
+        return (
+            re.search(f"(?<![{WORD_CHARS}]){re.escape(word)}(?![{WORD_CHARS}])", text)
+            is not None
+        )
+    return word in text
+
+
+def _referenced_types(tweet):
+    return {ref.get("type") for ref in tweet.get("referenced_tweets") or []}
+
+
+def evaluate(node, tweet, text):
+    """
+    構文木をツイートに対して評価する。textは大文字小文字を畳み込んだ本文
+    """
+    kind = node[0]
+    if kind == "and":
+        return all(evaluate(child, tweet, text) for child in node[1])
+    if kind == "or":
+        return any(evaluate(child, tweet, text) for child in node[1])
+    if kind == "not":
+        return not evaluate(node[1], tweet, text)
+    if kind in ("term", "phrase"):
+        return _contains_word(text, node[1])
+    if kind == "hashtag":
+        tag = re.escape(node[1].casefold())
+        return re.search(f"[#＃]{tag}(?![{WORD_CHARS}])", text) is not None
+    if kind == "op":
+        name, value = node[1], node[2].lower()
+        if name == "lang":
+            return (tweet.get("lang") or "").lower() == value
+        if name == "is":
+            referenced = _referenced_types(tweet)
+            return {"retweet": "retweeted", "reply": "replied_to", "quote": "quoted"}[
+                value
+            ] in referenced
+    return False
+
+
+def compile_matcher(keyword):
+    """
+    キーワードからツイートの一致判定関数を作る。ローカルで判定できないクエリの場合はNoneを返す
+    """
+    try:
+        node = parse_query(keyword or "")
+    except QuerySyntaxError:
+        return None
+    if not is_locally_matchable(node):
+        return None
+
+    def matcher(tweet):
+        text = (tweet.get("text") or "").casefold()
+        return evaluate(node, tweet, text)
+
+    return matcher
+
+
+def canonical_query(node):
+    """
+    構文木を正規形の文字列に変換する。大文字小文字を畳み込み、AND/ORの並び順をそろえる
+    """
+    kind = node[0]
+    if kind in ("and", "or"):
+        children = sorted(canonical_query(child) for child in node[1])
+        separator = " " if kind == "and" else " OR "
+        return "(" + separator.join(children) + ")"
+    if kind == "not":
+        return "-" + canonical_query(node[1])
+    if kind == "phrase":
+        return '"' + " ".join(node[1].casefold().split()) + '"'
+    if kind == "hashtag":
+        return "#" + node[1].casefold()
+    if kind == "op":
+        return f"{node[1]}:{node[2].casefold()}"
+    return node[1].casefold()
+
+
+def normalize_query(keyword):
+    """
+    同じ検索結果になるクエリが同じ文字列になるよう正規化する（空白・大文字小文字・条件の並び順）
+    構文を解釈できないクエリは空白の正規化のみ行う
+    """
+    try:
+        return canonical_query(parse_query(keyword or ""))
+    except QuerySyntaxError:
+        return " ".join((keyword or "").split())
+
+
+class SearchMemo:
+    """
+    1回の実行内で検索結果をメモ化するため、設定を正規化済みクエリごとにまとめる。
+    同じクエリの設定は1回の検索結果を共有し、閾値フィルタだけを設定ごとに行う。
+    2件目以降の設定をヒット、クエリごとの最初の設定をミスとして数える。
+    """
+
+    def __init__(self):
+        self.groups = {}
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, setting):
+        key = normalize_query(setting.get("keyword"))
+        if key in self.groups:
+            self.hits += 1
+            self.groups[key].append(setting)
+        else:
+            self.misses += 1
+            self.groups[key] = [setting]
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class QueryPack:
+    """
+    1回の検索（ページング込み）で処理する設定のまとまり。
+    複数の設定を含む場合はキーワードをORで結合したクエリで検索し、
+    返ってきたツイートをキーワードが一致する設定にだけ振り分ける。
+    """
+
+    def __init__(self, settings, query, matchers=None, query_count=1):
+        self.settings = settings
+        self.query = query
+        self.matchers = matchers or {}
+        # パックに含まれる（正規化後の）クエリの数。1つなら振り分けの判定は不要
+        self.query_count = query_count
+
+    @property
+    def since_id(self):
+        """
+        パック内で最も古いsince_id（1つでも未設定があればNone）を検索の基準点にする
+        """
+        since_ids = [setting.get("since_id") for setting in self.settings]
+        if not since_ids or any(not since_id for since_id in since_ids):
+            return None
+        return str(min(int(since_id) for since_id in since_ids))
+
+    def route(self, tweet):
+        """
+        ツイートを受け取るべき設定の一覧を返す。
+        各設定のsince_id以前のツイート（前回までに処理済み）は振り分けない
+        """
+        tweet_id = int(tweet.get("id", 0))
+        routed = []
+        for setting in self.settings:
+            since_id = setting.get("since_id")
+            if since_id and tweet_id <= int(since_id):
+                continue
+            matcher = self.matchers.get(setting.get("id"))
+            if self.query_count > 1 and matcher is not None and not matcher(tweet):
+                continue
+            routed.append(setting)
+        return routed
+
+
+def plan_query_packs(settings, max_query_length=None, memo=None):
+    """
+    設定をX APIのクエリ長の上限までORでまとめた検索パックに分割する。
+    正規化後のクエリが同じ設定は1つのクエリとして扱い、検索結果を共有する（memoにヒット数を記録）。
+    ローカルで一致判定できないキーワードの設定・上限を超える長さのキーワードの設定は単独で検索する。
+    since_idの有無が異なる設定は検索期間が大きく異なるため別のパックにする。
+    """
+    if max_query_length is None:
+        max_query_length = get_query_max_length()
+    if memo is None:
+        memo = SearchMemo()
+    for setting in settings:
+        memo.add(setting)
+    packs = []
+    open_packs = {}
+    for group in memo.groups.values():
+        keyword = group[0].get("keyword") or ""
+        matcher = compile_matcher(keyword) if max_query_length > 0 else None
+        if matcher is None or len(keyword) + 2 > max_query_length:
+            packs.append(QueryPack(list(group), keyword))
+            continue
+        matchers = {setting.get("id"): matcher for setting in group}
+        has_since_id = all(setting.get("since_id") for setting in group)
+        current = open_packs.get(has_since_id)
+        if current is not None:
+            query = f"{current.query} OR ({keyword})"
+            if len(query) <= max_query_length:
+                current.settings.extend(group)
+                current.query = query
+                current.matchers.update(matchers)
+                current.query_count += 1
+                continue
+        current = QueryPack(list(group), f"({keyword})", matchers)
+        open_packs[has_since_id] = current
+        packs.append(current)
+    return packs
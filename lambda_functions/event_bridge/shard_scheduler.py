@@ -0,0 +1,212 @@
+import heapq
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from decimal import Decimal
+from repositories.resource_registry import get_client
+from observability.logger import get_logger
+
+logger = get_logger("ShardScheduler")
+
+# 1シャードあたりのコストの上限の既定値（環境変数SHARD_MAX_COSTで上書き可）
+DEFAULT_SHARD_MAX_COST = 40
+# シャードを並列実行するワーカー数の既定値（環境変数SHARD_MAX_WORKERSで上書き可）
+DEFAULT_SHARD_MAX_WORKERS = 4
+# 設定1件あたりのコスト。since_idを持たない設定は検索期間が長く、
+# ページ数の上限まで取得しやすいため重く見積もる
+SHARD_COST_PER_SETTING = 1
+SHARD_COST_WITHOUT_SINCE_ID = 3
+# シャードの実行方式（環境変数SHARD_EXECUTORで切り替え）
+SHARD_EXECUTOR_THREAD = "thread"
+SHARD_EXECUTOR_PROCESS = "process"
+SHARD_EXECUTOR_LAMBDA = "lambda"
+# 非同期呼び出しを受け付けたときのステータスコード
+SHARD_INVOKE_ACCEPTED = 202
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    if not value:
+        return default
+    try:
+        return max(1, int(value))
+    except ValueError:
+        logger.warning("%sが不正です: %s", name, value)
+        return default
+
+
+def estimate_pack_cost(pack):
+    """
+    検索パック1つの処理コストを見積もる（X APIへのリクエスト数の目安）。
+    パック内の設定数に応じて検索の上限が広がるため、設定ごとのコストの合計とする
+    """
+    return sum(
+        (
+            SHARD_COST_PER_SETTING
+            if setting.get("since_id")
+            else SHARD_COST_WITHOUT_SINCE_ID
+        )
+        for setting in pack.settings
+    )
+
+
+def plan_shards(packs, max_shard_cost=None):
+    """
+    検索パックをコストがなるべく均等になるようシャードに分割し、シャードごとの設定一覧を返す。
+    シャード数は合計コストを1シャードあたりの上限で割った数とし、
+    コストの大きいパックから順に最も軽いシャードへ割り当てる。
+    同じパックの設定は同じシャードに入るため、シャード内で再計画しても検索はまとまったままになる
+    """
+    if max_shard_cost is None:
+        max_shard_cost = _env_int("SHARD_MAX_COST", DEFAULT_SHARD_MAX_COST)
+    costs = [(estimate_pack_cost(pack), index) for index, pack in enumerate(packs)]
+    total_cost = sum(cost for cost, _ in costs)
+    shard_count = max(1, min(len(packs), math.ceil(total_cost / max_shard_cost)))
+    heap = [(0, shard_id) for shard_id in range(shard_count)]
+    shards = [[] for _ in range(shard_count)]
+    for cost, index in sorted(costs, key=lambda c: (-c[0], c[1])):
+        shard_cost, shard_id = heapq.heappop(heap)
+        shards[shard_id].extend(packs[index].settings)
+        heapq.heappush(heap, (shard_cost + cost, shard_id))
+    return [shard for shard in shards if shard]
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"JSONに変換できない値です: {value!r}")
+
+
+def _run_all(executor_cls, max_workers, func, payloads):
+    results = []
+    with executor_cls(max_workers=min(max_workers, len(payloads))) as executor:
+        futures = [executor.submit(func, payload) for payload in payloads]
+        for payload, future in zip(payloads, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logger.error(
+                    "シャードの実行に失敗: %s", e, shard_id=payload["shard_id"]
+                )
+                results.append({"shard_id": payload["shard_id"], "error": str(e)})
+    return results
+
+
+class ThreadShardExecutor:
+    """
+    シャードを同じプロセス内のスレッドで並列実行する
+    """
+
+    executor_cls = ThreadPoolExecutor
+
+    def __init__(self, func, max_workers=DEFAULT_SHARD_MAX_WORKERS):
+        self.func = func
+        self.max_workers = max_workers
+
+    def execute(self, payloads):
+        if not payloads:
+            return []
+        return _run_all(self.executor_cls, self.max_workers, self.func, payloads)
+
+
+class ProcessShardExecutor(ThreadShardExecutor):
+    """
+    シャードをローカルのプロセスプールで並列実行する（ローカル実行・ベンチマーク用。
+    Lambdaの実行環境では/dev/shmが無くプロセスプールを使えない）
+    """
+
+    executor_cls = ProcessPoolExecutor
+
+
+class LambdaShardExecutor:
+    """
+    シャードごとに自分自身のLambda関数を非同期(Event)で呼び出して並列実行する。
+    呼び出し元は応答を待たないため、シャードは呼び出し元より長く動いてもよく、
+    自身の残り時間を期限にする（呼び出し元の期限はpayloadに含めない）。
+    シャードは実行時の状態を自身で設定テーブルへ保存し、実行サマリはログとメトリクスに出力する。
+    executeの結果は呼び出しを受け付けたシャードの一覧で、実行サマリは含まない
+    """
+
+    asynchronous = True
+
+    def __init__(
+        self, function_name, lambda_client=None, max_workers=DEFAULT_SHARD_MAX_WORKERS
+    ):
+        self.function_name = function_name
+        self.lambda_client = lambda_client
+        self.max_workers = max_workers
+
+    def _client(self):
+        if self.lambda_client is None:
+            # 呼び出しの重複でシャードが二重実行されないよう、自動リトライはしない
+            self.lambda_client = get_client("lambda", max_attempts=1)
+        return self.lambda_client
+
+    def invoke(self, payload):
+        shard = {key: value for key, value in payload.items() if key != "deadline"}
+        response = self._client().invoke(
+            FunctionName=self.function_name,
+            InvocationType="Event",
+            Payload=json.dumps({"shard": shard}, default=_json_default).encode(),
+        )
+        if response.get("StatusCode") != SHARD_INVOKE_ACCEPTED:
+            raise Exception(f"シャードの呼び出しに失敗しました: {response}")
+        return {"shard_id": payload["shard_id"], "dispatched": True}
+
+    def execute(self, payloads):
+        if not payloads:
+            return []
+        self._client()
+        return _run_all(ThreadPoolExecutor, self.max_workers, self.invoke, payloads)
+
+
+def get_shard_executor(func, context=None):
+    """
+    環境変数SHARD_EXECUTORからシャードの実行方式を選んで返す（既定はthread）。
+    lambdaの場合は実行中の関数自身を呼び出す
+    """
+    kind = (os.environ.get("SHARD_EXECUTOR") or SHARD_EXECUTOR_THREAD).lower()
+    max_workers = _env_int("SHARD_MAX_WORKERS", DEFAULT_SHARD_MAX_WORKERS)
+    if kind == SHARD_EXECUTOR_LAMBDA:
+        function_name = getattr(
+            context, "invoked_function_arn", None
+        ) or os.environ.get("AWS_LAMBDA_FUNCTION_NAME")
+        if function_name:
+            return LambdaShardExecutor(function_name, max_workers=max_workers)
+        logger.warning("関数名が分からないためスレッドで実行します")
+    elif kind == SHARD_EXECUTOR_PROCESS:
+        return ProcessShardExecutor(func, max_workers)
+    elif kind != SHARD_EXECUTOR_THREAD:
+        logger.warning("SHARD_EXECUTORが不正です: %s", kind)
+    return ThreadShardExecutor(func, max_workers)
+
+
+def merge_summaries(summaries):
+    """
+    シャードごとの実行サマリを1つにまとめる。
+    数値は合計（max_で始まるものは最大値）、リストは連結、dictは再帰的にまとめ、
+    それ以外の値は最初のシャードの値を使う
+    """
+    merged = {}
+    for summary in summaries:
+        for key, value in summary.items():
+            if key not in merged:
+                merged[key] = (
+                    merge_summaries([value])
+                    if isinstance(value, dict)
+                    else list(value) if isinstance(value, list) else value
+                )
+            elif isinstance(value, bool):
+                continue
+            elif isinstance(value, (int, float)):
+                merged[key] = (
+                    max(merged[key], value)
+                    if key.startswith("max_")
+                    else merged[key] + value
+                )
+            elif isinstance(value, list):
+                merged[key].extend(value)
+            elif isinstance(value, dict):
+                merged[key] = merge_summaries([merged[key], value])
+    return merged
@@ -1,10 +1,38 @@
 from repositories.settings_repository import SettingsRepository
 from repositories.notifications_repository import NotificationsRepository
 from repositories.x_credential_settings_repository import XCredentialSettingsRepository
+from repositories.watchlist_repository import WatchlistRepository
+from repositories.resource_registry import get_repository
+from integration.slack_blocks import build_tweet_blocks
+from integration.slack_dispatcher import SlackDispatcher, deadline_from_context
 from integration.slack_integration import SlackIntegration
+from integration.x_api import get_x_api_base_url, lookup_public_metrics
+from integration.x_credential_pool import XCredentialPool, NoAvailableCredentialError
+from lambda_functions.event_bridge.digest_collector import DigestCollector
+from lambda_functions.event_bridge.poll_scheduler import (
+    get_max_settings_per_run,
+    select_due_settings,
+    update_poll_stats,
+)
+from lambda_functions.event_bridge.shard_scheduler import (
+    get_shard_executor,
+    merge_summaries,
+    plan_shards,
+)
+from observability import metrics
+from observability.logger import get_logger
+from lambda_functions.event_bridge.query_planner import (
+    QueryPack,
+    SearchMemo,
+    normalize_query,
+    plan_query_packs,
+)
 import json
+import os
+import time
 import urllib.request
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone, timedelta
 
 # .env自動ロード（ローカル開発用）
@@ -15,91 +43,323 @@ try:
 except ImportError:
     pass
 
+logger = get_logger("BatchWatcher")
 
-def get_twitter_client():
+# 検索パックごとの処理を並列実行するワーカー数の既定値（環境変数BATCH_CONCURRENCYで上書き可）
+DEFAULT_BATCH_CONCURRENCY = 4
+# since_idを持たない（新規・リセット済み）設定の検索期間の既定値（時間）
+# 環境変数SEARCH_FALLBACK_HOURSで上書き可。recent searchの上限である7日を超えない
+DEFAULT_SEARCH_FALLBACK_HOURS = 24 * 7
+RECENT_SEARCH_MAX_HOURS = 24 * 7
+# since_idはrecent searchの検索可能期間内である必要があるため、境界付近は余裕を持って切り替える
+SINCE_ID_SAFETY_MARGIN = timedelta(hours=1)
+# ツイートID（Snowflake）に埋め込まれた時刻の基準（ミリ秒）
+TWITTER_SNOWFLAKE_EPOCH_MS = 1288834974657
+# recent searchの1ページあたりの取得件数の範囲（APIの仕様で10〜100件）
+SEARCH_PAGE_SIZE_MIN = 10
+SEARCH_PAGE_SIZE_MAX = 100
+# 1設定・1回の実行で取得するページ数・ツイート数の上限の既定値
+# 環境変数SEARCH_MAX_PAGES / SEARCH_MAX_TWEETSで上書き可
+DEFAULT_SEARCH_MAX_PAGES = 3
+DEFAULT_SEARCH_MAX_TWEETS = 300
+# バッチで使う設定の属性（有効な設定の取得時にこれだけを読む）
+BATCH_SETTING_ATTRIBUTES = (
+    "id",
+    "keyword",
+    "slack_ch",
+    "like_threshold",
+    "retweet_threshold",
+    "lastExecutedTime",
+    "since_id",
+    "digest",
+    "digest_max",
+    "poll_stats",
+    "next_due_at",
+)
+# 通知の配信方式（環境変数DELIVERY_MODEで切り替え）
+# outbox: バッチは通知テーブルへの登録のみ行い、送信はストリーム（notify_slack_stream）だけが行う
+# inline: バッチが登録と同時に送信権を取得して自ら送信する（ストリームは送信しない）
+DELIVERY_MODE_OUTBOX = "outbox"
+DELIVERY_MODE_INLINE = "inline"
+DEFAULT_DELIVERY_MODE = DELIVERY_MODE_OUTBOX
+# 閾値に届かなかったツイートを再確認の候補にする投稿からの時間の既定値（0で無効）
+# 環境変数WATCHLIST_MAX_AGE_HOURSで上書き可。候補は投稿からこの時間が過ぎるとTTLで消える
+DEFAULT_WATCHLIST_MAX_AGE_HOURS = 6
+# 1回の実行で再確認する候補数の上限の既定値（環境変数WATCHLIST_MAX_LOOKUPSで上書き可）
+# ID指定のツイート取得は100件で1リクエストのため、上限/100がリクエスト数の上限になる
+DEFAULT_WATCHLIST_MAX_LOOKUPS = 1000
+
+
+def get_credential_pool():
     """
-    XCredentialSettingsRepositoryから利用可能な認証情報を取得し、Bearer Tokenを返す
+    XCredentialSettingsRepositoryの認証情報からX APIの認証情報プールを作成して返す
     """
-    credential_repo = XCredentialSettingsRepository()
-    credential = credential_repo.get_available_credential()
+    credential_pool = XCredentialPool(get_repository(XCredentialSettingsRepository))
+    if credential_pool.available_count() == 0:
+        raise NoAvailableCredentialError(
+            "利用可能なTwitter API認証情報が見つかりません"
+        )
+    return credential_pool
 
-    if not credential:
-        raise Exception("利用可能なTwitter API認証情報が見つかりません")
 
-    bearer_token = credential.get("bearer_token")
-    if not bearer_token:
-        raise Exception("Twitter API認証情報が不足しています")
+def get_delivery_mode():
+    """
+    環境変数DELIVERY_MODEから通知の配信方式を取得する（未設定・不正値はoutbox）
+    """
+    value = (os.environ.get("DELIVERY_MODE") or "").strip().lower()
+    if not value:
+        return DEFAULT_DELIVERY_MODE
+    if value not in (DELIVERY_MODE_OUTBOX, DELIVERY_MODE_INLINE):
+        logger.warning("DELIVERY_MODEが不正です: %s", value)
+        return DEFAULT_DELIVERY_MODE
+    return value
+
 
-    return bearer_token
+def _env_int(name, default, minimum=1):
+    value = os.environ.get(name)
+    if not value:
+        return default
+    try:
+        return max(minimum, int(value))
+    except ValueError:
+        logger.warning("%sが不正です: %s", name, value)
+        return default
+
+
+def get_watchlist_max_age_hours():
+    return _env_int("WATCHLIST_MAX_AGE_HOURS", DEFAULT_WATCHLIST_MAX_AGE_HOURS, 0)
+
+
+def get_watchlist_max_lookups():
+    return _env_int("WATCHLIST_MAX_LOOKUPS", DEFAULT_WATCHLIST_MAX_LOOKUPS)
 
 
 def get_valid_settings():
     """
-    DynamoDBから全ての設定を取得する
+    有効な設定のうちバッチで使う属性だけを取得する。
+    設定の内容はウォームスタート間で使い回すスナップショットから読み（設定の変更があった場合のみ読み直す）、
+    since_idなどの実行時の状態は毎回テーブルから読む
     """
-    repo = SettingsRepository()
-    return repo.list_valid_settings().get("Items", [])
+    repo = get_repository(SettingsRepository)
+    return repo.snapshot.active_settings(projection=BATCH_SETTING_ATTRIBUTES)
 
 
-def fetch_tweets_from_twitter_api(bearer_token, keyword, max_results=30):
+def get_search_fallback_hours():
     """
-    Twitter APIに1回だけリクエストし、直近1週間分のツイートを取得して結果を返す。エラー時は例外を投げる。
+    環境変数SEARCH_FALLBACK_HOURSからsince_id未設定時の検索期間（時間）を取得する
     """
-    url = "https://api.twitter.com/2/tweets/search/recent"
-    # 直近1週間のISO8601形式の日時を計算
-    now = datetime.now(timezone.utc)
-    one_week_ago = now - timedelta(days=7)
-    start_time = one_week_ago.isoformat(timespec="seconds").replace("+00:00", "Z")
+    value = os.environ.get("SEARCH_FALLBACK_HOURS")
+    if not value:
+        return DEFAULT_SEARCH_FALLBACK_HOURS
+    try:
+        return min(max(1, int(value)), RECENT_SEARCH_MAX_HOURS)
+    except ValueError:
+        logger.warning("SEARCH_FALLBACK_HOURSが不正です: %s", value)
+        return DEFAULT_SEARCH_FALLBACK_HOURS
+
+
+def tweet_id_to_datetime(tweet_id):
+    """
+    ツイートID（Snowflake）から投稿時刻(UTC)を復元する
+    """
+    timestamp_ms = (int(tweet_id) >> 22) + TWITTER_SNOWFLAKE_EPOCH_MS
+    return datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc)
+
+
+def build_search_window_params(since_id=None, now=None):
+    """
+    検索範囲のパラメータを返す。
+    since_idが検索可能期間内ならsince_idより新しいツイートのみを対象にし、
+    未設定または期間外（長期間停止していた設定など）の場合はstart_timeによるフォールバック期間を使う
+    """
+    now = now or datetime.now(timezone.utc)
+    if since_id:
+        oldest_allowed = (
+            now - timedelta(hours=RECENT_SEARCH_MAX_HOURS) + SINCE_ID_SAFETY_MARGIN
+        )
+        try:
+            if tweet_id_to_datetime(since_id) > oldest_allowed:
+                return {"since_id": str(since_id)}
+        except (TypeError, ValueError):
+            logger.warning("since_idが不正です: %s", since_id)
+    start = now - timedelta(hours=get_search_fallback_hours())
+    # recent searchはstart_timeが7日より前だとエラーになるため余裕を持たせる
+    start = max(
+        start, now - timedelta(hours=RECENT_SEARCH_MAX_HOURS) + SINCE_ID_SAFETY_MARGIN
+    )
+    return {"start_time": start.isoformat(timespec="seconds").replace("+00:00", "Z")}
+
+
+def watchlist_expires_at(tweet_id, max_age_hours, now=None):
+    """
+    投稿からmax_age_hours以内のツイートなら再確認の期限（エポック秒）を返し、それより古ければNoneを返す
+    """
+    now = now or datetime.now(timezone.utc)
+    try:
+        expires_at = tweet_id_to_datetime(tweet_id) + timedelta(hours=max_age_hours)
+    except (TypeError, ValueError):
+        return None
+    return int(expires_at.timestamp()) if expires_at > now else None
+
+
+def newest_tweet_id(tweets, since_id=None):
+    """
+    ツイート一覧と現在のsince_idのうち最も新しいツイートIDを返す（どちらも無ければNone）
+    """
+    ids = [int(since_id)] if since_id else []
+    for tweet in tweets:
+        tweet_uid = tweet.id if hasattr(tweet, "id") else tweet.get("id")
+        if tweet_uid:
+            ids.append(int(tweet_uid))
+    return str(max(ids)) if ids else None
+
+
+def get_search_budget():
+    """
+    環境変数SEARCH_MAX_PAGES / SEARCH_MAX_TWEETSから検索のページ数・ツイート数の上限を取得する
+    """
+    budget = []
+    for name, default in (
+        ("SEARCH_MAX_PAGES", DEFAULT_SEARCH_MAX_PAGES),
+        ("SEARCH_MAX_TWEETS", DEFAULT_SEARCH_MAX_TWEETS),
+    ):
+        value = os.environ.get(name)
+        try:
+            budget.append(max(1, int(value)) if value else default)
+        except ValueError:
+            logger.warning("%sが不正です: %s", name, value)
+            budget.append(default)
+    return tuple(budget)
+
+
+def fetch_tweets_from_twitter_api(
+    credential_pool,
+    keyword,
+    max_results=SEARCH_PAGE_SIZE_MAX,
+    since_id=None,
+    next_token=None,
+):
+    """
+    Twitter APIに1回だけリクエストし、検索結果の1ページ分を(ツイート一覧, meta)で返す。
+    since_idより新しいツイートを対象とし、since_idが無い場合はフォールバック期間を対象にする。
+    next_token指定時はその続きのページを取得する。エラー時は例外を投げる。
+    認証情報はリクエストごとにプールから選び、レスポンスのレート制限ヘッダーをプールへ反映する。
+    """
+    url = f"{get_x_api_base_url()}/2/tweets/search/recent"
     params = {
         "query": keyword,
-        "max_results": max_results,
-        "tweet.fields": "public_metrics,created_at",
-        "start_time": start_time,
+        "max_results": min(
+            max(max_results, SEARCH_PAGE_SIZE_MIN), SEARCH_PAGE_SIZE_MAX
+        ),
+        # lang・referenced_tweetsはまとめたクエリの振り分け（lang:・is:の判定）に使う
+        "tweet.fields": "public_metrics,created_at,lang,referenced_tweets",
     }
+    params.update(build_search_window_params(since_id))
+    if next_token:
+        params["next_token"] = next_token
     full_url = url + "?" + urllib.parse.urlencode(params)
+    bearer_token = credential_pool.acquire()
     req = urllib.request.Request(
         full_url, headers={"Authorization": f"Bearer {bearer_token}"}
     )
-    with urllib.request.urlopen(req) as res:
-        if res.status == 429:
-            raise urllib.error.HTTPError(
-                full_url, 429, "Rate limit exceeded", res.headers, None
-            )
-        data = json.load(res)
-        return data.get("data", [])
+    metrics.count("x_search_requests")
+    try:
+        with metrics.span("x_search_request"), urllib.request.urlopen(req) as res:
+            credential_pool.record_response(bearer_token, res.status, res.headers)
+            if res.status == 429:
+                raise urllib.error.HTTPError(
+                    full_url, 429, "Rate limit exceeded", res.headers, None
+                )
+            data = json.load(res)
+            return data.get("data", []), data.get("meta", {})
+    except urllib.error.HTTPError as e:
+        credential_pool.record_response(bearer_token, e.code, e.headers)
+        raise
 
 
-def search_tweets_by_keyword(bearer_token, keyword, max_results=30, max_retry=2):
+def search_tweets_by_keyword(
+    credential_pool,
+    keyword,
+    max_results=SEARCH_PAGE_SIZE_MAX,
+    max_retry=2,
+    since_id=None,
+    max_pages=None,
+    max_tweets=None,
+    progress=None,
+):
     """
-    指定キーワードでTwitter検索を行う。レートリミット時は認証情報を切り替えてリトライ。
+    指定キーワードでTwitter検索を行い、ツイートを1件ずつ返すジェネレータ。
+    next_tokenをたどってページ数・ツイート数の上限までページングし、
+    保持するのは常に1ページ分だけなので結果件数によらずメモリ使用量は一定。
+    since_id（保存済みの最新ツイートID）に到達した時点で打ち切る。
+    レートリミット・認証エラー時はプールの別の認証情報でリトライし、
+    それ以外のエラー時や利用可能な認証情報が尽きた時はそこで終了する。
+    progress(dict)を渡した場合、検索対象を最後まで取り切れた（次のページが無い・since_idに到達した）
+    ときだけprogress["complete"]をTrueにする。上限やエラーで打ち切った場合はFalseのまま
     """
-    for error_count in range(max_retry + 1):
-        try:
-            return fetch_tweets_from_twitter_api(bearer_token, keyword, max_results)
-        except urllib.error.HTTPError as e:
-            if e.code == 429:
-                print(
-                    f"Rate limit exceeded (HTTPError) [{error_count+1}/{max_retry+1}]"
+    default_pages, default_tweets = get_search_budget()
+    max_pages = max_pages or default_pages
+    max_tweets = max_tweets or default_tweets
+    if progress is None:
+        progress = {}
+    progress["complete"] = False
+    yielded = 0
+    next_token = None
+    for _ in range(max_pages):
+        page_size = min(max_results, max_tweets - yielded)
+        page = None
+        for error_count in range(max_retry + 1):
+            try:
+                page = fetch_tweets_from_twitter_api(
+                    credential_pool,
+                    keyword,
+                    page_size,
+                    since_id=since_id,
+                    next_token=next_token,
                 )
-                if error_count < max_retry:
-                    try:
-                        bearer_token = get_twitter_client()
+                break
+            except NoAvailableCredentialError as e:
+                logger.warning("認証情報切り替え失敗: %s", e)
+                return
+            except urllib.error.HTTPError as e:
+                if e.code in (401, 403, 429):
+                    logger.warning(
+                        "X API error (HTTPError %s) [%s/%s]",
+                        e.code,
+                        error_count + 1,
+                        max_retry + 1,
+                    )
+                    if error_count < max_retry:
+                        # プールが次のリクエストで別の認証情報を選ぶ
                         continue
-                    except Exception as retry_error:
-                        print(f"[BatchWatcher] 認証情報切り替え失敗: {retry_error}")
-                        return []
+                    else:
+                        logger.warning(
+                            "最大試行回数に達しました (試行回数: %s)", error_count + 1
+                        )
+                        return
                 else:
-                    print(
-                        f"[BatchWatcher] 最大試行回数に達しました (試行回数: {error_count + 1})"
-                    )
-                    return []
-            else:
-                print(f"HTTPError: {e}")
-                return []
-        except Exception as e:
-            print(f"Error: {e}")
-            return []
-    return []
+                    logger.error("HTTPError: %s", e, query=keyword)
+                    return
+            except Exception as e:
+                logger.error("X APIの呼び出しに失敗: %s", e, exc_info=True)
+                return
+        if page is None:
+            return
+        tweets, meta = page
+        next_token = meta.get("next_token")
+        for index, tweet in enumerate(tweets):
+            if since_id and int(tweet.get("id", 0)) <= int(since_id):
+                progress["complete"] = True
+                return
+            yield tweet
+            yielded += 1
+            if yielded >= max_tweets:
+                # 最後のページの最後のツイートで上限に達した場合は取り切れている
+                progress["complete"] = index == len(tweets) - 1 and not next_token
+                return
+        if not next_token:
+            progress["complete"] = True
+            return
 
 
 def filter_tweets_by_thresholds(tweets, like_threshold, retweet_threshold):
@@ -109,13 +369,13 @@ def filter_tweets_by_thresholds(tweets, like_threshold, retweet_threshold):
     """
     filtered = []
     for tweet in tweets:
-        metrics = (
+        public_metrics = (
             tweet.public_metrics
             if hasattr(tweet, "public_metrics")
             else tweet.get("public_metrics", {})
         )
-        like_count = metrics.get("like_count", 0)
-        retweet_count = metrics.get("retweet_count", 0)
+        like_count = public_metrics.get("like_count", 0)
+        retweet_count = public_metrics.get("retweet_count", 0)
         like_ok = True if like_threshold is None else like_count >= like_threshold
         retweet_ok = (
             True if retweet_threshold is None else retweet_count >= retweet_threshold
@@ -125,54 +385,175 @@ def filter_tweets_by_thresholds(tweets, like_threshold, retweet_threshold):
     return filtered
 
 
+def _has_stale_claim(state, now):
+    """
+    通知テーブルの行が未通知・未断念のまま、送信中の印だけが古くなっているか
+    （送信権を取得した実行が送信を終えずに落ちた行）
+    """
+    claimed_at = state.get("notify_claimed_at")
+    return (
+        claimed_at is not None
+        and "notified_at" not in state
+        and "notify_failed_at" not in state
+        and int(claimed_at) < now - NotificationsRepository.NOTIFY_CLAIM_TIMEOUT
+    )
+
+
 def save_notifications_for_tweets(
-    tweets, slack_ch, notifications_repo, slack_integration=None
+    tweets,
+    slack_ch,
+    notifications_repo,
+    slack_integration=None,
+    digest=None,
+    digest_max=None,
+    delivery_mode=None,
 ):
     """
-    通知テーブルに未通知のツイートのみ保存し、Slack通知も送信する（重複防止）
+    通知テーブルに未通知のツイートのみ保存する（重複防止）
+    重複チェックは設定ごとにBatchGetItemで1回だけ行い、
+    登録は条件付きputで行うため並行実行時も二重登録されない。
+    digest（DigestCollector）を渡した場合はダイジェスト行として保存する。
+    outboxモードでは登録のみ行い、送信はストリームに任せる。
+    inlineモードでは登録と同時に送信権を取得し、その場で送信して通知済みにする
+    （ダイジェスト行はdigestに溜め、実行の最後にまとめて送信する）。
+    送信中の印が古いまま未通知の行（送信中に実行が落ちた行）は、送信権を取り直して送信し直す。
+    新規に保存したツイート件数を返す
     """
-    if slack_integration is None:
-        slack_integration = SlackIntegration()
+    if delivery_mode is None:
+        delivery_mode = get_delivery_mode()
+    inline = delivery_mode == DELIVERY_MODE_INLINE
+    candidates = []
     for tweet in tweets:
         tweet_uid = str(tweet.id) if hasattr(tweet, "id") else tweet.get("id")
-        tweet_url = f"https://twitter.com/i/web/status/{tweet_uid}"
-        metrics = (
+        public_metrics = (
             tweet.public_metrics
             if hasattr(tweet, "public_metrics")
             else tweet.get("public_metrics", {})
         )
-        like_count = metrics.get("like_count", 0)
-        retweet_count = metrics.get("retweet_count", 0)
-        if not notifications_repo.exists(tweet_uid, slack_ch):
-            notifications_repo.put(
-                tweet_uid, tweet_url, slack_ch, like_count, retweet_count
+        candidates.append(
+            (
+                tweet_uid,
+                public_metrics.get("like_count", 0),
+                public_metrics.get("retweet_count", 0),
             )
-            print(
-                f"[BatchWatcher] 通知テーブルに保存: {tweet_uid} {tweet_url} {slack_ch} {like_count} {retweet_count}"
+        )
+    if not candidates:
+        return 0
+
+    keys = [(tweet_uid, slack_ch) for tweet_uid, _, _ in candidates]
+    with metrics.span("notifications_dedup"):
+        # inlineモードでは送信中に落ちた行を見つけるため、送信の状態も一緒に読む
+        existing = (
+            notifications_repo.get_states_many(keys)
+            if inline
+            else notifications_repo.exists_many(keys)
+        )
+    now = int(time.time())
+    # inlineモードでは登録と同時に送信権を取得する
+    options = {"notify_claimed_at": now} if inline else {}
+    if digest is not None:
+        options.update(digest=True, digest_max=digest_max)
+    # 登録済みのものはBatchGetItemで除いてあるので、書き込むのは新しい通知だけになる。
+    # BatchWriteItemでは条件を付けられず、並行実行が先に登録・通知した行を上書きすると
+    # notified_atが消えて再送されるため、1件ずつ条件付きputで登録する
+    inserted = []
+    # 送信中の印が古いまま残っていた行のうち、送信権を取り直せたもの
+    reclaimed = []
+    with metrics.span("notifications_write"):
+        for tweet_uid, like_count, retweet_count in candidates:
+            item = {
+                "tweet_uid": tweet_uid,
+                "tweet_url": f"https://twitter.com/i/web/status/{tweet_uid}",
+                "slack_ch": slack_ch,
+                "like_count": like_count,
+                "retweet_count": retweet_count,
+            }
+            if (tweet_uid, slack_ch) in existing:
+                if (
+                    inline
+                    and _has_stale_claim(existing[(tweet_uid, slack_ch)], now)
+                    and notifications_repo.claim_for_notification(
+                        tweet_uid, slack_ch, now=now
+                    )
+                ):
+                    logger.warning(
+                        "送信中のまま残っていた通知を送信し直します",
+                        tweet_uid=tweet_uid,
+                        slack_ch=slack_ch,
+                    )
+                    reclaimed.append(item)
+                    continue
+                logger.debug("既に通知済み", tweet_uid=tweet_uid, slack_ch=slack_ch)
+                continue
+            if notifications_repo.put_if_not_exists(**item, **options):
+                inserted.append(item)
+
+    metrics.count("notifications_saved", len(inserted))
+    # 既に通知済みのもの・並行実行で先に登録されたもの
+    metrics.count("tweets_deduped", len(candidates) - len(inserted))
+    logger.debug(
+        "通知テーブルに保存",
+        slack_ch=slack_ch,
+        tweet_uids=lambda: [item["tweet_uid"] for item in inserted],
+    )
+    if not inline:
+        return len(inserted)
+
+    metrics.count("notifications_reclaimed", len(reclaimed))
+    deliveries = inserted + reclaimed
+    if digest is not None:
+        digest.add(slack_ch, deliveries, digest_max)
+        logger.debug("ダイジェストに追加: %s件", len(deliveries), slack_ch=slack_ch)
+        return len(inserted)
+
+    if slack_integration is None:
+        slack_integration = SlackIntegration()
+    for item in deliveries:
+        tweet_url = item["tweet_url"]
+        # Slack通知送信（登録時に送信権を取得済みのため、送信中はストリームからは送信されない）
+        try:
+            blocks = build_tweet_blocks(
+                tweet_url, item["like_count"], item["retweet_count"]
             )
-            # Slack通知送信
+            with metrics.span("slack_post"):
+                ts = slack_integration.send_message(
+                    slack_ch, "新しいツイート通知", blocks=blocks
+                )
+        except Exception as e:
+            logger.error("Slack通知失敗: %s", e, slack_ch=slack_ch)
+            # 送信中の印を外し、ストリーム（MODIFYイベント）から送信し直させる
             try:
-                msg = f"新しいツイート: {tweet_url}\n👍 {like_count} 🔁 {retweet_count}"
-                slack_integration.send_message(slack_ch, msg)
-                print(f"[BatchWatcher] Slack通知送信: {slack_ch} {tweet_url}")
-            except Exception as e:
-                print(f"[BatchWatcher] Slack通知失敗: {e}")
-        else:
-            print(f"[BatchWatcher] 既に通知済み: {tweet_uid} {slack_ch}")
+                notifications_repo.release_claim(item["tweet_uid"], slack_ch)
+            except Exception as release_error:
+                logger.error(
+                    "送信中の印の解除に失敗: %s",
+                    release_error,
+                    tweet_uid=item["tweet_uid"],
+                )
+            continue
+        try:
+            with metrics.span("notifications_mark"):
+                notifications_repo.mark_notified(
+                    item["tweet_uid"],
+                    slack_ch,
+                    ts,
+                    datetime.now(timezone.utc).isoformat(),
+                )
+            metrics.count("tweets_delivered")
+            logger.debug("Slack通知送信", slack_ch=slack_ch, tweet_url=tweet_url)
+        except Exception as e:
+            # 送信済みのため送信中の印は外さない（外すと再送される）
+            logger.error("通知済みの記録に失敗: %s", e, slack_ch=slack_ch)
+    return len(inserted)
 
 
-def process_setting_for_notification(
-    setting, bearer_token, notifications_repo, slack_integration=None
-):
+def parse_thresholds(setting):
     """
-    1つの設定に対してTwitter検索・閾値フィルタ・通知保存をまとめて実行
-    設定ごとにlike/retweet_thresholdがあればそれを使う
+    設定のlike/retweet_thresholdを数値に変換して返す
+    None許容: 0や""はint変換、未設定はNone
     """
-    keyword = setting.get("keyword")
-    slack_ch = setting.get("slack_ch")
     like_threshold = setting.get("like_threshold")
     retweet_threshold = setting.get("retweet_threshold")
-    # None許容: 0や""はint変換、未設定はNone
     like_threshold = (
         int(like_threshold)
         if like_threshold is not None and like_threshold != ""
@@ -183,41 +564,493 @@ def process_setting_for_notification(
         if retweet_threshold is not None and retweet_threshold != ""
         else None
     )
-    print(
-        f"[BatchWatcher] 検索キーワード: {keyword} (slack_ch: {slack_ch}) like_th: {like_threshold} rt_th: {retweet_threshold}"
+    return like_threshold, retweet_threshold
+
+
+def search_and_route(pack, credential_pool, max_pages, max_tweets, thresholds, routed):
+    """
+    検索パックのクエリで1系統の検索（ページング込み）を行い、返ってきたツイートを
+    キーワードが一致する設定へ振り分けて閾値フィルタし、routedに溜める。
+    routedは設定IDごとの{"seen": 振り分け済みのツイートID, "matched": 閾値を通過したツイート,
+    "below": 閾値に届かなかったツイートのID}で、複数回の検索で同じツイートを受け取っても1回として扱う。
+    戻り値は取得件数・取得した最新/最古のツイートID・最後まで取得できたか
+    """
+    progress = {}
+    fetched = 0
+    newest_id = None
+    oldest_id = None
+    # 検索結果はジェネレータのまま1件ずつ振り分け・閾値フィルタし、閾値を通過したものだけ保持する
+    for tweet in search_tweets_by_keyword(
+        credential_pool,
+        pack.query,
+        since_id=pack.since_id,
+        max_pages=max_pages,
+        max_tweets=max_tweets,
+        progress=progress,
+    ):
+        fetched += 1
+        tweet_uid = tweet.get("id")
+        newest_id = newest_tweet_id([tweet], newest_id)
+        if oldest_id is None or int(tweet_uid) < int(oldest_id):
+            oldest_id = str(tweet_uid)
+        for setting in pack.route(tweet):
+            state = routed[setting["id"]]
+            if tweet_uid in state["seen"]:
+                continue
+            state["seen"].add(tweet_uid)
+            passed = filter_tweets_by_thresholds([tweet], *thresholds[setting["id"]])
+            state["matched"].extend(passed)
+            if not passed:
+                state["below"].append(tweet_uid)
+    logger.info("検索結果: %s件", fetched, query=pack.query)
+    return {
+        "fetched": fetched,
+        "newest_id": newest_id,
+        "oldest_id": oldest_id,
+        "complete": bool(progress.get("complete")),
+    }
+
+
+def search_covers(search, since_id):
+    """
+    検索で設定のsince_idより新しいツイートを全て読めたかどうか。
+    最後まで取得できなかった場合も、読めた最古のツイートがsince_id以前まで届いていれば読めている
+    """
+    if search["complete"]:
+        return True
+    return (
+        bool(since_id)
+        and search["oldest_id"] is not None
+        and int(since_id) >= int(search["oldest_id"])
     )
-    tweets = search_tweets_by_keyword(bearer_token, keyword)
-    print(f"[BatchWatcher] 検索結果: {tweets}")
-    filtered_tweets = filter_tweets_by_thresholds(
-        tweets, like_threshold, retweet_threshold
+
+
+def advanced_since_id(search, since_id):
+    """
+    検索で読めた最新のツイートIDまでsince_idを進めた値を返す（1件も読めていなければ据え置く）
+    """
+    return newest_tweet_id(
+        [{"id": search["newest_id"]}] if search["newest_id"] else [], since_id
     )
-    print(f"[BatchWatcher] 閾値通過ツイート: {filtered_tweets}")
-    save_notifications_for_tweets(
-        filtered_tweets, slack_ch, notifications_repo, slack_integration
+
+
+def process_pack_for_notification(
+    pack,
+    credential_pool,
+    notifications_repo,
+    slack_integration=None,
+    settings_repo=None,
+    digest=None,
+    watchlist_repo=None,
+):
+    """
+    1つの検索パックに対してTwitter検索（ページング込みで1系統）を行い、
+    返ってきたツイートをキーワードが一致する設定へ振り分けて閾値フィルタ・通知保存を実行する
+    設定ごとにlike/retweet_thresholdがあればそれを使う
+    ダイジェストモードの設定の通知はdigest（DigestCollector）に溜め、実行の最後にまとめて送信する
+    watchlist_repoを渡した場合は、閾値に届かなかった新しいツイートを再確認の候補として登録する
+    戻り値はパック単位の取得件数と、設定単位の処理結果（閾値通過件数・新規通知件数）の一覧
+    """
+    thresholds = {}
+    for setting in pack.settings:
+        like_threshold, retweet_threshold = parse_thresholds(setting)
+        thresholds[setting["id"]] = (like_threshold, retweet_threshold)
+        logger.debug(
+            "検索キーワード: %s",
+            setting.get("keyword"),
+            setting_id=setting.get("id"),
+            slack_ch=setting.get("slack_ch"),
+            like_threshold=like_threshold,
+            retweet_threshold=retweet_threshold,
+            since_id=setting.get("since_id"),
+        )
+    # パック内の設定数に応じて検索の上限を広げる（結果が無ければ追加のリクエストは発生しない）
+    max_pages, max_tweets = get_search_budget()
+    size = len(pack.settings)
+    routed = {
+        setting["id"]: {"seen": set(), "matched": [], "below": []}
+        for setting in pack.settings
+    }
+    search = search_and_route(
+        pack,
+        credential_pool,
+        max_pages * size,
+        max_tweets * size,
+        thresholds,
+        routed,
     )
-    # 正常に処理が終わったらlastExecutedTimeをJSTのISO8601で保存
+    fetched = search["fetched"]
+    # 設定ごとの次回検索の基準点（取得済みのツイートは通知テーブルで重複を除く）。
+    # 自分のsince_idより新しいツイートを全て読めなかった設定は、最後に打ち切られた検索を記録しておく
+    new_since_ids = {}
+    uncovered = {}
+    for setting in pack.settings:
+        own_since_id = setting.get("since_id")
+        if search_covers(search, own_since_id):
+            new_since_ids[setting["id"]] = advanced_since_id(search, own_since_id)
+        else:
+            uncovered[setting["id"]] = (setting, search)
+    if uncovered and pack.query_count > 1:
+        # 他のキーワードのツイートでパックの上限が埋まった設定は、クエリごとに単独で検索し直す。
+        # パックの検索だけで1設定分の上限以上を受け取った（自身のツイートが多い）設定は
+        # 単独でも上限で打ち切られるため検索し直さない
+        groups = {}
+        for setting, _ in uncovered.values():
+            if len(routed[setting["id"]]["seen"]) >= max_tweets:
+                continue
+            key = normalize_query(setting.get("keyword"))
+            groups.setdefault(key, []).append(setting)
+        for group in groups.values():
+            metrics.count("pack_split_searches")
+            split_search = search_and_route(
+                QueryPack(group, group[0].get("keyword")),
+                credential_pool,
+                max_pages,
+                max_tweets,
+                thresholds,
+                routed,
+            )
+            fetched += split_search["fetched"]
+            for setting in group:
+                own_since_id = setting.get("since_id")
+                if search_covers(split_search, own_since_id):
+                    del uncovered[setting["id"]]
+                    new_since_ids[setting["id"]] = advanced_since_id(
+                        split_search, own_since_id
+                    )
+                else:
+                    uncovered[setting["id"]] = (setting, split_search)
+    if uncovered:
+        # 上限やエラーで打ち切られた設定も読めた最新のIDまで進める。据え置くと次回も同じ範囲から
+        # 読み直して毎回上限で打ち切られ、新しい設定は7日間の遡りから抜け出せない。
+        # 読めなかった範囲（since_idから読めた最古のIDまで）は取りこぼしとして記録する
+        gaps = {}
+        for setting_id, (setting, truncated) in uncovered.items():
+            own_since_id = setting.get("since_id")
+            new_since_ids[setting_id] = advanced_since_id(truncated, own_since_id)
+            gaps[setting_id] = {
+                "since_id": own_since_id,
+                "oldest_id": truncated["oldest_id"],
+            }
+        logger.warning(
+            "検索を最後まで取得できなかったため、読めなかった範囲を飛ばしてsince_idを進めます",
+            query=pack.query,
+            fetched=fetched,
+            gaps=gaps,
+        )
+        metrics.count("search_truncated", len(uncovered))
+    matched = {setting_id: state["matched"] for setting_id, state in routed.items()}
+    # キーワードに一致した件数（閾値フィルタ前）。ポーリング間隔の調整に使う
+    returned = {setting_id: len(state["seen"]) for setting_id, state in routed.items()}
+    # 閾値に届かなかったツイートのID（再確認の候補）
+    below = {setting_id: state["below"] for setting_id, state in routed.items()}
+    metrics.count("tweets_fetched", fetched)
+    metrics.count("tweets_filtered", sum(len(tweets) for tweets in matched.values()))
+
+    if settings_repo is None:
+        settings_repo = get_repository(SettingsRepository)
+    watched = save_watch_candidates(below, watchlist_repo)
+    results = []
+    for setting in pack.settings:
+        filtered_tweets = matched[setting["id"]]
+        logger.debug(
+            "閾値通過ツイート: %s件",
+            len(filtered_tweets),
+            setting_id=setting["id"],
+            tweet_ids=lambda: [tweet.get("id") for tweet in filtered_tweets],
+        )
+        if digest is not None and setting.get("digest"):
+            notified_count = save_notifications_for_tweets(
+                filtered_tweets,
+                setting.get("slack_ch"),
+                notifications_repo,
+                slack_integration,
+                digest=digest,
+                digest_max=setting.get("digest_max"),
+            )
+        else:
+            notified_count = save_notifications_for_tweets(
+                filtered_tweets,
+                setting.get("slack_ch"),
+                notifications_repo,
+                slack_integration,
+            )
+        # 正常に処理が終わったらlastExecutedTimeをJSTのISO8601で保存
+        # 取得できた最新ツイートIDを次回検索の基準点(since_id)として一緒に保存する
+        own_since_id = setting.get("since_id")
+        new_since_id = new_since_ids[setting["id"]]
+        # 今回の取得件数・閾値通過件数から次回の実行予定時刻を決める
+        poll_stats, next_due_at = update_poll_stats(
+            setting.get("poll_stats"),
+            returned[setting["id"]],
+            len(filtered_tweets),
+            due_at=setting.get("next_due_at"),
+        )
+        # 保存できた実行時の状態は結果にも載せ、呼び出し元のスナップショットへ反映できるようにする
+        saved_executed_time = None
+        try:
+            now_jst = datetime.now(timezone(timedelta(hours=9))).isoformat()
+            with metrics.span("settings_update"):
+                settings_repo.update_last_executed_time_by_id(
+                    setting["id"],
+                    now_jst,
+                    since_id=new_since_id if new_since_id != own_since_id else None,
+                    poll_stats=poll_stats,
+                    next_due_at=next_due_at,
+                )
+            saved_executed_time = now_jst
+            logger.debug(
+                "lastExecutedTime更新",
+                setting_id=setting["id"],
+                last_executed_time=now_jst,
+                since_id=new_since_id,
+                next_due_at=next_due_at,
+            )
+        except Exception as e:
+            logger.error("lastExecutedTime更新失敗: %s", e, setting_id=setting["id"])
+        results.append(
+            {
+                "id": setting.get("id"),
+                "matched": len(filtered_tweets),
+                "notified": notified_count,
+                "watched": watched.get(setting["id"], 0),
+                "lastExecutedTime": saved_executed_time,
+                "since_id": new_since_id if saved_executed_time else None,
+                "poll_stats": poll_stats if saved_executed_time else None,
+                "next_due_at": next_due_at if saved_executed_time else None,
+            }
+        )
+    return {"fetched": fetched, "settings": results}
+
+
+def save_watch_candidates(below, watchlist_repo):
+    """
+    設定ごとの閾値に届かなかったツイートのうち、再確認の期間内のものを候補リストに登録する。
+    戻り値は設定ごとの登録件数（候補リストを使わない場合は空）
+    """
+    max_age_hours = get_watchlist_max_age_hours()
+    if watchlist_repo is None or max_age_hours <= 0:
+        return {}
+    now = datetime.now(timezone.utc)
+    candidates = []
+    watched = {}
+    for setting_id, tweet_ids in below.items():
+        for tweet_id in tweet_ids:
+            expires_at = watchlist_expires_at(tweet_id, max_age_hours, now)
+            if expires_at is None:
+                continue
+            candidates.append((str(tweet_id), setting_id, expires_at))
+            watched[setting_id] = watched.get(setting_id, 0) + 1
+    if not candidates:
+        return watched
     try:
-        settings_repo = SettingsRepository()
-        now_jst = datetime.now(timezone(timedelta(hours=9))).isoformat()
-        settings_repo.update_last_executed_time_by_id(setting["id"], now_jst)
-        print(f"[BatchWatcher] lastExecutedTime更新: {setting['id']} {now_jst}")
+        watchlist_repo.put_many(candidates)
     except Exception as e:
-        print(f"[BatchWatcher] lastExecutedTime更新失敗: {e}")
+        logger.error("再確認候補の登録失敗: %s", e)
+        return {}
+    logger.info("再確認候補を登録: %s件", len(candidates))
+    return watched
 
 
-def lambda_handler(event, context):
+def recheck_watchlist(
+    credential_pool,
+    settings,
+    notifications_repo,
+    watchlist_repo,
+    slack_integration=None,
+    delivery_mode=None,
+    deadline=None,
+):
     """
-    Lambdaバッチのエントリポイント。全体の流れのみ記述。
+    候補リストのツイートの現在のいいね数・リツイート数をID指定で100件ずつまとめて取得し、
+    設定の閾値を超えたものを通常の検索結果と同じ経路で通知に昇格させる。
+    昇格したもの・設定が無効になったものは候補から外し、それ以外は期限(TTL)まで残す。
+    候補は前回の続きから読み、全ての候補を順番に再確認する。
+    認証情報の枯渇や期限で取得を打ち切った場合、次回は取得できなかった候補から読む。
+    ID指定取得は検索とは別のレート制限の枠を使うため、設定の検索の予算は減らさない。
+    deadlineはツイートの取得とSlackへの送信を待ってよい期限（UNIX時刻の秒）
+    """
+    summary = {"candidates": 0, "looked_up": 0, "promoted": 0, "notified": 0}
+    settings_by_id = {setting["id"]: setting for setting in settings}
+    candidates = watchlist_repo.next_batch(get_watchlist_max_lookups())
+    summary["candidates"] = len(candidates)
+    if not candidates:
+        return summary
+    removed = [
+        (item["tweet_uid"], item["setting_id"])
+        for item in candidates
+        if item["setting_id"] not in settings_by_id
+    ]
+    watched = [item for item in candidates if item["setting_id"] in settings_by_id]
+    progress = {}
+    looked_up = (
+        lookup_public_metrics(
+            credential_pool,
+            [item["tweet_uid"] for item in watched],
+            deadline=deadline,
+            progress=progress,
+        )
+        if watched
+        else {}
+    )
+    summary["looked_up"] = len(looked_up)
+    # 問い合わせを終えた候補の最後までカーソルを進め、
+    # 打ち切りで問い合わせなかった候補は次回の実行で先頭から読み直す
+    processed = set(progress.get("processed_ids", []))
+    last = None
+    for item in candidates:
+        if item["setting_id"] in settings_by_id and item["tweet_uid"] not in processed:
+            break
+        last = item
+    if last is not None:
+        watchlist_repo.save_cursor(
+            {"tweet_uid": last["tweet_uid"], "setting_id": last["setting_id"]}
+        )
+
+    promoted = {}
+    for item in watched:
+        public_metrics = looked_up.get(item["tweet_uid"])
+        if public_metrics is None:
+            continue
+        tweet = {"id": item["tweet_uid"], "public_metrics": public_metrics}
+        setting = settings_by_id[item["setting_id"]]
+        if filter_tweets_by_thresholds([tweet], *parse_thresholds(setting)):
+            promoted.setdefault(item["setting_id"], []).append(tweet)
+            removed.append((item["tweet_uid"], item["setting_id"]))
+
+    digest = DigestCollector()
+    if promoted and slack_integration is None:
+        slack_integration = SlackDispatcher(SlackIntegration(), deadline=deadline)
+    for setting_id, tweets in promoted.items():
+        setting = settings_by_id[setting_id]
+        logger.info(
+            "再確認で閾値を通過: %s件",
+            len(tweets),
+            setting_id=setting_id,
+            tweet_ids=[tweet["id"] for tweet in tweets],
+        )
+        summary["promoted"] += len(tweets)
+        summary["notified"] += save_notifications_for_tweets(
+            tweets,
+            setting.get("slack_ch"),
+            notifications_repo,
+            slack_integration,
+            digest=digest if setting.get("digest") else None,
+            digest_max=setting.get("digest_max"),
+            delivery_mode=delivery_mode,
+        )
+    if promoted:
+        summary["digest"] = digest.flush(slack_integration, notifications_repo)
+    if removed:
+        watchlist_repo.delete_many(removed)
+    return summary
+
+
+def process_setting_for_notification(
+    setting,
+    credential_pool,
+    notifications_repo,
+    slack_integration=None,
+    settings_repo=None,
+):
+    """
+    1つの設定に対してTwitter検索・閾値フィルタ・通知保存をまとめて実行
+    戻り値は設定単位の処理結果（取得件数・閾値通過件数・新規通知件数）
+    """
+    pack = QueryPack([setting], setting.get("keyword"))
+    result = process_pack_for_notification(
+        pack, credential_pool, notifications_repo, slack_integration, settings_repo
+    )
+    return {"fetched": result["fetched"], **result["settings"][0]}
+
+
+def get_batch_concurrency():
     """
+    環境変数BATCH_CONCURRENCYから検索パック処理の並列数を取得する
+    未設定・不正値の場合は既定値を使う
+    """
+    value = os.environ.get("BATCH_CONCURRENCY")
+    if not value:
+        return DEFAULT_BATCH_CONCURRENCY
     try:
-        bearer_token = get_twitter_client()
-    except Exception as e:
-        print(f"[BatchWatcher] {e}")
-        return {"statusCode": 500, "body": str(e)}
-    valid_settings = get_valid_settings()
-    print(f"[BatchWatcher] 有効な設定: {valid_settings}")
-    notifications_repo = NotificationsRepository()
-    slack_integration = SlackIntegration()
+        return max(1, int(value))
+    except ValueError:
+        logger.warning("BATCH_CONCURRENCYが不正です: %s", value)
+        return DEFAULT_BATCH_CONCURRENCY
+
+
+def run_packs_concurrently(packs, worker, max_workers):
+    """
+    検索パックごとにworkerを上限付きのスレッドプールで並列実行し、実行結果のサマリを返す。
+    1つのパックで例外が発生しても他のパックの処理は継続する（パック単位のエラー分離）。
+    失敗したパックに含まれる設定は全て失敗として集計する。
+    packsは渡された順に投入されるため、先頭ほど早く処理が始まる。
+    """
+    summary = {
+        "total": sum(len(pack.settings) for pack in packs),
+        "packs": len(packs),
+        "succeeded": 0,
+        "failed": 0,
+        "fetched": 0,
+        "matched": 0,
+        "notified": 0,
+        "watched": 0,
+        "errors": [],
+    }
+    if not packs:
+        return summary
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(packs))) as executor:
+        futures = {executor.submit(worker, pack): pack for pack in packs}
+        for future in as_completed(futures):
+            pack = futures[future]
+            try:
+                result = future.result() or {}
+            except Exception as e:
+                for setting in pack.settings:
+                    logger.error("設定処理失敗: %s", e, setting_id=setting.get("id"))
+                    summary["failed"] += 1
+                    summary["errors"].append({"id": setting.get("id"), "error": str(e)})
+                continue
+            summary["fetched"] += result.get("fetched", 0)
+            for setting_result in result.get("settings", []):
+                summary["succeeded"] += 1
+                summary["matched"] += setting_result.get("matched", 0)
+                summary["notified"] += setting_result.get("notified", 0)
+                summary["watched"] += setting_result.get("watched", 0)
+    return summary
+
+
+def run_shard(payload, credential_pool=None, deadline=None):
+    """
+    1シャード分の設定を処理し、実行サマリを返す（シャードの実行方式によらず共通の処理）。
+    payloadは{"shard_id": シャード番号, "settings": 設定の一覧, "deadline": 期限}。
+    deadline（UNIX時刻の秒）を過ぎるSlackへの送信は待たずに失敗させる
+    （引数で渡さない場合はpayloadのdeadlineを使う）
+    """
+    if deadline is None:
+        deadline = payload.get("deadline")
+    if credential_pool is None:
+        credential_pool = get_credential_pool()
+    settings = payload["settings"]
+    # リポジトリ・Slackクライアントは全ワーカーで共有する。
+    # Tableの各操作はスレッドセーフな低レベルクライアントに委譲され、
+    # SlackIntegrationの接続プールも複数スレッドから利用できるため共有して問題ない。
+    # Slackへの送信はチャンネルごとのレート制限を守るようSlackDispatcher経由で行う。
+    # リポジトリはウォームスタート間でも使い回す。
+    notifications_repo = get_repository(NotificationsRepository)
+    settings_repo = get_repository(SettingsRepository)
+    watchlist_repo = get_repository(WatchlistRepository)
+    slack_integration = SlackDispatcher(SlackIntegration(), deadline=deadline)
+    # outboxモードでは通知の登録のみ行い、送信はストリームが行う
+    delivery_mode = get_delivery_mode()
+    logger.info(
+        "シャード開始",
+        shard_id=payload.get("shard_id", 0),
+        settings=len(settings),
+        delivery_mode=delivery_mode,
+    )
+    # inlineモードのダイジェスト設定の通知はチャンネルごとに溜め、最後に1メッセージで送る
+    digest = DigestCollector()
 
     # lastExecutedTimeがnull→古い順でソート
     def sort_key(setting):
@@ -230,10 +1063,144 @@ def lambda_handler(event, context):
             return (1, None)
         return (1, dt)
 
-    valid_settings = sorted(valid_settings, key=sort_key)
-    for setting in valid_settings:
-        process_setting_for_notification(
-            setting, bearer_token, notifications_repo, slack_integration
+    settings = sorted(settings, key=sort_key)
+    # 同じクエリの設定は検索結果を共有し、異なるキーワードはORでまとめて検索回数を減らす
+    search_memo = SearchMemo()
+    packs = plan_query_packs(settings, memo=search_memo)
+    logger.info("検索パック数: %s", len(packs), settings=len(settings))
+
+    def worker(pack):
+        started = time.perf_counter()
+        with metrics.span("pack"):
+            result = process_pack_for_notification(
+                pack,
+                credential_pool,
+                notifications_repo,
+                slack_integration,
+                settings_repo=settings_repo,
+                digest=digest,
+                watchlist_repo=watchlist_repo,
+            )
+        # 設定ごとの処理時間（同じパックの設定は検索を共有するので、パックの処理時間になる）
+        elapsed = (time.perf_counter() - started) * 1000
+        for _ in pack.settings:
+            metrics.record_time("setting", elapsed)
+        return result
+
+    summary = run_packs_concurrently(packs, worker, get_batch_concurrency())
+    with metrics.span("digest_flush"):
+        summary["digest"] = digest.flush(slack_integration, notifications_repo)
+    summary["search_cache"] = search_memo.stats()
+    summary["delivery_mode"] = delivery_mode
+    summary["slack"] = slack_integration.stats()
+    return summary
+
+
+def run_sharded(settings, credential_pool, context=None):
+    """
+    有効な設定をコストの見積もりでシャードに分割し、シャードの実行方式（SHARD_EXECUTOR）で実行して
+    各シャードの実行サマリを集計する。シャードが1つの場合はこのプロセス内でそのまま実行する
+    """
+    shards = plan_shards(plan_query_packs(settings))
+    # 同じ実行環境で処理するシャードは、この実行の残り時間までにSlackへの送信を終える
+    deadline = deadline_from_context(context)
+    payloads = [
+        {"shard_id": shard_id, "settings": shard_settings, "deadline": deadline}
+        for shard_id, shard_settings in enumerate(shards)
+    ]
+    if len(payloads) <= 1:
+        payload = (
+            payloads[0]
+            if payloads
+            else {"shard_id": 0, "settings": [], "deadline": deadline}
         )
-    print("[BatchWatcher] Triggered by EventBridge schedule.")
-    return {"statusCode": 200, "body": "Batch executed."}
+        summary = run_shard(payload, credential_pool)
+        summary["shards"] = 1
+        summary["shard_errors"] = []
+        return summary
+
+    executor = get_shard_executor(run_shard, context)
+    logger.info("シャード数: %s", len(payloads), executor=type(executor).__name__)
+    results = executor.execute(payloads)
+    shard_errors = [result for result in results if "error" in result]
+    if getattr(executor, "asynchronous", False):
+        # 非同期のシャードの実行サマリは各シャードのログとメトリクスに出力される
+        return {
+            "shards": len(payloads),
+            "dispatched": [r["shard_id"] for r in results if "error" not in r],
+            "shard_errors": shard_errors,
+        }
+    summary = merge_summaries([result for result in results if "error" not in result])
+    summary["shards"] = len(payloads)
+    summary["shard_errors"] = shard_errors
+    return summary
+
+
+def lambda_handler(event, context):
+    """
+    Lambdaバッチのエントリポイント。全体の流れのみ記述。
+    EventBridgeから呼ばれた場合は有効な設定をシャードに分けて実行し、
+    シャードとして自己呼び出しされた場合（eventにshardを含む）はそのシャードだけを処理する。
+    実行中に記録したメトリクスは最後にEMFで出力する。
+    """
+    try:
+        with metrics.span("batch_total"):
+            return handle_event(event, context)
+    finally:
+        metrics.flush(function="BatchWatcher")
+
+
+def handle_event(event, context):
+    if isinstance(event, dict) and "shard" in event:
+        # 自己呼び出しされたシャードは自身の残り時間を期限にする。
+        # 呼び出し元の期限を渡された場合は、呼び出し元が待てる間に終える
+        deadlines = [
+            d
+            for d in (event["shard"].get("deadline"), deadline_from_context(context))
+            if d is not None
+        ]
+        try:
+            summary = run_shard(
+                event["shard"], deadline=min(deadlines) if deadlines else None
+            )
+        except NoAvailableCredentialError as e:
+            logger.error("%s", e)
+            return {"statusCode": 500, "body": str(e)}
+        logger.info("シャード実行サマリ", summary=summary)
+        return {"statusCode": 200, "body": "Shard executed.", "summary": summary}
+
+    try:
+        credential_pool = get_credential_pool()
+    except Exception as e:
+        logger.error("%s", e)
+        return {"statusCode": 500, "body": str(e)}
+    valid_settings = get_valid_settings()
+    # 実行予定時刻を過ぎた設定だけを、予定からの遅れが大きい順に処理する
+    due_settings, not_due, deferred = select_due_settings(
+        valid_settings, limit=get_max_settings_per_run()
+    )
+    logger.info(
+        "有効な設定: %s件 実行対象: %s件",
+        len(valid_settings),
+        len(due_settings),
+        not_due=not_due,
+        deferred=deferred,
+    )
+    summary = run_sharded(due_settings, credential_pool, context)
+    summary["poll"] = {"not_due": not_due, "deferred": deferred}
+    # 閾値に届かなかった新しいツイートを再確認し、閾値を超えたものを通知する
+    if get_watchlist_max_age_hours() > 0:
+        try:
+            with metrics.span("watchlist_recheck"):
+                summary["watchlist"] = recheck_watchlist(
+                    credential_pool,
+                    valid_settings,
+                    get_repository(NotificationsRepository),
+                    get_repository(WatchlistRepository),
+                    deadline=deadline_from_context(context),
+                )
+        except Exception as e:
+            logger.error("再確認候補の処理失敗: %s", e, exc_info=True)
+            summary["watchlist"] = {"error": str(e)}
+    logger.info("実行サマリ", summary=summary)
+    return {"statusCode": 200, "body": "Batch executed.", "summary": summary}
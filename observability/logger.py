@@ -0,0 +1,145 @@
+import json
+import os
+import random
+import sys
+import threading
+import traceback
+from datetime import datetime, timezone
+
+LOG_LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+# 出力するログレベルの既定値（環境変数LOG_LEVELで上書き可）
+DEFAULT_LOG_LEVEL = "INFO"
+# 1つのフィールドに出力する文字列の最大長・リストの最大要素数
+# 環境変数LOG_MAX_FIELD_LENGTH / LOG_MAX_ITEMSで上書き可
+DEFAULT_LOG_MAX_FIELD_LENGTH = 512
+DEFAULT_LOG_MAX_ITEMS = 10
+# dictのキー数の上限（実行サマリなどのdictはリストより大きめに残す）
+LOG_MAX_KEYS = 50
+# dictをたどる深さの上限（これより深い値は文字列にして切り詰める）
+LOG_MAX_DEPTH = 4
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    try:
+        return max(1, int(value)) if value else default
+    except ValueError:
+        return default
+
+
+def get_log_level():
+    name = (os.environ.get("LOG_LEVEL") or DEFAULT_LOG_LEVEL).upper()
+    return LOG_LEVELS.get(name, LOG_LEVELS[DEFAULT_LOG_LEVEL])
+
+
+def truncate(value, max_length=None, max_items=None, depth=0):
+    """
+    ログに載せる値をJSONに変換できる大きさに切り詰める。
+    長い文字列は末尾を省略し、長いリストは先頭max_items件と残りの件数だけにする
+    （dictは先頭LOG_MAX_KEYS個のキーまで）
+    """
+    if max_length is None:
+        max_length = _env_int("LOG_MAX_FIELD_LENGTH", DEFAULT_LOG_MAX_FIELD_LENGTH)
+    if max_items is None:
+        max_items = _env_int("LOG_MAX_ITEMS", DEFAULT_LOG_MAX_ITEMS)
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, str):
+        if len(value) <= max_length:
+            return value
+        return f"{value[:max_length]}...(+{len(value) - max_length})"
+    if depth < LOG_MAX_DEPTH:
+        if isinstance(value, dict):
+            items = list(value.items())
+            result = {
+                str(key): truncate(item, max_length, max_items, depth + 1)
+                for key, item in items[:LOG_MAX_KEYS]
+            }
+            if len(items) > LOG_MAX_KEYS:
+                result["..."] = f"+{len(items) - LOG_MAX_KEYS}"
+            return result
+        if isinstance(value, (list, tuple, set)):
+            items = list(value)
+            result = [
+                truncate(item, max_length, max_items, depth + 1)
+                for item in items[:max_items]
+            ]
+            if len(items) > max_items:
+                result.append(f"...(+{len(items) - max_items})")
+            return result
+    return truncate(str(value), max_length, max_items, depth)
+
+
+class StructuredLogger:
+    """
+    1行1レコードのJSONでログを出力するロガー。
+    LOG_LEVEL未満のログはメッセージの組み立て（%形式の引数の展開・フィールドの変換）をせずに捨てる。
+    フィールドの値に引数なしの関数を渡すと、出力する場合だけ呼び出す。
+    sampleを指定したログはその確率でだけ出力する（大量に出るログの間引き用）
+    """
+
+    def __init__(self, name, stream=None):
+        self.name = name
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def is_enabled_for(self, level):
+        return LOG_LEVELS[level] >= get_log_level()
+
+    def _log(self, level, message, args, fields, exc_info=False, sample=None):
+        if not self.is_enabled_for(level):
+            return
+        if sample is not None and random.random() >= sample:
+            return
+        if args:
+            try:
+                message = message % args
+            except (TypeError, ValueError):
+                message = f"{message} {args}"
+        record = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "level": level,
+            "logger": self.name,
+            "message": truncate(message),
+        }
+        for key, value in fields.items():
+            record[key] = truncate(value() if callable(value) else value)
+        if sample is not None:
+            record["sample_rate"] = sample
+        if exc_info:
+            error = sys.exc_info()[1]
+            if error is not None:
+                record["error"] = truncate(repr(error))
+                record["traceback"] = truncate(
+                    "".join(traceback.format_exception(error))
+                )
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        stream = self.stream or sys.stdout
+        with self._lock:
+            stream.write(line + "\n")
+
+    def debug(self, message, *args, sample=None, **fields):
+        self._log("DEBUG", message, args, fields, sample=sample)
+
+    def info(self, message, *args, sample=None, **fields):
+        self._log("INFO", message, args, fields, sample=sample)
+
+    def warning(self, message, *args, exc_info=False, **fields):
+        self._log("WARNING", message, args, fields, exc_info=exc_info)
+
+    def error(self, message, *args, exc_info=False, **fields):
+        self._log("ERROR", message, args, fields, exc_info=exc_info)
+
+
+_loggers = {}
+_loggers_lock = threading.Lock()
+
+
+def get_logger(name):
+    """
+    名前ごとに1つだけロガーを生成して返す
+    """
+    with _loggers_lock:
+        if name not in _loggers:
+            _loggers[name] = StructuredLogger(name)
+        return _loggers[name]
@@ -0,0 +1,179 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# メトリクスの名前空間の既定値（環境変数METRICS_NAMESPACEで上書き可）
+DEFAULT_METRICS_NAMESPACE = "TweetWatcher"
+# EMFの1メトリクスに載せられる値の数の上限。超えた分は次のレコードに分けて出力する
+EMF_MAX_VALUES = 100
+
+
+class StdoutSink:
+    """
+    EMFのレコードを1行のJSONとして標準出力に書く（Lambdaでは CloudWatch Logs 経由でメトリクスになる）
+    """
+
+    def emit(self, record):
+        print(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+
+
+class MemorySink:
+    """
+    EMFのレコードをメモリに溜める（ローカル実行・テスト・ベンチマーク用）
+    """
+
+    def __init__(self):
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def values(self, name):
+        """全レコードに含まれるメトリクスnameの値を1つのリストにして返す"""
+        values = []
+        for record in self.records:
+            value = record.get(name)
+            if isinstance(value, list):
+                values.extend(value)
+            elif value is not None:
+                values.append(value)
+        return values
+
+
+class NullSink:
+    def emit(self, record):
+        pass
+
+
+def _default_sink():
+    kind = (os.environ.get("METRICS_SINK") or "stdout").lower()
+    if kind == "memory":
+        return MemorySink()
+    if kind in ("off", "none"):
+        return NullSink()
+    return StdoutSink()
+
+
+class Metrics:
+    """
+    1回の実行分の件数（カウンタ）と処理時間（スパン）を溜め、flushでEMFのレコードとして出力する。
+    カウンタは合計、処理時間は個々の値の配列として出力する。
+    複数のワーカースレッドから同時に記録してよい。
+    """
+
+    def __init__(self, namespace=None, sink=None):
+        self.namespace = namespace or os.environ.get(
+            "METRICS_NAMESPACE", DEFAULT_METRICS_NAMESPACE
+        )
+        self.sink = sink
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._timings = {}
+
+    def count(self, name, value=1):
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + value
+
+    def record_time(self, name, milliseconds):
+        with self._lock:
+            self._timings.setdefault(name, []).append(round(milliseconds, 3))
+
+    @contextmanager
+    def span(self, name):
+        """
+        with文の中の処理時間をミリ秒で記録する（例外で抜けた場合も記録する）
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_time(name, (time.perf_counter() - started) * 1000)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts), {k: list(v) for k, v in self._timings.items()}
+
+    def _records(self, counts, timings, dimensions):
+        timestamp = int(time.time() * 1000)
+        chunks = max(
+            [1]
+            + [
+                (len(values) + EMF_MAX_VALUES - 1) // EMF_MAX_VALUES
+                for values in timings.values()
+            ]
+        )
+        for index in range(chunks):
+            record = dict(dimensions)
+            definitions = []
+            if index == 0:
+                for name, value in counts.items():
+                    record[name] = value
+                    definitions.append({"Name": name, "Unit": "Count"})
+            for name, values in timings.items():
+                part = values[index * EMF_MAX_VALUES : (index + 1) * EMF_MAX_VALUES]
+                if part:
+                    record[name] = part
+                    definitions.append({"Name": name, "Unit": "Milliseconds"})
+            if not definitions:
+                continue
+            record["_aws"] = {
+                "Timestamp": timestamp,
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": self.namespace,
+                        "Dimensions": [sorted(dimensions)],
+                        "Metrics": definitions,
+                    }
+                ],
+            }
+            yield record
+
+    def flush(self, **dimensions):
+        """
+        溜めたメトリクスをEMFのレコードとしてsinkに出力し、カウンタ・処理時間を空にする。
+        dimensions（例: function="BatchWatcher"）はメトリクスのディメンションになる
+        """
+        with self._lock:
+            counts, self._counts = self._counts, {}
+            timings, self._timings = self._timings, {}
+        sink = self.sink or _sink
+        records = list(self._records(counts, timings, dimensions))
+        for record in records:
+            sink.emit(record)
+        return records
+
+
+_sink = _default_sink()
+# 実行中のプロセスで共有するメトリクス。ハンドラの最後にflushする
+_metrics = Metrics()
+
+
+def set_sink(sink):
+    """
+    メトリクスの出力先を差し替え、元の出力先を返す（ローカル実行ではMemorySinkで収集できる）
+    """
+    global _sink
+    previous, _sink = _sink, sink
+    return previous
+
+
+def get_metrics():
+    return _metrics
+
+
+def count(name, value=1):
+    _metrics.count(name, value)
+
+
+def record_time(name, milliseconds):
+    _metrics.record_time(name, milliseconds)
+
+
+def span(name):
+    return _metrics.span(name)
+
+
+def flush(**dimensions):
+    return _metrics.flush(**dimensions)
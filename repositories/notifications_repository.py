@@ -1,10 +1,25 @@
 import os
-import boto3
+import time
+from datetime import datetime, timedelta, timezone
+from boto3.dynamodb.conditions import Key
+from repositories.pagination import paginate
+from repositories.resource_registry import get_dynamodb_resource
+from botocore.exceptions import ClientError
 
 
 class NotificationsRepository:
-    def __init__(self, table_name=None):
-        self.dynamodb = boto3.resource("dynamodb")
+    # BatchGetItemで1回に指定できるキー数の上限
+    BATCH_GET_MAX_KEYS = 100
+    # BatchGetItemのUnprocessedKeysを再試行する最大回数
+    BATCH_GET_MAX_RETRY = 5
+    # 送信中の印(notify_claimed_at)がこの秒数より古い場合は、送信が途中で失敗したとみなして再取得できる
+    NOTIFY_CLAIM_TIMEOUT = 300
+    # 通知日（notified_atのUTCの日付）ごとに通知済みの行を引くインデックス
+    NOTIFIED_DATE_INDEX = "notified_date-index"
+    SLACK_MESSAGE_TS_INDEX = "slack_message_ts-index"
+
+    def __init__(self, table_name=None, dynamodb=None):
+        self.dynamodb = dynamodb or get_dynamodb_resource()
         self.table_name = table_name or os.environ.get(
             "NOTIFICATIONS_TABLE", "TweetWacherNotificationsTable"
         )
@@ -14,7 +29,58 @@ class NotificationsRepository:
         resp = self.table.get_item(Key={"tweet_uid": tweet_uid, "slack_ch": slack_ch})
         return "Item" in resp
 
-    def put(
+    def exists_many(self, keys):
+        """
+        (tweet_uid, slack_ch)のリストを受け取り、通知テーブルに存在するキーの集合を返す。
+        """
+        return set(self.get_states_many(keys, "tweet_uid, slack_ch"))
+
+    def get_states_many(
+        self,
+        keys,
+        projection="tweet_uid, slack_ch, notified_at, notify_claimed_at, notify_failed_at",
+    ):
+        """
+        (tweet_uid, slack_ch)のリストを受け取り、通知テーブルに存在する行の送信状態を
+        {(tweet_uid, slack_ch): 行}で返す。
+        BatchGetItemで100件ずつ問い合わせ、UnprocessedKeysは指数バックオフで再試行する。
+        """
+        unique_keys = list(dict.fromkeys(keys))
+        found = {}
+        for start in range(0, len(unique_keys), self.BATCH_GET_MAX_KEYS):
+            request_keys = [
+                {"tweet_uid": tweet_uid, "slack_ch": slack_ch}
+                for tweet_uid, slack_ch in unique_keys[
+                    start : start + self.BATCH_GET_MAX_KEYS
+                ]
+            ]
+            retry_count = 0
+            while request_keys:
+                resp = self.dynamodb.batch_get_item(
+                    RequestItems={
+                        self.table_name: {
+                            "Keys": request_keys,
+                            "ProjectionExpression": projection,
+                        }
+                    }
+                )
+                for item in resp.get("Responses", {}).get(self.table_name, []):
+                    found[(item["tweet_uid"], item["slack_ch"])] = item
+                request_keys = (
+                    resp.get("UnprocessedKeys", {})
+                    .get(self.table_name, {})
+                    .get("Keys", [])
+                )
+                if request_keys:
+                    retry_count += 1
+                    if retry_count > self.BATCH_GET_MAX_RETRY:
+                        raise Exception(
+                            f"BatchGetItemの未処理キーが残っています: {len(request_keys)}件"
+                        )
+                    time.sleep(min(0.05 * (2**retry_count), 1.0))
+        return found
+
+    def _build_item(
         self,
         tweet_uid,
         tweet_url,
@@ -22,6 +88,9 @@ class NotificationsRepository:
         like_count,
         retweet_count,
         slack_message_ts=None,
+        digest=False,
+        digest_max=None,
+        notify_claimed_at=None,
     ):
         item = {
             "tweet_uid": tweet_uid,
@@ -32,4 +101,239 @@ class NotificationsRepository:
         }
         if slack_message_ts is not None:
             item["slack_message_ts"] = slack_message_ts
+        # ダイジェストで通知する行。チャンネルごとにまとめて1メッセージで通知する
+        if digest:
+            item["digest"] = True
+            if digest_max is not None:
+                item["digest_max"] = int(digest_max)
+        # 登録と同時に送信権を取得しておく（登録した側が送信し、ストリームは送信しない）
+        if notify_claimed_at is not None:
+            item["notify_claimed_at"] = notify_claimed_at
+        return item
+
+    def put(
+        self,
+        tweet_uid,
+        tweet_url,
+        slack_ch,
+        like_count,
+        retweet_count,
+        slack_message_ts=None,
+        digest=False,
+        digest_max=None,
+        notify_claimed_at=None,
+    ):
+        item = self._build_item(
+            tweet_uid,
+            tweet_url,
+            slack_ch,
+            like_count,
+            retweet_count,
+            slack_message_ts,
+            digest,
+            digest_max,
+            notify_claimed_at,
+        )
         self.table.put_item(Item=item)
+
+    def put_if_not_exists(
+        self,
+        tweet_uid,
+        tweet_url,
+        slack_ch,
+        like_count,
+        retweet_count,
+        slack_message_ts=None,
+        digest=False,
+        digest_max=None,
+        notify_claimed_at=None,
+    ):
+        """
+        同じ(tweet_uid, slack_ch)が未登録の場合のみ保存する（重複チェックと登録を1回の書き込みで行う）。
+        保存できた場合はTrue、既に存在した場合はFalseを返す。
+        """
+        item = self._build_item(
+            tweet_uid,
+            tweet_url,
+            slack_ch,
+            like_count,
+            retweet_count,
+            slack_message_ts,
+            digest,
+            digest_max,
+            notify_claimed_at,
+        )
+        try:
+            self.table.put_item(
+                Item=item, ConditionExpression="attribute_not_exists(tweet_uid)"
+            )
+        except ClientError as e:
+            if (
+                e.response.get("Error", {}).get("Code")
+                == "ConditionalCheckFailedException"
+            ):
+                return False
+            raise
+        return True
+
+    def claim_for_notification(self, tweet_uid, slack_ch, now=None):
+        """
+        Slack通知を送る権利を条件付き更新で取得する。
+        未通知(notified_atが未設定)で送信を断念しておらず、他の実行が送信中でない場合のみTrueを返す。
+        """
+        now = int(now if now is not None else time.time())
+        try:
+            self.table.update_item(
+                Key={"tweet_uid": tweet_uid, "slack_ch": slack_ch},
+                UpdateExpression="SET notify_claimed_at = :now",
+                ConditionExpression=(
+                    "attribute_exists(tweet_uid) AND attribute_not_exists(notified_at)"
+                    " AND attribute_not_exists(notify_failed_at)"
+                    " AND (attribute_not_exists(notify_claimed_at)"
+                    " OR notify_claimed_at < :stale)"
+                ),
+                ExpressionAttributeValues={
+                    ":now": now,
+                    ":stale": now - self.NOTIFY_CLAIM_TIMEOUT,
+                },
+            )
+        except ClientError as e:
+            if (
+                e.response.get("Error", {}).get("Code")
+                == "ConditionalCheckFailedException"
+            ):
+                return False
+            raise
+        return True
+
+    def mark_notified(self, tweet_uid, slack_ch, slack_message_ts, notified_at):
+        """
+        通知済みとしてnotified_atとslack_message_tsを保存し、送信中の印を外す。
+        エンゲージメントの更新対象を日付で引けるよう、通知日(notified_date)も保存する
+        """
+        return self.table.update_item(
+            Key={"tweet_uid": tweet_uid, "slack_ch": slack_ch},
+            UpdateExpression=(
+                "SET notified_at = :n, notified_date = :d, slack_message_ts = :ts"
+                " REMOVE notify_claimed_at"
+            ),
+            ExpressionAttributeValues={
+                ":n": notified_at,
+                ":d": notified_at[:10],
+                ":ts": slack_message_ts,
+            },
+        )
+
+    def release_claim(self, tweet_uid, slack_ch):
+        """
+        送信に失敗した場合に送信中の印を外し、再試行で再取得できるようにする
+        """
+        return self.table.update_item(
+            Key={"tweet_uid": tweet_uid, "slack_ch": slack_ch},
+            UpdateExpression="REMOVE notify_claimed_at",
+        )
+
+    def mark_failed(self, tweet_uid, slack_ch, error, failed_at):
+        """
+        再送しても成功しないエラー（チャンネルが無い・アーカイブ済み等）で送信を断念した行に
+        notify_failed_atとエラーコードを保存し、送信中の印を外す（以後は送信権を取得できない）
+        """
+        return self.table.update_item(
+            Key={"tweet_uid": tweet_uid, "slack_ch": slack_ch},
+            UpdateExpression=(
+                "SET notify_failed_at = :f, notify_error = :e REMOVE notify_claimed_at"
+            ),
+            ExpressionAttributeValues={":f": failed_at, ":e": error},
+        )
+
+    def is_pending(self, tweet_uid, slack_ch):
+        """
+        通知テーブルに登録済みで、まだ通知済みになっておらず送信も断念していないかを
+        強い整合性の読み込みで返す。送信権を取得できなかった通知が、通知済み（または削除済み・断念済み）
+        なのか他の実行が送信中なのかを見分けるために使う
+        """
+        resp = self.table.get_item(
+            Key={"tweet_uid": tweet_uid, "slack_ch": slack_ch},
+            ConsistentRead=True,
+            ProjectionExpression="tweet_uid, notified_at, notify_failed_at",
+        )
+        item = resp.get("Item")
+        return (
+            item is not None
+            and "notified_at" not in item
+            and "notify_failed_at" not in item
+        )
+
+    def iter_notified_since(self, since, now=None):
+        """
+        since以降に通知した行を1件ずつ返すジェネレータ。
+        notified_date-indexを日付ごとに全ページ分queryする（sinceはタイムゾーン付きのdatetime）
+        """
+        now = now or datetime.now(timezone.utc)
+        since = since.astimezone(timezone.utc)
+        day = since.date()
+        while day <= now.astimezone(timezone.utc).date():
+            yield from paginate(
+                self.table.query,
+                IndexName=self.NOTIFIED_DATE_INDEX,
+                KeyConditionExpression=Key("notified_date").eq(day.isoformat())
+                & Key("notified_at").gte(since.isoformat()),
+            )
+            day += timedelta(days=1)
+
+    def list_by_message_ts(self, slack_message_ts, slack_ch):
+        """
+        同じSlackメッセージで通知した行（ダイジェストでは複数行）の一覧を返す
+        """
+        return [
+            item
+            for item in paginate(
+                self.table.query,
+                IndexName=self.SLACK_MESSAGE_TS_INDEX,
+                KeyConditionExpression=Key("slack_message_ts").eq(slack_message_ts),
+            )
+            if item.get("slack_ch") == slack_ch
+        ]
+
+    def update_engagement(
+        self,
+        tweet_uid,
+        slack_ch,
+        like_count,
+        retweet_count,
+        expected_like_count,
+        expected_retweet_count,
+    ):
+        """
+        いいね数・リツイート数を更新する。読み込んだ時点の値から変わっていない場合のみ書き込み
+        （他の実行が先に更新していた場合はFalseを返す）
+        """
+        conditions = ["attribute_exists(tweet_uid)"]
+        values = {":like": like_count, ":rt": retweet_count}
+        for name, placeholder, expected in (
+            ("like_count", ":old_like", expected_like_count),
+            ("retweet_count", ":old_rt", expected_retweet_count),
+        ):
+            if expected is None:
+                conditions.append(
+                    f"(attribute_not_exists({name}) OR attribute_type({name}, :null))"
+                )
+                values[":null"] = "NULL"
+            else:
+                conditions.append(f"{name} = {placeholder}")
+                values[placeholder] = expected
+        try:
+            self.table.update_item(
+                Key={"tweet_uid": tweet_uid, "slack_ch": slack_ch},
+                UpdateExpression="SET like_count = :like, retweet_count = :rt",
+                ConditionExpression=" AND ".join(conditions),
+                ExpressionAttributeValues=values,
+            )
+        except ClientError as e:
+            if (
+                e.response.get("Error", {}).get("Code")
+                == "ConditionalCheckFailedException"
+            ):
+                return False
+            raise
+        return True
@@ -0,0 +1,81 @@
+import queue
+import threading
+
+# 並列スキャンのワーカーから結果を受け取る際の終了の印
+_SEGMENT_DONE = object()
+
+
+def build_projection(attributes):
+    """
+    取得する属性名の一覧からProjectionExpressionの引数を組み立てる。
+    予約語（keywordなど）と衝突しないよう全ての属性名をプレースホルダで指定する
+    """
+    if not attributes:
+        return {}
+    names = {f"#p{i}": attribute for i, attribute in enumerate(attributes)}
+    return {
+        "ProjectionExpression": ", ".join(names),
+        "ExpressionAttributeNames": names,
+    }
+
+
+def paginate(operation, **kwargs):
+    """
+    scan/queryをLastEvaluatedKeyを辿りながら呼び出し、全ページのItemsを1件ずつ返すジェネレータ
+    """
+    while True:
+        response = operation(**kwargs)
+        yield from response.get("Items", [])
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        if not last_evaluated_key:
+            return
+        kwargs["ExclusiveStartKey"] = last_evaluated_key
+
+
+def count(operation, **kwargs):
+    """
+    Select=COUNTでscan/queryを全ページ分呼び出し、件数の合計を返す（アイテムは取得しない）
+    """
+    total = 0
+    while True:
+        response = operation(Select="COUNT", **kwargs)
+        total += response.get("Count", 0)
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        if not last_evaluated_key:
+            return total
+        kwargs["ExclusiveStartKey"] = last_evaluated_key
+
+
+def parallel_scan(table, total_segments, **kwargs):
+    """
+    テーブルをtotal_segments個のセグメントに分けてスレッドで並列にscanし、
+    取得できた順にアイテムを1件ずつ返すジェネレータ。順序は保証しない
+    """
+    results = queue.Queue()
+
+    def scan_segment(segment):
+        try:
+            for item in paginate(
+                table.scan, Segment=segment, TotalSegments=total_segments, **kwargs
+            ):
+                results.put(item)
+        except Exception as e:
+            results.put(e)
+        finally:
+            results.put(_SEGMENT_DONE)
+
+    threads = [
+        threading.Thread(target=scan_segment, args=(segment,), daemon=True)
+        for segment in range(total_segments)
+    ]
+    for thread in threads:
+        thread.start()
+    remaining = total_segments
+    while remaining:
+        item = results.get()
+        if item is _SEGMENT_DONE:
+            remaining -= 1
+        elif isinstance(item, Exception):
+            raise item
+        else:
+            yield item
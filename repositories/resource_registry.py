@@ -0,0 +1,86 @@
+import threading
+
+# boto3・botocoreのimportは重い（コールドスタートで数十ms）ため、モジュールの読み込み時ではなく
+# 最初にリソース・クライアントを生成するときに行う
+
+# botocoreの接続プールの最大数（バッチの並列ワーカー数より多めに確保する）
+MAX_POOL_CONNECTIONS = 32
+CONNECT_TIMEOUT = 3
+READ_TIMEOUT = 10
+
+# ウォームスタート間で共有するboto3リソース・クライアント・リポジトリ
+# boto3のデフォルトセッションからの生成はスレッドセーフではないため、生成はロック内で行う
+_lock = threading.RLock()
+_resources = {}
+_clients = {}
+_repositories = {}
+
+
+def _botocore_config(read_timeout=READ_TIMEOUT, max_attempts=5):
+    from botocore.config import Config
+
+    return Config(
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        tcp_keepalive=True,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=read_timeout,
+        retries={"max_attempts": max_attempts, "mode": "standard"},
+    )
+
+
+def get_resource(service_name):
+    """
+    boto3リソースを初回呼び出し時に生成して返す。以降は同じインスタンスを使い回す
+    """
+    with _lock:
+        if service_name not in _resources:
+            import boto3
+
+            _resources[service_name] = boto3.resource(
+                service_name, config=_botocore_config()
+            )
+        return _resources[service_name]
+
+
+def get_client(service_name, read_timeout=READ_TIMEOUT, max_attempts=5):
+    """
+    boto3クライアントを初回呼び出し時に生成して返す。以降は同じインスタンスを使い回す
+    応答に時間がかかる呼び出し（Lambdaの同期実行など）はread_timeoutを指定する
+    """
+    key = (service_name, read_timeout, max_attempts)
+    with _lock:
+        if key not in _clients:
+            import boto3
+
+            _clients[key] = boto3.client(
+                service_name,
+                config=_botocore_config(read_timeout, max_attempts),
+            )
+        return _clients[key]
+
+
+def get_dynamodb_resource():
+    return get_resource("dynamodb")
+
+
+def get_repository(repository_cls, table_name=None):
+    """
+    リポジトリのインスタンスをクラス・テーブル名ごとに1つだけ生成して返す
+    """
+    key = (repository_cls, table_name)
+    with _lock:
+        if key not in _repositories:
+            _repositories[key] = (
+                repository_cls(table_name) if table_name else repository_cls()
+            )
+        return _repositories[key]
+
+
+def reset_registry():
+    """
+    保持しているリソース・クライアント・リポジトリを破棄する（テスト用）
+    """
+    with _lock:
+        _resources.clear()
+        _clients.clear()
+        _repositories.clear()
@@ -1,20 +1,140 @@
 import os
-import boto3
+import time
+from repositories.pagination import build_projection, count, paginate, parallel_scan
+from repositories.resource_registry import get_dynamodb_resource
+from repositories.settings_snapshot import SettingsSnapshot
 import random
 import string
-from boto3.dynamodb.conditions import Key
+from observability.logger import get_logger
+
+logger = get_logger("SettingsRepository")
+
+
+def get_max_active_settings():
+    """
+    環境変数MAX_ACTIVE_SETTINGSからアクティブな設定の最大件数を取得する
+    未設定・0以下の場合は上限なし(None)
+    """
+    value = os.environ.get("MAX_ACTIVE_SETTINGS")
+    if not value:
+        return None
+    try:
+        value = int(value)
+    except ValueError:
+        logger.warning("MAX_ACTIVE_SETTINGSが不正です: %s", value)
+        return None
+    return value if value > 0 else None
+
+
+def _active_key_condition():
+    # boto3はresource_registryと同じく、実際に問い合わせるときに初めて読み込む
+    from boto3.dynamodb.conditions import Key
+
+    return Key("publication_status").eq("active")
 
 
 class SettingsRepository:
-    # アクティブな設定の最大件数
-    MAX_ACTIVE_SETTINGS = 3
+    # 設定の書き込みのたびに更新するバージョン項目のID（publication_statusを持たないためGSIには現れない）
+    VERSION_ITEM_ID = "__settings_version__"
+    # バッチが実行のたびに書き込む実行時の状態（スナップショットには含めず、毎回テーブルから読む）
+    RUNTIME_ATTRIBUTES = ("lastExecutedTime", "since_id", "poll_stats", "next_due_at")
+    # BatchGetItemで1回に指定できるキー数の上限
+    BATCH_GET_MAX_KEYS = 100
+    # BatchGetItemのUnprocessedKeysを再試行する最大回数
+    BATCH_GET_MAX_RETRY = 5
 
-    def __init__(self, table_name=None):
-        self.dynamodb = boto3.resource("dynamodb")
+    def __init__(self, table_name=None, dynamodb=None):
+        self.dynamodb = dynamodb or get_dynamodb_resource()
         self.table_name = table_name or os.environ.get(
             "SETTINGS_TABLE", "TweetWacherSettingsTable"
         )
         self.table = self.dynamodb.Table(self.table_name)
+        # アクティブな設定の最大件数（Noneは上限なし）
+        self.max_active_settings = get_max_active_settings()
+        # アクティブな設定のスナップショット（リポジトリと一緒にウォームスタート間で使い回す）
+        self.snapshot = SettingsSnapshot(self)
+
+    def get_settings_version(self):
+        """
+        設定のバージョンを強い整合性で読み込む（未作成の場合は0）
+        """
+        resp = self.table.get_item(
+            Key={"id": self.VERSION_ITEM_ID},
+            ConsistentRead=True,
+            ProjectionExpression="#v",
+            ExpressionAttributeNames={"#v": "version"},
+        )
+        return int(resp.get("Item", {}).get("version", 0))
+
+    def get_runtime_states(self, ids):
+        """
+        設定ごとの実行時の状態（RUNTIME_ATTRIBUTES）と設定のバージョンを強い整合性でまとめて読み込み、
+        (バージョン, {id: 実行時の状態})を返す。バージョン項目は同じBatchGetItemで読むため、
+        バージョンの確認に別の読み込みは要らない。存在しない設定は結果に含まれない。
+        UnprocessedKeysは指数バックオフで再試行する
+        """
+        keys = [{"id": self.VERSION_ITEM_ID}] + [
+            {"id": id} for id in dict.fromkeys(ids)
+        ]
+        names = {
+            f"#p{i}": a
+            for i, a in enumerate(("id", "version") + self.RUNTIME_ATTRIBUTES)
+        }
+        version = 0
+        states = {}
+        for start in range(0, len(keys), self.BATCH_GET_MAX_KEYS):
+            request_keys = keys[start : start + self.BATCH_GET_MAX_KEYS]
+            retry_count = 0
+            while request_keys:
+                resp = self.dynamodb.batch_get_item(
+                    RequestItems={
+                        self.table_name: {
+                            "Keys": request_keys,
+                            "ConsistentRead": True,
+                            "ProjectionExpression": ", ".join(names),
+                            "ExpressionAttributeNames": names,
+                        }
+                    }
+                )
+                for item in resp.get("Responses", {}).get(self.table_name, []):
+                    if item["id"] == self.VERSION_ITEM_ID:
+                        version = int(item.get("version", 0))
+                    else:
+                        states[item["id"]] = item
+                request_keys = (
+                    resp.get("UnprocessedKeys", {})
+                    .get(self.table_name, {})
+                    .get("Keys", [])
+                )
+                if request_keys:
+                    retry_count += 1
+                    if retry_count > self.BATCH_GET_MAX_RETRY:
+                        raise Exception(
+                            f"BatchGetItemの未処理キーが残っています: {len(request_keys)}件"
+                        )
+                    time.sleep(min(0.05 * (2**retry_count), 1.0))
+        return version, states
+
+    def bump_settings_version(self):
+        """
+        設定のバージョンを1つ上げ、各実行環境のスナップショットに読み直しを促す。
+        書き込みの後に呼ぶ（先に上げると、書き込み前の内容を新しいバージョンとして読まれうる）
+        """
+        self.table.update_item(
+            Key={"id": self.VERSION_ITEM_ID},
+            UpdateExpression="ADD version :one",
+            ExpressionAttributeValues={":one": 1},
+        )
+        self.snapshot.invalidate()
+
+    def has_active_capacity(self):
+        """
+        アクティブな設定をもう1件増やせるかどうか（上限なしの場合は件数を数えない）。
+        書き込みの判定に使うため、TTLの間古いままのスナップショットではなく毎回テーブルを数える
+        """
+        if self.max_active_settings is None:
+            return True
+        return self.valid_setting_count() < self.max_active_settings
 
     def get_by_id(self, id):
         return self.table.get_item(Key={"id": id})
@@ -32,10 +152,7 @@ class SettingsRepository:
             raise Exception("ID生成に失敗しました")
 
         # 現在のアクティブ設定数をチェックしてpublication_statusを決定
-        current_active_count = self.valid_setting_count()
-        publication_status = (
-            "active" if current_active_count < self.MAX_ACTIVE_SETTINGS else "inactive"
-        )
+        publication_status = "active" if self.has_active_capacity() else "inactive"
 
         item = {
             "id": id,
@@ -49,54 +166,93 @@ class SettingsRepository:
         if retweet_threshold is not None:
             item["retweet_threshold"] = int(retweet_threshold)
         self.table.put_item(Item=item)
+        self.bump_settings_version()
         return {"id": id, "publication_status": publication_status}
 
     def update_keyword_by_id(self, id, keyword):
-        update_expr = "SET keyword = :keyword"
+        # キーワードが変わると検索結果の連続性が切れるため、since_idもリセットする
+        update_expr = "SET keyword = :keyword REMOVE since_id"
         expr_attr = {":keyword": keyword}
-        return self.table.update_item(
+        resp = self.table.update_item(
             Key={"id": id},
             UpdateExpression=update_expr,
             ExpressionAttributeValues=expr_attr,
         )
+        self.bump_settings_version()
+        return resp
 
     def update_publication_status_active_by_id(self, id):
-        # アクティブな設定がMAX_ACTIVE_SETTINGS件以上ある場合はエラーを返す
-        if self.valid_setting_count() >= self.MAX_ACTIVE_SETTINGS:
-            raise Exception("アクティブな設定は3件までしか登録できません")
+        # アクティブな設定が上限件数以上ある場合はエラーを返す
+        if not self.has_active_capacity():
+            raise Exception(
+                f"アクティブな設定は{self.max_active_settings}件までしか登録できません"
+            )
 
         update_expr = "SET publication_status = :publication_status"
         expr_attr = {":publication_status": "active"}
-        return self.table.update_item(
+        resp = self.table.update_item(
             Key={"id": id},
             UpdateExpression=update_expr,
             ExpressionAttributeValues=expr_attr,
         )
+        self.bump_settings_version()
+        return resp
 
     def update_publication_status_inactive_by_id(self, id):
         update_expr = "SET publication_status = :publication_status"
         expr_attr = {":publication_status": "inactive"}
-        return self.table.update_item(
+        resp = self.table.update_item(
             Key={"id": id},
             UpdateExpression=update_expr,
             ExpressionAttributeValues=expr_attr,
         )
+        self.bump_settings_version()
+        return resp
 
     def delete_by_id(self, id):
-        return self.table.delete_item(Key={"id": id})
+        resp = self.table.delete_item(Key={"id": id})
+        self.bump_settings_version()
+        return resp
 
-    def list_all(self):
-        return self.table.scan()
+    def iter_all(self, projection=None, segments=None):
+        """
+        全設定を1件ずつ返すジェネレータ。ページングはLastEvaluatedKeyを辿って透過的に行う。
+        projectionで取得する属性を絞り込み、segmentsを2以上にすると並列スキャンする
+        """
+        kwargs = build_projection(projection)
+        if segments and segments > 1:
+            items = parallel_scan(self.table, segments, **kwargs)
+        else:
+            items = paginate(self.table.scan, **kwargs)
+        # バージョン項目は設定ではないため除く
+        return (item for item in items if item.get("id") != self.VERSION_ITEM_ID)
 
-    def list_valid_settings(self):
-        response = self.table.query(
+    def iter_valid_settings(self, projection=None):
+        """
+        アクティブな設定を1件ずつ返すジェネレータ（publication_status-indexを全ページ分query）
+        """
+        return paginate(
+            self.table.query,
             IndexName="publication_status-index",
-            KeyConditionExpression=Key("publication_status").eq("active"),
+            KeyConditionExpression=_active_key_condition(),
+            **build_projection(projection),
         )
-        return response
+
+    def list_all(self):
+        return {"Items": list(self.iter_all())}
+
+    def list_valid_settings(self):
+        """
+        アクティブな設定の一覧を返す（コマンドへの応答用のため、スナップショットを使わずテーブルから読む）
+        """
+        return {"Items": list(self.iter_valid_settings())}
 
     def valid_setting_count(self):
-        return len(self.list_valid_settings().get("Items", []))
+        return count(
+            self.table.query,
+            IndexName="publication_status-index",
+            KeyConditionExpression=_active_key_condition(),
+        )
 
     def update_like_threshold_by_id(self, id, like_threshold):
         update_expr = "SET like_threshold = :like_threshold"
@@ -105,11 +261,13 @@ class SettingsRepository:
                 int(like_threshold) if like_threshold is not None else None
             )
         }
-        return self.table.update_item(
+        resp = self.table.update_item(
             Key={"id": id},
             UpdateExpression=update_expr,
             ExpressionAttributeValues=expr_attr,
         )
+        self.bump_settings_version()
+        return resp
 
     def update_retweet_threshold_by_id(self, id, retweet_threshold):
         update_expr = "SET retweet_threshold = :retweet_threshold"
@@ -118,15 +276,51 @@ class SettingsRepository:
                 int(retweet_threshold) if retweet_threshold is not None else None
             )
         }
-        return self.table.update_item(
+        resp = self.table.update_item(
+            Key={"id": id},
+            UpdateExpression=update_expr,
+            ExpressionAttributeValues=expr_attr,
+        )
+        self.bump_settings_version()
+        return resp
+
+    def update_digest_by_id(self, id, digest, digest_max=None):
+        """
+        ダイジェスト通知の有効/無効と、1メッセージに載せる最大件数を更新する
+        """
+        update_expr = "SET digest = :digest"
+        expr_attr = {":digest": bool(digest)}
+        if digest_max is not None:
+            update_expr += ", digest_max = :digest_max"
+            expr_attr[":digest_max"] = int(digest_max)
+        resp = self.table.update_item(
             Key={"id": id},
             UpdateExpression=update_expr,
             ExpressionAttributeValues=expr_attr,
         )
+        self.bump_settings_version()
+        return resp
 
-    def update_last_executed_time_by_id(self, id, last_executed_time):
+    def update_last_executed_time_by_id(
+        self, id, last_executed_time, since_id=None, poll_stats=None, next_due_at=None
+    ):
+        """
+        lastExecutedTimeを更新する。since_id（取得済みの最新ツイートID）が
+        指定された場合は同じ書き込みで検索の基準点も更新する。
+        poll_stats・next_due_at（ポーリング間隔の統計と次回の実行予定時刻）も同様
+        """
         update_expr = "SET lastExecutedTime = :lastExecutedTime"
         expr_attr = {":lastExecutedTime": last_executed_time}
+        if since_id is not None:
+            update_expr += ", since_id = :since_id"
+            expr_attr[":since_id"] = str(since_id)
+        if poll_stats is not None:
+            update_expr += ", poll_stats = :poll_stats"
+            expr_attr[":poll_stats"] = poll_stats
+        if next_due_at is not None:
+            update_expr += ", next_due_at = :next_due_at"
+            expr_attr[":next_due_at"] = next_due_at
+        # 実行時の状態はスナップショットに含めず毎回読み込むため、バージョンは上げない
         return self.table.update_item(
             Key={"id": id},
             UpdateExpression=update_expr,
@@ -0,0 +1,100 @@
+import os
+import threading
+import time
+from observability.logger import get_logger
+
+logger = get_logger("SettingsSnapshot")
+
+# バージョンが変わっていなくても全件を読み直すまでの最大秒数
+# （GSIの結果整合性により、バージョン更新直後の読み込みで変更を取りこぼした場合の保険）
+DEFAULT_SNAPSHOT_MAX_AGE = 3600
+
+
+def _env_seconds(name, default):
+    value = os.environ.get(name)
+    if not value:
+        return default
+    try:
+        return max(0, int(value))
+    except ValueError:
+        logger.warning("%sが不正です: %s", name, value)
+        return default
+
+
+class SettingsSnapshot:
+    """
+    アクティブな設定のメモリ上のスナップショット（バッチが処理する設定の読み込み専用）。
+    リポジトリと一緒にウォームスタート間で使い回し、キーワード・閾値などの設定の内容だけを保持する。
+    lastExecutedTime・since_id・ポーリング統計のような実行時の状態は別の実行環境のシャードも書き込むため
+    スナップショットには含めず、読み出しのたびに設定ごとの状態とバージョン項目を1回のBatchGetItemで読む。
+    バージョンが変わっていた（設定の書き込みがあった）場合のみ全件を読み直す。
+    上限件数の判定やコマンドへの応答には使わない。
+    """
+
+    def __init__(self, repo, max_age=None):
+        self.repo = repo
+        self.max_age = (
+            max_age
+            if max_age is not None
+            else _env_seconds("SETTINGS_SNAPSHOT_MAX_AGE", DEFAULT_SNAPSHOT_MAX_AGE)
+        )
+        self._lock = threading.RLock()
+        self._settings = None
+        self._version = None
+        self._loaded_at = 0.0
+        self.loads = 0
+
+    def _load(self, version):
+        # バージョンは読み込みの前に読んだものを使い、読み込み中の書き込みは次回の確認で検知する
+        runtime_attributes = set(self.repo.RUNTIME_ATTRIBUTES)
+        self._settings = {
+            item["id"]: {
+                key: value
+                for key, value in item.items()
+                if key not in runtime_attributes
+            }
+            for item in self.repo.iter_valid_settings()
+        }
+        self._version = version
+        self._loaded_at = time.monotonic()
+        self.loads += 1
+        logger.info(
+            "アクティブな設定を読み込みました: %s件",
+            len(self._settings),
+            version=version,
+        )
+
+    def active_settings(self, projection=None):
+        """
+        アクティブな設定に最新の実行時の状態を合わせたコピーの一覧を返す。
+        projectionを指定するとその属性だけを含める
+        """
+        with self._lock:
+            if (
+                self._settings is None
+                or time.monotonic() - self._loaded_at >= self.max_age
+            ):
+                self._load(self.repo.get_settings_version())
+            version, states = self.repo.get_runtime_states(list(self._settings))
+            if version != self._version:
+                self._load(version)
+                missing = [id for id in self._settings if id not in states]
+                if missing:
+                    states.update(self.repo.get_runtime_states(missing)[1])
+            # 読み込んだ後に削除された設定（状態が読めなかった設定）は除く
+            settings = [
+                {**setting, **states[id]}
+                for id, setting in self._settings.items()
+                if id in states
+            ]
+        if projection:
+            return [
+                {key: setting[key] for key in projection if key in setting}
+                for setting in settings
+            ]
+        return settings
+
+    def invalidate(self):
+        with self._lock:
+            self._settings = None
+            self._version = None
@@ -0,0 +1,95 @@
+import os
+import time
+from itertools import islice
+from boto3.dynamodb.conditions import Attr
+from repositories.pagination import paginate
+from repositories.resource_registry import get_dynamodb_resource
+
+
+class WatchlistRepository:
+    """
+    閾値に届かなかった新しいツイートを後から再確認するための候補リスト。
+    (tweet_uid, setting_id)と有効期限(expires_at, TTL属性)だけを持ち、
+    期限切れの行はDynamoDBのTTLで削除される（削除までの間は読み込み時に除外する）。
+    再確認はスキャンの続きから行うため、前回どこまで読んだか（カーソル）も同じテーブルに保存する
+    """
+
+    # 前回の再確認で最後に読んだ候補のキーを持つ項目のキー（expires_atを持たないため候補には現れない）
+    CURSOR_KEY = {"tweet_uid": "__cursor__", "setting_id": "__cursor__"}
+
+    def __init__(self, table_name=None, dynamodb=None):
+        self.dynamodb = dynamodb or get_dynamodb_resource()
+        self.table_name = table_name or os.environ.get(
+            "WATCHLIST_TABLE", "TweetWacherWatchlistTable"
+        )
+        self.table = self.dynamodb.Table(self.table_name)
+
+    def put_many(self, candidates):
+        """
+        (tweet_uid, setting_id, expires_at)の一覧をBatchWriteItemでまとめて登録する。
+        同じキーが既にあれば上書きする
+        """
+        with self.table.batch_writer(
+            overwrite_by_pkeys=["tweet_uid", "setting_id"]
+        ) as batch:
+            for tweet_uid, setting_id, expires_at in candidates:
+                batch.put_item(
+                    Item={
+                        "tweet_uid": tweet_uid,
+                        "setting_id": setting_id,
+                        "expires_at": int(expires_at),
+                    }
+                )
+
+    def iter_active(self, now=None, start_key=None):
+        """
+        有効期限内の候補を1件ずつ返すジェネレータ。start_keyを渡すとそのキーの次から読む
+        """
+        now = int(now if now is not None else time.time())
+        kwargs = {"ExclusiveStartKey": start_key} if start_key else {}
+        return paginate(
+            self.table.scan, FilterExpression=Attr("expires_at").gt(now), **kwargs
+        )
+
+    def get_cursor(self):
+        """
+        前回の再確認で最後に読んだ候補のキーを返す（未保存の場合はNone）
+        """
+        resp = self.table.get_item(Key=self.CURSOR_KEY, ConsistentRead=True)
+        return resp.get("Item", {}).get("last_key")
+
+    def save_cursor(self, last_key):
+        """
+        最後に読んだ候補のキー(tweet_uid, setting_id)を保存し、次回の再確認をその次から始めさせる
+        """
+        self.table.put_item(Item={**self.CURSOR_KEY, "last_key": last_key})
+
+    def next_batch(self, limit, now=None):
+        """
+        前回の続きから有効期限内の候補を最大limit件返す。
+        テーブルの末尾まで読んだら先頭に戻り、今回既に返した候補に戻ってきたところで止める
+        （毎回同じ先頭の候補だけを読み続けないよう、実行ごとに読む範囲をずらす）
+        """
+        start_key = self.get_cursor()
+        candidates = list(islice(self.iter_active(now, start_key), limit))
+        if start_key and len(candidates) < limit:
+            seen = {(item["tweet_uid"], item["setting_id"]) for item in candidates}
+            for item in self.iter_active(now):
+                if len(candidates) >= limit:
+                    break
+                if (item["tweet_uid"], item["setting_id"]) in seen:
+                    break
+                candidates.append(item)
+        return candidates
+
+    def delete_many(self, keys):
+        """
+        (tweet_uid, setting_id)の一覧をBatchWriteItemでまとめて削除する
+        """
+        with self.table.batch_writer(
+            overwrite_by_pkeys=["tweet_uid", "setting_id"]
+        ) as batch:
+            for tweet_uid, setting_id in keys:
+                batch.delete_item(
+                    Key={"tweet_uid": tweet_uid, "setting_id": setting_id}
+                )
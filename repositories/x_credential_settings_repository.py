@@ -1,20 +1,30 @@
 import os
-import boto3
+from repositories.pagination import build_projection, paginate
+from repositories.resource_registry import get_dynamodb_resource
 from datetime import datetime, timezone
 
 
 class XCredentialSettingsRepository:
-    def __init__(self, table_name=None):
-        self.dynamodb = boto3.resource("dynamodb")
+    def __init__(self, table_name=None, dynamodb=None):
+        self.dynamodb = dynamodb or get_dynamodb_resource()
         self.table_name = table_name or os.environ.get(
             "X_CREDENTIAL_SETTINGS_TABLE", "TweetWacherXCredentialSettingsTable"
         )
         self.table = self.dynamodb.Table(self.table_name)
 
+    def iter_all(self, projection=None):
+        """
+        全ての認証情報を1件ずつ返すジェネレータ（LastEvaluatedKeyを辿って全ページ分scan）
+        """
+        return paginate(self.table.scan, **build_projection(projection))
+
     def list_all(self):
-        return self.table.scan()
+        return {"Items": list(self.iter_all())}
 
-    def update_latelimit_reset_time(self, bearer_token, latelimit_reset_time):
+    def update_latelimit_reset_time(
+        self, bearer_token, latelimit_reset_time, attribute="latelimit_reset_time"
+    ):
+        # レート制限はエンドポイントごとのため、attributeでエンドポイントごとの属性に保存する
         # UTCのエポック秒をISO8601形式に変換
         iso8601_time = (
             datetime.fromtimestamp(latelimit_reset_time, tz=timezone.utc)
@@ -24,7 +34,8 @@ class XCredentialSettingsRepository:
 
         return self.table.update_item(
             Key={"bearer_token": bearer_token},
-            UpdateExpression="SET latelimit_reset_time = :latelimit_reset_time",
+            UpdateExpression="SET #attribute = :latelimit_reset_time",
+            ExpressionAttributeNames={"#attribute": attribute},
             ExpressionAttributeValues={":latelimit_reset_time": iso8601_time},
         )
 
@@ -32,12 +43,9 @@ class XCredentialSettingsRepository:
         """
         list_allを取得してlatelimit_reset_timeがnullか現在時刻より前のものを一つ取得
         """
-        response = self.list_all()
-        items = response.get("Items", [])
-
         current_time = datetime.now(timezone.utc)
 
-        for item in items:
+        for item in self.iter_all():
             latelimit_reset_time = item.get("latelimit_reset_time")
 
             # latelimit_reset_timeがnullの場合
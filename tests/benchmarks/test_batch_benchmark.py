@@ -0,0 +1,68 @@
+import os
+from benchmarks import report
+from benchmarks.batch_benchmark import main, run_benchmark
+
+
+def test_run_benchmark_measures_real_handler_against_fakes():
+    results = run_benchmark([3], [4], x_latency=0, slack_latency=0)
+    (run,) = results["runs"]
+    assert run["status_code"] == 200
+    assert run["scenario"] == {"settings": 3, "tweets_per_keyword": 4}
+    # 3設定のキーワードは1つの検索にまとめられ、半分のツイートが閾値を通過してSlackへ送られる
+    assert run["counts"]["tweets_fetched"] == 12
+    assert run["counts"]["tweets_delivered"] == 6
+    assert run["calls"]["x"]["search"] == 1
+    assert run["calls"]["slack"]["chat.postMessage"] == 6
+    assert run["calls"]["dynamodb"]["PutItem"] == 6
+    assert run["latency"]["setting"]["count"] == 3
+    assert run["throughput"]["tweets_per_second"] > 0
+    # 実行後は環境変数が元に戻る
+    assert "X_API_BASE_URL" not in os.environ
+
+
+def test_rate_limited_slack_requests_are_retried():
+    results = run_benchmark(
+        [2], [10], x_latency=0, slack_latency=0, slack_rate_limit_ratio=0.3
+    )
+    (run,) = results["runs"]
+    assert run["counts"]["tweets_delivered"] == 10
+    assert run["calls"]["slack"]["rate_limited"] > 0
+    assert run["calls"]["slack"]["chat.postMessage"] == 10
+
+
+def test_compare_reports_regressions_beyond_tolerance():
+    def result(settings_per_second, p95):
+        return {
+            "runs": [
+                {
+                    "scenario": {"settings": 10, "tweets_per_keyword": 10},
+                    "throughput": {
+                        "settings_per_second": settings_per_second,
+                        "tweets_per_second": 100,
+                    },
+                    "latency": {"setting": {"p95": p95}},
+                }
+            ]
+        }
+
+    baseline = result(100, 50)
+    assert report.compare(result(90, 55), baseline, tolerance=0.25) == []
+    regressions = report.compare(result(50, 100), baseline, tolerance=0.25)
+    assert [r["metric"] for r in regressions] == [
+        "settings_per_second",
+        "setting_p95_ms",
+    ]
+
+
+def test_main_saves_results_and_fails_on_regression(tmp_path):
+    output = tmp_path / "result.json"
+    baseline = tmp_path / "baseline.json"
+    args = ["--settings", "2", "--tweets", "2", "--x-latency-ms", "0"]
+    args += ["--slack-latency-ms", "0", "--baseline", str(baseline)]
+    assert main(args + ["--output", str(output), "--save-baseline"]) == 0
+    assert report.load(baseline)["runs"][0]["scenario"]["settings"] == 2
+
+    saved = report.load(baseline)
+    saved["runs"][0]["throughput"]["settings_per_second"] *= 1000
+    report.save(baseline, saved)
+    assert main(args + ["--output", str(output)]) == 1
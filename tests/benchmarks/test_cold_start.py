@@ -0,0 +1,37 @@
+from benchmarks.cold_start import parse_importtime, run_cold
+
+
+def test_help_and_bad_signature_do_not_load_boto3():
+    result, _ = run_cold("setting help", True)
+    assert result["status"] == 200
+    assert result["boto3_loaded"] is False
+    assert "lambda_functions.api_gateway.setting_api" in result["app_modules"]
+    # helpでは設定の各アクションのモジュールを読み込まない
+    assert "lambda_functions.api_gateway.setting.create" not in result["app_modules"]
+
+    result, _ = run_cold("setting help", False)
+    assert result["status"] == 401
+    assert result["boto3_loaded"] is False
+    assert "lambda_functions.api_gateway.setting_api" not in result["app_modules"]
+
+
+def test_action_loads_only_its_own_module():
+    result, _ = run_cold("setting unknown", True)
+    assert result["status"] == 200
+    assert result["boto3_loaded"] is False
+
+    result, _ = run_cold("setting list", True)
+    assert result["boto3_loaded"] is True
+    assert "lambda_functions.api_gateway.setting.list" in result["app_modules"]
+    assert "lambda_functions.api_gateway.setting.create" not in result["app_modules"]
+
+
+def test_parse_importtime_reads_cumulative_microseconds():
+    stderr = "\n".join(
+        [
+            "import time: self [us] | cumulative | imported package",
+            "import time:       120 |        120 |   json.decoder",
+            "import time:        80 |        200 | json",
+        ]
+    )
+    assert parse_importtime(stderr) == {"json.decoder": 120, "json": 200}
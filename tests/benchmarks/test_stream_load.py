@@ -0,0 +1,65 @@
+from collections import Counter
+from benchmarks.stream_events import (
+    delivered_tweet_uids,
+    generate_notifications,
+    generate_stream_batches,
+)
+from benchmarks.stream_load import run_load
+
+
+def test_generate_stream_batches_mixes_events_duplicates_and_replays():
+    rows = generate_notifications(100, channels=5, distribution="zipf", seed=1)
+    # zipfでは先頭のチャンネルに偏る
+    by_channel = Counter(row["slack_ch"] for row in rows)
+    assert by_channel.most_common(1)[0][0] == "C00000"
+
+    batches = generate_stream_batches(
+        rows, 10, insert_ratio=0.5, duplicate_ratio=0.2, replay_ratio=0.3, seed=1
+    )
+    records = [record for batch in batches for record in batch]
+    events = Counter(record["eventName"] for record in records)
+    assert events["MODIFY"] >= 100
+    sequence_numbers = Counter(
+        record["dynamodb"]["SequenceNumber"] for record in records
+    )
+    # 重複・再送されたレコードは同じシーケンス番号で現れる
+    assert max(sequence_numbers.values()) > 1
+    assert all(len(batch) <= 10 for batch in batches)
+    # MODIFYは通知済みの行のイメージを持つ
+    modify = next(record for record in records if record["eventName"] == "MODIFY")
+    assert "notified_at" in modify["dynamodb"]["NewImage"]
+
+
+def test_delivered_tweet_uids_reads_urls_from_blocks():
+    rows = generate_notifications(2, channels=1)
+    payload = {
+        "blocks": [{"text": rows[0]["tweet_url"]}, {"text": rows[1]["tweet_url"]}]
+    }
+    assert delivered_tweet_uids(payload) == [row["tweet_uid"] for row in rows]
+
+
+def test_run_load_retries_failures_without_duplicate_deliveries():
+    results = run_load(
+        records=60,
+        batch_sizes=[20],
+        concurrency_list=[2],
+        channels=4,
+        duplicate_ratio=0.2,
+        replay_ratio=0.5,
+        slack_latency=0,
+        slack_error_ratio=0.1,
+        max_retry_attempts=10,
+    )
+    (run,) = results["runs"]
+    assert run["scenario"] == {"batch_size": 20, "concurrency": 2}
+    assert run["records"]["notifications"] == 42
+    # 失敗したレコード以降の再送で、ハンドラに渡るレコード数は生成した数より増える
+    assert run["retry_amplification"] > 1
+    assert run["slack"]["calls"]["server_error"] > 0
+    # 重複・再送・再試行があっても、全ての通知がちょうど1回ずつ送られる
+    assert run["deliveries"] == {
+        "delivered": 42,
+        "duplicates": 0,
+        "undelivered": 0,
+        "unmarked": 0,
+    }
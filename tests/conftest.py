@@ -0,0 +1,10 @@
+import pytest
+from repositories.resource_registry import reset_registry
+
+
+@pytest.fixture(autouse=True)
+def reset_resource_registry():
+    # テストごとにboto3のモック（patch・moto）が効くよう、共有リソースを破棄する
+    reset_registry()
+    yield
+    reset_registry()
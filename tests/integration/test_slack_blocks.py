@@ -0,0 +1,45 @@
+from integration.slack_blocks import (
+    DIGEST_MAX_LIMIT,
+    build_digest_blocks,
+    build_tweet_blocks,
+)
+
+
+def make_item(uid, like, rt):
+    return {
+        "tweet_uid": uid,
+        "tweet_url": f"https://twitter.com/i/web/status/{uid}",
+        "like_count": like,
+        "retweet_count": rt,
+    }
+
+
+def test_build_tweet_blocks_shows_missing_counts_as_dash():
+    blocks = build_tweet_blocks("https://x.com/1", None, 3)
+    fields = [f["text"] for f in blocks[1]["fields"]]
+    assert fields == ["*👍 いいね:* -", "*🔁 リツイート:* 3"]
+    assert blocks[2]["elements"][0]["url"] == "https://x.com/1"
+
+
+def test_build_digest_blocks_sorts_by_engagement_and_caps():
+    items = [make_item("1", 1, 0), make_item("2", 50, 5), make_item("3", 10, 10)]
+    blocks = build_digest_blocks(items, digest_max=2)
+
+    assert blocks[0]["text"]["text"] == "*新しいツイート通知 (3件)*"
+    shown = [block["text"]["text"] for block in blocks[1:3]]
+    assert "status/2|" in shown[0]
+    assert "status/3|" in shown[1]
+    assert blocks[3] == {
+        "type": "context",
+        "elements": [{"type": "mrkdwn", "text": "+1 more"}],
+    }
+
+
+def test_build_digest_blocks_without_overflow_and_limit():
+    items = [make_item(str(i), i, 0) for i in range(60)]
+    blocks = build_digest_blocks(items[:2])
+    assert len(blocks) == 3
+    # Slackのblocks数の上限を超えないよう件数を丸める
+    blocks = build_digest_blocks(items, digest_max=100)
+    assert len(blocks) == DIGEST_MAX_LIMIT + 2
+    assert blocks[-1]["elements"][0]["text"] == f"+{60 - DIGEST_MAX_LIMIT} more"
@@ -0,0 +1,137 @@
+import threading
+import pytest
+from unittest.mock import MagicMock, patch
+from integration.slack_dispatcher import (
+    SlackDeadlineExceededError,
+    SlackDispatcher,
+    TokenBucket,
+    deadline_from_context,
+)
+from integration.slack_integration import SlackRateLimitedError
+
+
+def test_token_bucket_allows_burst_then_paces():
+    with patch("integration.slack_dispatcher.time.monotonic", return_value=100.0):
+        bucket = TokenBucket(rate=2.0, capacity=2)
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == 0
+        # バーストを使い切ると1/rate秒ずつ待つ
+        assert bucket.reserve() == pytest.approx(0.5)
+        assert bucket.reserve() == pytest.approx(1.0)
+
+
+def test_token_bucket_block_honors_retry_after():
+    with patch("integration.slack_dispatcher.time.monotonic", return_value=100.0):
+        bucket = TokenBucket(rate=10.0, capacity=5)
+        bucket.block(3)
+        assert bucket.reserve() == pytest.approx(3.0)
+
+
+@patch("integration.slack_dispatcher.time.sleep")
+def test_send_message_retries_after_rate_limit(mock_sleep):
+    slack = MagicMock()
+    slack.send_message.side_effect = [SlackRateLimitedError(2), "1.0"]
+    dispatcher = SlackDispatcher(slack, rate=100, burst=10)
+
+    assert dispatcher.send_message("C1", "msg", blocks=[]) == "1.0"
+    assert slack.send_message.call_count == 2
+    slack.send_message.assert_called_with("C1", "msg", blocks=[])
+    # Retry-Afterの秒数だけ待ってから再送する
+    assert mock_sleep.call_args[0][0] == pytest.approx(2, abs=0.1)
+    stats = dispatcher.stats()
+    assert stats["sent"] == 1
+    assert stats["rate_limited"] == 1
+    assert stats["queue_depth"] == 0
+
+
+@patch("integration.slack_dispatcher.time.sleep")
+def test_send_message_raises_when_retry_after_too_long(mock_sleep):
+    slack = MagicMock()
+    slack.send_message.side_effect = SlackRateLimitedError(60)
+    dispatcher = SlackDispatcher(slack, rate=100, burst=10, max_retry_wait=10)
+
+    with pytest.raises(SlackRateLimitedError):
+        dispatcher.send_message("C1", "msg")
+    assert slack.send_message.call_count == 1
+    mock_sleep.assert_not_called()
+
+
+def test_channels_are_sent_in_parallel_and_serialized_per_channel():
+    active = {}
+    max_active = {}
+    lock = threading.Lock()
+    barrier = threading.Barrier(2, timeout=5)
+
+    def send_message(channel, message, **kwargs):
+        with lock:
+            active[channel] = active.get(channel, 0) + 1
+            max_active[channel] = max(max_active.get(channel, 0), active[channel])
+        if message == "first":
+            # 異なるチャンネルの送信が同時に行われないとBarrierを通過できない
+            barrier.wait()
+        with lock:
+            active[channel] -= 1
+        return f"{channel}-{message}"
+
+    slack = MagicMock()
+    slack.send_message.side_effect = send_message
+    dispatcher = SlackDispatcher(slack, rate=1000, burst=10, max_workers=4)
+    futures = [
+        dispatcher.submit("C1", "first"),
+        dispatcher.submit("C2", "first"),
+        dispatcher.submit("C1", "second"),
+        dispatcher.submit("C1", "third"),
+    ]
+    results = [future.result(timeout=5) for future in futures]
+    dispatcher.shutdown()
+
+    assert results == ["C1-first", "C2-first", "C1-second", "C1-third"]
+    assert max_active == {"C1": 1, "C2": 1}
+    assert dispatcher.stats()["sent"] == 4
+
+
+@patch("integration.slack_dispatcher.time.sleep")
+def test_update_message_retries_after_rate_limit(mock_sleep):
+    slack = MagicMock()
+    slack.update_message.side_effect = [SlackRateLimitedError(1), "5.0"]
+    dispatcher = SlackDispatcher(slack, rate=100, burst=10)
+    assert dispatcher.update_message("C1", "5.0", "text", blocks=[]) == "5.0"
+    slack.update_message.assert_called_with("C1", "5.0", "text", blocks=[])
+    assert dispatcher.stats()["rate_limited"] == 1
+
+
+@patch("integration.slack_dispatcher.time.sleep")
+def test_retry_after_past_deadline_is_not_waited(mock_sleep):
+    slack = MagicMock()
+    slack.send_message.side_effect = [SlackRateLimitedError(5), "1.0"]
+    with patch("integration.slack_dispatcher.time.time", return_value=1000.0):
+        dispatcher = SlackDispatcher(slack, rate=100, burst=10, deadline=1003.0)
+        # Retry-Afterを待つと期限を過ぎるため、待たずに失敗させる
+        with pytest.raises(SlackDeadlineExceededError):
+            dispatcher.send_message("C1", "msg")
+    assert slack.send_message.call_count == 1
+    mock_sleep.assert_not_called()
+    assert dispatcher.stats()["deadline_exceeded"] == 1
+    assert dispatcher.stats()["queue_depth"] == 0
+
+
+@patch("integration.slack_dispatcher.time.sleep")
+def test_channel_rate_wait_past_deadline_is_not_waited(mock_sleep):
+    slack = MagicMock()
+    slack.send_message.return_value = "1.0"
+    with patch("integration.slack_dispatcher.time.time", return_value=1000.0):
+        dispatcher = SlackDispatcher(slack, rate=1, burst=1, deadline=1000.5)
+        assert dispatcher.send_message("C1", "first") == "1.0"
+        # 2件目はレート制限で約1秒待つ必要があり、期限を過ぎる
+        with pytest.raises(SlackDeadlineExceededError):
+            dispatcher.send_message("C1", "second")
+    assert slack.send_message.call_count == 1
+    mock_sleep.assert_not_called()
+
+
+def test_deadline_from_context():
+    context = MagicMock()
+    context.get_remaining_time_in_millis.return_value = 30000
+    with patch("integration.slack_dispatcher.time.time", return_value=1000.0):
+        assert deadline_from_context(context, margin=5) == pytest.approx(1025.0)
+    assert deadline_from_context(None) is None
@@ -0,0 +1,183 @@
+import http.client
+import json
+import pytest
+from unittest.mock import patch
+from integration.slack_integration import (
+    SlackApiError,
+    SlackConnectionPool,
+    SlackIntegration,
+    SlackRateLimitedError,
+)
+
+
+class FakeResponse:
+    def __init__(self, status=200, body=None, will_close=False, headers=None):
+        self.status = status
+        self.will_close = will_close
+        self.headers = headers or {}
+        self._body = json.dumps(body or {"ok": True, "ts": "1.0"}).encode()
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name, default)
+
+    def read(self):
+        return self._body
+
+
+class FakeConnection:
+    instances = []
+
+    def __init__(self, host, timeout=None):
+        self.host = host
+        self.timeout = timeout
+        self.closed = False
+        self.requests = []
+        self.fail_next = None
+        FakeConnection.instances.append(self)
+
+    def request(self, method, path, body, headers):
+        if self.fail_next:
+            error, self.fail_next = self.fail_next, None
+            raise error
+        self.requests.append((method, path, body))
+
+    def getresponse(self):
+        return FakeResponse()
+
+    def close(self):
+        self.closed = True
+
+
+@patch("http.client.HTTPSConnection", FakeConnection)
+def test_connection_is_reused_across_messages():
+    FakeConnection.instances = []
+    pool = SlackConnectionPool(timeout=3)
+    slack = SlackIntegration(bot_token="xoxb", connection_pool=pool)
+
+    assert slack.send_message("C1", "a") == "1.0"
+    assert slack.send_message("C1", "b") == "1.0"
+
+    assert len(FakeConnection.instances) == 1
+    conn = FakeConnection.instances[0]
+    assert conn.host == "slack.com"
+    assert conn.timeout == 3
+    assert [r[1] for r in conn.requests] == [
+        "/api/chat.postMessage",
+        "/api/chat.postMessage",
+    ]
+    assert not conn.closed
+
+
+@patch("http.client.HTTPSConnection", FakeConnection)
+def test_stale_connection_is_replaced_once():
+    FakeConnection.instances = []
+    pool = SlackConnectionPool()
+    pool.request("POST", "/api/chat.postMessage", "{}")
+    stale = FakeConnection.instances[0]
+    stale.fail_next = http.client.RemoteDisconnected("closed")
+
+    res, _ = pool.request("POST", "/api/chat.postMessage", "{}")
+    assert res.status == 200
+    assert stale.closed
+    assert len(FakeConnection.instances) == 2
+
+
+@patch("http.client.HTTPSConnection", FakeConnection)
+def test_fresh_connection_error_is_not_retried():
+    FakeConnection.instances = []
+    pool = SlackConnectionPool()
+    original_new = pool._new_connection
+
+    def failing_connection():
+        conn = original_new()
+        conn.fail_next = ConnectionResetError("reset")
+        return conn
+
+    pool._new_connection = failing_connection
+    with pytest.raises(ConnectionResetError):
+        pool.request("POST", "/api/chat.postMessage", "{}")
+    assert len(FakeConnection.instances) == 1
+    assert FakeConnection.instances[0].closed
+
+
+def test_rate_limited_response_raises_with_retry_after():
+    class RateLimitedPool:
+        def request(self, method, path, body, headers=None):
+            res = FakeResponse(
+                status=429, body={"ok": False}, headers={"Retry-After": "7"}
+            )
+            return res, json.loads(res.read())
+
+    slack = SlackIntegration(bot_token="xoxb", connection_pool=RateLimitedPool())
+    with pytest.raises(SlackRateLimitedError) as excinfo:
+        slack.send_message("C1", "a")
+    assert excinfo.value.retry_after == 7.0
+
+
+def test_ok_false_raises_slack_api_error_with_code():
+    class ErrorPool:
+        def __init__(self, error):
+            self.error = error
+
+        def request(self, method, path, body, headers=None):
+            body = {"ok": False, "error": self.error}
+            return FakeResponse(body=body), json.dumps(body).encode()
+
+    slack = SlackIntegration(bot_token="xoxb", connection_pool=ErrorPool("is_archived"))
+    with pytest.raises(SlackApiError) as excinfo:
+        slack.send_message("C1", "a")
+    assert excinfo.value.error == "is_archived"
+    assert excinfo.value.permanent is True
+
+    slack = SlackIntegration(
+        bot_token="xoxb", connection_pool=ErrorPool("internal_error")
+    )
+    with pytest.raises(SlackApiError) as excinfo:
+        slack.update_message("C1", "1.0", "a")
+    assert excinfo.value.permanent is False
+
+
+def test_update_message_posts_chat_update():
+    class RecordingPool:
+        def __init__(self):
+            self.requests = []
+
+        def request(self, method, path, body, headers=None):
+            self.requests.append((path, json.loads(body)))
+            return (
+                FakeResponse(body={"ok": True, "ts": "5.0"}),
+                json.dumps({"ok": True, "ts": "5.0"}).encode(),
+            )
+
+    pool = RecordingPool()
+    slack = SlackIntegration(bot_token="xoxb", connection_pool=pool)
+    assert slack.update_message("C1", "5.0", "text", blocks=[{"type": "x"}]) == "5.0"
+    assert pool.requests == [
+        (
+            "/api/chat.update",
+            {"channel": "C1", "ts": "5.0", "text": "text", "blocks": [{"type": "x"}]},
+        )
+    ]
+
+
+@patch("http.client.HTTPConnection", FakeConnection)
+def test_base_url_can_be_overridden_by_env(monkeypatch):
+    monkeypatch.setenv("SLACK_API_BASE_URL", "http://127.0.0.1:8080")
+    FakeConnection.instances = []
+    pool = SlackConnectionPool()
+    pool.request("POST", "/api/chat.postMessage", "{}")
+    assert FakeConnection.instances[0].host == "127.0.0.1:8080"
+
+
+@patch("http.client.HTTPSConnection", FakeConnection)
+def test_respond_posts_to_response_url():
+    FakeConnection.instances = []
+    SlackIntegration(bot_token="xoxb").respond(
+        "https://hooks.slack.com/commands/T000/1/abc?x=1", "done"
+    )
+    (conn,) = FakeConnection.instances
+    assert conn.host == "hooks.slack.com"
+    assert conn.closed
+    method, path, body = conn.requests[0]
+    assert (method, path) == ("POST", "/commands/T000/1/abc?x=1")
+    assert json.loads(body) == {"response_type": "ephemeral", "text": "done"}
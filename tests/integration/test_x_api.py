@@ -0,0 +1,90 @@
+import io
+import json
+import urllib.error
+from unittest.mock import MagicMock, patch
+from integration import x_api
+from integration.x_credential_pool import NoAvailableCredentialError
+
+
+class FakeResponse(io.BytesIO):
+    def __init__(self, body, status=200):
+        super().__init__(json.dumps(body).encode())
+        self.status = status
+        self.headers = {}
+
+
+def test_lookup_public_metrics_requests_100_ids_at_a_time():
+    pool = MagicMock()
+    pool.acquire.return_value = "token"
+    requested = []
+
+    def urlopen(req):
+        ids = req.full_url.split("ids=")[1].split("&")[0].split("%2C")
+        requested.append(ids)
+        return FakeResponse(
+            {"data": [{"id": i, "public_metrics": {"like_count": 1}} for i in ids[1:]]}
+        )
+
+    ids = [str(i) for i in range(250)]
+    with patch("urllib.request.urlopen", side_effect=urlopen):
+        metrics = x_api.lookup_public_metrics(pool, ids + ids[:3])
+    assert [len(chunk) for chunk in requested] == [100, 100, 50]
+    # 先頭のIDは削除済み扱い（dataに含まれない）
+    assert len(metrics) == 247
+    assert "0" not in metrics and metrics["1"] == {"like_count": 1}
+    assert pool.record_response.call_count == 3
+
+
+def test_lookup_public_metrics_retries_with_another_credential():
+    pool = MagicMock()
+    pool.acquire.side_effect = ["a", "b", NoAvailableCredentialError("none")]
+    error = urllib.error.HTTPError("url", 429, "Too Many Requests", {}, None)
+    responses = [error, FakeResponse({"data": [{"id": "1", "public_metrics": {}}]})]
+
+    def urlopen(req):
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    progress = {}
+    with patch("urllib.request.urlopen", side_effect=urlopen):
+        metrics = x_api.lookup_public_metrics(
+            pool, ["1"] + [str(i) for i in range(2, 102)], progress=progress
+        )
+    # 1チャンク目は2回目で成功し、2チャンク目は認証情報が尽きて打ち切る
+    assert metrics == {"1": {}}
+    assert progress["processed_ids"] == [str(i) for i in range(1, 101)]
+    pool.record_response.assert_any_call("a", 429, {}, "lookup")
+    # ID指定取得は検索とは別のエンドポイントの予算を使う
+    pool.acquire.assert_called_with("lookup")
+
+
+def test_lookup_public_metrics_stops_at_deadline(monkeypatch):
+    pool = MagicMock()
+    pool.acquire.return_value = "token"
+    progress = {}
+    with patch(
+        "urllib.request.urlopen", return_value=FakeResponse({"data": []})
+    ) as urlopen:
+        # 1チャンク目を問い合わせた後に期限を過ぎる
+        monkeypatch.setattr(
+            x_api.time, "time", lambda: 200.0 if urlopen.called else 100.0
+        )
+        x_api.lookup_public_metrics(
+            pool, [str(i) for i in range(150)], deadline=150.0, progress=progress
+        )
+    # 2チャンク目は期限を過ぎたため問い合わせない
+    assert urlopen.call_count == 1
+    assert progress["processed_ids"] == [str(i) for i in range(100)]
+
+
+def test_fetch_tweets_by_ids_uses_base_url_from_env(monkeypatch):
+    monkeypatch.setenv("X_API_BASE_URL", "http://127.0.0.1:8080/")
+    pool = MagicMock()
+    pool.acquire.return_value = "token"
+    with patch("urllib.request.urlopen", return_value=FakeResponse({})) as urlopen:
+        x_api.fetch_tweets_by_ids(pool, ["1"])
+    assert urlopen.call_args[0][0].full_url.startswith(
+        "http://127.0.0.1:8080/2/tweets?ids=1"
+    )
@@ -0,0 +1,106 @@
+import time
+import pytest
+from datetime import datetime, timezone, timedelta
+from unittest.mock import MagicMock
+from integration.x_credential_pool import (
+    ENDPOINT_LOOKUP,
+    ENDPOINT_SEARCH,
+    NoAvailableCredentialError,
+    XCredentialPool,
+)
+
+
+def make_pool(*credentials):
+    repo = MagicMock()
+    return XCredentialPool(repo, credentials=list(credentials)), repo
+
+
+def test_acquire_prefers_token_with_most_remaining_budget():
+    pool, _ = make_pool({"bearer_token": "a"}, {"bearer_token": "b"})
+    reset = int(time.time()) + 600
+    pool.record_response(
+        "a", 200, {"x-rate-limit-remaining": "40", "x-rate-limit-reset": str(reset)}
+    )
+    pool.record_response(
+        "b", 200, {"x-rate-limit-remaining": "100", "x-rate-limit-reset": str(reset)}
+    )
+    assert pool.acquire() == "b"
+    pool.record_response(
+        "b", 200, {"x-rate-limit-remaining": "10", "x-rate-limit-reset": str(reset)}
+    )
+    assert pool.acquire() == "a"
+
+
+def test_rotates_before_429_and_persists_reset_time():
+    pool, repo = make_pool({"bearer_token": "a"}, {"bearer_token": "b"})
+    reset = int(time.time()) + 600
+    pool.record_response(
+        "a", 200, {"x-rate-limit-remaining": "1", "x-rate-limit-reset": str(reset)}
+    )
+    repo.update_latelimit_reset_time.assert_called_once_with(
+        "a", reset, attribute="latelimit_reset_time"
+    )
+    assert pool.acquire() == "b"
+    # 同じリセット時刻は再保存しない
+    pool.record_response(
+        "a", 200, {"x-rate-limit-remaining": "0", "x-rate-limit-reset": str(reset)}
+    )
+    assert repo.update_latelimit_reset_time.call_count == 1
+
+    pool.record_response("b", 429, {"x-rate-limit-reset": str(reset)})
+    repo.update_latelimit_reset_time.assert_called_with(
+        "b", reset, attribute="latelimit_reset_time"
+    )
+    with pytest.raises(NoAvailableCredentialError):
+        pool.acquire()
+
+
+def test_quarantines_unauthorized_tokens_and_skips_exhausted_ones():
+    future = (datetime.now(timezone.utc) + timedelta(minutes=5)).isoformat()
+    past = (datetime.now(timezone.utc) - timedelta(minutes=5)).isoformat()
+    pool, _ = make_pool(
+        {"bearer_token": "exhausted", "latelimit_reset_time": future},
+        {"bearer_token": "bad"},
+        {"bearer_token": "recovered", "latelimit_reset_time": past},
+    )
+    assert pool.available_count() == 2
+    pool.record_response("bad", 401, {})
+    assert pool.available_count() == 1
+    assert pool.acquire() == "recovered"
+
+
+def test_window_reset_makes_token_available_again():
+    pool, _ = make_pool({"bearer_token": "a"})
+    pool.record_response("a", 429, {"x-rate-limit-reset": str(int(time.time()) - 1)})
+    assert pool.acquire() == "a"
+
+
+def test_budget_is_tracked_per_endpoint():
+    future = (datetime.now(timezone.utc) + timedelta(minutes=5)).isoformat()
+    pool, repo = make_pool(
+        {"bearer_token": "a", "lookup_latelimit_reset_time": future},
+        {"bearer_token": "b"},
+    )
+    # aはID指定取得の枠だけが枯渇していて、検索には使える
+    assert pool.available_count(ENDPOINT_SEARCH) == 2
+    assert pool.available_count(ENDPOINT_LOOKUP) == 1
+    assert pool.acquire(ENDPOINT_LOOKUP) == "b"
+
+    # 検索の枠が枯渇してもID指定取得の枠には影響しない
+    reset = int(time.time()) + 600
+    pool.record_response("b", 429, {"x-rate-limit-reset": str(reset)})
+    repo.update_latelimit_reset_time.assert_called_with(
+        "b", reset, attribute="latelimit_reset_time"
+    )
+    assert pool.acquire(ENDPOINT_SEARCH) == "a"
+    assert pool.acquire(ENDPOINT_LOOKUP) == "b"
+    pool.record_response("b", 429, {"x-rate-limit-reset": str(reset)}, ENDPOINT_LOOKUP)
+    repo.update_latelimit_reset_time.assert_called_with(
+        "b", reset, attribute="lookup_latelimit_reset_time"
+    )
+    with pytest.raises(NoAvailableCredentialError):
+        pool.acquire(ENDPOINT_LOOKUP)
+
+    # 401/403はトークン自体の問題のため全エンドポイントで隔離する
+    pool.record_response("a", 401, {}, ENDPOINT_LOOKUP)
+    assert pool.available_count(ENDPOINT_SEARCH) == 0
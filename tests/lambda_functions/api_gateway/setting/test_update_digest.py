@@ -0,0 +1,64 @@
+import pytest
+from lambda_functions.api_gateway.setting import update_digest as digest_mod
+
+
+class DummyIntegration:
+    def build_response(self, message):
+        return message
+
+
+@pytest.fixture
+def integration():
+    return DummyIntegration()
+
+
+def test_update_digest_success(monkeypatch, integration):
+    calls = []
+
+    class DummyRepo:
+        def get_by_id(self, id):
+            return {"Item": {}}
+
+        def update_digest_by_id(self, id, digest, digest_max=None):
+            calls.append((id, digest, digest_max))
+
+    monkeypatch.setattr(digest_mod, "SettingsRepository", lambda: DummyRepo())
+    resp = digest_mod.update_digest(["id1", "on", "5"], integration)
+    assert "更新しました" in resp
+    resp = digest_mod.update_digest(["id1", "off"], integration)
+    assert "更新しました" in resp
+    assert calls == [("id1", True, 5), ("id1", False, None)]
+
+
+def test_update_digest_param_error(monkeypatch, integration):
+    class DummyRepo:
+        pass
+
+    monkeypatch.setattr(digest_mod, "SettingsRepository", lambda: DummyRepo())
+    assert "パラメータが正しくありません" in digest_mod.update_digest(
+        ["id1"], integration
+    )
+    assert "パラメータが正しくありません" in digest_mod.update_digest(
+        ["id1", "yes"], integration
+    )
+    assert "最大件数" in digest_mod.update_digest(["id1", "on", "0"], integration)
+
+
+def test_update_digest_not_found(monkeypatch, integration):
+    class DummyRepo:
+        def get_by_id(self, id):
+            return {}
+
+    monkeypatch.setattr(digest_mod, "SettingsRepository", lambda: DummyRepo())
+    resp = digest_mod.update_digest(["id1", "on"], integration)
+    assert "該当設定がありません" in resp
+
+
+def test_update_digest_exception(monkeypatch, integration):
+    class DummyRepo:
+        def get_by_id(self, id):
+            raise Exception("fail")
+
+    monkeypatch.setattr(digest_mod, "SettingsRepository", lambda: DummyRepo())
+    resp = digest_mod.update_digest(["id1", "on"], integration)
+    assert "エラー" in resp
@@ -0,0 +1,125 @@
+import json
+import pytest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from urllib.parse import urlencode
+from lambda_functions.api_gateway import main, setting_api
+from lambda_functions.api_gateway.deferred_command import DEFERRED_EVENT_KEY, defer
+
+FUNCTION_ARN = "arn:aws:lambda:ap-northeast-1:123456789012:function:settings-api"
+RESPONSE_URL = "https://hooks.slack.com/commands/T000/1/abc"
+CONTEXT = SimpleNamespace(invoked_function_arn=FUNCTION_ARN)
+
+
+def slack_event(text, response_url=RESPONSE_URL):
+    return {"body": urlencode({"text": text, "response_url": response_url})}
+
+
+@pytest.fixture
+def list_handler():
+    handler = MagicMock(
+        return_value={"statusCode": 200, "body": "[list] 全設定一覧:\nabc"}
+    )
+    with patch.dict(setting_api._action_handlers, {"list": handler}):
+        yield handler
+
+
+@pytest.fixture
+def lambda_client():
+    client = MagicMock()
+    with patch(
+        "lambda_functions.api_gateway.deferred_command.get_client",
+        return_value=client,
+    ):
+        yield client
+
+
+def test_slow_action_is_acknowledged_and_invoked_asynchronously(
+    monkeypatch, list_handler, lambda_client
+):
+    monkeypatch.setenv("COMMAND_MODE", "async")
+    event = slack_event("setting list -a")
+    resp = setting_api.lambda_handler(event, CONTEXT)
+    assert resp["statusCode"] == 200
+    assert "受け付けました" in resp["body"]
+    list_handler.assert_not_called()
+    kwargs = lambda_client.invoke.call_args.kwargs
+    assert kwargs["FunctionName"] == FUNCTION_ARN
+    assert kwargs["InvocationType"] == "Event"
+    assert json.loads(kwargs["Payload"]) == {
+        DEFERRED_EVENT_KEY: True,
+        "body": event["body"],
+    }
+
+
+def test_fast_actions_and_inline_mode_run_immediately(
+    monkeypatch, list_handler, lambda_client
+):
+    monkeypatch.setenv("COMMAND_MODE", "async")
+    resp = setting_api.lambda_handler(slack_event("setting help"), CONTEXT)
+    assert "使い方" in resp["body"]
+    # 引数なしのlistはスナップショットを読むだけなのでその場で処理する
+    resp = setting_api.lambda_handler(slack_event("setting list"), CONTEXT)
+    assert resp["body"].startswith("[list] 全設定一覧")
+    assert list_handler.call_args.args[0] == []
+
+    monkeypatch.setenv("COMMAND_MODE", "inline")
+    resp = setting_api.lambda_handler(slack_event("setting list -a"), CONTEXT)
+    assert resp["body"].startswith("[list] 全設定一覧")
+    assert list_handler.call_count == 2
+    lambda_client.invoke.assert_not_called()
+
+
+def test_falls_back_to_inline_when_defer_is_not_possible(monkeypatch, lambda_client):
+    monkeypatch.setenv("COMMAND_MODE", "async")
+    monkeypatch.delenv("AWS_LAMBDA_FUNCTION_NAME", raising=False)
+    # 関数名が分からない
+    assert defer(slack_event("setting list"), None) is False
+    # response_urlが無い
+    assert defer({"body": "text=setting+list"}, CONTEXT) is False
+    # 自己呼び出しで渡されたイベントは再度渡さない
+    assert defer({DEFERRED_EVENT_KEY: True, "body": ""}, CONTEXT) is False
+    lambda_client.invoke.assert_not_called()
+    # 呼び出しに失敗した場合は受け付け済みかもしれないため例外を投げる
+    lambda_client.invoke.side_effect = Exception("throttled")
+    with pytest.raises(Exception):
+        defer(slack_event("setting list"), CONTEXT)
+
+
+def test_failed_defer_replies_with_error_instead_of_running_inline(
+    monkeypatch, list_handler, lambda_client
+):
+    monkeypatch.setenv("COMMAND_MODE", "async")
+    lambda_client.invoke.side_effect = Exception("read timeout")
+    resp = setting_api.lambda_handler(slack_event("setting list -a"), CONTEXT)
+    assert "受け付けに失敗しました" in resp["body"]
+    list_handler.assert_not_called()
+    assert lambda_client.invoke.call_count == 1
+
+
+def test_deferred_event_runs_command_and_posts_to_response_url(
+    monkeypatch, list_handler, lambda_client
+):
+    monkeypatch.setenv("COMMAND_MODE", "async")
+    event = {DEFERRED_EVENT_KEY: True, **slack_event("setting list -a")}
+    with patch.object(main.SlackIntegration, "respond") as respond:
+        # 署名ヘッダーが無くても処理する
+        resp = main.lambda_handler(event, CONTEXT)
+    assert resp["statusCode"] == 200
+    list_handler.assert_called_once()
+    assert list_handler.call_args.args[0] == ["-a"]
+    respond.assert_called_once_with(RESPONSE_URL, "[list] 全設定一覧:\nabc")
+    lambda_client.invoke.assert_not_called()
+
+
+def test_deferred_failure_is_reported_without_raising(monkeypatch, list_handler):
+    list_handler.side_effect = Exception("boom")
+    event = {DEFERRED_EVENT_KEY: True, **slack_event("setting list")}
+    with patch.object(main.SlackIntegration, "respond") as respond:
+        resp = main.lambda_handler(event, CONTEXT)
+    assert resp["statusCode"] == 200
+    respond.assert_called_once_with(RESPONSE_URL, "エラー: boom")
+
+    with patch.object(main.SlackIntegration, "respond", side_effect=Exception("gone")):
+        resp = main.lambda_handler(event, CONTEXT)
+    assert resp["statusCode"] == 500
@@ -1,9 +1,18 @@
 import os
+import time
 from unittest.mock import patch, MagicMock
+from botocore.exceptions import ClientError
 from lambda_functions.dynamodb_stream import notify_slack_stream
 
 
-def make_stream_event(tweet_uid, tweet_url, slack_ch, notified_at=None):
+def make_record(
+    tweet_uid,
+    tweet_url,
+    slack_ch,
+    notified_at=None,
+    sequence_number=None,
+    digest=False,
+):
     new_image = {
         "tweet_uid": {"S": tweet_uid},
         "tweet_url": {"S": tweet_url},
@@ -11,7 +20,16 @@ def make_stream_event(tweet_uid, tweet_url, slack_ch, notified_at=None):
     }
     if notified_at:
         new_image["notified_at"] = {"S": notified_at}
-    return {"Records": [{"eventName": "INSERT", "dynamodb": {"NewImage": new_image}}]}
+    if digest:
+        new_image["digest"] = {"BOOL": True}
+    dynamodb = {"NewImage": new_image}
+    if sequence_number:
+        dynamodb["SequenceNumber"] = sequence_number
+    return {"eventName": "INSERT", "dynamodb": dynamodb}
+
+
+def make_stream_event(tweet_uid, tweet_url, slack_ch, notified_at=None):
+    return {"Records": [make_record(tweet_uid, tweet_url, slack_ch, notified_at)]}
 
 
 @patch("lambda_functions.dynamodb_stream.notify_slack_stream.SlackIntegration")
@@ -56,10 +74,14 @@ def test_notify_and_update(mock_boto3_resource, mock_slack_integration):
     mock_slack.send_message.assert_called_once_with(
         "C12345", "新しいツイート通知", blocks=expected_blocks
     )
-    mock_table.update_item.assert_called_once()
+    # 送信権の取得（条件付き更新）と通知済みの記録の2回更新する
+    assert mock_table.update_item.call_count == 2
+    claim_kwargs = mock_table.update_item.call_args_list[0].kwargs
+    assert "attribute_not_exists(notified_at)" in claim_kwargs["ConditionExpression"]
     args, kwargs = mock_table.update_item.call_args
     assert kwargs["ExpressionAttributeValues"][":ts"] == "12345.6789"
     assert result["statusCode"] == 200
+    assert result["batchItemFailures"] == []
 
 
 @patch("lambda_functions.dynamodb_stream.notify_slack_stream.SlackIntegration")
@@ -81,3 +103,286 @@ def test_idempotency(mock_boto3_resource, mock_slack_integration):
     mock_slack.send_message.assert_not_called()
     mock_table.update_item.assert_not_called()
     assert result["statusCode"] == 200
+
+
+@patch("lambda_functions.dynamodb_stream.notify_slack_stream.SlackIntegration")
+@patch("boto3.resource")
+def test_digest_rows_are_sent_as_one_message(
+    mock_boto3_resource, mock_slack_integration
+):
+    # 同じチャンネルのダイジェスト行は1メッセージにまとめて送信し、全行に同じtsを記録する
+    mock_table = MagicMock()
+    mock_boto3_resource.return_value.Table.return_value = mock_table
+    mock_slack = MagicMock()
+    mock_slack.send_message.return_value = "ts-digest"
+    mock_slack_integration.return_value = mock_slack
+
+    event = {
+        "Records": [
+            make_record("uid3", "https://x.com/3", "C12345", digest=True),
+            make_record("uid4", "https://x.com/4", "C12345", digest=True),
+        ]
+    }
+    result = notify_slack_stream.lambda_handler(event, None)
+
+    mock_slack.send_message.assert_called_once()
+    args, kwargs = mock_slack.send_message.call_args
+    assert args[0] == "C12345"
+    assert kwargs["blocks"][0]["text"]["text"] == "*新しいツイート通知 (2件)*"
+    marked = [
+        c.kwargs
+        for c in mock_table.update_item.call_args_list
+        if c.kwargs["UpdateExpression"].startswith("SET notified_at")
+    ]
+    assert {m["Key"]["tweet_uid"] for m in marked} == {"uid3", "uid4"}
+    assert all(m["ExpressionAttributeValues"][":ts"] == "ts-digest" for m in marked)
+    assert "Processed: 2" in result["body"]
+
+
+@patch("lambda_functions.dynamodb_stream.notify_slack_stream.SlackIntegration")
+@patch("boto3.resource")
+def test_rows_recently_claimed_by_batch_are_skipped(
+    mock_boto3_resource, mock_slack_integration
+):
+    # inlineモードでバッチが登録時に送信権を取得した行はバッチが送信するため、
+    # 送信権を取りに行かず、再試行もさせずに読み飛ばす
+    mock_table = MagicMock()
+    mock_boto3_resource.return_value.Table.return_value = mock_table
+    mock_slack = MagicMock()
+    mock_slack_integration.return_value = mock_slack
+
+    record = make_record("uid5", "https://x.com/5", "C12345", sequence_number="200")
+    record["dynamodb"]["NewImage"]["notify_claimed_at"] = {"N": str(int(time.time()))}
+    result = notify_slack_stream.lambda_handler({"Records": [record]}, None)
+
+    mock_slack.send_message.assert_not_called()
+    mock_table.update_item.assert_not_called()
+    mock_table.get_item.assert_not_called()
+    assert result["batchItemFailures"] == []
+    assert "Skipped: 1" in result["body"]
+
+
+@patch("lambda_functions.dynamodb_stream.notify_slack_stream.SlackIntegration")
+@patch("boto3.resource")
+def test_rows_with_stale_batch_claim_are_delivered(
+    mock_boto3_resource, mock_slack_integration
+):
+    # 送信権の有効期限を過ぎた印の行（バッチが送信中に落ちた行）は送信権を取り直して送信する
+    mock_table = MagicMock()
+    mock_boto3_resource.return_value.Table.return_value = mock_table
+    mock_slack = MagicMock()
+    mock_slack.send_message.return_value = "1.0"
+    mock_slack_integration.return_value = mock_slack
+
+    record = make_record("uid5", "https://x.com/5", "C12345", sequence_number="200")
+    record["dynamodb"]["NewImage"]["notify_claimed_at"] = {"N": "1700000000"}
+    result = notify_slack_stream.lambda_handler({"Records": [record]}, None)
+
+    mock_slack.send_message.assert_called_once()
+    assert result["batchItemFailures"] == []
+
+
+@patch("lambda_functions.dynamodb_stream.notify_slack_stream.SlackIntegration")
+@patch("boto3.resource")
+def test_released_claim_modify_is_delivered(
+    mock_boto3_resource, mock_slack_integration
+):
+    # バッチの送信失敗で送信中の印が外された行(MODIFY)は送信し、
+    # 送信権の取得・通知済みの記録によるMODIFYは読み飛ばす
+    mock_table = MagicMock()
+    mock_boto3_resource.return_value.Table.return_value = mock_table
+    mock_slack = MagicMock()
+    mock_slack.send_message.return_value = "1.0"
+    mock_slack_integration.return_value = mock_slack
+
+    released = make_record("uid6", "https://x.com/6", "C12345")
+    released["eventName"] = "MODIFY"
+    claimed = make_record("uid7", "https://x.com/7", "C12345")
+    claimed["eventName"] = "MODIFY"
+    claimed["dynamodb"]["NewImage"]["notify_claimed_at"] = {"N": "1700000000"}
+    notified = make_record(
+        "uid8", "https://x.com/8", "C12345", notified_at="2024-07-01T00:00:00Z"
+    )
+    notified["eventName"] = "MODIFY"
+    result = notify_slack_stream.lambda_handler(
+        {"Records": [released, claimed, notified]}, None
+    )
+
+    mock_slack.send_message.assert_called_once()
+    assert mock_slack.send_message.call_args.kwargs["blocks"][-1]["elements"][0][
+        "url"
+    ] == ("https://x.com/6")
+    assert "Processed: 1, Skipped: 0, Failed: 0" in result["body"]
+
+
+@patch("lambda_functions.dynamodb_stream.notify_slack_stream.SlackIntegration")
+@patch("boto3.resource")
+def test_partial_batch_failure(mock_boto3_resource, mock_slack_integration):
+    # 送信済み(条件付き更新で弾かれる)・送信失敗・成功が混在するバッチ
+    mock_table = MagicMock()
+    mock_boto3_resource.return_value.Table.return_value = mock_table
+
+    def update_item(Key, UpdateExpression, **kwargs):
+        if Key["tweet_uid"] == "dup" and "ConditionExpression" in kwargs:
+            raise ClientError(
+                {"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem"
+            )
+
+    mock_table.update_item.side_effect = update_item
+    # 条件付き更新で弾かれた行は通知済み
+    mock_table.get_item.return_value = {
+        "Item": {"tweet_uid": "dup", "notified_at": "2024-07-01T00:00:00Z"}
+    }
+    mock_slack = MagicMock()
+
+    def send_message(channel, message, blocks=None):
+        if channel == "C_BAD":
+            raise Exception("channel_not_found")
+        return "1.0"
+
+    mock_slack.send_message.side_effect = send_message
+    mock_slack_integration.return_value = mock_slack
+    os.environ["NOTIFICATIONS_TABLE"] = "TweetWacherNotificationsTable"
+
+    event = {
+        "Records": [
+            make_record("ok1", "https://x.com/ok1", "C1", sequence_number="100"),
+            make_record("bad", "https://x.com/bad", "C_BAD", sequence_number="101"),
+            make_record("dup", "https://x.com/dup", "C1", sequence_number="102"),
+            make_record("ok2", "https://x.com/ok2", "C2", sequence_number="103"),
+        ]
+    }
+    result = notify_slack_stream.lambda_handler(event, None)
+
+    assert result["batchItemFailures"] == [{"itemIdentifier": "101"}]
+    assert "Processed: 2, Skipped: 1, Failed: 1" in result["body"]
+    sent = sorted(c.args[0] for c in mock_slack.send_message.call_args_list)
+    assert sent == ["C1", "C2", "C_BAD"]
+    # 失敗したレコードは送信中の印を外して再試行に備える
+    release_calls = [
+        c
+        for c in mock_table.update_item.call_args_list
+        if c.kwargs["UpdateExpression"] == "REMOVE notify_claimed_at"
+    ]
+    assert [c.kwargs["Key"]["tweet_uid"] for c in release_calls] == ["bad"]
+
+
+@patch("lambda_functions.dynamodb_stream.notify_slack_stream.SlackIntegration")
+@patch("boto3.resource")
+def test_handler_emits_stage_metrics(mock_boto3_resource, mock_slack_integration):
+    from observability import metrics
+    from observability.metrics import MemorySink
+
+    mock_boto3_resource.return_value.Table.return_value = MagicMock()
+    mock_slack_integration.return_value.send_message.return_value = "1.0"
+    sink = MemorySink()
+    previous = metrics.set_sink(sink)
+    try:
+        notify_slack_stream.lambda_handler(
+            make_stream_event("uid1", "https://x.com/1", "C1"), None
+        )
+    finally:
+        metrics.set_sink(previous)
+    (record,) = sink.records
+    assert record["function"] == "NotifySlack"
+    assert record["stream_records"] == 1
+    assert record["tweets_delivered"] == 1
+    for stage in ("stream_claim", "slack_post", "notifications_mark", "stream_total"):
+        assert len(record[stage]) == 1
+
+
+@patch("lambda_functions.dynamodb_stream.notify_slack_stream.SlackIntegration")
+@patch("boto3.resource")
+def test_rate_limit_past_deadline_is_retried(
+    mock_boto3_resource, mock_slack_integration
+):
+    # 429のRetry-Afterを待つとLambdaの残り時間を超える場合は、待たずに再試行させる
+    from integration.slack_integration import SlackRateLimitedError
+
+    mock_table = MagicMock()
+    mock_boto3_resource.return_value.Table.return_value = mock_table
+    mock_slack = MagicMock()
+    mock_slack.send_message.side_effect = SlackRateLimitedError(9)
+    mock_slack_integration.return_value = mock_slack
+    context = MagicMock()
+    context.get_remaining_time_in_millis.return_value = 20000
+
+    event = {
+        "Records": [make_record("uid9", "https://x.com/9", "C1", sequence_number="300")]
+    }
+    with patch("integration.slack_dispatcher.time.sleep") as mock_sleep:
+        result = notify_slack_stream.lambda_handler(event, context)
+
+    mock_sleep.assert_not_called()
+    assert result["batchItemFailures"] == [{"itemIdentifier": "300"}]
+    release_calls = [
+        c
+        for c in mock_table.update_item.call_args_list
+        if c.kwargs["UpdateExpression"] == "REMOVE notify_claimed_at"
+    ]
+    assert len(release_calls) == 1
+
+
+@patch("lambda_functions.dynamodb_stream.notify_slack_stream.SlackIntegration")
+@patch("boto3.resource")
+def test_permanent_slack_errors_are_not_retried(
+    mock_boto3_resource, mock_slack_integration
+):
+    # アーカイブ済み等の再送しても成功しないエラーは送信断念として記録し、
+    # batchItemFailuresで返さない（シャードの後続のレコードを止めない）
+    from integration.slack_integration import SlackApiError
+
+    mock_table = MagicMock()
+    mock_boto3_resource.return_value.Table.return_value = mock_table
+    mock_slack = MagicMock()
+
+    def send_message(channel, message, blocks=None):
+        if channel == "C_ARCHIVED":
+            raise SlackApiError("is_archived")
+        if channel == "C_DOWN":
+            raise SlackApiError("internal_error")
+        return "1.0"
+
+    mock_slack.send_message.side_effect = send_message
+    mock_slack_integration.return_value = mock_slack
+
+    event = {
+        "Records": [
+            make_record("a1", "https://x.com/a1", "C_ARCHIVED", sequence_number="1"),
+            make_record(
+                "a2", "https://x.com/a2", "C_ARCHIVED", sequence_number="2", digest=True
+            ),
+            make_record("d1", "https://x.com/d1", "C_DOWN", sequence_number="3"),
+            make_record("ok", "https://x.com/ok", "C1", sequence_number="4"),
+        ]
+    }
+    result = notify_slack_stream.lambda_handler(event, None)
+
+    # 一時的なエラーだけを再試行させる
+    assert result["batchItemFailures"] == [{"itemIdentifier": "3"}]
+    assert "Processed: 1, Skipped: 2, Failed: 1" in result["body"]
+    failed_marks = [
+        c.kwargs
+        for c in mock_table.update_item.call_args_list
+        if c.kwargs["UpdateExpression"].startswith("SET notify_failed_at")
+    ]
+    assert sorted(m["Key"]["tweet_uid"] for m in failed_marks) == ["a1", "a2"]
+    assert all(
+        m["ExpressionAttributeValues"][":e"] == "is_archived" for m in failed_marks
+    )
+    released = [
+        c.kwargs["Key"]["tweet_uid"]
+        for c in mock_table.update_item.call_args_list
+        if c.kwargs["UpdateExpression"] == "REMOVE notify_claimed_at"
+    ]
+    assert released == ["d1"]
+
+    # 送信断念の記録によるMODIFYは読み飛ばす
+    failed_record = make_record("a1", "https://x.com/a1", "C_ARCHIVED")
+    failed_record["eventName"] = "MODIFY"
+    failed_record["dynamodb"]["NewImage"]["notify_failed_at"] = {
+        "S": "2025-01-01T00:00:00Z"
+    }
+    mock_slack.send_message.reset_mock()
+    result = notify_slack_stream.lambda_handler({"Records": [failed_record]}, None)
+    mock_slack.send_message.assert_not_called()
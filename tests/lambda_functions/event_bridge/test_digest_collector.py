@@ -0,0 +1,64 @@
+from unittest.mock import MagicMock
+from lambda_functions.event_bridge.digest_collector import DigestCollector
+
+
+def make_item(uid, like=1, rt=0):
+    return {
+        "tweet_uid": uid,
+        "tweet_url": f"https://twitter.com/i/web/status/{uid}",
+        "like_count": like,
+        "retweet_count": rt,
+    }
+
+
+def test_flush_sends_one_message_per_channel_and_records_ts():
+    collector = DigestCollector()
+    collector.add("C1", [make_item("1"), make_item("2")], digest_max=5)
+    collector.add("C1", [make_item("3")])
+    collector.add("C2", [make_item("4")])
+    collector.add("C3", [])
+    slack = MagicMock()
+    slack.send_message.side_effect = lambda ch, text, blocks=None: f"ts-{ch}"
+    repo = MagicMock()
+
+    summary = collector.flush(slack, repo)
+
+    assert summary == {"channels": 2, "tweets": 4, "failed": []}
+    assert sorted(c.args[0] for c in slack.send_message.call_args_list) == [
+        "C1",
+        "C2",
+    ]
+    marked = {
+        (c.args[0], c.args[1], c.args[2]) for c in repo.mark_notified.call_args_list
+    }
+    assert marked == {
+        ("1", "C1", "ts-C1"),
+        ("2", "C1", "ts-C1"),
+        ("3", "C1", "ts-C1"),
+        ("4", "C2", "ts-C2"),
+    }
+    # flush後は空になる
+    assert collector.flush(slack, repo)["channels"] == 0
+
+
+def test_flush_isolates_channel_failures():
+    collector = DigestCollector()
+    collector.add("C1", [make_item("1")])
+    collector.add("C2", [make_item("2")])
+    slack = MagicMock()
+
+    def send_message(ch, text, blocks=None):
+        if ch == "C1":
+            raise Exception("fail")
+        return "ts"
+
+    slack.send_message.side_effect = send_message
+    repo = MagicMock()
+
+    summary = collector.flush(slack, repo)
+
+    assert summary == {"channels": 1, "tweets": 1, "failed": ["C1"]}
+    repo.mark_notified.assert_called_once()
+    assert repo.mark_notified.call_args.args[:2] == ("2", "C2")
+    # 送信に失敗したチャンネルの行は送信中の印を外してストリームに送信し直させる
+    repo.release_claim.assert_called_once_with("1", "C1")
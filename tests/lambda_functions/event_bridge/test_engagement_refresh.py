@@ -0,0 +1,132 @@
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+from lambda_functions.event_bridge import engagement_refresh
+
+NOW = datetime(2025, 1, 2, 8, 0, tzinfo=timezone.utc)
+
+
+def make_row(tweet_uid, slack_ch, ts, like_count, retweet_count, **extra):
+    return {
+        "tweet_uid": tweet_uid,
+        "tweet_url": f"https://twitter.com/i/web/status/{tweet_uid}",
+        "slack_ch": slack_ch,
+        "slack_message_ts": ts,
+        "like_count": like_count,
+        "retweet_count": retweet_count,
+        **extra,
+    }
+
+
+def test_refresh_updates_only_changed_messages(monkeypatch):
+    rows = [
+        make_row("1", "C1", "1.0", 10, 1),
+        make_row("2", "C1", "2.0", 20, 2),
+        # 送信前の行は対象外
+        make_row("3", "C1", None, 0, 0),
+    ]
+    repo = MagicMock()
+    repo.iter_notified_since.return_value = iter(rows)
+    repo.update_engagement.return_value = True
+    lookups = []
+
+    def fake_lookup(pool, ids):
+        lookups.append(list(ids))
+        return {
+            "1": {"like_count": 15, "retweet_count": 1},
+            "2": {"like_count": 20, "retweet_count": 2},
+        }
+
+    monkeypatch.setattr(engagement_refresh, "lookup_public_metrics", fake_lookup)
+    slack = MagicMock()
+    summary = engagement_refresh.refresh_engagement("pool", repo, slack, now=NOW)
+
+    assert lookups == [["1", "2"]]
+    repo.update_engagement.assert_called_once_with("1", "C1", 15, 1, 10, 1)
+    slack.update_message.assert_called_once()
+    args, kwargs = slack.update_message.call_args
+    assert args[:2] == ("C1", "1.0")
+    assert "*👍 いいね:* 15" in str(kwargs["blocks"])
+    assert summary == {
+        "rows": 2,
+        "looked_up": 2,
+        "changed": 1,
+        "unchanged": 1,
+        "conflicts": 0,
+        "messages_updated": 1,
+        "errors": [],
+    }
+
+
+def test_refresh_counts_conflict_when_conditional_write_loses(monkeypatch):
+    repo = MagicMock()
+    repo.iter_notified_since.return_value = iter([make_row("1", "C1", "1.0", 1, 0)])
+    repo.update_engagement.return_value = False
+    monkeypatch.setattr(
+        engagement_refresh,
+        "lookup_public_metrics",
+        lambda pool, ids: {"1": {"like_count": 3, "retweet_count": 0}},
+    )
+    slack = MagicMock()
+    summary = engagement_refresh.refresh_engagement("pool", repo, slack, now=NOW)
+    assert summary["conflicts"] == 1
+    assert summary["changed"] == 0
+    slack.update_message.assert_called_once()
+
+
+def test_refresh_retries_message_when_slack_update_fails(monkeypatch):
+    stored = make_row("1", "C1", "1.0", 1, 0)
+    repo = MagicMock()
+    repo.iter_notified_since.side_effect = lambda since, now: iter([dict(stored)])
+
+    def update_engagement(tweet_uid, slack_ch, like, rt, old_like, old_rt):
+        stored.update(like_count=like, retweet_count=rt)
+        return True
+
+    repo.update_engagement.side_effect = update_engagement
+    monkeypatch.setattr(
+        engagement_refresh,
+        "lookup_public_metrics",
+        lambda pool, ids: {"1": {"like_count": 3, "retweet_count": 0}},
+    )
+    slack = MagicMock()
+    slack.update_message.side_effect = [Exception("timeout"), None]
+
+    first = engagement_refresh.refresh_engagement("pool", repo, slack, now=NOW)
+    # メッセージを更新できなかった行は古い値のまま残す
+    assert first["errors"] == [{"slack_ch": "C1", "ts": "1.0", "error": "timeout"}]
+    assert first["changed"] == 0
+    repo.update_engagement.assert_not_called()
+    assert stored["like_count"] == 1
+
+    second = engagement_refresh.refresh_engagement("pool", repo, slack, now=NOW)
+    assert second["messages_updated"] == 1
+    assert second["changed"] == 1
+    assert slack.update_message.call_count == 2
+    repo.update_engagement.assert_called_once_with("1", "C1", 3, 0, 1, 0)
+    assert stored["like_count"] == 3
+
+
+def test_refresh_rebuilds_digest_from_message_rows(monkeypatch):
+    digest_rows = [
+        make_row("1", "C1", "9.0", 1, 0, digest=True, digest_max=5),
+        make_row("2", "C1", "9.0", 50, 0, digest=True, digest_max=5),
+    ]
+    repo = MagicMock()
+    repo.iter_notified_since.return_value = iter(digest_rows[:1])
+    repo.update_engagement.return_value = True
+    # インデックスからは更新前の値が返ってくる
+    repo.list_by_message_ts.return_value = digest_rows
+    monkeypatch.setattr(
+        engagement_refresh,
+        "lookup_public_metrics",
+        lambda pool, ids: {"1": {"like_count": 100, "retweet_count": 0}},
+    )
+    slack = MagicMock()
+    engagement_refresh.refresh_engagement("pool", repo, slack, now=NOW)
+
+    repo.list_by_message_ts.assert_called_once_with("9.0", "C1")
+    args, kwargs = slack.update_message.call_args
+    assert args == ("C1", "9.0", "新しいツイート通知 (2件)")
+    # 更新した行が手元の値で並び替えられ先頭に来る
+    assert "status/1|" in kwargs["blocks"][1]["text"]["text"]
+    assert "👍 100" in kwargs["blocks"][1]["text"]["text"]
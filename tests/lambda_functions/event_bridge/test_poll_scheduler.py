@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from lambda_functions.event_bridge import poll_scheduler
+
+NOW = datetime(2024, 6, 13, 3, 0, tzinfo=timezone.utc)
+
+
+def test_update_poll_stats_speeds_up_on_hits_and_backs_off_when_quiet(monkeypatch):
+    for name in (
+        "POLL_MIN_INTERVAL_MINUTES",
+        "POLL_BASE_INTERVAL_MINUTES",
+        "POLL_MAX_INTERVAL_MINUTES",
+    ):
+        monkeypatch.delenv(name, raising=False)
+    # 初回は初期間隔(20分)を基準にする
+    stats, due = poll_scheduler.update_poll_stats(None, 5, 2, now=NOW)
+    assert stats["interval"] == 10
+    assert stats["hits"] == 1
+    assert stats["last_hit_at"] == "2024-06-13T03:00:00Z"
+    assert due == "2024-06-13T03:10:00Z"
+    # 連続して閾値を通過すると最小間隔まで縮む
+    stats, _ = poll_scheduler.update_poll_stats(stats, 5, 1, now=NOW)
+    stats, due = poll_scheduler.update_poll_stats(stats, 5, 1, now=NOW)
+    assert stats["interval"] == 5
+    assert due == "2024-06-13T03:05:00Z"
+    # 一致はあるが閾値を通過しない場合は緩やかに、一致が無い場合は大きく広げる
+    stats, _ = poll_scheduler.update_poll_stats(stats, 3, 0, now=NOW)
+    assert stats["interval"] == 6
+    stats, _ = poll_scheduler.update_poll_stats(stats, 0, 0, now=NOW)
+    assert stats["interval"] == 12
+    assert stats["runs"] == 5
+    assert stats["hits"] == 3
+    assert (stats["last_returned"], stats["last_matched"]) == (0, 0)
+    # 最大間隔で頭打ちになる
+    for _ in range(10):
+        stats, _ = poll_scheduler.update_poll_stats(stats, 0, 0, now=NOW)
+    assert stats["interval"] == poll_scheduler.DEFAULT_POLL_MAX_INTERVAL
+
+
+def test_update_poll_stats_accepts_decimal_values_from_dynamodb(monkeypatch):
+    monkeypatch.setenv("POLL_MAX_INTERVAL_MINUTES", "60")
+    stored = {"interval": Decimal(40), "hits": Decimal(2), "runs": Decimal(7)}
+    stats, due = poll_scheduler.update_poll_stats(stored, 0, 0, now=NOW)
+    assert stats["interval"] == 60
+    assert stats["runs"] == 8
+    assert due == "2024-06-13T04:00:00Z"
+
+
+def test_next_due_at_is_based_on_previous_due_time(monkeypatch):
+    monkeypatch.setenv("POLL_MIN_INTERVAL_MINUTES", "5")
+    monkeypatch.setenv("POLL_MAX_INTERVAL_MINUTES", "240")
+    # 03:00予定の設定を03:00の実行で拾い、処理を03:02に終えても次回は03:15（25分にずれない）
+    processed_at = NOW + timedelta(minutes=2)
+    stats, due = poll_scheduler.update_poll_stats(
+        {"interval": 12}, 3, 0, now=processed_at, due_at="2024-06-13T03:00:00Z"
+    )
+    assert stats["interval"] == 15
+    assert due == "2024-06-13T03:15:00Z"
+    # 5分間隔の実行で拾われる時刻がずれても、予定は15分ごとに進む
+    selected, _, _ = poll_scheduler.select_due_settings(
+        [{"id": "s", "next_due_at": due, "poll_stats": stats}],
+        now=NOW + timedelta(minutes=15),
+    )
+    assert [s["id"] for s in selected] == ["s"]
+    stats, due = poll_scheduler.update_poll_stats(
+        {"interval": 12}, 3, 0, now=NOW + timedelta(minutes=17), due_at=due
+    )
+    assert due == "2024-06-13T03:30:00Z"
+    # 間隔以上遅れていた場合・予定が無い場合は今の時刻を基準にする
+    _, due = poll_scheduler.update_poll_stats(
+        {"interval": 12}, 3, 0, now=NOW, due_at="2024-06-13T02:00:00Z"
+    )
+    assert due == "2024-06-13T03:15:00Z"
+    _, due = poll_scheduler.update_poll_stats({"interval": 12}, 3, 0, now=NOW)
+    assert due == "2024-06-13T03:15:00Z"
+
+
+def test_select_due_settings_orders_by_overdue_ratio():
+    settings = [
+        # 予定前
+        {"id": "future", "next_due_at": "2024-06-13T03:30:00Z"},
+        # 10分遅れ・間隔60分
+        {
+            "id": "slow",
+            "next_due_at": "2024-06-13T02:50:00Z",
+            "poll_stats": {"interval": Decimal(60)},
+        },
+        # 5分遅れ・間隔5分（間隔に対する遅れが大きい）
+        {
+            "id": "hot",
+            "next_due_at": "2024-06-13T02:55:00Z",
+            "poll_stats": {"interval": Decimal(5)},
+        },
+        # 統計の無い新規設定は最優先
+        {"id": "new"},
+    ]
+    selected, not_due, deferred = poll_scheduler.select_due_settings(settings, now=NOW)
+    assert [s["id"] for s in selected] == ["new", "hot", "slow"]
+    assert (not_due, deferred) == (1, 0)
+
+    selected, not_due, deferred = poll_scheduler.select_due_settings(
+        settings, now=NOW, limit=2
+    )
+    assert [s["id"] for s in selected] == ["new", "hot"]
+    assert (not_due, deferred) == (1, 1)
+
+
+def test_get_max_settings_per_run(monkeypatch):
+    monkeypatch.delenv("POLL_MAX_SETTINGS_PER_RUN", raising=False)
+    assert poll_scheduler.get_max_settings_per_run() is None
+    monkeypatch.setenv("POLL_MAX_SETTINGS_PER_RUN", "50")
+    assert poll_scheduler.get_max_settings_per_run() == 50
+    monkeypatch.setenv("POLL_MAX_SETTINGS_PER_RUN", "x")
+    assert poll_scheduler.get_max_settings_per_run() is None
+
+
+def test_next_due_settings_are_skipped_until_due():
+    stats, due = poll_scheduler.update_poll_stats(None, 0, 0, now=NOW)
+    setting = {"id": "a", "poll_stats": stats, "next_due_at": due}
+    assert poll_scheduler.select_due_settings([setting], now=NOW)[0] == []
+    later = NOW + timedelta(minutes=stats["interval"])
+    assert poll_scheduler.select_due_settings([setting], now=later)[0] == [setting]
@@ -0,0 +1,113 @@
+from lambda_functions.event_bridge import query_planner
+
+
+def matches(keyword, text, **fields):
+    matcher = query_planner.compile_matcher(keyword)
+    assert matcher is not None
+    return matcher({"id": "1", "text": text, **fields})
+
+
+def test_matcher_terms_phrases_negations_and_hashtags():
+    assert matches("python aws", "I love AWS and Python")
+    assert not matches("python aws", "I love Python")
+    # 英数字の語は単語単位で一致させる
+    assert not matches("cat", "concatenate")
+    assert matches("cat", "my cat!")
+    # 日本語は部分一致
+    assert matches("東京 天気", "今日の東京の天気は晴れ")
+    assert matches('"machine learning"', "Machine learning rocks")
+    assert not matches('"machine learning"', "learning machine")
+    assert matches("python -snake", "python code")
+    assert not matches("python -snake", "python snake")
+    assert matches("#AWS", "new release #aws")
+    assert not matches("#aws", "aws release")
+    assert matches("(foo OR bar) baz", "bar and baz")
+    assert not matches("(foo OR bar) baz", "foo only")
+
+
+def test_matcher_local_operators():
+    assert matches("python lang:ja", "python", lang="ja")
+    assert not matches("python lang:ja", "python", lang="en")
+    retweet = {"referenced_tweets": [{"type": "retweeted", "id": "9"}]}
+    assert not matches("python -is:retweet", "RT python", **retweet)
+    assert matches("python -is:retweet", "python")
+    # ローカルで判定できない演算子・不正なクエリはNone
+    assert query_planner.compile_matcher("from:someone python") is None
+    assert query_planner.compile_matcher('"unterminated') is None
+    assert query_planner.compile_matcher("(a OR b") is None
+
+
+def test_plan_query_packs_respects_length_and_compatibility():
+    settings = [
+        {"id": "1", "keyword": "python", "since_id": "100"},
+        {"id": "2", "keyword": "aws lambda", "since_id": "200"},
+        {"id": "3", "keyword": "from:someone news", "since_id": "100"},
+        {"id": "4", "keyword": "rust"},
+        {"id": "5", "keyword": "golang", "since_id": "150"},
+    ]
+    packs = query_planner.plan_query_packs(settings, max_query_length=30)
+    queries = [pack.query for pack in packs]
+    assert queries == [
+        "(python) OR (aws lambda)",
+        "from:someone news",
+        "(rust)",
+        "(golang)",
+    ]
+    assert packs[0].since_id == "100"
+    assert packs[2].since_id is None
+
+    # 上限0でまとめを無効化
+    packs = query_planner.plan_query_packs(settings, max_query_length=0)
+    assert len(packs) == len(settings)
+
+
+def test_pack_route_uses_matcher_and_own_since_id():
+    settings = [
+        {"id": "1", "keyword": "python", "since_id": "100"},
+        {"id": "2", "keyword": "aws", "since_id": "200"},
+    ]
+    (pack,) = query_planner.plan_query_packs(settings, max_query_length=100)
+    route = lambda tweet: [s["id"] for s in pack.route(tweet)]
+    assert route({"id": "150", "text": "python and aws"}) == ["1"]
+    assert route({"id": "250", "text": "python and aws"}) == ["1", "2"]
+    assert route({"id": "250", "text": "aws only"}) == ["2"]
+    assert route({"id": "250", "text": "nothing"}) == []
+
+
+def test_normalize_query():
+    assert query_planner.normalize_query(
+        "Python  AWS"
+    ) == query_planner.normalize_query("aws python")
+    assert query_planner.normalize_query(
+        "(b OR a) -Snake"
+    ) == query_planner.normalize_query("-snake (A OR B)")
+    # ORは演算子なので小文字の"or"（語）とは区別する
+    assert query_planner.normalize_query("a OR b") != query_planner.normalize_query(
+        "a or b"
+    )
+    # 構文を解釈できないクエリは空白のみ正規化
+    assert query_planner.normalize_query('  "open  ') == '"open'
+
+
+def test_same_query_settings_share_one_search():
+    settings = [
+        {"id": "1", "keyword": "Python AWS", "slack_ch": "C1"},
+        {"id": "2", "keyword": "aws  python", "slack_ch": "C2"},
+        {"id": "3", "keyword": "from:someone", "slack_ch": "C1"},
+        {"id": "4", "keyword": "from:someone", "slack_ch": "C3"},
+        {"id": "5", "keyword": "rust", "slack_ch": "C1"},
+    ]
+    memo = query_planner.SearchMemo()
+    packs = query_planner.plan_query_packs(settings, max_query_length=100, memo=memo)
+    assert memo.stats() == {"hits": 2, "misses": 3}
+    assert [pack.query for pack in packs] == [
+        "(Python AWS) OR (rust)",
+        "from:someone",
+    ]
+    assert [s["id"] for s in packs[0].settings] == ["1", "2", "5"]
+    # 同じクエリの設定には同じツイートが振り分けられる
+    routed = packs[0].route({"id": "9", "text": "aws python"})
+    assert [s["id"] for s in routed] == ["1", "2"]
+    # 単独検索のパックは振り分けの判定をしない
+    routed = packs[1].route({"id": "9", "text": "anything"})
+    assert [s["id"] for s in routed] == ["3", "4"]
@@ -0,0 +1,140 @@
+import io
+import json
+from decimal import Decimal
+from unittest.mock import MagicMock
+import pytest
+from lambda_functions.event_bridge import shard_scheduler
+from lambda_functions.event_bridge.query_planner import QueryPack, plan_query_packs
+
+
+def make_settings(count, since_id="100"):
+    return [
+        {"id": f"s{i}", "keyword": f"kw{i}", "slack_ch": "C1", "since_id": since_id}
+        for i in range(count)
+    ]
+
+
+def test_estimate_pack_cost_weights_settings_without_since_id():
+    pack = QueryPack([{"id": "a", "since_id": "1"}, {"id": "b"}], "(a) OR (b)")
+    assert shard_scheduler.estimate_pack_cost(pack) == (
+        shard_scheduler.SHARD_COST_PER_SETTING
+        + shard_scheduler.SHARD_COST_WITHOUT_SINCE_ID
+    )
+
+
+def test_plan_shards_balances_cost_and_keeps_packs_together():
+    packs = [
+        QueryPack(make_settings(1)[:1], "kw0"),
+        QueryPack([{"id": "x"}, {"id": "y"}], "(x) OR (y)"),  # コスト6
+        QueryPack([{"id": "z", "since_id": "1"}], "z"),
+        QueryPack([{"id": "w", "since_id": "1"}], "w"),
+    ]
+    shards = shard_scheduler.plan_shards(packs, max_shard_cost=5)
+    # 合計コスト9 → 2シャード。重いパックが1つのシャードを占める
+    assert len(shards) == 2
+    assert [s["id"] for s in shards[0]] == ["x", "y"]
+    assert sorted(s["id"] for s in shards[1]) == ["s0", "w", "z"]
+
+
+def test_plan_shards_single_shard_when_under_limit():
+    packs = plan_query_packs(make_settings(3), max_query_length=0)
+    shards = shard_scheduler.plan_shards(packs, max_shard_cost=40)
+    assert len(shards) == 1
+    assert len(shards[0]) == 3
+    assert shard_scheduler.plan_shards([], max_shard_cost=40) == []
+
+
+def test_thread_executor_isolates_shard_errors():
+    def run(payload):
+        if payload["shard_id"] == 1:
+            raise Exception("boom")
+        return {"total": len(payload["settings"])}
+
+    executor = shard_scheduler.ThreadShardExecutor(run, max_workers=2)
+    results = executor.execute(
+        [{"shard_id": 0, "settings": [1, 2]}, {"shard_id": 1, "settings": [3]}]
+    )
+    assert results == [{"total": 2}, {"shard_id": 1, "error": "boom"}]
+
+
+def test_lambda_executor_invokes_self_asynchronously_per_shard():
+    client = MagicMock()
+    client.invoke.return_value = {"StatusCode": 202, "Payload": io.BytesIO(b"")}
+    executor = shard_scheduler.LambdaShardExecutor("arn:fn", lambda_client=client)
+    results = executor.execute(
+        [
+            {
+                "shard_id": 0,
+                "settings": [{"like_threshold": Decimal("10")}],
+                "deadline": 1000.0,
+            },
+            {"shard_id": 1, "settings": [], "deadline": 1000.0},
+        ]
+    )
+    assert results == [
+        {"shard_id": 0, "dispatched": True},
+        {"shard_id": 1, "dispatched": True},
+    ]
+    assert executor.asynchronous
+    assert client.invoke.call_count == 2
+    kwargs = client.invoke.call_args_list[0].kwargs
+    assert kwargs["FunctionName"] == "arn:fn"
+    assert kwargs["InvocationType"] == "Event"
+    shard = json.loads(kwargs["Payload"])["shard"]
+    # DynamoDBのDecimalもJSONに変換して渡す
+    assert shard["settings"] == [{"like_threshold": 10}]
+    # 呼び出し元は応答を待たないため、呼び出し元の期限は渡さない
+    assert "deadline" not in shard
+
+
+def test_lambda_executor_reports_rejected_invocation():
+    client = MagicMock()
+    client.invoke.return_value = {"StatusCode": 500, "Payload": io.BytesIO(b"")}
+    executor = shard_scheduler.LambdaShardExecutor("fn", lambda_client=client)
+    (result,) = executor.execute([{"shard_id": 3, "settings": []}])
+    assert result["shard_id"] == 3
+    assert "シャードの呼び出しに失敗しました" in result["error"]
+
+
+@pytest.mark.parametrize(
+    "kind, expected",
+    [
+        (None, shard_scheduler.ThreadShardExecutor),
+        ("process", shard_scheduler.ProcessShardExecutor),
+        ("lambda", shard_scheduler.LambdaShardExecutor),
+        ("unknown", shard_scheduler.ThreadShardExecutor),
+    ],
+)
+def test_get_shard_executor(monkeypatch, kind, expected):
+    if kind:
+        monkeypatch.setenv("SHARD_EXECUTOR", kind)
+    else:
+        monkeypatch.delenv("SHARD_EXECUTOR", raising=False)
+    context = MagicMock(invoked_function_arn="arn:fn")
+    executor = shard_scheduler.get_shard_executor(lambda p: p, context)
+    assert type(executor) is expected
+
+
+def test_merge_summaries():
+    merged = shard_scheduler.merge_summaries(
+        [
+            {
+                "total": 2,
+                "errors": [{"id": "a"}],
+                "delivery_mode": "outbox",
+                "slack": {"sent": 1, "max_wait_seconds": 0.5},
+            },
+            {
+                "total": 3,
+                "errors": [],
+                "delivery_mode": "outbox",
+                "slack": {"sent": 2, "max_wait_seconds": 0.2},
+            },
+        ]
+    )
+    assert merged == {
+        "total": 5,
+        "errors": [{"id": "a"}],
+        "delivery_mode": "outbox",
+        "slack": {"sent": 3, "max_wait_seconds": 0.5},
+    }
@@ -39,3 +39,818 @@ def test_filter_tweets_by_thresholds():
     filtered4 = tweet_monitor_batch.filter_tweets_by_thresholds(tweets, None, None)
     ids4 = [t.id for t in filtered4]
     assert set(ids4) == {"1", "2", "3"}
+
+
+def test_run_packs_concurrently_runs_in_parallel_and_isolates_errors():
+    import threading
+    from lambda_functions.event_bridge.query_planner import QueryPack
+
+    packs = [
+        QueryPack([{"id": "a"}, {"id": "a2"}], "(a) OR (a2)"),
+        QueryPack([{"id": "b"}], "b"),
+        QueryPack([{"id": "c"}], "c"),
+    ]
+    # 3件が同時に実行されないとBarrierを通過できない
+    barrier = threading.Barrier(3, timeout=5)
+
+    def worker(pack):
+        barrier.wait()
+        if pack.query == "b":
+            raise Exception("fail")
+        return {
+            "fetched": 3,
+            "settings": [
+                {"id": s["id"], "matched": 2, "notified": 1} for s in pack.settings
+            ],
+        }
+
+    summary = tweet_monitor_batch.run_packs_concurrently(packs, worker, 3)
+    assert summary["total"] == 4
+    assert summary["packs"] == 3
+    assert summary["succeeded"] == 3
+    assert summary["failed"] == 1
+    assert summary["errors"] == [{"id": "b", "error": "fail"}]
+    assert summary["fetched"] == 6
+    assert summary["matched"] == 6
+    assert summary["notified"] == 3
+
+
+def test_get_batch_concurrency(monkeypatch):
+    monkeypatch.delenv("BATCH_CONCURRENCY", raising=False)
+    assert (
+        tweet_monitor_batch.get_batch_concurrency()
+        == tweet_monitor_batch.DEFAULT_BATCH_CONCURRENCY
+    )
+    monkeypatch.setenv("BATCH_CONCURRENCY", "8")
+    assert tweet_monitor_batch.get_batch_concurrency() == 8
+    monkeypatch.setenv("BATCH_CONCURRENCY", "0")
+    assert tweet_monitor_batch.get_batch_concurrency() == 1
+    monkeypatch.setenv("BATCH_CONCURRENCY", "x")
+    assert (
+        tweet_monitor_batch.get_batch_concurrency()
+        == tweet_monitor_batch.DEFAULT_BATCH_CONCURRENCY
+    )
+
+
+def _snowflake_at(dt):
+    timestamp_ms = int(dt.timestamp() * 1000)
+    return str((timestamp_ms - tweet_monitor_batch.TWITTER_SNOWFLAKE_EPOCH_MS) << 22)
+
+
+def test_build_search_window_params(monkeypatch):
+    from datetime import datetime, timezone, timedelta
+
+    monkeypatch.delenv("SEARCH_FALLBACK_HOURS", raising=False)
+    now = datetime(2025, 1, 10, tzinfo=timezone.utc)
+
+    # since_idが検索可能期間内ならsince_idを使う
+    recent_id = _snowflake_at(now - timedelta(hours=1))
+    assert tweet_monitor_batch.build_search_window_params(recent_id, now) == {
+        "since_id": recent_id
+    }
+
+    # since_idが無い場合・期間外の場合はstart_timeでフォールバック
+    old_id = _snowflake_at(now - timedelta(days=8))
+    for since_id in (None, old_id):
+        params = tweet_monitor_batch.build_search_window_params(since_id, now)
+        assert list(params) == ["start_time"]
+        start = datetime.fromisoformat(params["start_time"].replace("Z", "+00:00"))
+        assert now - timedelta(days=7) < start < now
+
+    monkeypatch.setenv("SEARCH_FALLBACK_HOURS", "2")
+    params = tweet_monitor_batch.build_search_window_params(None, now)
+    assert params == {"start_time": "2025-01-09T22:00:00Z"}
+
+
+def test_newest_tweet_id():
+    tweets = [MockTweet("100", 0, 0), {"id": "250"}, MockTweet("99", 0, 0)]
+    assert tweet_monitor_batch.newest_tweet_id(tweets) == "250"
+    assert tweet_monitor_batch.newest_tweet_id(tweets, since_id="300") == "300"
+    assert tweet_monitor_batch.newest_tweet_id([], since_id="300") == "300"
+    assert tweet_monitor_batch.newest_tweet_id([]) is None
+
+
+def _fake_pages(pages):
+    """next_tokenごとにページを返すfetch_tweets_from_twitter_apiの差し替え"""
+    calls = []
+
+    def fake_fetch(
+        credential_pool, keyword, max_results, since_id=None, next_token=None
+    ):
+        calls.append({"next_token": next_token, "max_results": max_results})
+        return pages[next_token]
+
+    return fake_fetch, calls
+
+
+def test_search_tweets_by_keyword_follows_next_token(monkeypatch):
+    pages = {
+        None: ([{"id": "30"}, {"id": "29"}], {"next_token": "p2"}),
+        "p2": ([{"id": "28"}, {"id": "27"}], {"next_token": "p3"}),
+        "p3": ([{"id": "26"}], {}),
+    }
+    fake_fetch, calls = _fake_pages(pages)
+    monkeypatch.setattr(
+        tweet_monitor_batch, "fetch_tweets_from_twitter_api", fake_fetch
+    )
+
+    tweets = tweet_monitor_batch.search_tweets_by_keyword("token", "kw", max_pages=5)
+    # ジェネレータなので消費するまでリクエストしない
+    assert calls == []
+    assert [t["id"] for t in tweets] == ["30", "29", "28", "27", "26"]
+    assert [c["next_token"] for c in calls] == [None, "p2", "p3"]
+
+
+def test_search_tweets_by_keyword_respects_budget_and_since_id(monkeypatch):
+    pages = {
+        None: ([{"id": "30"}, {"id": "29"}], {"next_token": "p2"}),
+        "p2": ([{"id": "28"}, {"id": "27"}], {"next_token": "p3"}),
+        "p3": ([{"id": "26"}], {}),
+    }
+    fake_fetch, calls = _fake_pages(pages)
+    monkeypatch.setattr(
+        tweet_monitor_batch, "fetch_tweets_from_twitter_api", fake_fetch
+    )
+
+    # ページ数の上限
+    tweets = list(
+        tweet_monitor_batch.search_tweets_by_keyword("token", "kw", max_pages=1)
+    )
+    assert [t["id"] for t in tweets] == ["30", "29"]
+
+    # ツイート数の上限
+    tweets = list(
+        tweet_monitor_batch.search_tweets_by_keyword(
+            "token", "kw", max_pages=5, max_tweets=3
+        )
+    )
+    assert [t["id"] for t in tweets] == ["30", "29", "28"]
+
+    # 保存済みのsince_idに到達したら打ち切る
+    calls.clear()
+    tweets = list(
+        tweet_monitor_batch.search_tweets_by_keyword(
+            "token", "kw", since_id="29", max_pages=5
+        )
+    )
+    assert [t["id"] for t in tweets] == ["30"]
+    assert len(calls) == 1
+
+
+def test_search_tweets_by_keyword_reports_whether_search_was_drained(monkeypatch):
+    pages = {
+        None: ([{"id": "30"}, {"id": "29"}], {"next_token": "p2"}),
+        "p2": ([{"id": "28"}], {}),
+    }
+    fake_fetch, _ = _fake_pages(pages)
+    monkeypatch.setattr(
+        tweet_monitor_batch, "fetch_tweets_from_twitter_api", fake_fetch
+    )
+
+    def run(**kwargs):
+        progress = {}
+        list(
+            tweet_monitor_batch.search_tweets_by_keyword(
+                "token", "kw", progress=progress, **kwargs
+            )
+        )
+        return progress["complete"]
+
+    assert run(max_pages=5) is True
+    assert run(max_pages=5, since_id="29") is True
+    # 最後のツイートでちょうど上限に達した場合は取り切れている
+    assert run(max_pages=5, max_tweets=3) is True
+    # ページ数・ツイート数の上限で打ち切った
+    assert run(max_pages=1) is False
+    assert run(max_pages=5, max_tweets=2) is False
+
+
+def test_truncated_search_advances_since_id_past_the_gap(monkeypatch):
+    from unittest.mock import MagicMock
+
+    def fake_search(credential_pool, keyword, since_id=None, **kwargs):
+        # 上限で打ち切られ、古いページは読んでいない
+        yield {"id": "20", "public_metrics": {"like_count": 50, "retweet_count": 0}}
+
+    monkeypatch.setattr(tweet_monitor_batch, "search_tweets_by_keyword", fake_search)
+    monkeypatch.setattr(
+        tweet_monitor_batch,
+        "save_notifications_for_tweets",
+        lambda tweets, slack_ch, repo, slack: len(tweets),
+    )
+    settings_repo = MagicMock()
+    setting = {"id": "s1", "keyword": "kw", "slack_ch": "C1", "since_id": "10"}
+    result = tweet_monitor_batch.process_setting_for_notification(
+        setting, "token", MagicMock(), MagicMock(), settings_repo=settings_repo
+    )
+    assert result["notified"] == 1
+    # 読めなかった範囲(10〜20)は取りこぼしとして飛ばし、読めた最新のIDまで進める
+    assert result["since_id"] == "20"
+    kwargs = settings_repo.update_last_executed_time_by_id.call_args.kwargs
+    assert kwargs["since_id"] == "20"
+
+
+def test_new_setting_on_busy_keyword_resumes_from_previous_newest_id(monkeypatch):
+    from unittest.mock import MagicMock
+
+    searched_since_ids = []
+
+    def fake_search(credential_pool, keyword, since_id=None, **kwargs):
+        searched_since_ids.append(since_id)
+        newest = 300 if since_id is None else 400
+        # 毎回上限で打ち切られる（古いページが残る）
+        for tweet_id in range(newest, newest - 10, -1):
+            yield {"id": str(tweet_id), "public_metrics": {"like_count": 0}}
+
+    monkeypatch.setattr(tweet_monitor_batch, "search_tweets_by_keyword", fake_search)
+    monkeypatch.setattr(
+        tweet_monitor_batch,
+        "save_notifications_for_tweets",
+        lambda tweets, slack_ch, repo, slack: len(tweets),
+    )
+    setting = {"id": "s1", "keyword": "kw", "slack_ch": "C1"}
+    for _ in range(2):
+        result = tweet_monitor_batch.process_setting_for_notification(
+            setting, "token", MagicMock(), MagicMock(), settings_repo=MagicMock()
+        )
+        setting["since_id"] = result["since_id"]
+    # 2回目は1回目に読めた最新のIDから検索する（7日間の遡りに戻らない）
+    assert searched_since_ids == [None, "300"]
+    assert setting["since_id"] == "400"
+
+
+def test_process_setting_for_notification_updates_since_id(monkeypatch):
+    from unittest.mock import MagicMock
+
+    def fake_search(credential_pool, keyword, since_id=None, **kwargs):
+        yield {"id": "12", "public_metrics": {"like_count": 1, "retweet_count": 0}}
+        yield {"id": "11", "public_metrics": {"like_count": 50, "retweet_count": 9}}
+        # 検索対象を最後まで取得できた
+        kwargs["progress"]["complete"] = True
+
+    monkeypatch.setattr(tweet_monitor_batch, "search_tweets_by_keyword", fake_search)
+
+    notifications_repo = MagicMock()
+    notifications_repo.exists_many.return_value = set()
+    notifications_repo.put_if_not_exists.return_value = True
+    settings_repo = MagicMock()
+    slack = MagicMock()
+
+    setting = {"id": "s1", "keyword": "kw", "slack_ch": "C1", "like_threshold": 10}
+    setting["since_id"] = "10"
+    result = tweet_monitor_batch.process_setting_for_notification(
+        setting, "token", notifications_repo, slack, settings_repo=settings_repo
+    )
+    executed_time = result.pop("lastExecutedTime")
+    assert result.pop("next_due_at")
+    # 閾値を通過したツイートがあったため、ポーリング間隔は初期値から縮む
+    assert result.pop("poll_stats")["interval"] == 10
+    assert result == {
+        "id": "s1",
+        "fetched": 2,
+        "matched": 1,
+        "notified": 1,
+        "watched": 0,
+        "since_id": "12",
+    }
+    args, kwargs = settings_repo.update_last_executed_time_by_id.call_args
+    assert args[0] == "s1"
+    assert args[1] == executed_time
+    assert kwargs["since_id"] == "12"
+
+
+def test_save_notifications_for_tweets_dedups_in_one_call():
+    from unittest.mock import MagicMock
+
+    notifications_repo = MagicMock()
+    # 1は既に通知済み、3は別プロセスが先に登録した（条件付きputで弾かれる）
+    notifications_repo.get_states_many.return_value = {
+        ("1", "C1"): {"tweet_uid": "1", "slack_ch": "C1", "notified_at": "2024"}
+    }
+    notifications_repo.put_if_not_exists.side_effect = (
+        lambda tweet_uid, **kwargs: tweet_uid != "3"
+    )
+    slack = MagicMock()
+
+    tweets = [MockTweet("1", 10, 1), MockTweet("2", 20, 2), MockTweet("3", 30, 3)]
+    saved = tweet_monitor_batch.save_notifications_for_tweets(
+        tweets,
+        "C1",
+        notifications_repo,
+        slack,
+        delivery_mode=tweet_monitor_batch.DELIVERY_MODE_INLINE,
+    )
+    assert saved == 1
+    notifications_repo.get_states_many.assert_called_once_with(
+        [("1", "C1"), ("2", "C1"), ("3", "C1")]
+    )
+    notifications_repo.exists.assert_not_called()
+    notifications_repo.claim_for_notification.assert_not_called()
+    assert notifications_repo.put_if_not_exists.call_count == 2
+    slack.send_message.assert_called_once()
+    assert slack.send_message.call_args[0][0] == "C1"
+    # inlineモードでは登録時に送信権を取得し、送信後に通知済みにする
+    for call in notifications_repo.put_if_not_exists.call_args_list:
+        assert call.kwargs["notify_claimed_at"] is not None
+    notifications_repo.mark_notified.assert_called_once()
+    assert notifications_repo.mark_notified.call_args[0][:2] == ("2", "C1")
+
+
+def test_inline_reclaims_rows_left_with_stale_claim(monkeypatch):
+    from unittest.mock import MagicMock
+
+    now = 1_700_000_000
+    monkeypatch.setattr(tweet_monitor_batch.time, "time", lambda: now)
+    timeout = tweet_monitor_batch.NotificationsRepository.NOTIFY_CLAIM_TIMEOUT
+    notifications_repo = MagicMock()
+    # 1は送信中に落ちた実行の印が古いまま残り、2は別の実行が送信中
+    notifications_repo.get_states_many.return_value = {
+        ("1", "C1"): {"notify_claimed_at": now - timeout - 1},
+        ("2", "C1"): {"notify_claimed_at": now - 10},
+    }
+    notifications_repo.claim_for_notification.return_value = True
+    slack = MagicMock()
+    slack.send_message.return_value = "ts-1"
+
+    saved = tweet_monitor_batch.save_notifications_for_tweets(
+        [MockTweet("1", 10, 1), MockTweet("2", 20, 2)],
+        "C1",
+        notifications_repo,
+        slack,
+        delivery_mode=tweet_monitor_batch.DELIVERY_MODE_INLINE,
+    )
+
+    # 新規に登録した行はない
+    assert saved == 0
+    notifications_repo.put_if_not_exists.assert_not_called()
+    notifications_repo.claim_for_notification.assert_called_once_with(
+        "1", "C1", now=now
+    )
+    slack.send_message.assert_called_once()
+    assert notifications_repo.mark_notified.call_args[0][:3] == ("1", "C1", "ts-1")
+
+
+def test_inline_send_failure_releases_claim():
+    from unittest.mock import MagicMock
+
+    notifications_repo = MagicMock()
+    notifications_repo.get_states_many.return_value = {}
+    notifications_repo.put_if_not_exists.return_value = True
+    slack = MagicMock()
+    slack.send_message.side_effect = [Exception("rate_limited"), "ts-2"]
+
+    tweets = [MockTweet("1", 10, 1), MockTweet("2", 20, 2)]
+    saved = tweet_monitor_batch.save_notifications_for_tweets(
+        tweets,
+        "C1",
+        notifications_repo,
+        slack,
+        delivery_mode=tweet_monitor_batch.DELIVERY_MODE_INLINE,
+    )
+
+    assert saved == 2
+    # 送信に失敗した行は送信中の印を外し、ストリームから送信し直させる
+    notifications_repo.release_claim.assert_called_once_with("1", "C1")
+    notifications_repo.mark_notified.assert_called_once()
+    assert notifications_repo.mark_notified.call_args[0][:3] == ("2", "C1", "ts-2")
+
+    # 送信後に通知済みの記録だけ失敗した場合は、再送を防ぐため印を外さない
+    notifications_repo.reset_mock()
+    slack.send_message.side_effect = None
+    slack.send_message.return_value = "ts-3"
+    notifications_repo.mark_notified.side_effect = Exception("throttled")
+    tweet_monitor_batch.save_notifications_for_tweets(
+        [MockTweet("3", 30, 3)],
+        "C1",
+        notifications_repo,
+        slack,
+        delivery_mode=tweet_monitor_batch.DELIVERY_MODE_INLINE,
+    )
+    notifications_repo.release_claim.assert_not_called()
+
+
+def test_save_notifications_for_tweets_outbox_only_writes_rows(monkeypatch):
+    from unittest.mock import MagicMock
+
+    monkeypatch.delenv("DELIVERY_MODE", raising=False)
+    notifications_repo = MagicMock()
+    notifications_repo.exists_many.return_value = set()
+    notifications_repo.put_if_not_exists.return_value = True
+    slack = MagicMock()
+
+    tweets = [MockTweet("1", 10, 1), MockTweet("2", 20, 2)]
+    saved = tweet_monitor_batch.save_notifications_for_tweets(
+        tweets, "C1", notifications_repo, slack
+    )
+    assert saved == 2
+    # 送信はストリームだけが行うため、バッチは送信せず送信権も取得しない
+    slack.send_message.assert_not_called()
+    notifications_repo.mark_notified.assert_not_called()
+    for call in notifications_repo.put_if_not_exists.call_args_list:
+        assert "notify_claimed_at" not in call.kwargs
+
+
+def test_get_delivery_mode(monkeypatch):
+    monkeypatch.delenv("DELIVERY_MODE", raising=False)
+    assert tweet_monitor_batch.get_delivery_mode() == "outbox"
+    monkeypatch.setenv("DELIVERY_MODE", "Inline")
+    assert tweet_monitor_batch.get_delivery_mode() == "inline"
+    monkeypatch.setenv("DELIVERY_MODE", "both")
+    assert tweet_monitor_batch.get_delivery_mode() == "outbox"
+
+
+def test_process_pack_for_notification_searches_once_and_demultiplexes(monkeypatch):
+    from unittest.mock import MagicMock
+    from lambda_functions.event_bridge.query_planner import plan_query_packs
+
+    queries = []
+
+    def fake_search(credential_pool, keyword, since_id=None, **kwargs):
+        queries.append(keyword)
+        yield {"id": "3", "text": "python", "public_metrics": {"like_count": 5}}
+        yield {"id": "2", "text": "aws", "public_metrics": {"like_count": 50}}
+        yield {"id": "1", "text": "python aws", "public_metrics": {"like_count": 1}}
+        # 検索対象を最後まで取得できた
+        kwargs["progress"]["complete"] = True
+
+    monkeypatch.setattr(tweet_monitor_batch, "search_tweets_by_keyword", fake_search)
+    monkeypatch.setattr(
+        tweet_monitor_batch,
+        "save_notifications_for_tweets",
+        lambda tweets, slack_ch, repo, slack: len(tweets),
+    )
+    settings = [
+        {"id": "p", "keyword": "python", "slack_ch": "C1"},
+        {"id": "a", "keyword": "aws", "slack_ch": "C2", "like_threshold": 10},
+    ]
+    (pack,) = plan_query_packs(settings, max_query_length=100)
+    settings_repo = MagicMock()
+    result = tweet_monitor_batch.process_pack_for_notification(
+        pack, "pool", MagicMock(), MagicMock(), settings_repo=settings_repo
+    )
+    assert queries == ["(python) OR (aws)"]
+    poll_stats = {}
+    for setting_result in result["settings"]:
+        assert setting_result.pop("lastExecutedTime")
+        assert setting_result.pop("next_due_at")
+        poll_stats[setting_result["id"]] = setting_result.pop("poll_stats")
+    # 閾値フィルタ前の一致件数と閾値通過件数が設定ごとに記録される
+    assert (poll_stats["p"]["last_returned"], poll_stats["p"]["last_matched"]) == (2, 2)
+    assert (poll_stats["a"]["last_returned"], poll_stats["a"]["last_matched"]) == (2, 1)
+    assert result == {
+        "fetched": 3,
+        "settings": [
+            {"id": "p", "matched": 2, "notified": 2, "watched": 0, "since_id": "3"},
+            {"id": "a", "matched": 1, "notified": 1, "watched": 0, "since_id": "3"},
+        ],
+    }
+    # 両方の設定のsince_idがパックの最新IDに進む
+    for call in settings_repo.update_last_executed_time_by_id.call_args_list:
+        assert call.kwargs["since_id"] == "3"
+
+
+def test_truncated_pack_searches_quiet_keyword_alone(monkeypatch):
+    from unittest.mock import MagicMock
+    from lambda_functions.event_bridge.query_planner import plan_query_packs
+
+    # 多いキーワード(hot)のツイート1000件と、それより古い少ないキーワード(quiet)のツイート1件
+    timeline = [{"id": str(1000 + i), "text": "hot"} for i in range(1000, 0, -1)]
+    timeline.append({"id": "500", "text": "quiet"})
+    queries = []
+
+    def fake_search(credential_pool, keyword, since_id=None, **kwargs):
+        queries.append(keyword)
+        words = [word for word in ("hot", "quiet") if word in keyword]
+        hits = [
+            tweet
+            for tweet in timeline
+            if tweet["text"] in words and int(tweet["id"]) > int(since_id or 0)
+        ]
+        yield from hits[: kwargs["max_tweets"]]
+        kwargs["progress"]["complete"] = len(hits) <= kwargs["max_tweets"]
+
+    monkeypatch.setattr(tweet_monitor_batch, "search_tweets_by_keyword", fake_search)
+    notified = {}
+
+    def fake_save(tweets, slack_ch, repo, slack):
+        notified.setdefault(slack_ch, []).extend(tweet["id"] for tweet in tweets)
+        return len(tweets)
+
+    monkeypatch.setattr(tweet_monitor_batch, "save_notifications_for_tweets", fake_save)
+    monkeypatch.delenv("SEARCH_MAX_PAGES", raising=False)
+    monkeypatch.delenv("SEARCH_MAX_TWEETS", raising=False)
+    settings = [
+        {"id": "h", "keyword": "hot", "slack_ch": "C1", "since_id": "100"},
+        {"id": "q", "keyword": "quiet", "slack_ch": "C2", "since_id": "100"},
+    ]
+    (pack,) = plan_query_packs(settings, max_query_length=100)
+    result = tweet_monitor_batch.process_pack_for_notification(
+        pack, "pool", MagicMock(), MagicMock(), settings_repo=MagicMock()
+    )
+    # パックの上限がhotで埋まったため、quietだけ単独で検索し直す
+    assert queries == ["(hot) OR (quiet)", "quiet"]
+    assert notified["C2"] == ["500"]
+    since_ids = {item["id"]: item["since_id"] for item in result["settings"]}
+    # quietは最後まで取得できたので進め、hotは読めなかった古い範囲を飛ばして読めた最新のIDまで進める
+    assert since_ids == {"h": "2000", "q": "500"}
+
+
+def test_truncated_pack_advances_settings_whose_range_was_read(monkeypatch):
+    from unittest.mock import MagicMock
+    from lambda_functions.event_bridge.query_planner import plan_query_packs
+
+    def fake_search(credential_pool, keyword, since_id=None, **kwargs):
+        yield {"id": "30", "text": "python"}
+        yield {"id": "20", "text": "aws"}
+        # 上限で打ち切られた
+
+    monkeypatch.setattr(tweet_monitor_batch, "search_tweets_by_keyword", fake_search)
+    monkeypatch.setattr(
+        tweet_monitor_batch,
+        "save_notifications_for_tweets",
+        lambda tweets, slack_ch, repo, slack: len(tweets),
+    )
+    settings = [
+        {"id": "p", "keyword": "python", "slack_ch": "C1", "since_id": "25"},
+        {"id": "a", "keyword": "aws", "slack_ch": "C2", "since_id": "10"},
+    ]
+    (pack,) = plan_query_packs(settings, max_query_length=100)
+    result = tweet_monitor_batch.process_pack_for_notification(
+        pack, "pool", MagicMock(), MagicMock(), settings_repo=MagicMock()
+    )
+    since_ids = {item["id"]: item["since_id"] for item in result["settings"]}
+    # pythonのsince_id(25)より新しい範囲は読めている。
+    # awsは単独の検索でも打ち切られたため、読めなかった範囲を飛ばして読めた最新のIDまで進める
+    assert since_ids == {"p": "30", "a": "30"}
+
+
+def test_save_notifications_for_tweets_collects_digest_instead_of_sending():
+    from unittest.mock import MagicMock
+    from lambda_functions.event_bridge.digest_collector import DigestCollector
+
+    notifications_repo = MagicMock()
+    notifications_repo.get_states_many.return_value = {}
+    notifications_repo.put_if_not_exists.return_value = True
+    slack = MagicMock()
+    digest = DigestCollector()
+
+    tweets = [MockTweet("1", 10, 1), MockTweet("2", 20, 2)]
+    saved = tweet_monitor_batch.save_notifications_for_tweets(
+        tweets,
+        "C1",
+        notifications_repo,
+        slack,
+        digest=digest,
+        digest_max=5,
+        delivery_mode=tweet_monitor_batch.DELIVERY_MODE_INLINE,
+    )
+    assert saved == 2
+    slack.send_message.assert_not_called()
+    # ストリームが送信しないよう送信権を取得し、ダイジェストの印を付けて保存する
+    for call in notifications_repo.put_if_not_exists.call_args_list:
+        assert call.kwargs["digest"] is True
+        assert call.kwargs["digest_max"] == 5
+        assert call.kwargs["notify_claimed_at"] is not None
+    assert [item["tweet_uid"] for item in digest.channels["C1"]["items"]] == [
+        "1",
+        "2",
+    ]
+    assert digest.channels["C1"]["digest_max"] == 5
+
+
+def test_run_sharded_fans_out_and_aggregates(monkeypatch):
+    from lambda_functions.event_bridge import shard_scheduler
+
+    monkeypatch.setenv("SHARD_MAX_COST", "2")
+    monkeypatch.setenv("X_QUERY_MAX_LENGTH", "0")
+    monkeypatch.delenv("SHARD_EXECUTOR", raising=False)
+    payloads = []
+
+    def fake_run_shard(payload, credential_pool=None, deadline=None):
+        payloads.append(payload)
+        if payload["shard_id"] == 2:
+            raise Exception("shard failed")
+        count = len(payload["settings"])
+        return {"total": count, "succeeded": count, "errors": []}
+
+    monkeypatch.setattr(tweet_monitor_batch, "run_shard", fake_run_shard)
+    settings = [{"id": f"s{i}", "keyword": f"kw{i}", "since_id": "1"} for i in range(6)]
+    summary = tweet_monitor_batch.run_sharded(settings, "pool")
+
+    assert summary["shards"] == 3
+    assert summary["total"] == 4
+    assert summary["shard_errors"] == [{"shard_id": 2, "error": "shard failed"}]
+    assert sorted(s["id"] for p in payloads for s in p["settings"]) == [
+        f"s{i}" for i in range(6)
+    ]
+
+
+def test_lambda_handler_runs_single_shard_from_event(monkeypatch):
+    received = []
+
+    def fake_run_shard(payload, credential_pool=None, deadline=None):
+        received.append(payload)
+        return {"total": len(payload["settings"])}
+
+    monkeypatch.setattr(tweet_monitor_batch, "run_shard", fake_run_shard)
+    event = {"shard": {"shard_id": 1, "settings": [{"id": "a"}]}}
+    result = tweet_monitor_batch.lambda_handler(event, None)
+    assert result == {
+        "statusCode": 200,
+        "body": "Shard executed.",
+        "summary": {"total": 1},
+    }
+    assert received == [event["shard"]]
+
+
+def test_shard_uses_the_earlier_of_dispatcher_and_own_deadline(monkeypatch):
+    from unittest.mock import MagicMock
+    from integration import slack_dispatcher
+
+    deadlines = []
+
+    def fake_run_shard(payload, credential_pool=None, deadline=None):
+        deadlines.append(deadline)
+        return {"total": 0}
+
+    monkeypatch.setattr(tweet_monitor_batch, "run_shard", fake_run_shard)
+    monkeypatch.setattr(slack_dispatcher.time, "time", lambda: 1000.0)
+    context = MagicMock()
+    context.get_remaining_time_in_millis.return_value = 60_000
+    own = 1000.0 + 60 - slack_dispatcher.DEFAULT_DEADLINE_MARGIN
+    for dispatcher_deadline, expected in [(1010.0, 1010.0), (2000.0, own)]:
+        event = {
+            "shard": {"shard_id": 1, "settings": [], "deadline": dispatcher_deadline}
+        }
+        tweet_monitor_batch.lambda_handler(event, context)
+        assert deadlines[-1] == expected
+    # 呼び出し元の期限が無い（非同期で呼び出された）場合は自身の残り時間を使う
+    tweet_monitor_batch.lambda_handler(
+        {"shard": {"shard_id": 1, "settings": []}}, context
+    )
+    assert deadlines[-1] == own
+
+
+def test_lambda_executor_dispatches_shards_without_waiting(monkeypatch):
+    from unittest.mock import MagicMock
+
+    monkeypatch.setenv("SHARD_MAX_COST", "1")
+    monkeypatch.setenv("X_QUERY_MAX_LENGTH", "0")
+    monkeypatch.setenv("SHARD_EXECUTOR", "lambda")
+    monkeypatch.setenv("WATCHLIST_MAX_AGE_HOURS", "0")
+    client = MagicMock()
+    client.invoke.return_value = {"StatusCode": 202}
+    monkeypatch.setattr(
+        "lambda_functions.event_bridge.shard_scheduler.get_client",
+        lambda *args, **kwargs: client,
+    )
+    settings = [{"id": f"s{i}", "keyword": f"kw{i}", "since_id": "1"} for i in range(2)]
+    repo = MagicMock()
+    monkeypatch.setattr(tweet_monitor_batch, "get_credential_pool", lambda: "pool")
+    monkeypatch.setattr(tweet_monitor_batch, "get_valid_settings", lambda: settings)
+    monkeypatch.setattr(
+        tweet_monitor_batch, "select_due_settings", lambda s, limit: (s, 0, 0)
+    )
+    monkeypatch.setattr(tweet_monitor_batch, "get_repository", lambda cls: repo)
+    context = MagicMock(invoked_function_arn="arn:fn")
+    context.get_remaining_time_in_millis.return_value = 30_000
+
+    result = tweet_monitor_batch.lambda_handler({}, context)
+
+    summary = result["summary"]
+    assert summary["shards"] == 2
+    assert summary["dispatched"] == [0, 1]
+    assert client.invoke.call_count == 2
+
+
+def snowflake_id(dt):
+    ms = int(dt.timestamp() * 1000) - tweet_monitor_batch.TWITTER_SNOWFLAKE_EPOCH_MS
+    return str(ms << 22)
+
+
+def test_tweets_below_threshold_are_added_to_watchlist(monkeypatch):
+    from unittest.mock import MagicMock
+    from datetime import datetime, timedelta, timezone
+    from lambda_functions.event_bridge.query_planner import QueryPack
+
+    monkeypatch.delenv("WATCHLIST_MAX_AGE_HOURS", raising=False)
+    now = datetime.now(timezone.utc)
+    fresh = snowflake_id(now - timedelta(minutes=30))
+    old = snowflake_id(now - timedelta(hours=12))
+    hot = snowflake_id(now - timedelta(minutes=10))
+
+    def fake_search(credential_pool, keyword, since_id=None, **kwargs):
+        yield {"id": hot, "public_metrics": {"like_count": 100}}
+        yield {"id": fresh, "public_metrics": {"like_count": 5}}
+        yield {"id": old, "public_metrics": {"like_count": 5}}
+        # 検索対象を最後まで取得できた
+        kwargs["progress"]["complete"] = True
+
+    monkeypatch.setattr(tweet_monitor_batch, "search_tweets_by_keyword", fake_search)
+    monkeypatch.setattr(
+        tweet_monitor_batch,
+        "save_notifications_for_tweets",
+        lambda tweets, slack_ch, repo, slack: len(tweets),
+    )
+    watchlist_repo = MagicMock()
+    pack = QueryPack([{"id": "s1", "keyword": "kw", "like_threshold": 50}], "kw")
+    result = tweet_monitor_batch.process_pack_for_notification(
+        pack,
+        "pool",
+        MagicMock(),
+        MagicMock(),
+        MagicMock(),
+        watchlist_repo=watchlist_repo,
+    )
+    # 閾値未満かつ再確認の期間内のツイートだけが候補になる
+    (candidates,), _ = watchlist_repo.put_many.call_args
+    assert [(uid, sid) for uid, sid, _ in candidates] == [(fresh, "s1")]
+    assert candidates[0][2] > now.timestamp()
+    assert result["settings"][0]["watched"] == 1
+
+
+def test_recheck_watchlist_promotes_tweets_past_threshold(monkeypatch):
+    from unittest.mock import MagicMock
+
+    watchlist_repo = MagicMock()
+    watchlist_repo.next_batch.return_value = [
+        {"tweet_uid": "1", "setting_id": "s1"},
+        {"tweet_uid": "2", "setting_id": "s1"},
+        {"tweet_uid": "3", "setting_id": "gone"},
+    ]
+    lookups = []
+
+    def fake_lookup(pool, ids, deadline=None, progress=None):
+        lookups.append(ids)
+        progress["processed_ids"] = list(ids)
+        return {"1": {"like_count": 80}, "2": {"like_count": 10}}
+
+    saved = []
+
+    def fake_save(tweets, slack_ch, repo, slack, digest=None, **kwargs):
+        saved.append((slack_ch, [t["id"] for t in tweets], digest))
+        return len(tweets)
+
+    monkeypatch.setattr(tweet_monitor_batch, "lookup_public_metrics", fake_lookup)
+    monkeypatch.setattr(tweet_monitor_batch, "save_notifications_for_tweets", fake_save)
+    settings = [{"id": "s1", "slack_ch": "C1", "like_threshold": 50}]
+    summary = tweet_monitor_batch.recheck_watchlist(
+        "pool", settings, MagicMock(), watchlist_repo, MagicMock()
+    )
+    # 無効になった設定の候補は問い合わせない
+    assert lookups == [["1", "2"]]
+    assert saved == [("C1", ["1"], None)]
+    watchlist_repo.delete_many.assert_called_once_with([("3", "gone"), ("1", "s1")])
+    assert summary["promoted"] == 1
+    assert summary["notified"] == 1
+    assert summary["candidates"] == 3
+    # 次回は今回最後に読んだ候補の次から再確認する
+    watchlist_repo.save_cursor.assert_called_once_with(
+        {"tweet_uid": "3", "setting_id": "gone"}
+    )
+
+
+def test_recheck_watchlist_cursor_stops_at_last_looked_up_candidate(monkeypatch):
+    from unittest.mock import MagicMock
+
+    watchlist_repo = MagicMock()
+    watchlist_repo.next_batch.return_value = [
+        {"tweet_uid": "1", "setting_id": "s1"},
+        {"tweet_uid": "2", "setting_id": "gone"},
+        {"tweet_uid": "3", "setting_id": "s1"},
+        {"tweet_uid": "4", "setting_id": "s1"},
+    ]
+    deadlines = []
+
+    def fake_lookup(pool, ids, deadline=None, progress=None):
+        deadlines.append(deadline)
+        # 期限で打ち切り、先頭の1件だけ問い合わせた
+        progress["processed_ids"] = ids[:1]
+        return {}
+
+    monkeypatch.setattr(tweet_monitor_batch, "lookup_public_metrics", fake_lookup)
+    settings = [{"id": "s1", "slack_ch": "C1", "like_threshold": 50}]
+    tweet_monitor_batch.recheck_watchlist(
+        "pool", settings, MagicMock(), watchlist_repo, deadline=123.0
+    )
+    assert deadlines == [123.0]
+    # 問い合わせなかった候補3・4は次回の実行で読み直す
+    # （無効な設定の候補2は問い合わせずに消すため、その後までは進める）
+    watchlist_repo.save_cursor.assert_called_once_with(
+        {"tweet_uid": "2", "setting_id": "gone"}
+    )
+
+    # 1件も問い合わせられなかった場合はカーソルを動かさない
+    watchlist_repo.save_cursor.reset_mock()
+    watchlist_repo.next_batch.return_value = [
+        {"tweet_uid": "3", "setting_id": "s1"},
+        {"tweet_uid": "4", "setting_id": "s1"},
+    ]
+
+    def exhausted_lookup(pool, ids, deadline=None, progress=None):
+        progress["processed_ids"] = []
+        return {}
+
+    monkeypatch.setattr(tweet_monitor_batch, "lookup_public_metrics", exhausted_lookup)
+    tweet_monitor_batch.recheck_watchlist("pool", settings, MagicMock(), watchlist_repo)
+    watchlist_repo.save_cursor.assert_not_called()
@@ -0,0 +1,78 @@
+import io
+import json
+from observability.logger import StructuredLogger, get_logger, truncate
+
+
+def _records(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_info_writes_one_json_line_with_fields(monkeypatch):
+    monkeypatch.setenv("LOG_LEVEL", "INFO")
+    stream = io.StringIO()
+    logger = StructuredLogger("BatchWatcher", stream=stream)
+    logger.info("検索結果: %s件", 3, query="python")
+    (record,) = _records(stream)
+    assert record["level"] == "INFO"
+    assert record["logger"] == "BatchWatcher"
+    assert record["message"] == "検索結果: 3件"
+    assert record["query"] == "python"
+    assert "timestamp" in record
+
+
+def test_disabled_level_does_not_format_or_call_fields(monkeypatch):
+    monkeypatch.setenv("LOG_LEVEL", "INFO")
+    stream = io.StringIO()
+    logger = StructuredLogger("BatchWatcher", stream=stream)
+    calls = []
+
+    class Arg:
+        def __str__(self):
+            calls.append("str")
+            return "arg"
+
+    logger.debug("ツイート: %s", Arg(), detail=lambda: calls.append("field"))
+    assert stream.getvalue() == ""
+    assert calls == []
+
+    monkeypatch.setenv("LOG_LEVEL", "DEBUG")
+    logger.debug("ツイート: %s", Arg(), detail=lambda: "evaluated")
+    (record,) = _records(stream)
+    assert record["message"] == "ツイート: arg"
+    assert record["detail"] == "evaluated"
+
+
+def test_truncate_limits_strings_lists_and_dicts():
+    assert truncate("a" * 20, max_length=5, max_items=3) == "aaaaa...(+15)"
+    assert truncate(list(range(5)), max_length=5, max_items=3) == [0, 1, 2, "...(+2)"]
+    nested = truncate({"body": "b" * 10, "ids": [1, 2, 3, 4]}, 4, 2)
+    assert nested == {"body": "bbbb...(+6)", "ids": [1, 2, "...(+2)"]}
+    assert truncate({"a": object()}, 100, 10)["a"].startswith("<object object")
+
+
+def test_sampled_logs_are_dropped_or_kept_by_rate(monkeypatch):
+    monkeypatch.setenv("LOG_LEVEL", "INFO")
+    stream = io.StringIO()
+    logger = StructuredLogger("BatchWatcher", stream=stream)
+    logger.info("dropped", sample=0)
+    logger.info("kept", sample=1)
+    (record,) = _records(stream)
+    assert record["message"] == "kept"
+    assert record["sample_rate"] == 1
+
+
+def test_error_with_exc_info_includes_traceback():
+    stream = io.StringIO()
+    logger = StructuredLogger("SettingApi", stream=stream)
+    try:
+        raise ValueError("boom")
+    except ValueError as e:
+        logger.error("エラーが発生しました: %s", e, exc_info=True)
+    (record,) = _records(stream)
+    assert record["level"] == "ERROR"
+    assert record["error"] == "ValueError('boom')"
+    assert "Traceback" in record["traceback"]
+
+
+def test_get_logger_returns_same_instance():
+    assert get_logger("BatchWatcher") is get_logger("BatchWatcher")
@@ -0,0 +1,82 @@
+import json
+import threading
+from observability import metrics as metrics_module
+from observability.metrics import EMF_MAX_VALUES, MemorySink, Metrics, StdoutSink
+
+
+def test_flush_emits_emf_record_and_resets():
+    sink = MemorySink()
+    metrics = Metrics(namespace="Test", sink=sink)
+    metrics.count("tweets_fetched", 3)
+    metrics.count("tweets_fetched", 2)
+    with metrics.span("slack_post"):
+        pass
+    (record,) = metrics.flush(function="BatchWatcher")
+
+    assert sink.records == [record]
+    assert record["function"] == "BatchWatcher"
+    assert record["tweets_fetched"] == 5
+    assert len(record["slack_post"]) == 1
+    (definition,) = record["_aws"]["CloudWatchMetrics"]
+    assert definition["Namespace"] == "Test"
+    assert definition["Dimensions"] == [["function"]]
+    assert {"Name": "tweets_fetched", "Unit": "Count"} in definition["Metrics"]
+    assert {"Name": "slack_post", "Unit": "Milliseconds"} in definition["Metrics"]
+    # 出力した分は破棄され、空の状態では何も出力しない
+    assert metrics.flush(function="BatchWatcher") == []
+
+
+def test_span_records_even_when_exception_is_raised():
+    metrics = Metrics(sink=MemorySink())
+    try:
+        with metrics.span("x_search_request"):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+    counts, timings = metrics.snapshot()
+    assert counts == {}
+    assert len(timings["x_search_request"]) == 1
+
+
+def test_timings_are_split_into_records_of_100_values():
+    sink = MemorySink()
+    metrics = Metrics(sink=sink)
+    metrics.count("tweets_delivered", 7)
+    for i in range(EMF_MAX_VALUES + 20):
+        metrics.record_time("slack_post", i)
+    records = metrics.flush()
+    assert [len(record["slack_post"]) for record in records] == [100, 20]
+    # カウンタは最初のレコードにだけ載せる
+    assert [record.get("tweets_delivered") for record in records] == [7, None]
+    assert len(sink.values("slack_post")) == EMF_MAX_VALUES + 20
+
+
+def test_counts_from_multiple_threads():
+    metrics = Metrics(sink=MemorySink())
+
+    def work():
+        for _ in range(1000):
+            metrics.count("tweets_fetched")
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert metrics.snapshot()[0] == {"tweets_fetched": 4000}
+
+
+def test_stdout_sink_writes_one_json_line(capsys):
+    StdoutSink().emit({"a": 1, "b": "テスト"})
+    assert json.loads(capsys.readouterr().out) == {"a": 1, "b": "テスト"}
+
+
+def test_module_level_metrics_use_pluggable_sink():
+    sink = MemorySink()
+    previous = metrics_module.set_sink(sink)
+    try:
+        metrics_module.count("stream_records", 2)
+        metrics_module.flush(function="NotifySlack")
+    finally:
+        metrics_module.set_sink(previous)
+    assert sink.values("stream_records") == [2]
@@ -30,3 +30,208 @@ def test_exists_and_put():
                 "slack_message_ts": "2025-01-01T00:00:00Z",
             }
         )
+
+
+def test_exists_many_chunks_and_retries_unprocessed_keys():
+    with patch("boto3.resource") as mock_resource, patch("time.sleep"):
+        mock_dynamodb = mock_resource.return_value
+        repo = NotificationsRepository(table_name="TestTable")
+        keys = [(str(i), "ch") for i in range(150)]
+
+        def batch_get_item(RequestItems):
+            request_keys = RequestItems["TestTable"]["Keys"]
+            # 1回目の先頭チャンクだけ最後の1件を未処理として返す
+            if len(request_keys) == 100:
+                return {
+                    "Responses": {"TestTable": [request_keys[0]]},
+                    "UnprocessedKeys": {"TestTable": {"Keys": request_keys[-1:]}},
+                }
+            return {"Responses": {"TestTable": request_keys[:1]}}
+
+        mock_dynamodb.batch_get_item.side_effect = batch_get_item
+        found = repo.exists_many(keys + keys[:5])
+        # 100件 + 未処理1件の再試行 + 残り50件
+        sizes = [
+            len(c.kwargs["RequestItems"]["TestTable"]["Keys"])
+            for c in mock_dynamodb.batch_get_item.call_args_list
+        ]
+        assert sizes == [100, 1, 50]
+        assert found == {("0", "ch"), ("99", "ch"), ("100", "ch")}
+
+
+def test_get_states_many_returns_delivery_state_by_key():
+    with patch("boto3.resource") as mock_resource:
+        mock_dynamodb = mock_resource.return_value
+        repo = NotificationsRepository(table_name="TestTable")
+        row = {"tweet_uid": "1", "slack_ch": "ch", "notify_claimed_at": 100}
+        mock_dynamodb.batch_get_item.return_value = {"Responses": {"TestTable": [row]}}
+
+        states = repo.get_states_many([("1", "ch"), ("2", "ch")])
+
+        assert states == {("1", "ch"): row}
+        projection = mock_dynamodb.batch_get_item.call_args.kwargs["RequestItems"][
+            "TestTable"
+        ]["ProjectionExpression"]
+        assert "notify_claimed_at" in projection
+        assert "notified_at" in projection
+
+
+def test_put_if_not_exists():
+    from botocore.exceptions import ClientError
+
+    with patch("boto3.resource") as mock_resource:
+        mock_table = MagicMock()
+        mock_resource.return_value.Table.return_value = mock_table
+        repo = NotificationsRepository(table_name="TestTable")
+
+        assert repo.put_if_not_exists("1", "url", "ch", 1, 2) is True
+        mock_table.put_item.assert_called_with(
+            Item={
+                "tweet_uid": "1",
+                "tweet_url": "url",
+                "slack_ch": "ch",
+                "like_count": 1,
+                "retweet_count": 2,
+            },
+            ConditionExpression="attribute_not_exists(tweet_uid)",
+        )
+
+        # ダイジェスト行・登録時の送信権取得
+        repo.put_if_not_exists(
+            "1", "url", "ch", 1, 2, digest=True, digest_max=5, notify_claimed_at=100
+        )
+        item = mock_table.put_item.call_args.kwargs["Item"]
+        assert item["digest"] is True
+        assert item["digest_max"] == 5
+        assert item["notify_claimed_at"] == 100
+
+        mock_table.put_item.side_effect = ClientError(
+            {"Error": {"Code": "ConditionalCheckFailedException"}}, "PutItem"
+        )
+        assert repo.put_if_not_exists("1", "url", "ch", 1, 2) is False
+
+
+def test_claim_for_notification():
+    from botocore.exceptions import ClientError
+
+    with patch("boto3.resource") as mock_resource:
+        mock_table = MagicMock()
+        mock_resource.return_value.Table.return_value = mock_table
+        repo = NotificationsRepository(table_name="TestTable")
+
+        assert repo.claim_for_notification("1", "ch", now=1000) is True
+        kwargs = mock_table.update_item.call_args.kwargs
+        assert kwargs["Key"] == {"tweet_uid": "1", "slack_ch": "ch"}
+        assert kwargs["ExpressionAttributeValues"] == {
+            ":now": 1000,
+            ":stale": 1000 - NotificationsRepository.NOTIFY_CLAIM_TIMEOUT,
+        }
+
+        mock_table.update_item.side_effect = ClientError(
+            {"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem"
+        )
+        assert repo.claim_for_notification("1", "ch") is False
+
+
+def test_is_pending_reads_consistently():
+    with patch("boto3.resource") as mock_resource:
+        mock_table = MagicMock()
+        mock_resource.return_value.Table.return_value = mock_table
+        repo = NotificationsRepository(table_name="TestTable")
+
+        mock_table.get_item.return_value = {"Item": {"tweet_uid": "1"}}
+        assert repo.is_pending("1", "ch") is True
+        assert mock_table.get_item.call_args.kwargs["ConsistentRead"] is True
+        mock_table.get_item.return_value = {
+            "Item": {"tweet_uid": "1", "notified_at": "2025-01-01T00:00:00Z"}
+        }
+        assert repo.is_pending("1", "ch") is False
+        mock_table.get_item.return_value = {}
+        assert repo.is_pending("1", "ch") is False
+        # 送信を断念した行は送信待ちではない
+        mock_table.get_item.return_value = {
+            "Item": {"tweet_uid": "1", "notify_failed_at": "2025-01-01T00:00:00Z"}
+        }
+        assert repo.is_pending("1", "ch") is False
+
+
+def test_mark_failed_blocks_later_claims():
+    with patch("boto3.resource") as mock_resource:
+        mock_table = MagicMock()
+        mock_resource.return_value.Table.return_value = mock_table
+        repo = NotificationsRepository(table_name="TestTable")
+
+        repo.mark_failed("1", "ch", "channel_not_found", "2025-01-01T00:00:00Z")
+        kwargs = mock_table.update_item.call_args.kwargs
+        assert "REMOVE notify_claimed_at" in kwargs["UpdateExpression"]
+        assert kwargs["ExpressionAttributeValues"][":e"] == "channel_not_found"
+        repo.claim_for_notification("1", "ch")
+        assert (
+            "attribute_not_exists(notify_failed_at)"
+            in mock_table.update_item.call_args.kwargs["ConditionExpression"]
+        )
+
+
+def test_mark_notified_stores_notified_date():
+    with patch("boto3.resource") as mock_resource:
+        mock_table = MagicMock()
+        mock_resource.return_value.Table.return_value = mock_table
+        repo = NotificationsRepository(table_name="TestTable")
+        repo.mark_notified("1", "ch", "5.0", "2025-01-02T03:04:05+00:00")
+        kwargs = mock_table.update_item.call_args.kwargs
+        assert kwargs["ExpressionAttributeValues"] == {
+            ":n": "2025-01-02T03:04:05+00:00",
+            ":d": "2025-01-02",
+            ":ts": "5.0",
+        }
+
+
+def test_iter_notified_since_queries_each_day():
+    from datetime import datetime, timezone
+
+    with patch("boto3.resource") as mock_resource:
+        mock_table = MagicMock()
+        mock_resource.return_value.Table.return_value = mock_table
+        mock_table.query.side_effect = [
+            {"Items": [{"tweet_uid": "1"}]},
+            {"Items": [{"tweet_uid": "2"}]},
+        ]
+        repo = NotificationsRepository(table_name="TestTable")
+        since = datetime(2025, 1, 1, 20, 0, tzinfo=timezone.utc)
+        now = datetime(2025, 1, 2, 8, 0, tzinfo=timezone.utc)
+        items = list(repo.iter_notified_since(since, now))
+        assert [item["tweet_uid"] for item in items] == ["1", "2"]
+        assert mock_table.query.call_count == 2
+        for call in mock_table.query.call_args_list:
+            assert call.kwargs["IndexName"] == "notified_date-index"
+
+
+def test_update_engagement_is_conditional():
+    from botocore.exceptions import ClientError
+
+    with patch("boto3.resource") as mock_resource:
+        mock_table = MagicMock()
+        mock_resource.return_value.Table.return_value = mock_table
+        repo = NotificationsRepository(table_name="TestTable")
+
+        assert repo.update_engagement("1", "ch", 10, 2, 5, None) is True
+        kwargs = mock_table.update_item.call_args.kwargs
+        assert kwargs["UpdateExpression"] == (
+            "SET like_count = :like, retweet_count = :rt"
+        )
+        assert kwargs["ConditionExpression"] == (
+            "attribute_exists(tweet_uid) AND like_count = :old_like"
+            " AND (attribute_not_exists(retweet_count)"
+            " OR attribute_type(retweet_count, :null))"
+        )
+        assert kwargs["ExpressionAttributeValues"] == {
+            ":like": 10,
+            ":rt": 2,
+            ":old_like": 5,
+            ":null": "NULL",
+        }
+
+        mock_table.update_item.side_effect = ClientError(
+            {"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem"
+        )
+        assert repo.update_engagement("1", "ch", 10, 2, 5, 1) is False
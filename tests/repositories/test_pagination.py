@@ -0,0 +1,79 @@
+import pytest
+from unittest.mock import MagicMock
+from repositories.pagination import build_projection, count, paginate, parallel_scan
+
+
+def paged_operation(pages):
+    """ExclusiveStartKeyに応じてページを返すscan/queryの差し替え"""
+
+    def operation(**kwargs):
+        return pages[kwargs.get("ExclusiveStartKey")]
+
+    return MagicMock(side_effect=operation)
+
+
+def test_paginate_follows_last_evaluated_key():
+    operation = paged_operation(
+        {
+            None: {"Items": [{"id": "1"}, {"id": "2"}], "LastEvaluatedKey": "k2"},
+            "k2": {"Items": [{"id": "3"}], "LastEvaluatedKey": "k3"},
+            "k3": {"Items": []},
+        }
+    )
+    items = paginate(operation, IndexName="idx")
+    # ジェネレータなので消費するまで問い合わせない
+    operation.assert_not_called()
+    assert [item["id"] for item in items] == ["1", "2", "3"]
+    assert [c.kwargs.get("ExclusiveStartKey") for c in operation.call_args_list] == [
+        None,
+        "k2",
+        "k3",
+    ]
+    assert all(c.kwargs["IndexName"] == "idx" for c in operation.call_args_list)
+
+
+def test_count_uses_select_count():
+    operation = paged_operation(
+        {None: {"Count": 3, "LastEvaluatedKey": "k2"}, "k2": {"Count": 2}}
+    )
+    assert count(operation) == 5
+    assert all(c.kwargs["Select"] == "COUNT" for c in operation.call_args_list)
+
+
+def test_build_projection_uses_placeholders():
+    assert build_projection(None) == {}
+    assert build_projection(["id", "keyword"]) == {
+        "ProjectionExpression": "#p0, #p1",
+        "ExpressionAttributeNames": {"#p0": "id", "#p1": "keyword"},
+    }
+
+
+def test_parallel_scan_reads_every_segment():
+    table = MagicMock()
+
+    def scan(Segment, TotalSegments, **kwargs):
+        assert TotalSegments == 3
+        if kwargs.get("ExclusiveStartKey"):
+            return {"Items": [{"id": f"{Segment}-b"}]}
+        return {"Items": [{"id": f"{Segment}-a"}], "LastEvaluatedKey": "next"}
+
+    table.scan.side_effect = scan
+    items = list(parallel_scan(table, 3, ProjectionExpression="#p0"))
+    assert sorted(item["id"] for item in items) == [
+        "0-a",
+        "0-b",
+        "1-a",
+        "1-b",
+        "2-a",
+        "2-b",
+    ]
+    assert all(
+        c.kwargs["ProjectionExpression"] == "#p0" for c in table.scan.call_args_list
+    )
+
+
+def test_parallel_scan_raises_segment_error():
+    table = MagicMock()
+    table.scan.side_effect = Exception("throttled")
+    with pytest.raises(Exception, match="throttled"):
+        list(parallel_scan(table, 2))
@@ -0,0 +1,32 @@
+from unittest.mock import patch
+from repositories import resource_registry
+from repositories.settings_repository import SettingsRepository
+from repositories.notifications_repository import NotificationsRepository
+
+
+def test_resource_and_repositories_are_shared():
+    with patch("boto3.resource") as mock_resource:
+        settings_repo = resource_registry.get_repository(SettingsRepository)
+        assert resource_registry.get_repository(SettingsRepository) is settings_repo
+        notifications_repo = resource_registry.get_repository(NotificationsRepository)
+        assert notifications_repo.dynamodb is settings_repo.dynamodb
+
+        # boto3.resourceは最初の1回だけ、チューニング済みのConfigで呼ばれる
+        mock_resource.assert_called_once()
+        args, kwargs = mock_resource.call_args
+        assert args == ("dynamodb",)
+        config = kwargs["config"]
+        assert config.max_pool_connections == resource_registry.MAX_POOL_CONNECTIONS
+        assert config.tcp_keepalive is True
+
+        other = resource_registry.get_repository(SettingsRepository, "OtherTable")
+        assert other is not settings_repo
+        assert other.table_name == "OtherTable"
+
+
+def test_reset_registry():
+    with patch("boto3.resource") as mock_resource:
+        first = resource_registry.get_dynamodb_resource()
+        resource_registry.reset_registry()
+        mock_resource.return_value = object()
+        assert resource_registry.get_dynamodb_resource() is not first
@@ -1,6 +1,21 @@
-from unittest.mock import MagicMock, patch
+import pytest
+from unittest.mock import MagicMock, call, patch
 from repositories.settings_repository import SettingsRepository
 
+VERSION_BUMP = call(
+    Key={"id": SettingsRepository.VERSION_ITEM_ID},
+    UpdateExpression="ADD version :one",
+    ExpressionAttributeValues={":one": 1},
+)
+
+
+def assert_written_then_bumped(mock_table, **expected):
+    """設定の書き込みの直後にバージョンが更新されていること"""
+    assert mock_table.update_item.call_args_list[-2:] == [
+        call(**expected),
+        VERSION_BUMP,
+    ]
+
 
 def test_put_get_delete_update():
     with patch("boto3.resource") as mock_resource:
@@ -29,12 +44,14 @@ def test_put_get_delete_update():
         # delete_by_id: delete_item呼び出し
         repo.delete_by_id("abc123")
         mock_table.delete_item.assert_called_with(Key={"id": "abc123"})
+        assert mock_table.update_item.call_args == VERSION_BUMP
 
-        # update_keyword_by_id: update_item呼び出し
+        # update_keyword_by_id: update_item呼び出しの後にバージョンを更新
         repo.update_keyword_by_id("abc123", "kw2")
-        mock_table.update_item.assert_called_with(
+        assert_written_then_bumped(
+            mock_table,
             Key={"id": "abc123"},
-            UpdateExpression="SET keyword = :keyword",
+            UpdateExpression="SET keyword = :keyword REMOVE since_id",
             ExpressionAttributeValues={":keyword": "kw2"},
         )
 
@@ -47,3 +64,103 @@ def test_put_get_delete_update():
                 ":lastExecutedTime": "2024-06-13T12:34:56+09:00"
             },
         )
+
+        # since_id指定時は同じupdate_itemで基準点も更新する
+        repo.update_last_executed_time_by_id(
+            "abc123", "2024-06-13T12:34:56+09:00", since_id="1800000000000000000"
+        )
+        mock_table.update_item.assert_called_with(
+            Key={"id": "abc123"},
+            UpdateExpression=(
+                "SET lastExecutedTime = :lastExecutedTime, since_id = :since_id"
+            ),
+            ExpressionAttributeValues={
+                ":lastExecutedTime": "2024-06-13T12:34:56+09:00",
+                ":since_id": "1800000000000000000",
+            },
+        )
+
+        # ポーリング統計と次回の実行予定時刻も同じupdate_itemで保存する
+        stats = {"interval": 10, "runs": 1}
+        repo.update_last_executed_time_by_id(
+            "abc123",
+            "2024-06-13T12:34:56+09:00",
+            poll_stats=stats,
+            next_due_at="2024-06-13T03:44:56Z",
+        )
+        mock_table.update_item.assert_called_with(
+            Key={"id": "abc123"},
+            UpdateExpression=(
+                "SET lastExecutedTime = :lastExecutedTime,"
+                " poll_stats = :poll_stats, next_due_at = :next_due_at"
+            ),
+            ExpressionAttributeValues={
+                ":lastExecutedTime": "2024-06-13T12:34:56+09:00",
+                ":poll_stats": stats,
+                ":next_due_at": "2024-06-13T03:44:56Z",
+            },
+        )
+
+        # update_digest_by_id: 最大件数は指定した場合のみ更新する
+        repo.update_digest_by_id("abc123", True, 5)
+        assert_written_then_bumped(
+            mock_table,
+            Key={"id": "abc123"},
+            UpdateExpression="SET digest = :digest, digest_max = :digest_max",
+            ExpressionAttributeValues={":digest": True, ":digest_max": 5},
+        )
+        repo.update_digest_by_id("abc123", False)
+        assert_written_then_bumped(
+            mock_table,
+            Key={"id": "abc123"},
+            UpdateExpression="SET digest = :digest",
+            ExpressionAttributeValues={":digest": False},
+        )
+
+
+def test_max_active_settings(monkeypatch):
+    with patch("boto3.resource") as mock_resource:
+        mock_table = MagicMock()
+        mock_resource.return_value.Table.return_value = mock_table
+        mock_table.get_item.return_value = {"Item": {"version": 1}}
+        mock_table.query.return_value = {"Count": 2}
+
+        # 既定では上限なし（件数の問い合わせもしない）
+        monkeypatch.delenv("MAX_ACTIVE_SETTINGS", raising=False)
+        repo = SettingsRepository(table_name="TestTable")
+        assert repo.has_active_capacity() is True
+        repo.update_publication_status_active_by_id("a")
+        mock_table.query.assert_not_called()
+
+        monkeypatch.setenv("MAX_ACTIVE_SETTINGS", "2")
+        repo = SettingsRepository(table_name="TestTable")
+        assert repo.has_active_capacity() is False
+        with pytest.raises(Exception, match="2件まで"):
+            repo.update_publication_status_active_by_id("a")
+        # 書き込みの判定はスナップショットを使わず毎回件数を数える
+        assert mock_table.query.call_args.kwargs["Select"] == "COUNT"
+
+
+def test_iter_valid_settings_pages_and_projects():
+    with patch("boto3.resource") as mock_resource:
+        mock_table = MagicMock()
+        mock_resource.return_value.Table.return_value = mock_table
+        mock_table.query.side_effect = [
+            {"Items": [{"id": "a"}], "LastEvaluatedKey": {"id": "a"}},
+            {"Items": [{"id": "b"}]},
+        ]
+        repo = SettingsRepository(table_name="TestTable")
+
+        items = list(repo.iter_valid_settings(projection=["id", "keyword"]))
+        assert items == [{"id": "a"}, {"id": "b"}]
+        first, second = mock_table.query.call_args_list
+        assert first.kwargs["IndexName"] == "publication_status-index"
+        assert first.kwargs["ProjectionExpression"] == "#p0, #p1"
+        assert second.kwargs["ExclusiveStartKey"] == {"id": "a"}
+
+        # list_allも全ページ分を返す
+        mock_table.scan.side_effect = [
+            {"Items": [{"id": "a"}], "LastEvaluatedKey": {"id": "a"}},
+            {"Items": [{"id": "b"}]},
+        ]
+        assert repo.list_all() == {"Items": [{"id": "a"}, {"id": "b"}]}
@@ -0,0 +1,128 @@
+import os
+import boto3
+import pytest
+from unittest.mock import patch
+from moto import mock_dynamodb
+from repositories.settings_repository import SettingsRepository
+from repositories.settings_snapshot import SettingsSnapshot
+
+TABLE_NAME = "TweetWacherSettingsTable"
+
+
+@pytest.fixture
+def dynamodb():
+    os.environ["AWS_DEFAULT_REGION"] = "ap-northeast-1"
+    with mock_dynamodb():
+        resource = boto3.resource("dynamodb", region_name="ap-northeast-1")
+        resource.create_table(
+            TableName=TABLE_NAME,
+            KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}],
+            AttributeDefinitions=[
+                {"AttributeName": "id", "AttributeType": "S"},
+                {"AttributeName": "publication_status", "AttributeType": "S"},
+            ],
+            GlobalSecondaryIndexes=[
+                {
+                    "IndexName": "publication_status-index",
+                    "KeySchema": [
+                        {"AttributeName": "publication_status", "KeyType": "HASH"}
+                    ],
+                    "Projection": {"ProjectionType": "ALL"},
+                }
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        yield resource
+
+
+def test_snapshot_reads_only_after_version_change(dynamodb):
+    # バッチ側とSlackコマンド側を別の実行環境として別インスタンスで表す
+    batch_repo = SettingsRepository(TABLE_NAME, dynamodb=dynamodb)
+    command_repo = SettingsRepository(TABLE_NAME, dynamodb=dynamodb)
+    command_repo.put("kw1", "C1")
+    snapshot = SettingsSnapshot(batch_repo)
+
+    assert [s["keyword"] for s in snapshot.active_settings()] == ["kw1"]
+    assert snapshot.loads == 1
+
+    # 変更が無ければ実行時の状態と一緒にバージョン項目を読むだけで、
+    # バージョンの読み込みも全件の読み直しもしない
+    with patch.object(
+        batch_repo, "iter_valid_settings", side_effect=AssertionError
+    ), patch.object(batch_repo, "get_settings_version", side_effect=AssertionError):
+        assert len(snapshot.active_settings()) == 1
+    assert snapshot.loads == 1
+
+    # 設定の書き込みでバージョンが上がると読み直す
+    command_repo.put("kw2", "C2")
+    settings = snapshot.active_settings()
+    assert sorted(s["keyword"] for s in settings) == ["kw1", "kw2"]
+    assert all("lastExecutedTime" in s for s in settings)
+    assert snapshot.loads == 2
+
+
+def test_runtime_state_written_elsewhere_is_read_every_time(dynamodb):
+    # 別の実行環境のシャードが書き込んだ実行時の状態も、次の読み出しで反映される
+    repo = SettingsRepository(TABLE_NAME, dynamodb=dynamodb)
+    shard_repo = SettingsRepository(TABLE_NAME, dynamodb=dynamodb)
+    id = repo.put("kw1", "C1")["id"]
+    settings = repo.snapshot.active_settings(projection=["id", "since_id"])
+    assert settings == [{"id": id}]
+
+    version = repo.get_settings_version()
+    shard_repo.update_last_executed_time_by_id(
+        id, "2025-01-01T00:00:00+09:00", "123", next_due_at="2025-01-01T00:20:00+09:00"
+    )
+    # 実行時の更新ではバージョンを上げず、全件も読み直さない
+    assert shard_repo.get_settings_version() == version
+    (setting,) = repo.snapshot.active_settings()
+    assert setting["since_id"] == "123"
+    assert setting["lastExecutedTime"] == "2025-01-01T00:00:00+09:00"
+    assert setting["next_due_at"] == "2025-01-01T00:20:00+09:00"
+    assert repo.snapshot.loads == 1
+
+
+def test_deleted_setting_is_dropped_before_reload(dynamodb):
+    repo = SettingsRepository(TABLE_NAME, dynamodb=dynamodb)
+    id = repo.put("kw1", "C1")["id"]
+    assert len(repo.snapshot.active_settings()) == 1
+    # バージョンを上げる前の削除（削除とバージョン更新の間の読み出し）
+    repo.table.delete_item(Key={"id": id})
+    assert repo.snapshot.active_settings() == []
+
+
+def test_get_runtime_states_reads_version_with_states(dynamodb):
+    repo = SettingsRepository(TABLE_NAME, dynamodb=dynamodb)
+    ids = [repo.put(f"kw{i}", "C1")["id"] for i in range(3)]
+    repo.update_last_executed_time_by_id(ids[0], "t0", "10")
+    repo.BATCH_GET_MAX_KEYS = 2
+
+    version, states = repo.get_runtime_states(ids + ["missing"])
+
+    assert version == 3
+    assert sorted(states) == sorted(ids)
+    assert states[ids[0]]["since_id"] == "10"
+    # 設定の内容は読まない
+    assert "keyword" not in states[ids[1]]
+
+
+def test_version_item_is_not_listed(dynamodb):
+    repo = SettingsRepository(TABLE_NAME, dynamodb=dynamodb)
+    id = repo.put("kw1", "C1")["id"]
+    repo.update_publication_status_inactive_by_id(id)
+    assert repo.get_settings_version() == 2
+    assert [item["id"] for item in repo.list_all()["Items"]] == [id]
+    assert repo.list_valid_settings() == {"Items": []}
+
+
+def test_capacity_and_list_do_not_use_stale_snapshot(dynamodb, monkeypatch):
+    monkeypatch.setenv("MAX_ACTIVE_SETTINGS", "1")
+    repo = SettingsRepository(TABLE_NAME, dynamodb=dynamodb)
+    other = SettingsRepository(TABLE_NAME, dynamodb=dynamodb)
+    # スナップショットを読み込んだ後に、別の実行環境が設定を追加する
+    assert repo.snapshot.active_settings() == []
+    id = other.put("kw1", "C1")["id"]
+
+    assert repo.has_active_capacity() is False
+    assert repo.put("kw2", "C2")["publication_status"] == "inactive"
+    assert [item["id"] for item in repo.list_valid_settings()["Items"]] == [id]
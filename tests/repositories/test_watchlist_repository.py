@@ -0,0 +1,69 @@
+import os
+import boto3
+import pytest
+from moto import mock_dynamodb
+from repositories.watchlist_repository import WatchlistRepository
+
+TABLE_NAME = "TweetWacherWatchlistTable"
+
+
+@pytest.fixture
+def dynamodb():
+    os.environ["AWS_DEFAULT_REGION"] = "ap-northeast-1"
+    with mock_dynamodb():
+        resource = boto3.resource("dynamodb", region_name="ap-northeast-1")
+        resource.create_table(
+            TableName=TABLE_NAME,
+            KeySchema=[
+                {"AttributeName": "tweet_uid", "KeyType": "HASH"},
+                {"AttributeName": "setting_id", "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "tweet_uid", "AttributeType": "S"},
+                {"AttributeName": "setting_id", "AttributeType": "S"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        yield resource
+
+
+def test_put_iter_and_delete(dynamodb):
+    repo = WatchlistRepository(TABLE_NAME, dynamodb=dynamodb)
+    repo.put_many(
+        [("1", "s1", 2000), ("1", "s2", 2000), ("2", "s1", 500), ("1", "s1", 3000)]
+    )
+    # 期限切れ(TTLの削除待ち)の行は返さない。同じキーは上書きされる
+    items = sorted(
+        (item["tweet_uid"], item["setting_id"], int(item["expires_at"]))
+        for item in repo.iter_active(now=1000)
+    )
+    assert items == [("1", "s1", 3000), ("1", "s2", 2000)]
+
+    repo.delete_many([("1", "s1"), ("2", "s1")])
+    items = [(item["tweet_uid"], item["setting_id"]) for item in repo.iter_active(0)]
+    assert items == [("1", "s2")]
+
+
+def test_next_batch_rotates_through_all_candidates(dynamodb):
+    repo = WatchlistRepository(TABLE_NAME, dynamodb=dynamodb)
+    repo.put_many([(str(i), "s1", 2000) for i in range(5)])
+    order = [item["tweet_uid"] for item in repo.iter_active(now=1000)]
+
+    # カーソルが無い場合は先頭から読む
+    first = [item["tweet_uid"] for item in repo.next_batch(2, now=1000)]
+    assert first == order[:2]
+    # 保存したカーソルの次から読み、末尾まで読んだら先頭に戻る
+    repo.save_cursor({"tweet_uid": order[1], "setting_id": "s1"})
+    assert [item["tweet_uid"] for item in repo.next_batch(2, now=1000)] == order[2:4]
+    repo.save_cursor({"tweet_uid": order[3], "setting_id": "s1"})
+    assert [item["tweet_uid"] for item in repo.next_batch(3, now=1000)] == [
+        order[4],
+        order[0],
+        order[1],
+    ]
+    # 候補より多く読もうとしても同じ候補は2回返さない
+    assert sorted(item["tweet_uid"] for item in repo.next_batch(10, now=1000)) == (
+        sorted(order)
+    )
+    # カーソルの項目は候補に含まれない
+    assert len(list(repo.iter_active(now=0))) == 5
@@ -7,8 +7,9 @@ def test_list_all():
     with patch("boto3.resource") as mock_resource:
         mock_table = MagicMock()
         mock_resource.return_value.Table.return_value = mock_table
+        mock_table.scan.return_value = {"Items": [{"bearer_token": "a"}]}
         repo = XCredentialSettingsRepository(table_name="TestTable")
-        repo.list_all()
+        assert repo.list_all() == {"Items": [{"bearer_token": "a"}]}
         mock_table.scan.assert_called_with()
 
 
@@ -27,9 +28,17 @@ def test_update_latelimit_reset_time():
         repo.update_latelimit_reset_time(bearer_token, latelimit_reset_time)
         mock_table.update_item.assert_called_with(
             Key={"bearer_token": bearer_token},
-            UpdateExpression="SET latelimit_reset_time = :latelimit_reset_time",
+            UpdateExpression="SET #attribute = :latelimit_reset_time",
+            ExpressionAttributeNames={"#attribute": "latelimit_reset_time"},
             ExpressionAttributeValues={":latelimit_reset_time": iso8601_time},
         )
+        # エンドポイントごとの属性に保存できる
+        repo.update_latelimit_reset_time(
+            bearer_token, latelimit_reset_time, attribute="lookup_latelimit_reset_time"
+        )
+        assert mock_table.update_item.call_args.kwargs["ExpressionAttributeNames"] == {
+            "#attribute": "lookup_latelimit_reset_time"
+        }
 
 
 def test_get_available_credential():